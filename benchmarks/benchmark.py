@@ -35,6 +35,14 @@ if __name__ == "__main__":
     #     # "exp=dreamer_v2_benchmarks",
     #     # "exp=dreamer_v3_benchmarks",
     # ]
+
+    # DreamerV3 Arguments, with and without `torch.compile`
+    # args = [
+    #     os.path.join(ROOT_DIR, "__main__.py"),
+    #     "exp=dreamer_v3_compile_benchmarks",
+    #     "compile.enabled=True",
+    #     # "compile.enabled=False",
+    # ]
     with mock.patch.object(sys, "argv", args):
         tic = time.perf_counter()
         run()
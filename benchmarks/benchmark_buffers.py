@@ -0,0 +1,89 @@
+"""Micro-benchmark of the replay buffers `add` and `sample` methods.
+
+It reports the number of `add` and `sample` calls per second for different buffer sizes,
+once the buffer is full (which is the steady-state of every off-policy algorithm).
+The `EpisodeBuffer` is filled with episodes of '--episode-length' steps, so that the
+number of stored episodes grows with the buffer size.
+
+Example:
+    python benchmarks/benchmark_buffers.py --buffer-sizes 10000 100000 1000000 --n-envs 4
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from sheeprl.data.buffers import EpisodeBuffer, ReplayBuffer, SequentialReplayBuffer
+
+
+def _ops_per_second(fn, iters: int) -> float:
+    fn()  # warmup
+    tic = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return iters / (time.perf_counter() - tic)
+
+
+def benchmark(buffer_cls, buffer_size: int, n_envs: int, obs_dim: int, batch_size: int, iters: int) -> dict:
+    rb = buffer_cls(buffer_size, n_envs, obs_keys=("observations",))
+    # Fill the buffer with a single call, so that the benchmark measures the steady-state
+    rb.add(
+        {
+            "observations": np.zeros((buffer_size, n_envs, obs_dim), dtype=np.float32),
+            "rewards": np.zeros((buffer_size, n_envs, 1), dtype=np.float32),
+        }
+    )
+    step_data = {
+        "observations": np.random.rand(1, n_envs, obs_dim).astype(np.float32),
+        "rewards": np.random.rand(1, n_envs, 1).astype(np.float32),
+    }
+    sample_kwargs = {"batch_size": batch_size, "sample_next_obs": buffer_cls is ReplayBuffer}
+    if buffer_cls is SequentialReplayBuffer:
+        sample_kwargs["sequence_length"] = 64
+    return {
+        "add/s": _ops_per_second(lambda: rb.add(step_data), iters),
+        "sample/s": _ops_per_second(lambda: rb.sample(**sample_kwargs), iters),
+    }
+
+
+def benchmark_episode_buffer(buffer_size: int, episode_length: int, obs_dim: int, batch_size: int, iters: int) -> dict:
+    rb = EpisodeBuffer(buffer_size, episode_length, obs_keys=("observations",))
+    episode = {
+        "observations": np.random.rand(episode_length, 1, obs_dim).astype(np.float32),
+        "dones": np.zeros((episode_length, 1, 1), dtype=np.float32),
+    }
+    episode["dones"][-1] = 1
+    for _ in range(buffer_size // episode_length):
+        rb.add(episode)
+    return {
+        "add/s": _ops_per_second(lambda: rb.add(episode), iters),
+        "sample/s": _ops_per_second(
+            lambda: rb.sample(batch_size, sequence_length=episode_length, sample_next_obs=False), iters
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer-sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--n-envs", type=int, default=1)
+    parser.add_argument("--obs-dim", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--iters", type=int, default=1000)
+    parser.add_argument("--episode-length", type=int, default=10)
+    args = parser.parse_args()
+
+    for buffer_cls in (ReplayBuffer, SequentialReplayBuffer):
+        for buffer_size in args.buffer_sizes:
+            results = benchmark(buffer_cls, buffer_size, args.n_envs, args.obs_dim, args.batch_size, args.iters)
+            print(
+                f"{buffer_cls.__name__:<24} buffer_size={buffer_size:<10} "
+                + " ".join(f"{k}={v:,.0f}" for k, v in results.items())
+            )
+    for buffer_size in args.buffer_sizes:
+        results = benchmark_episode_buffer(buffer_size, args.episode_length, args.obs_dim, args.batch_size, args.iters)
+        print(
+            f"{EpisodeBuffer.__name__:<24} buffer_size={buffer_size:<10} "
+            + " ".join(f"{k}={v:,.0f}" for k, v in results.items())
+        )
@@ -0,0 +1,75 @@
+"""Micro-benchmark of the compressed storage of the replay buffers.
+
+It reports, for every compression codec, the number of bytes stored for every transition and the number of
+sequences per second sampled by the `SequentialReplayBuffer`. Random pixels do not compress, so the
+observations are synthetic Atari-like frames: a flat background with a few moving rectangles.
+
+Example:
+    python benchmarks/benchmark_compression.py --buffer-size 20000 --n-envs 4 --obs-shape 3 64 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from sheeprl.data.buffers import SequentialReplayBuffer
+from sheeprl.utils.imports import _IS_LZ4_AVAILABLE, _IS_ZSTD_AVAILABLE
+
+
+def synthetic_frames(buffer_size: int, n_envs: int, obs_shape: tuple) -> np.ndarray:
+    channels, height, width = obs_shape
+    frames = np.full((buffer_size, n_envs, channels, height, width), 32, dtype=np.uint8)
+    t = np.arange(buffer_size)
+    for obj in range(4):
+        rows = (t * (obj + 1) + 7 * obj) % (height - 8)
+        cols = (t * (obj + 2) // 2 + 11 * obj) % (width - 8)
+        for i in range(buffer_size):
+            frames[i, :, :, rows[i] : rows[i] + 8, cols[i] : cols[i] + 8] = 64 * (obj + 1) - 1
+    return frames
+
+
+def benchmark(
+    codec: str | None,
+    frames: np.ndarray,
+    batch_size: int,
+    sequence_length: int,
+    iters: int,
+) -> tuple:
+    buffer_size, n_envs = frames.shape[:2]
+    rb = SequentialReplayBuffer(buffer_size, n_envs, compression={"observations": codec} if codec is not None else None)
+    rb.add({"observations": frames, "rewards": np.random.rand(buffer_size, n_envs, 1).astype(np.float32)})
+    bytes_per_transition = rb["observations"].nbytes / (buffer_size * n_envs)
+    rb.sample(batch_size, sequence_length=sequence_length)  # warmup
+    tic = time.perf_counter()
+    for _ in range(iters):
+        rb.sample(batch_size, sequence_length=sequence_length)
+    return bytes_per_transition, iters * batch_size / (time.perf_counter() - tic)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer-size", type=int, default=20_000)
+    parser.add_argument("--n-envs", type=int, default=4)
+    parser.add_argument("--obs-shape", type=int, nargs="+", default=[3, 64, 64])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--sequence-length", type=int, default=64)
+    parser.add_argument("--iters", type=int, default=50)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.buffer_size, args.n_envs, tuple(args.obs_shape))
+    codecs = [None, "zlib"]
+    if _IS_LZ4_AVAILABLE:
+        codecs.append("lz4")
+    if _IS_ZSTD_AVAILABLE:
+        codecs.append("zstd")
+    for codec in codecs:
+        bytes_per_transition, sequences_per_second = benchmark(
+            codec, frames, args.batch_size, args.sequence_length, args.iters
+        )
+        print(
+            f"codec={str(codec):<6} {bytes_per_transition:>10.1f} bytes/transition "
+            f"{sequences_per_second:>10.1f} sequences/s"
+        )
@@ -0,0 +1,90 @@
+"""Micro-benchmark of the `FrameStack` wrapper.
+
+It reports the number of steps per second of an environment wrapped by the `FrameStack` wrapper, which keeps
+the frames in a preallocated circular buffer, and by the previous implementation, which kept them in a deque
+and stacked them with `np.stack` at every step, for different numbers of stacked frames and dilations.
+The environment returns the same frame without doing any computation, so that only the cost of the
+frame stack is measured.
+
+Example:
+    python benchmarks/benchmark_frame_stack.py --num-stack 4 8 16 --dilation 1 2 4 --frame-shape 3 64 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from collections import deque
+
+import gymnasium as gym
+import numpy as np
+
+from sheeprl.envs.wrappers import FrameStack
+
+
+class FrameEnv(gym.Env):
+    def __init__(self, size: tuple = (3, 64, 64)):
+        self.action_space = gym.spaces.Discrete(4)
+        self.observation_space = gym.spaces.Dict({"rgb": gym.spaces.Box(0, 255, shape=tuple(size), dtype=np.uint8)})
+        self._frame = np.random.randint(0, 256, size, dtype=np.uint8)
+
+    def step(self, action):
+        return {"rgb": self._frame}, 0.0, False, False, {}
+
+    def reset(self, seed=None, options=None):
+        return {"rgb": self._frame}, {}
+
+
+class DequeFrameStack(FrameStack):
+    """The previous implementation of the `FrameStack` wrapper, with a deque."""
+
+    def __init__(self, env: gym.Env, num_stack: int, cnn_keys, dilation: int = 1) -> None:
+        super().__init__(env, num_stack, cnn_keys, dilation)
+        self._frames = {k: deque(maxlen=num_stack * dilation) for k in self._cnn_keys}
+
+    def _get_obs(self, key):
+        frames_subset = list(self._frames[key])[self._dilation - 1 :: self._dilation]
+        return np.stack(list(frames_subset), axis=0)
+
+    def step(self, action):
+        obs, reward, done, truncated, infos = self.env.step(action)
+        for k in self._cnn_keys:
+            self._frames[k].append(obs[k])
+            obs[k] = self._get_obs(k)
+        return obs, reward, done, truncated, infos
+
+    def reset(self, *, seed=None, options=None, **kwargs):
+        obs, infos = self.env.reset(seed=seed, **kwargs)
+        for k in self._cnn_keys:
+            self._frames[k].clear()
+            self._frames[k].extend([obs[k]] * (self._num_stack * self._dilation))
+            obs[k] = self._get_obs(k)
+        return obs, infos
+
+
+def benchmark(wrapper: type, num_stack: int, dilation: int, args: argparse.Namespace) -> float:
+    env = wrapper(FrameEnv(tuple(args.frame_shape)), num_stack, ["rgb"], dilation)
+    env.reset(seed=0)
+    for _ in range(10):  # warmup
+        env.step(0)
+    tic = time.perf_counter()
+    for _ in range(args.steps):
+        env.step(0)
+    return args.steps / (time.perf_counter() - tic)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-stack", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--dilation", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--frame-shape", type=int, nargs="+", default=[3, 64, 64])
+    parser.add_argument("--steps", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'num_stack':>9} {'dilation':>8} {'deque steps/s':>14} {'ring steps/s':>13} {'speedup':>8}")
+    for num_stack in args.num_stack:
+        for dilation in args.dilation:
+            deque_stack = benchmark(DequeFrameStack, num_stack, dilation, args)
+            ring_stack = benchmark(FrameStack, num_stack, dilation, args)
+            speedup = ring_stack / deque_stack
+            print(f"{num_stack:>9} {dilation:>8} {deque_stack:>14.0f} {ring_stack:>13.0f} {speedup:>8.2f}")
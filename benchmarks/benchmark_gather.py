@@ -0,0 +1,80 @@
+"""Micro-benchmark of the sampling throughput of the replay buffers.
+
+It reports the number of gigabytes per second gathered by the `sample` method of the
+`ReplayBuffer` and of the `SequentialReplayBuffer`, both for in-RAM and memory-mapped buffers,
+with image-like observations (which dominate the memory traffic of pixel-based algorithms).
+
+Example:
+    python benchmarks/benchmark_gather.py --buffer-size 50000 --n-envs 4 --obs-shape 3 64 64 --arena-slabs 2
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from sheeprl.data.buffers import ReplayBuffer, SampleArena, SequentialReplayBuffer
+
+
+def benchmark(
+    buffer_cls,
+    memmap: bool,
+    buffer_size: int,
+    n_envs: int,
+    obs_shape: tuple,
+    batch_size: int,
+    sequence_length: int,
+    iters: int,
+    memmap_dir: str,
+    arena_slabs: int = 0,
+) -> float:
+    rb = buffer_cls(buffer_size, n_envs, obs_keys=("observations",), memmap=memmap, memmap_dir=memmap_dir)
+    rb.add(
+        {
+            "observations": np.random.randint(0, 256, (buffer_size, n_envs, *obs_shape), dtype=np.uint8),
+            "rewards": np.random.rand(buffer_size, n_envs, 1).astype(np.float32),
+        }
+    )
+    if arena_slabs > 0:
+        rb.arena = SampleArena(arena_slabs)
+    sample_kwargs = {"batch_size": batch_size}
+    if buffer_cls is SequentialReplayBuffer:
+        sample_kwargs["sequence_length"] = sequence_length
+    else:
+        sample_kwargs["sample_next_obs"] = True
+    rb.sample(**sample_kwargs)  # warmup
+    n_bytes = 0
+    tic = time.perf_counter()
+    for _ in range(iters):
+        n_bytes += sum(v.nbytes for v in rb.sample(**sample_kwargs).values())
+    return n_bytes / (time.perf_counter() - tic) / 1e9
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer-size", type=int, default=50_000)
+    parser.add_argument("--n-envs", type=int, default=4)
+    parser.add_argument("--obs-shape", type=int, nargs="+", default=[3, 64, 64])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--sequence-length", type=int, default=64)
+    parser.add_argument("--iters", type=int, default=100)
+    parser.add_argument("--arena-slabs", type=int, default=0)
+    args = parser.parse_args()
+
+    for buffer_cls in (ReplayBuffer, SequentialReplayBuffer):
+        for memmap in (False, True):
+            with tempfile.TemporaryDirectory() as memmap_dir:
+                gbps = benchmark(
+                    buffer_cls,
+                    memmap,
+                    args.buffer_size,
+                    args.n_envs,
+                    tuple(args.obs_shape),
+                    args.batch_size,
+                    args.sequence_length,
+                    args.iters,
+                    memmap_dir,
+                    args.arena_slabs,
+                )
+            print(f"{buffer_cls.__name__:<24} memmap={str(memmap):<6} {gbps:.2f} GB/s")
@@ -0,0 +1,77 @@
+"""Micro-benchmark of the `LayerNormGRUCell`.
+
+It reports the time needed to run (forward and backward) the cell on a sequence, for the recurrent model
+sizes of DreamerV3, when the cell is called once per step, as the Dreamer recurrent models do, and when
+the whole sequence is run by `forward_sequence`, with and without the fused gates.
+The benchmark runs on CPU and, if available, on CUDA.
+
+Example:
+    python benchmarks/benchmark_gru.py --sizes S M L XL --sequence-length 64 --batch-size 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import torch
+
+from sheeprl.models.models import LayerNormGRUCell
+
+# The (dense_units, recurrent_state_size) of the DreamerV3 model sizes
+SIZES = {"XS": (256, 256), "S": (512, 512), "M": (640, 1024), "L": (768, 2048), "XL": (1024, 4096)}
+
+
+def run_steps(cell: LayerNormGRUCell, input: torch.Tensor, hx: torch.Tensor) -> torch.Tensor:
+    hxs = []
+    for x in input.unbind(0):
+        hx = cell(x, hx)
+        hxs.append(hx)
+    return torch.stack(hxs, 0)
+
+
+def benchmark(fn, cell: LayerNormGRUCell, input: torch.Tensor, hx: torch.Tensor, iters: int) -> float:
+    def run():
+        fn(cell, input, hx).sum().backward()
+
+    for _ in range(2):
+        run()
+    if input.is_cuda:
+        torch.cuda.synchronize()
+    tic = time.perf_counter()
+    for _ in range(iters):
+        run()
+    if input.is_cuda:
+        torch.cuda.synchronize()
+    return (time.perf_counter() - tic) / iters
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=str, nargs="+", default=["S", "M", "L", "XL"], choices=list(SIZES.keys()))
+    parser.add_argument("--sequence-length", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args()
+
+    devices = ["cpu"] + (["cuda"] if torch.cuda.is_available() else [])
+    variants = {
+        "per-step": (False, run_steps),
+        "sequence": (False, LayerNormGRUCell.forward_sequence),
+        "fused sequence": (True, LayerNormGRUCell.forward_sequence),
+    }
+    print(f"{'device':>6} {'size':>4} " + " ".join(f"{name + ' [ms]':>20}" for name in variants) + f" {'speedup':>8}")
+    for device in devices:
+        for size in args.sizes:
+            dense_units, recurrent_state_size = SIZES[size]
+            input = torch.randn(args.sequence_length, args.batch_size, dense_units, device=device)
+            hx = torch.zeros(args.batch_size, recurrent_state_size, device=device)
+            times = []
+            for fused, fn in variants.values():
+                cell = LayerNormGRUCell(dense_units, recurrent_state_size, bias=False, layer_norm=True, fused=fused)
+                times.append(benchmark(fn, cell.to(device), input, hx, args.iters))
+            print(
+                f"{device:>6} {size:>4} "
+                + " ".join(f"{t * 1000:>20.2f}" for t in times)
+                + f" {times[0] / min(times[1:]):>8.2f}"
+            )
@@ -0,0 +1,156 @@
+"""Benchmark of the imagination of DreamerV3.
+
+It reports the number of gradient steps per second of the DreamerV3 `train` function, with the imagination
+run step by step (eager) and with the whole rollout over the horizon compiled as a single static-shape graph
+(captured with CUDA graphs on CUDA). The batches are random 64x64 pixel observations with discrete actions.
+The model is the one of the `dreamer_v3_compile_benchmarks` experiment (XS-like sizes), which can be changed
+with Hydra overrides.
+
+Example:
+    python benchmarks/benchmark_imagination.py --batch-size 16 --sequence-length 64 --iters 10
+    python benchmarks/benchmark_imagination.py --device cuda --overrides algo.dense_units=512
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, Sequence, Tuple
+
+import gymnasium as gym
+import hydra
+import numpy as np
+import torch
+from hydra import compose, initialize_config_dir
+from lightning import Fabric
+from omegaconf import OmegaConf
+
+from sheeprl.algos.dreamer_v3.agent import build_agent
+from sheeprl.algos.dreamer_v3.dreamer_v3 import train
+from sheeprl.algos.dreamer_v3.utils import ImaginationEngine, Moments
+from sheeprl.utils.utils import dotdict
+
+CONFIG_DIR = str(Path(__file__).parents[1] / "sheeprl" / "configs")
+ACTIONS_DIM = (9,)
+
+
+def random_batch(cfg, device: torch.device) -> dict:
+    sequence_length, batch_size = cfg.algo.per_rank_sequence_length, cfg.algo.per_rank_batch_size
+    actions = torch.nn.functional.one_hot(torch.randint(0, ACTIONS_DIM[0], (sequence_length, batch_size)))
+    return {
+        "rgb": torch.randint(0, 256, (sequence_length, batch_size, 3, 64, 64), device=device).float(),
+        "actions": actions.float().to(device),
+        "rewards": torch.randn(sequence_length, batch_size, 1, device=device),
+        "dones": torch.zeros(sequence_length, batch_size, 1, device=device),
+        "is_first": torch.zeros(sequence_length, batch_size, 1, device=device),
+    }
+
+
+def make_train_step(cfg, device: str, compile: bool = False) -> Tuple[Fabric, Callable[[], None]]:
+    """Build the DreamerV3 agent and return a function running one gradient step on a random batch."""
+    fabric = Fabric(accelerator=device, devices=1, precision=cfg.fabric.precision)
+    fabric.seed_everything(cfg.seed)
+    obs_space = gym.spaces.Dict({"rgb": gym.spaces.Box(0, 255, (3, 64, 64), np.uint8)})
+    world_model, actor, critic, target_critic = build_agent(fabric, ACTIONS_DIM, False, cfg, obs_space)
+    world_optimizer = hydra.utils.instantiate(cfg.algo.world_model.optimizer, params=world_model.parameters())
+    actor_optimizer = hydra.utils.instantiate(cfg.algo.actor.optimizer, params=actor.parameters())
+    critic_optimizer = hydra.utils.instantiate(cfg.algo.critic.optimizer, params=critic.parameters())
+    world_optimizer, actor_optimizer, critic_optimizer = fabric.setup_optimizers(
+        world_optimizer, actor_optimizer, critic_optimizer
+    )
+    moments = Moments(
+        cfg.algo.actor.moments.decay,
+        cfg.algo.actor.moments.max,
+        cfg.algo.actor.moments.percentile.low,
+        cfg.algo.actor.moments.percentile.high,
+    )
+    imagination = ImaginationEngine(
+        world_model.rssm,
+        actor,
+        cfg.algo.horizon,
+        cfg.algo.world_model.stochastic_size,
+        cfg.algo.world_model.discrete_size,
+        cfg.algo.world_model.recurrent_model.recurrent_state_size,
+        ACTIONS_DIM,
+        compile=compile,
+        mode=cfg.algo.imagination.mode,
+    )
+    batch = random_batch(cfg, fabric.device)
+
+    def step():
+        train(
+            fabric,
+            world_model,
+            actor,
+            critic,
+            target_critic,
+            world_optimizer,
+            actor_optimizer,
+            critic_optimizer,
+            {k: v.clone() for k, v in batch.items()},
+            None,
+            cfg,
+            False,
+            ACTIONS_DIM,
+            moments,
+            imagination,
+        )
+
+    return fabric, step
+
+
+def benchmark(fabric: Fabric, step: Callable[[], None], iters: int, warmup: int) -> float:
+    # The first steps are not timed: they compile the graphs and warm up the allocators
+    for _ in range(warmup):
+        step()
+    if fabric.device.type == "cuda":
+        torch.cuda.synchronize()
+    tic = time.perf_counter()
+    for _ in range(iters):
+        step()
+    if fabric.device.type == "cuda":
+        torch.cuda.synchronize()
+    return iters / (time.perf_counter() - tic)
+
+
+def compose_config(args: argparse.Namespace, overrides: Sequence[str] = ()):
+    with initialize_config_dir(config_dir=CONFIG_DIR, version_base="1.3"):
+        cfg = compose(
+            config_name="config",
+            overrides=[
+                "exp=dreamer_v3_compile_benchmarks",
+                "compile.enabled=False",
+                "algo.cnn_keys.encoder=[rgb]",
+                "algo.mlp_keys.encoder=[]",
+                f"algo.per_rank_batch_size={args.batch_size}",
+                f"algo.per_rank_sequence_length={args.sequence_length}",
+                f"algo.horizon={args.horizon}",
+                *overrides,
+                *args.overrides,
+            ],
+        )
+    return dotdict(OmegaConf.to_container(cfg, resolve=True, throw_on_missing=True))
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--device", type=str, default="cpu", choices=["cpu", "cuda"])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--sequence-length", type=int, default=64)
+    parser.add_argument("--horizon", type=int, default=15)
+    parser.add_argument("--iters", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--overrides", type=str, nargs="*", default=[])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args()
+    cfg = compose_config(args)
+
+    results = {}
+    for compile in (False, True):
+        results[compile] = benchmark(*make_train_step(cfg, args.device, compile), args.iters, args.warmup)
+        print(f"{'compiled' if compile else 'eager':>8} imagination: {results[compile]:.2f} gradient steps/s")
+    print(f"Speedup: {results[True] / results[False]:.2f}x")
@@ -0,0 +1,52 @@
+"""Micro-benchmark of the object-centric observations of the `OCAtariWrapper`.
+
+For every perturbation mode, it reports the number of environment steps per second of the wrapped OCAtari
+environment and the number of observations per second converted by the wrapper (the extraction of the
+object vector and its perturbation), measured on the objects of a fixed frame.
+It requires the `ocatari` package and the Atari ROMs.
+
+Example:
+    python benchmarks/benchmark_ocatari.py --id MsPacmanNoFrameskip-v4 --steps 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from sheeprl.envs.ocatari import OCAtariWrapper, Perturbation
+
+PERTURBATIONS = {
+    name: value for name, value in vars(Perturbation).items() if not name.startswith("_") and isinstance(value, int)
+}
+
+
+def benchmark(perturbation: int, args: argparse.Namespace) -> tuple[float, float]:
+    env = OCAtariWrapper(args.id, render_mode="rgb_array", perturbation=perturbation, seed=0)
+    env.reset(seed=0)
+    tic = time.perf_counter()
+    for _ in range(args.steps):
+        _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+        if terminated or truncated:
+            env.reset()
+    steps_per_second = args.steps / (time.perf_counter() - tic)
+
+    rgb_obs = env.step(0)[0]["rgb"]
+    tic = time.perf_counter()
+    for _ in range(args.steps):
+        env._convert_obs(rgb_obs)
+    conversions_per_second = args.steps / (time.perf_counter() - tic)
+    env.close()
+    return steps_per_second, conversions_per_second
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--id", type=str, default="MsPacmanNoFrameskip-v4")
+    parser.add_argument("--steps", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'perturbation':>24} {'env steps/s':>12} {'conversions/s':>14}")
+    for name, perturbation in PERTURBATIONS.items():
+        steps_per_second, conversions_per_second = benchmark(perturbation, args)
+        print(f"{name:>24} {steps_per_second:>12.0f} {conversions_per_second:>14.0f}")
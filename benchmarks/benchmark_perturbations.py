@@ -0,0 +1,47 @@
+"""Micro-benchmark of the batched observation perturbations.
+
+It reports the time needed to perturb a set of recorded observations (object vectors and frames) with all
+the perturbation modes, when every observation is perturbed on its own (as the 'OCAtariWrapper' does inside
+the environments) and when all the modes are applied at once by `sweep_perturbations`.
+
+Example:
+    python benchmarks/benchmark_perturbations.py --num-obs 1000 --num-slots 32 --frame-shape 3 64 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from sheeprl.envs.perturbations import OBJ_SIZE, Perturbation, perturb_observations, sweep_perturbations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-obs", type=int, default=1000)
+    parser.add_argument("--num-slots", type=int, default=32)
+    parser.add_argument("--frame-shape", type=int, nargs="+", default=[3, 64, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    objects = rng.integers(0, 256, (args.num_obs, args.num_slots * OBJ_SIZE), dtype=np.uint8)
+    objects[:, : args.num_slots] = 0
+    obs = {
+        "objects_position": objects,
+        "rgb": rng.integers(0, 256, (args.num_obs, *args.frame_shape), dtype=np.uint8),
+    }
+    perturbations = list(range(Perturbation.ALL + 1))
+
+    tic = time.perf_counter()
+    for p in perturbations:
+        for i in range(args.num_obs):
+            perturb_observations({k: v[i] for k, v in obs.items()}, p, rng)
+    per_obs = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    sweep_perturbations(obs, perturbations, rng)
+    batched = time.perf_counter() - tic
+
+    print(f"{'num_obs':>8} {'modes':>6} {'per-obs [s]':>12} {'batched [s]':>12} {'speedup':>8}")
+    print(f"{args.num_obs:>8} {len(perturbations):>6} {per_obs:>12.3f} {batched:>12.3f} {per_obs / batched:>8.2f}")
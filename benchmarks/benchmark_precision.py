@@ -0,0 +1,55 @@
+"""Benchmark of the precision of DreamerV3.
+
+It reports the number of gradient steps per second and the peak memory of the DreamerV3 `train` function
+with full precision, with the mixed precision of Fabric applied to every module and with the per-module
+precision (`precision.enabled=True`): bfloat16 encoder, RSSM and decoder, float32 heads and losses.
+Every configuration runs in its own process: on CPU the peak memory is the peak resident set size of the process,
+on CUDA it is the peak memory allocated by PyTorch.
+The model and the batches are the ones of `benchmark_imagination.py`.
+
+Example:
+    python benchmarks/benchmark_precision.py --batch-size 16 --sequence-length 64 --iters 10
+    python benchmarks/benchmark_precision.py --device cuda --overrides algo.dense_units=512
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import resource
+
+import torch
+from benchmark_imagination import add_arguments, benchmark, compose_config, make_train_step
+
+CONFIGURATIONS = {
+    "32-true": ["fabric.precision=32-true"],
+    "bf16-mixed": ["fabric.precision=bf16-mixed"],
+    "per-module bf16": ["fabric.precision=32-true", "precision.enabled=True"],
+}
+
+
+def run(args: argparse.Namespace, overrides: list, queue: mp.Queue) -> None:
+    cfg = compose_config(args, overrides)
+    fabric, step = make_train_step(cfg, args.device)
+    steps_per_second = benchmark(fabric, step, args.iters, args.warmup)
+    if fabric.device.type == "cuda":
+        peak_memory = torch.cuda.max_memory_allocated() / 2**20
+    else:
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+    queue.put((steps_per_second, peak_memory))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'precision':>16} {'steps/s':>8} {'peak memory [MiB]':>18}")
+    for name, overrides in CONFIGURATIONS.items():
+        queue = ctx.Queue()
+        process = ctx.Process(target=run, args=(args, overrides, queue))
+        process.start()
+        steps_per_second, peak_memory = queue.get()
+        process.join()
+        print(f"{name:>16} {steps_per_second:>8.2f} {peak_memory:>18.0f}")
@@ -0,0 +1,93 @@
+"""Micro-benchmark of the preprocessing of the pixel observations.
+
+It reports the number of environment steps per second of the vectorized environments for a growing number of
+environments, when the frames are resized (and converted to grayscale) inside every environment and when they
+are preprocessed at once by the `BatchedPreprocessObservation` wrapper of the vectorized environment.
+The environments return Atari-like frames without doing any computation, so that only the cost
+of the preprocessing and of the vectorization is measured.
+
+Example:
+    python benchmarks/benchmark_preprocessing.py --num-envs 16 32 64 --frame-shape 210 160 3 --grayscale
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import gymnasium as gym
+import numpy as np
+
+from sheeprl.utils.env import make_env, make_vector_env
+from sheeprl.utils.utils import dotdict
+
+
+class FramesEnv(gym.Env):
+    def __init__(self, size: tuple = (210, 160, 3), n_frames: int = 16):
+        self.action_space = gym.spaces.Discrete(4)
+        self.observation_space = gym.spaces.Box(0, 255, shape=tuple(size), dtype=np.uint8)
+        self._frames = np.random.randint(0, 256, (n_frames, *size), dtype=np.uint8)
+        self._step = 0
+
+    def step(self, action):
+        self._step += 1
+        return self._frames[self._step % len(self._frames)], 0.0, False, False, {}
+
+    def reset(self, seed=None, options=None):
+        self._step = 0
+        return self._frames[0], {}
+
+
+def benchmark(num_envs: int, sync_env: bool, batched: bool, args: argparse.Namespace) -> float:
+    cfg = dotdict(
+        {
+            "env": {
+                "id": "frames",
+                "num_envs": num_envs,
+                "sync_env": sync_env,
+                "screen_size": args.screen_size,
+                "grayscale": args.grayscale,
+                "frame_stack": 1,
+                "frame_stack_dilation": 1,
+                "action_repeat": 1,
+                "capture_video": False,
+                "max_episode_steps": None,
+                "reward_as_observation": False,
+                "batched_preprocessing": batched,
+                "wrapper": {"_target_": f"{__name__}.FramesEnv", "size": list(args.frame_shape)},
+            },
+            "algo": {"cnn_keys": {"encoder": ["rgb"]}, "mlp_keys": {"encoder": []}},
+        }
+    )
+    envs = make_vector_env(
+        cfg, [make_env(cfg, i, 0, vector_env_idx=i, batched_preprocessing=batched) for i in range(num_envs)]
+    )
+    actions = np.zeros(num_envs, dtype=np.int64)
+    envs.reset(seed=0)
+    for _ in range(10):  # warmup
+        envs.step(actions)
+    tic = time.perf_counter()
+    for _ in range(args.steps):
+        envs.step(actions)
+    env_steps_per_second = args.steps * num_envs / (time.perf_counter() - tic)
+    envs.close()
+    return env_steps_per_second
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--frame-shape", type=int, nargs="+", default=[210, 160, 3])
+    parser.add_argument("--screen-size", type=int, default=64)
+    parser.add_argument("--grayscale", action="store_true")
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--async-env", action="store_true", help="benchmark the AsyncVectorEnv too")
+    args = parser.parse_args()
+
+    vector_envs = [("sync", True)] + ([("async", False)] if args.async_env else [])
+    print(f"{'num_envs':>8} {'vector_env':>10} {'per-env steps/s':>16} {'batched steps/s':>16} {'speedup':>8}")
+    for num_envs in args.num_envs:
+        for name, sync_env in vector_envs:
+            per_env = benchmark(num_envs, sync_env, False, args)
+            batched = benchmark(num_envs, sync_env, True, args)
+            print(f"{num_envs:>8} {name:>10} {per_env:>16.0f} {batched:>16.0f} {batched / per_env:>8.2f}")
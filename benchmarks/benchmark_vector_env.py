@@ -0,0 +1,132 @@
+"""Micro-benchmark of the transport of the observations of the asynchronous vectorized environments.
+
+It reports the number of environment steps per second of the `gymnasium.vector.AsyncVectorEnv`, which copies
+the observations read from shared memory and pickles the final observations, and of the `SharedMemoryVectorEnv`,
+which returns views of the shared memory written by the workers.
+The environments return dictionary observations with an Atari-like frame and a vector without doing
+any computation, and their episodes last 'episode_length' steps, so that only the cost
+of the transport of the observations is measured.
+
+With '--long-tail', the steps of the environments last 'step_time' seconds and their resets,
+every 'episode_length' steps, last 'reset_time' seconds: then the `AsyncVectorEnv` is compared
+with the `AsyncBatchVectorEnv`, which steps the environments in partial batches of 'batch_size' environments.
+
+Example:
+    python benchmarks/benchmark_vector_env.py --num-envs 4 8 16 --frame-shape 3 64 64 --episode-length 100
+    python benchmarks/benchmark_vector_env.py --num-envs 8 16 --long-tail --batch-size 4 --reset-time 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import gymnasium as gym
+import numpy as np
+
+from sheeprl.envs.vector import AsyncBatchVectorEnv, SharedMemoryVectorEnv
+
+
+class DictFramesEnv(gym.Env):
+    def __init__(
+        self,
+        size: tuple = (3, 64, 64),
+        episode_length: int = 100,
+        n_frames: int = 16,
+        step_time: float = 0.0,
+        reset_time: float = 0.0,
+        seed: int = 0,
+    ):
+        self.action_space = gym.spaces.Discrete(4)
+        self.observation_space = gym.spaces.Dict(
+            {
+                "rgb": gym.spaces.Box(0, 255, shape=tuple(size), dtype=np.uint8),
+                "state": gym.spaces.Box(-np.inf, np.inf, shape=(32,), dtype=np.float32),
+            }
+        )
+        self._frames = np.random.randint(0, 256, (n_frames, *size), dtype=np.uint8)
+        self._state = np.zeros(32, dtype=np.float32)
+        self._episode_length = episode_length
+        self._step_time = step_time
+        self._reset_time = reset_time
+        # The environments reset at different steps
+        self._step = seed % episode_length
+
+    def _obs(self):
+        return {"rgb": self._frames[self._step % len(self._frames)], "state": self._state}
+
+    def step(self, action):
+        self._step += 1
+        if self._step_time > 0:
+            time.sleep(self._step_time)
+        return self._obs(), 0.0, self._step % self._episode_length == 0, False, {}
+
+    def reset(self, seed=None, options=None):
+        # The step counter is not reset, so that the environments keep resetting at different steps
+        if self._reset_time > 0:
+            time.sleep(self._reset_time)
+        return self._obs(), {}
+
+
+def _env_fns(num_envs: int, args: argparse.Namespace, long_tail: bool = False) -> list:
+    times = {"step_time": args.step_time, "reset_time": args.reset_time} if long_tail else {}
+    return [
+        lambda i=i: DictFramesEnv(tuple(args.frame_shape), args.episode_length, seed=i, **times)
+        for i in range(num_envs)
+    ]
+
+
+def benchmark(num_envs: int, vectorized_env: type, args: argparse.Namespace, long_tail: bool = False) -> float:
+    envs = vectorized_env(_env_fns(num_envs, args, long_tail))
+    actions = np.zeros(num_envs, dtype=np.int64)
+    envs.reset(seed=0)
+    for _ in range(10):  # warmup
+        envs.step(actions)
+    tic = time.perf_counter()
+    for _ in range(args.steps):
+        envs.step(actions)
+    env_steps_per_second = args.steps * num_envs / (time.perf_counter() - tic)
+    envs.close()
+    return env_steps_per_second
+
+
+def benchmark_partial_batches(num_envs: int, args: argparse.Namespace) -> float:
+    envs = AsyncBatchVectorEnv(_env_fns(num_envs, args, long_tail=True), args.batch_size)
+    envs.reset(seed=0)
+    envs.send(np.zeros(num_envs, dtype=np.int64))
+    n_steps = 0
+    tic = time.perf_counter()
+    while n_steps < args.steps * num_envs:
+        *_, env_ids = envs.recv()
+        envs.send(np.zeros(len(env_ids), dtype=np.int64), env_ids)
+        n_steps += len(env_ids)
+    env_steps_per_second = n_steps / (time.perf_counter() - tic)
+    envs.close()
+    return env_steps_per_second
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--frame-shape", type=int, nargs="+", default=[3, 64, 64])
+    parser.add_argument("--episode-length", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--long-tail", action="store_true", help="benchmark the partial batches")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--step-time", type=float, default=0.001)
+    parser.add_argument("--reset-time", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.long_tail:
+        print(f"{'num_envs':>8} {'async steps/s':>14} {'partial batches steps/s':>24} {'speedup':>8}")
+        for num_envs in args.num_envs:
+            async_env = benchmark(num_envs, gym.vector.AsyncVectorEnv, args, long_tail=True)
+            partial = benchmark_partial_batches(num_envs, args)
+            print(f"{num_envs:>8} {async_env:>14.0f} {partial:>24.0f} {partial / async_env:>8.2f}")
+        raise SystemExit
+
+    print(f"{'num_envs':>8} {'async steps/s':>14} {'zero-copy steps/s':>18} {'speedup':>8}")
+    for num_envs in args.num_envs:
+        async_env = benchmark(num_envs, gym.vector.AsyncVectorEnv, args)
+        zero_copy = benchmark(num_envs, SharedMemoryVectorEnv, args)
+        print(f"{num_envs:>8} {async_env:>14.0f} {zero_copy:>18.0f} {zero_copy / async_env:>8.2f}")
@@ -1,55 +1,94 @@
-import os
 import glob
+import json
+import os
+import statistics
 
 NUM_EVALS = 19
+# number of environments playing the evaluation episodes in parallel
+NUM_ENVS = 4
+
+
+def save_results(results_path, results, new_results, evals_done):
+    # the evaluations run before are kept: the ones of the old runs (without results) are only counted
+    if results is None:
+        new_results["legacy_evals"] = evals_done
+    else:
+        new_results["legacy_evals"] = results.get("legacy_evals", 0)
+        new_results["episodes"] = results["episodes"] + new_results["episodes"]
+        new_results["num_evals"] = len(new_results["episodes"])
+        rewards = [episode["cumulative_reward"] for episode in new_results["episodes"]]
+        new_results["cumulative_reward"] = {
+            "mean": statistics.mean(rewards),
+            "std": statistics.pstdev(rewards),
+            "min": min(rewards),
+            "max": max(rewards),
+        }
+    with open(results_path, "w") as f:
+        json.dump(new_results, f, indent=2)
+
 
 def main():
-    print(f"Running test evals ...")
-    checkpoint_pattern = 'ckpt_100000'
+    print("Running test evals ...")
+    checkpoint_pattern = "ckpt_100000"
     run_count = 0
     eval_count = 0
-    for game_dir in glob.glob(os.path.join('logs/runs/dreamer_v3', '*')):
-        for run_dir in glob.glob(os.path.join(game_dir, '*')):
-            run_name = run_dir.split('/')[-1]
-            # if run_dir start with a number lesser than 2024-02-07 continue, 
+    for game_dir in glob.glob(os.path.join("logs/runs/dreamer_v3", "*")):
+        for run_dir in glob.glob(os.path.join(game_dir, "*")):
+            run_name = run_dir.split("/")[-1]
+            # if run_dir start with a number lesser than 2024-02-07 continue,
             # early runs used a different ocatari wrapper with x,y,w,h instead of just x,y
-            if run_name < '2024-02-07':
+            if run_name < "2024-02-07":
                 print("skipping", run_name, "because it is an old run with different octari wrapper")
                 continue
-            for version_dir in glob.glob(os.path.join(run_dir, 'version_*')):
+            for version_dir in glob.glob(os.path.join(run_dir, "version_*")):
                 # check if checkpoint subdirectory exists
-                if not os.path.exists(os.path.join(version_dir, 'checkpoint')):
-                    continue # no checkpoint directory found
-                # Get checkpoint file path by looking for a file in the checkpoint directory that starts with 'ckpt_100000'
-                checkpoint_path = glob.glob(os.path.join(version_dir, 'checkpoint', f'{checkpoint_pattern}*'))
+                if not os.path.exists(os.path.join(version_dir, "checkpoint")):
+                    continue  # no checkpoint directory found
+                # Get checkpoint file path by looking for a file in the checkpoint directory
+                # that starts with 'ckpt_100000'
+                checkpoint_path = glob.glob(os.path.join(version_dir, "checkpoint", f"{checkpoint_pattern}*"))
                 if len(checkpoint_path) == 0:
-                    continue # no checkpoint found in the checkpoint directory
-                checkpoint_path = checkpoint_path[0] # should be only one file
+                    continue  # no checkpoint found in the checkpoint directory
+                checkpoint_path = checkpoint_path[0]  # should be only one file
                 # check if the evaluation directory exists
-                eval_dir = os.path.join(version_dir, 'evaluation')
-                test_evals_to_run = 0
+                eval_dir = os.path.join(version_dir, "evaluation")
                 if not os.path.exists(eval_dir):
                     # crete the evaluation directory
                     os.makedirs(eval_dir)
-                # check that version_N for N = 0,1,2,3,4 exists within the evaluation dir, if not add to the list
-                for i in range(0, NUM_EVALS):
-                    version_dir = os.path.join(eval_dir, f'version_{i}')
-                    if not os.path.exists(version_dir):
-                        test_evals_to_run += 1
-                if test_evals_to_run == 0:
+                # the evaluations of a checkpoint are run by a single process and saved in results.json,
+                # old runs have one version_N directory for each evaluation
+                results_path = os.path.join(eval_dir, "results.json")
+                results = None
+                if os.path.exists(results_path):
+                    with open(results_path) as f:
+                        results = json.load(f)
+                    evals_done = results["num_evals"] + results.get("legacy_evals", 0)
+                else:
+                    evals_done = sum(os.path.exists(os.path.join(eval_dir, f"version_{i}")) for i in range(NUM_EVALS))
+                if evals_done >= NUM_EVALS:
                     print(f"Skipping {run_name} because all {NUM_EVALS} test evals have been run")
                     continue
+                test_evals_to_run = NUM_EVALS - evals_done
 
                 print(f"Running {test_evals_to_run} test evals for {checkpoint_path}")
-                # run the evaluation
-                for i in range(test_evals_to_run):
-                    os.system(f"python sheeprl_eval.py checkpoint_path={checkpoint_path}")
-                run_count +=1
+                # run the evaluation: the checkpoint is loaded and the environments are built only once
+                new_results_path = os.path.join(eval_dir, "results_new.json")
+                os.system(
+                    f"python sheeprl_eval.py checkpoint_path={checkpoint_path} num_evals={test_evals_to_run} "
+                    f"env.num_envs={NUM_ENVS} results_path={new_results_path}"
+                )
+                if not os.path.exists(new_results_path):
+                    print(f"The test evals of {checkpoint_path} failed")
+                    continue
+                with open(new_results_path) as f:
+                    new_results = json.load(f)
+                os.remove(new_results_path)
+                save_results(results_path, results, new_results, evals_done)
+                run_count += 1
                 eval_count += test_evals_to_run
-                
-    
-    print("Done",eval_count ,"test evals for", run_count, "experiments")
+
+    print("Done", eval_count, "test evals for", run_count, "experiments")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -14,7 +14,7 @@ from sheeprl.algos.a2c.agent import build_agent
 from sheeprl.algos.a2c.loss import policy_loss, value_loss
 from sheeprl.algos.a2c.utils import test
 from sheeprl.data import ReplayBuffer
-from sheeprl.utils.env import make_env
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -119,8 +119,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -129,9 +129,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     observation_space = envs.single_observation_space
 
@@ -17,6 +17,8 @@ from sheeprl.algos.dreamer_v2.agent import CNNDecoder, CNNEncoder
 from sheeprl.algos.dreamer_v2.agent import MinedojoActor as DV2MinedojoActor
 from sheeprl.algos.dreamer_v2.agent import MLPDecoder, MLPEncoder
 from sheeprl.models.models import MLP, MultiDecoder, MultiEncoder
+from sheeprl.utils.compile import compile_modules
+from sheeprl.utils.precision import set_modules_precision
 from sheeprl.utils.utils import init_weights
 
 # In order to use the hydra.utils.get_class method, in this way the user can
@@ -131,6 +133,50 @@ class RSSM(nn.Module):
         posterior_mean_std, posterior = self._representation(recurrent_state, embedded_obs)
         return recurrent_state, posterior, prior, posterior_mean_std, prior_state_mean_std
 
+    def dynamic_sequence(
+        self, posterior: Tensor, recurrent_state: Tensor, actions: Tensor, embedded_obs: Tensor
+    ) -> Tuple[Tensor, Tensor, Tensor, Tuple[Tensor, Tensor], Tuple[Tensor, Tensor]]:
+        """
+        Perform the dynamic learning on a whole sequence, equivalent to calling `dynamic` for every step.
+        Only the recurrent model and the representation model are run step by step, while the prior states
+        of all the steps are computed by the transition model at once from the recurrent outputs.
+
+        Args:
+            posterior (Tensor): the initial posterior state, of shape `[1, batch_size, stochastic_size]`.
+            recurrent_state (Tensor): the initial recurrent state, of shape `[1, batch_size, recurrent_state_size]`.
+            actions (Tensor): the actions taken by the agent, of shape `[sequence_length, batch_size, actions_dim]`.
+            embedded_obs (Tensor): the embedded observations provided by the environment,
+                of shape `[sequence_length, batch_size, embedded_size]`.
+
+        Returns:
+            The recurrent states (Tensor): the recurrent states of the recurrent model.
+            The posterior states (Tensor): computed by the representation model
+            from the recurrent states and the embedded observations.
+            The prior states (Tensor): computed by the transition model from the recurrent outputs.
+            The posterior means and stds (Tuple[Tensor, Tensor]): the means and stds of
+            the distributions of the posterior states.
+            The prior means and stds (Tuple[Tensor, Tensor]): the predicted means and stds of
+            the distributions of the prior states.
+        """
+        sequence_length, batch_size = actions.shape[:2]
+        recurrent_outs = recurrent_state.new_empty(sequence_length, batch_size, recurrent_state.shape[-1])
+        recurrent_states = recurrent_state.new_empty(sequence_length, batch_size, recurrent_state.shape[-1])
+        posteriors = posterior.new_empty(sequence_length, batch_size, posterior.shape[-1])
+        posteriors_mean = posterior.new_empty(sequence_length, batch_size, posterior.shape[-1])
+        posteriors_std = posterior.new_empty(sequence_length, batch_size, posterior.shape[-1])
+        for i in range(sequence_length):
+            recurrent_out, recurrent_state = self.recurrent_model(
+                torch.cat((posterior, actions[i : i + 1]), -1), recurrent_state
+            )
+            (posterior_mean, posterior_std), posterior = self._representation(recurrent_state, embedded_obs[i : i + 1])
+            recurrent_outs[i] = recurrent_out
+            recurrent_states[i] = recurrent_state
+            posteriors[i] = posterior
+            posteriors_mean[i] = posterior_mean
+            posteriors_std[i] = posterior_std
+        prior_mean_std, priors = self._transition(recurrent_outs)
+        return recurrent_states, posteriors, priors, (posteriors_mean, posteriors_std), prior_mean_std
+
     def _representation(self, recurrent_state: Tensor, embedded_obs: Tensor) -> Tuple[Tuple[Tensor, Tensor], Tensor]:
         """Compute the distribution of the posterior state.
 
@@ -509,4 +555,21 @@ def build_agent(
     actor = fabric.setup_module(actor)
     critic = fabric.setup_module(critic)
 
+    # Set the precision and compile the selected modules in place
+    modules = {
+        "encoder": [world_model.encoder],
+        "rssm": [
+            world_model.rssm.recurrent_model,
+            world_model.rssm.representation_model,
+            world_model.rssm.transition_model,
+        ],
+        "decoder": [world_model.observation_model],
+        "reward": [world_model.reward_model],
+        "continue": [world_model.continue_model],
+        "actor": [actor],
+        "critic": [critic],
+    }
+    set_modules_precision(modules, cfg, fabric.device)
+    compile_modules(modules, cfg)
+
     return world_model, actor, critic
@@ -21,8 +21,8 @@ from sheeprl.algos.dreamer_v1.agent import PlayerDV1, WorldModel, build_agent
 from sheeprl.algos.dreamer_v1.loss import actor_loss, critic_loss, reconstruction_loss
 from sheeprl.algos.dreamer_v1.utils import compute_lambda_values
 from sheeprl.algos.dreamer_v2.utils import test
-from sheeprl.data.buffers import EnvIndependentReplayBuffer, SequentialReplayBuffer
-from sheeprl.utils.env import make_env
+from sheeprl.data.buffers import EnvIndependentReplayBuffer, ReplayPrefetcher, SampleArena, SequentialReplayBuffer
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -120,41 +120,18 @@ def train(
     # [https://arxiv.org/abs/1811.04551](https://arxiv.org/abs/1811.04551)
     posterior = torch.zeros(1, batch_size, stochastic_size, device=device)
 
-    # initialize the tensors for dynamic learning
-    # recurrent_states will contain all the recurrent states computed during the dynamic learning phase,
-    # and its dimension is (sequence_length, batch_size, recurrent_state_size)
-    recurrent_states = torch.empty(sequence_length, batch_size, recurrent_state_size, device=device)
-    # posteriors will contain all the posterior states computed during the dynamic learning phase,
-    # and its dimension is (sequence_length, batch_size, stochastic_size)
-    posteriors = torch.empty(sequence_length, batch_size, stochastic_size, device=device)
-
-    # posteriors_mean and posteriors_std will contain all
-    # the actual means and stds of the posterior states respectively,
-    # their dimension is (sequence_length, batch_size, stochastic_size)
-    posteriors_mean = torch.empty(sequence_length, batch_size, stochastic_size, device=device)
-    posteriors_std = torch.empty(sequence_length, batch_size, stochastic_size, device=device)
-
-    # priors_mean and priors_std will contain all
-    # the predicted means and stds of the prior states respectively,
-    # their dimension is (sequence_length, batch_size, stochastic_size)
-    priors_mean = torch.empty(sequence_length, batch_size, stochastic_size, device=device)
-    priors_std = torch.empty(sequence_length, batch_size, stochastic_size, device=device)
-
     embedded_obs = world_model.encoder(batch_obs)
 
-    for i in range(0, sequence_length):
-        # one step of dynamic learning, take the posterior state, the recurrent state, the action, and the observation
-        # compute the mean and std of both the posterior and prior state, the new recurrent state
-        # and the new posterior state
-        recurrent_state, posterior, _, posterior_mean_std, prior_state_mean_std = world_model.rssm.dynamic(
-            posterior, recurrent_state, data["actions"][i : i + 1], embedded_obs[i : i + 1]
-        )
-        recurrent_states[i] = recurrent_state
-        posteriors[i] = posterior
-        posteriors_mean[i] = posterior_mean_std[0]
-        posteriors_std[i] = posterior_mean_std[1]
-        priors_mean[i] = prior_state_mean_std[0]
-        priors_std[i] = prior_state_mean_std[1]
+    # dynamic learning on the whole sequence, take the posterior state, the recurrent state, the actions,
+    # and the observations and compute the mean and std of both the posterior and prior states,
+    # the recurrent states and the posterior states: only the recurrent and the representation models
+    # are run step by step, while the priors are computed at once.
+    # All the tensors have dimension (sequence_length, batch_size, recurrent_state_size or stochastic_size)
+    recurrent_states, posteriors, _, posteriors_mean_std, priors_mean_std = world_model.rssm.dynamic_sequence(
+        posterior, recurrent_state, data["actions"], embedded_obs
+    )
+    posteriors_mean, posteriors_std = posteriors_mean_std
+    priors_mean, priors_std = priors_mean_std
 
     # concatenate the posterior states with the recurrent states on the last dimension
     # latent_states tensor has dimension (sequence_length, batch_size, recurrent_state_size + stochastic_size)
@@ -416,8 +393,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -426,9 +403,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     action_space = envs.single_action_space
     observation_space = envs.single_observation_space
@@ -515,6 +493,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         obs_keys=obs_keys,
         memmap=cfg.buffer.memmap,
         memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
+        compression=cfg.buffer.compression,
+        compression_threads=cfg.buffer.compression_threads,
         buffer_cls=SequentialReplayBuffer,
     )
     if cfg.checkpoint.resume_from and cfg.buffer.checkpoint:
@@ -524,6 +504,11 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             rb = state["rb"]
         else:
             raise RuntimeError(f"Given {len(state['rb'])}, but {world_size} processes are instantiated")
+    if cfg.buffer.arena_slabs > 0:
+        rb.arena = SampleArena(cfg.buffer.arena_slabs, pin_memory=cfg.buffer.pin_memory)
+    prefetcher = ReplayPrefetcher(
+        rb, prefetch=cfg.buffer.prefetch, device=fabric.device, from_numpy=cfg.buffer.from_numpy
+    )
 
     # Global variables
     train_step = 0
@@ -682,17 +667,14 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         # Train the agent
         if update > learning_starts and updates_before_training <= 0:
             # Start training
+            local_data = prefetcher.iterate(
+                batch_size=cfg.algo.per_rank_batch_size,
+                sequence_length=cfg.algo.per_rank_sequence_length,
+                n_samples=cfg.algo.per_rank_gradient_steps,
+            )  # [Seq_len, Batch_size, ...]
             with timer("Time/train_time", SumMetric, sync_on_compute=cfg.metric.sync_on_compute):
-                for i in range(cfg.algo.per_rank_gradient_steps):
-                    sample = rb.sample_tensors(
-                        batch_size=cfg.algo.per_rank_batch_size,
-                        sequence_length=cfg.algo.per_rank_sequence_length,
-                        n_samples=1,
-                        dtype=None,
-                        device=device,
-                        from_numpy=cfg.buffer.from_numpy,
-                    )  # [N_samples, Seq_len, Batch_size, ...]
-                    batch = {k: v[0].float() for k, v in sample.items()}
+                for batch in local_data:
+                    batch = {k: v.float() for k, v in batch.items()}
                     train(
                         fabric,
                         world_model,
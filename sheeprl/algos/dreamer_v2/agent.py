@@ -15,12 +15,14 @@ from torch.distributions import Distribution, Independent, Normal, TanhTransform
 
 from sheeprl.algos.dreamer_v2.utils import compute_stochastic_state, init_weights
 from sheeprl.models.models import CNN, MLP, DeCNN, LayerNormGRUCell, MultiDecoder, MultiEncoder
+from sheeprl.utils.compile import compile_modules
 from sheeprl.utils.distribution import (
     OneHotCategoricalStraightThroughValidateArgs,
     OneHotCategoricalValidateArgs,
     TruncatedNormal,
 )
 from sheeprl.utils.model import LayerNormChannelLast, ModuleType, cnn_forward
+from sheeprl.utils.precision import set_modules_precision
 
 
 class CNNEncoder(nn.Module):
@@ -254,6 +256,8 @@ class RecurrentModel(nn.Module):
             Default to ELU.
         layer_norm (bool): whether to use the LayerNorm inside the GRU.
             Defaults to True.
+        fused (bool): whether to fuse the elementwise operations of the GRU gates with TorchScript.
+            Defaults to False.
     """
 
     def __init__(
@@ -263,6 +267,7 @@ class RecurrentModel(nn.Module):
         dense_units: int,
         activation: nn.Module = nn.ELU,
         layer_norm: bool = False,
+        fused: bool = False,
     ) -> None:
         super().__init__()
         self.mlp = MLP(
@@ -273,7 +278,9 @@ class RecurrentModel(nn.Module):
             norm_layer=[nn.LayerNorm] if layer_norm else None,
             norm_args=[{"normalized_shape": dense_units}] if layer_norm else None,
         )
-        self.rnn = LayerNormGRUCell(dense_units, recurrent_state_size, bias=True, batch_first=False, layer_norm=True)
+        self.rnn = LayerNormGRUCell(
+            dense_units, recurrent_state_size, bias=True, batch_first=False, layer_norm=True, fused=fused
+        )
 
     def forward(self, input: Tensor, recurrent_state: Tensor) -> Tensor:
         """
@@ -360,6 +367,51 @@ class RSSM(nn.Module):
         posterior_logits, posterior = self._representation(recurrent_state, embedded_obs)
         return recurrent_state, posterior, prior, posterior_logits, prior_logits
 
+    def dynamic_sequence(
+        self, posterior: Tensor, recurrent_state: Tensor, actions: Tensor, embedded_obs: Tensor, is_first: Tensor
+    ) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor]:
+        """
+        Perform the dynamic learning on a whole sequence, equivalent to calling `dynamic` for every step.
+        Only the recurrent model and the representation model are run step by step, while the prior states
+        of all the steps are computed by the transition model at once from the recurrent states.
+
+        Args:
+            posterior (Tensor): the initial stochastic state, of shape `[1, batch_size, stoch_size, self.discrete]`.
+            recurrent_state (Tensor): the initial recurrent state, of shape `[1, batch_size, recurrent_state_size]`.
+            actions (Tensor): the actions taken by the agent, of shape `[sequence_length, batch_size, actions_dim]`.
+            embedded_obs (Tensor): the embedded observations provided by the environment,
+                of shape `[sequence_length, batch_size, embedded_size]`.
+            is_first (Tensor): whether the steps are the first ones in the episode,
+                of shape `[sequence_length, batch_size, 1]`.
+
+        Returns:
+            The recurrent states (Tensor): the recurrent states of the recurrent model.
+            The posterior stochastic states (Tensor): computed by the representation model.
+            The prior stochastic states (Tensor): computed by the transition model.
+            The logits of the posterior states (Tensor): computed by the representation model
+            from the recurrent states and the embbedded observations.
+            The logits of the prior states (Tensor): computed by the transition model from the recurrent states.
+        """
+        sequence_length, batch_size = actions.shape[:2]
+        stoch_state_size = posterior.shape[-2] * posterior.shape[-1]
+        posterior = posterior.view(*posterior.shape[:-2], -1)
+        recurrent_states = recurrent_state.new_empty(sequence_length, batch_size, recurrent_state.shape[-1])
+        posteriors = posterior.new_empty(sequence_length, batch_size, stoch_state_size)
+        posteriors_logits = posterior.new_empty(sequence_length, batch_size, stoch_state_size)
+        for i in range(sequence_length):
+            not_first = 1 - is_first[i : i + 1]
+            recurrent_state = self.recurrent_model(
+                torch.cat((not_first * posterior, not_first * actions[i : i + 1]), -1), not_first * recurrent_state
+            )
+            posterior_logits, posterior = self._representation(recurrent_state, embedded_obs[i : i + 1])
+            posterior = posterior.view(*posterior.shape[:-2], -1)
+            recurrent_states[i] = recurrent_state
+            posteriors[i] = posterior
+            posteriors_logits[i] = posterior_logits
+        priors_logits, priors = self._transition(recurrent_states)
+        posteriors = posteriors.view(*posteriors.shape[:-1], -1, self.discrete)
+        return recurrent_states, posteriors, priors, posteriors_logits, priors_logits
+
     def _representation(self, recurrent_state: Tensor, embedded_obs: Tensor) -> Tuple[Tensor, Tensor]:
         """
         Args:
@@ -1083,4 +1135,21 @@ def build_agent(
     if target_critic_state:
         target_critic.load_state_dict(target_critic_state)
 
+    # Set the precision and compile the selected modules in place, once the target critic has been copied
+    modules = {
+        "encoder": [world_model.encoder],
+        "rssm": [
+            world_model.rssm.recurrent_model,
+            world_model.rssm.representation_model,
+            world_model.rssm.transition_model,
+        ],
+        "decoder": [world_model.observation_model],
+        "reward": [world_model.reward_model],
+        "continue": [world_model.continue_model],
+        "actor": [actor],
+        "critic": [critic, target_critic],
+    }
+    set_modules_precision(modules, cfg, fabric.device)
+    compile_modules(modules, cfg)
+
     return world_model, actor, critic, target_critic
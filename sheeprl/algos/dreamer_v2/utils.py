@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Union
 
 import gymnasium as gym
+import numpy as np
 import torch
 import torch.nn as nn
 from lightning import Fabric
@@ -10,7 +11,7 @@ from torch import Tensor
 from torch.distributions import Independent
 
 from sheeprl.utils.distribution import OneHotCategoricalStraightThroughValidateArgs
-from sheeprl.utils.env import make_env
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.imports import _IS_MLFLOW_AVAILABLE
 from sheeprl.utils.utils import unwrap_fabric
 
@@ -19,6 +20,7 @@ if TYPE_CHECKING:
 
     from sheeprl.algos.dreamer_v1.agent import PlayerDV1
     from sheeprl.algos.dreamer_v2.agent import PlayerDV2
+    from sheeprl.algos.dreamer_v3.agent import PlayerDV3
 
 
 AGGREGATOR_KEYS = {
@@ -114,7 +116,9 @@ def test(
     test_name: str = "",
     sample_actions: bool = False,
 ):
-    """Test the model on the environment with the frozen model.
+    """Test the model on the environment with the frozen model: the 'cfg.algo.test_episodes' episodes
+    are played in parallel by as many environments (see `evaluate_episodes`) and
+    their mean cumulative reward is logged.
 
     Args:
         player (PlayerDV2 | PlayerDV1): the agent which contains all the models needed to play.
@@ -126,41 +130,126 @@ def test(
         sample_actoins (bool): whether or not to sample actions.
             Default to False.
     """
-    env: gym.Env = make_env(cfg, cfg.seed, 0, log_dir, "test" + (f"_{test_name}" if test_name != "" else ""))()
-    done = False
-    cumulative_rew = 0
+    num_episodes = cfg.algo.get("test_episodes", 1)
+    envs = make_vector_env(
+        cfg,
+        [
+            make_env(
+                cfg,
+                cfg.seed + i,
+                0,
+                log_dir,
+                "test" + (f"_{test_name}" if test_name != "" else ""),
+                vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
+            )
+            for i in range(num_episodes)
+        ],
+    )
+    results = evaluate_episodes(player, fabric, cfg, envs, num_episodes, sample_actions=sample_actions)
+    envs.close()
+    cumulative_rew = np.mean([r["cumulative_reward"] for r in results])
+    if num_episodes > 1:
+        fabric.print("Test - Rewards:", [r["cumulative_reward"] for r in results])
+    fabric.print("Test - Reward:", cumulative_rew)
+    if cfg.metric.log_level > 0 and len(fabric.loggers) > 0:
+        fabric.logger.log_metrics({"Test/cumulative_reward": cumulative_rew}, 0)
+
+
+def _normalize_pixels(obs: Tensor) -> Tensor:
+    return obs / 255 - 0.5
+
+
+@torch.no_grad()
+def evaluate_episodes(
+    player: Union["PlayerDV3", "PlayerDV2", "PlayerDV1"],
+    fabric: Fabric,
+    cfg: Dict[str, Any],
+    envs: gym.vector.VectorEnv,
+    num_episodes: int,
+    sample_actions: bool = False,
+    cnn_preprocessing: Optional[Callable[[Tensor], Tensor]] = None,
+) -> List[Dict[str, Any]]:
+    """Play 'num_episodes' episodes with the frozen model in the vectorized environments 'envs',
+    which play their episodes in parallel: the recurrent states of the player are sized as the number of
+    environments and every environment starts a new episode as soon as the previous one ends,
+    until all the episodes have been started. The environments that have no more episodes to play
+    keep being stepped, but their rewards are ignored. The environments are reset with the seeds
+    'cfg.seed + i' (one for every environment) only at the beginning, then they are reset automatically
+    at the end of every episode.
+
+    Args:
+        player (PlayerDV3 | PlayerDV2 | PlayerDV1): the agent which contains all the models needed to play.
+        fabric (Fabric): the fabric instance.
+        cfg (Dict[str, Any]): the hyper-parameters.
+        envs (gym.vector.VectorEnv): the vectorized environments, which are reset automatically.
+        num_episodes (int): the number of episodes to play.
+        sample_actions (bool): whether or not to sample the actions.
+            Default to False.
+        cnn_preprocessing (Callable[[Tensor], Tensor], optional): the preprocessing of the image observations,
+            applied to the float tensors of the raw pixels. If None, then the pixels are normalized in [-0.5, 0.5],
+            as expected by the encoders of DreamerV1 and DreamerV2.
+            Default to None.
+
+    Returns:
+        List[Dict[str, Any]]: the results of the episodes, in the order they have been started:
+            the index of the episode, the environment that played it, the seed the environment was reset with,
+            the cumulative reward and the length of the episode.
+    """
+    if num_episodes <= 0:
+        raise ValueError(f"The number of episodes must be greater than zero, got {num_episodes}")
+    if cnn_preprocessing is None:
+        cnn_preprocessing = _normalize_pixels
     device = fabric.device
-    next_obs = env.reset(seed=cfg.seed)[0]
-    for k in next_obs.keys():
-        next_obs[k] = torch.from_numpy(next_obs[k]).view(1, *next_obs[k].shape).float()
-    player.num_envs = 1
+    num_envs = envs.num_envs
+    player.num_envs = num_envs
     player.init_states()
-    while not done:
-        # Act greedly through the environment
+    obs = envs.reset(seed=cfg.seed)[0]
+    # The episode played by every environment, -1 if the environment has no more episodes to play
+    episodes = np.arange(num_envs)
+    episodes[num_episodes:] = -1
+    next_episode = min(num_envs, num_episodes)
+    cumulative_rewards = np.zeros(num_envs)
+    lengths = np.zeros(num_envs, dtype=np.int64)
+    results = []
+    while len(results) < num_episodes:
         preprocessed_obs = {}
-        for k, v in next_obs.items():
+        for k, v in obs.items():
             if k in cfg.algo.cnn_keys.encoder:
-                preprocessed_obs[k] = v[None, ...].to(device) / 255 - 0.5
-            elif k in cfg.algo.mlp_keys.encoder:
-                preprocessed_obs[k] = v[None, ...].to(device)
-        real_actions = player.get_greedy_action(
-            preprocessed_obs, sample_actions, {k: v for k, v in preprocessed_obs.items() if k.startswith("mask")}
-        )
+                preprocessed_obs[k] = cnn_preprocessing(
+                    torch.as_tensor(v[np.newaxis], dtype=torch.float32, device=device)
+                )
+            elif k in cfg.algo.mlp_keys.encoder or k.startswith("mask"):
+                preprocessed_obs[k] = torch.as_tensor(v[np.newaxis], dtype=torch.float32, device=device)
+        mask = {k: v for k, v in preprocessed_obs.items() if k.startswith("mask")}
+        real_actions = player.get_greedy_action(preprocessed_obs, sample_actions, mask or None)
         if player.actor.is_continuous:
             real_actions = torch.cat(real_actions, -1).cpu().numpy()
         else:
             real_actions = torch.cat([real_act.argmax(dim=-1) for real_act in real_actions], dim=-1).cpu().numpy()
 
-        # Single environment step
-        next_obs, reward, done, truncated, _ = env.step(real_actions.reshape(env.action_space.shape))
-        for k in next_obs.keys():
-            next_obs[k] = torch.from_numpy(next_obs[k]).view(1, *next_obs[k].shape).float()
-        done = done or truncated or cfg.dry_run
-        cumulative_rew += reward
-    fabric.print("Test - Reward:", cumulative_rew)
-    if cfg.metric.log_level > 0 and len(fabric.loggers) > 0:
-        fabric.logger.log_metrics({"Test/cumulative_reward": cumulative_rew}, 0)
-    env.close()
+        obs, rewards, terminated, truncated, _ = envs.step(real_actions.reshape(envs.action_space.shape))
+        playing = episodes >= 0
+        cumulative_rewards[playing] += np.asarray(rewards, dtype=np.float64)[playing]
+        lengths[playing] += 1
+        dones = np.logical_or(terminated, truncated) | cfg.dry_run
+        for i in np.flatnonzero(dones & playing):
+            results.append(
+                {
+                    "episode": int(episodes[i]),
+                    "env_idx": int(i),
+                    "env_seed": cfg.seed + int(i),
+                    "cumulative_reward": float(cumulative_rewards[i]),
+                    "length": int(lengths[i]),
+                }
+            )
+            cumulative_rewards[i] = 0
+            lengths[i] = 0
+            episodes[i] = next_episode if next_episode < num_episodes else -1
+            next_episode += int(next_episode < num_episodes)
+        if dones.any():
+            player.init_states(np.flatnonzero(dones).tolist())
+    return sorted(results, key=lambda r: r["episode"])
 
 
 def log_models_from_checkpoint(
@@ -18,12 +18,14 @@ from sheeprl.algos.dreamer_v2.agent import WorldModel
 from sheeprl.algos.dreamer_v2.utils import compute_stochastic_state
 from sheeprl.algos.dreamer_v3.utils import init_weights, uniform_init_weights
 from sheeprl.models.models import CNN, MLP, DeCNN, LayerNormGRUCell, MultiDecoder, MultiEncoder
+from sheeprl.utils.compile import compile_modules
 from sheeprl.utils.distribution import (
     OneHotCategoricalStraightThroughValidateArgs,
     OneHotCategoricalValidateArgs,
     TruncatedNormal,
 )
 from sheeprl.utils.model import LayerNormChannelLast, ModuleType, cnn_forward
+from sheeprl.utils.precision import set_modules_precision
 from sheeprl.utils.utils import symlog
 
 
@@ -273,6 +275,8 @@ class RecurrentModel(nn.Module):
             Default to SiLU.
         layer_norm (bool): whether to use the LayerNorm inside the GRU.
             Defaults to True.
+        fused (bool): whether to fuse the elementwise operations of the GRU gates with TorchScript.
+            Defaults to False.
     """
 
     def __init__(
@@ -282,6 +286,7 @@ class RecurrentModel(nn.Module):
         dense_units: int,
         activation_fn: nn.Module = nn.SiLU,
         layer_norm: bool = True,
+        fused: bool = False,
     ) -> None:
         super().__init__()
         self.mlp = MLP(
@@ -293,7 +298,9 @@ class RecurrentModel(nn.Module):
             norm_layer=[nn.LayerNorm] if layer_norm else None,
             norm_args=[{"normalized_shape": dense_units, "eps": 1e-3}] if layer_norm else None,
         )
-        self.rnn = LayerNormGRUCell(dense_units, recurrent_state_size, bias=False, batch_first=False, layer_norm=True)
+        self.rnn = LayerNormGRUCell(
+            dense_units, recurrent_state_size, bias=False, batch_first=False, layer_norm=True, fused=fused
+        )
 
     def forward(self, input: Tensor, recurrent_state: Tensor) -> Tensor:
         """
@@ -389,6 +396,55 @@ class RSSM(nn.Module):
         posterior_logits, posterior = self._representation(recurrent_state, embedded_obs)
         return recurrent_state, posterior, prior, posterior_logits, prior_logits
 
+    def dynamic_sequence(
+        self, posterior: Tensor, recurrent_state: Tensor, actions: Tensor, embedded_obs: Tensor, is_first: Tensor
+    ) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor]:
+        """
+        Perform the dynamic learning on a whole sequence, equivalent to calling `dynamic` for every step.
+        Only the recurrent model and the representation model are run step by step, while the prior states
+        of all the steps are computed by the transition model at once from the recurrent states.
+        The posterior state with which an episode starts (i.e. the mode of the prior of the initial recurrent state)
+        is computed just once.
+
+        Args:
+            posterior (Tensor): the initial stochastic state, of shape `[1, batch_size, stoch_size, self.discrete]`.
+            recurrent_state (Tensor): the initial recurrent state, of shape `[1, batch_size, recurrent_state_size]`.
+            actions (Tensor): the actions taken by the agent, of shape `[sequence_length, batch_size, actions_dim]`.
+            embedded_obs (Tensor): the embedded observations provided by the environment,
+                of shape `[sequence_length, batch_size, embedded_size]`.
+            is_first (Tensor): whether the steps are the first ones in the episode,
+                of shape `[sequence_length, batch_size, 1]`.
+
+        Returns:
+            The recurrent states (Tensor): the recurrent states of the recurrent model.
+            The posterior stochastic states (Tensor): computed by the representation model.
+            The prior stochastic states (Tensor): computed by the transition model.
+            The logits of the posterior states (Tensor): computed by the representation model
+            from the recurrent states and the embbedded observations.
+            The logits of the prior states (Tensor): computed by the transition model from the recurrent states.
+        """
+        sequence_length, batch_size = actions.shape[:2]
+        # The initial recurrent state is tanh(0) = 0, the same for every episode
+        initial_posterior = self._transition(torch.zeros_like(recurrent_state[:, :1]), sample_state=False)[1]
+        initial_posterior = initial_posterior.view(1, 1, -1)
+        posterior = posterior.view(*posterior.shape[:-2], -1)
+        recurrent_states = recurrent_state.new_empty(sequence_length, batch_size, recurrent_state.shape[-1])
+        posteriors = posterior.new_empty(sequence_length, batch_size, *initial_posterior.shape[2:])
+        posteriors_logits = posterior.new_empty(sequence_length, batch_size, *initial_posterior.shape[2:])
+        for i in range(sequence_length):
+            first = is_first[i : i + 1]
+            action = (1 - first) * actions[i : i + 1]
+            posterior = (1 - first) * posterior + first * initial_posterior
+            recurrent_state = self.recurrent_model(torch.cat((posterior, action), -1), (1 - first) * recurrent_state)
+            posterior_logits, posterior = self._representation(recurrent_state, embedded_obs[i : i + 1])
+            posterior = posterior.view(*posterior.shape[:-2], -1)
+            recurrent_states[i] = recurrent_state
+            posteriors[i] = posterior
+            posteriors_logits[i] = posterior_logits
+        priors_logits, priors = self._transition(recurrent_states)
+        posteriors = posteriors.view(*posteriors.shape[:-1], -1, self.discrete)
+        return recurrent_states, posteriors, priors, posteriors_logits, priors_logits
+
     def _uniform_mix(self, logits: Tensor) -> Tensor:
         dim = logits.dim()
         if dim == 3:
@@ -536,7 +592,12 @@ class PlayerDV3(nn.Module):
                 self.recurrent_state[:, reset_envs], sample_state=False
             )[1].reshape(1, len(reset_envs), -1)
 
-    def get_exploration_action(self, obs: Dict[str, Tensor], mask: Optional[Dict[str, Tensor]] = None) -> Tensor:
+    def get_exploration_action(
+        self,
+        obs: Dict[str, Tensor],
+        mask: Optional[Dict[str, Tensor]] = None,
+        env_idxes: Optional[Sequence[int]] = None,
+    ) -> Tensor:
         """
         Return the actions with a certain amount of noise for exploration.
 
@@ -544,15 +605,18 @@ class PlayerDV3(nn.Module):
             obs (Dict[str, Tensor]): the current observations.
             mask (Dict[str, Tensor], optional): the mask of the actions.
                 Default to None.
+            env_idxes (Sequence[int], optional): the environments the observations come from,
+                whose states are updated. If None, then the observations come from all the environments.
+                Default to None.
 
         Returns:
             The actions the agent has to perform.
         """
-        actions = self.get_greedy_action(obs, mask=mask)
+        actions = self.get_greedy_action(obs, mask=mask, env_idxes=env_idxes)
         expl_actions = None
         if self.actor.expl_amount > 0:
             expl_actions = self.actor.add_exploration_noise(actions, mask=mask)
-            self.actions = torch.cat(expl_actions, dim=-1)
+            self._set_states(env_idxes, actions=torch.cat(expl_actions, dim=-1))
         return expl_actions or actions
 
     def get_greedy_action(
@@ -560,6 +624,7 @@ class PlayerDV3(nn.Module):
         obs: Dict[str, Tensor],
         is_training: bool = True,
         mask: Optional[Dict[str, Tensor]] = None,
+        env_idxes: Optional[Sequence[int]] = None,
     ) -> Sequence[Tensor]:
         """
         Return the greedy actions.
@@ -568,22 +633,43 @@ class PlayerDV3(nn.Module):
             obs (Dict[str, Tensor]): the current observations.
             is_training (bool): whether it is training.
                 Default to True.
+            env_idxes (Sequence[int], optional): the environments the observations come from,
+                whose states are updated. If None, then the observations come from all the environments.
+                Default to None.
 
         Returns:
             The actions the agent has to perform.
         """
+        idxes = slice(None) if env_idxes is None else torch.as_tensor(env_idxes, device=self.recurrent_state.device)
         embedded_obs = self.encoder(obs)
-        self.recurrent_state = self.rssm.recurrent_model(
-            torch.cat((self.stochastic_state, self.actions), -1), self.recurrent_state
+        recurrent_state = self.rssm.recurrent_model(
+            torch.cat((self.stochastic_state[:, idxes], self.actions[:, idxes]), -1), self.recurrent_state[:, idxes]
         )
-        _, self.stochastic_state = self.rssm._representation(self.recurrent_state, embedded_obs)
-        self.stochastic_state = self.stochastic_state.view(
-            *self.stochastic_state.shape[:-2], self.stochastic_size * self.discrete_size
+        _, stochastic_state = self.rssm._representation(recurrent_state, embedded_obs)
+        stochastic_state = stochastic_state.view(
+            *stochastic_state.shape[:-2], self.stochastic_size * self.discrete_size
         )
-        actions, _ = self.actor(torch.cat((self.stochastic_state, self.recurrent_state), -1), is_training, mask)
-        self.actions = torch.cat(actions, -1)
+        actions, _ = self.actor(torch.cat((stochastic_state, recurrent_state), -1), is_training, mask)
+        self._set_states(env_idxes, recurrent_state, stochastic_state, torch.cat(actions, -1))
         return actions
 
+    def _set_states(
+        self,
+        env_idxes: Optional[Sequence[int]],
+        recurrent_state: Optional[Tensor] = None,
+        stochastic_state: Optional[Tensor] = None,
+        actions: Optional[Tensor] = None,
+    ) -> None:
+        """Set the states of the 'env_idxes' environments (of all the environments if None)."""
+        states = {"recurrent_state": recurrent_state, "stochastic_state": stochastic_state, "actions": actions}
+        for name, value in states.items():
+            if value is None:
+                continue
+            if env_idxes is None:
+                setattr(self, name, value)
+            else:
+                getattr(self, name)[:, env_idxes] = value
+
 
 class Actor(nn.Module):
     """
@@ -1138,4 +1224,21 @@ def build_agent(
     if target_critic_state:
         target_critic.load_state_dict(target_critic_state)
 
+    # Set the precision and compile the selected modules in place, once the target critic has been copied
+    modules = {
+        "encoder": [world_model.encoder],
+        "rssm": [
+            world_model.rssm.recurrent_model,
+            world_model.rssm.representation_model,
+            world_model.rssm.transition_model,
+        ],
+        "decoder": [world_model.observation_model],
+        "reward": [world_model.reward_model],
+        "continue": [world_model.continue_model],
+        "actor": [actor],
+        "critic": [critic, target_critic],
+    }
+    set_modules_precision(modules, cfg, fabric.device)
+    compile_modules(modules, cfg)
+
     return world_model, actor, critic, target_critic
@@ -23,8 +23,14 @@ from torchmetrics import SumMetric
 
 from sheeprl.algos.dreamer_v3.agent import PlayerDV3, WorldModel, build_agent
 from sheeprl.algos.dreamer_v3.loss import reconstruction_loss
-from sheeprl.algos.dreamer_v3.utils import Moments, compute_lambda_values, test
-from sheeprl.data.buffers import EnvIndependentReplayBuffer, SequentialReplayBuffer
+from sheeprl.algos.dreamer_v3.utils import ImaginationEngine, Moments, compute_lambda_values, test
+from sheeprl.data.buffers import (
+    EnvIndependentReplayBuffer,
+    PrioritizedSequentialReplayBuffer,
+    ReplayPrefetcher,
+    SampleArena,
+    SequentialReplayBuffer,
+)
 from sheeprl.envs.wrappers import RestartOnException
 from sheeprl.utils.distribution import (
     BernoulliSafeMode,
@@ -33,7 +39,7 @@ from sheeprl.utils.distribution import (
     SymlogDistribution,
     TwoHotEncodingDistribution,
 )
-from sheeprl.utils.env import make_env
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -60,7 +66,8 @@ def train(
     is_continuous: bool,
     actions_dim: Sequence[int],
     moments: Moments,
-) -> None:
+    imagination: ImaginationEngine,
+) -> Tensor:
     """Runs one-step update of the agent.
 
     Args:
@@ -78,6 +85,11 @@ def train(
         is_continuous (bool): whether or not the environment is continuous.
         actions_dim (Sequence[int]): the actions dimension.
         moments (Moments): the moments for normalizing the lambda values.
+        imagination (ImaginationEngine): the engine that imagines the trajectories in the latent space.
+
+    Returns:
+        Tensor: the reconstruction loss of every sequence in the batch, which is the new priority
+        of the sequences when they are sampled from a prioritized buffer.
     """
     # The environment interaction goes like this:
     # Actions:           a0       a1       a2      a4
@@ -90,7 +102,6 @@ def train(
     # Is-first       1        i1       i2       i3
 
     batch_size = cfg.algo.per_rank_batch_size
-    sequence_length = cfg.algo.per_rank_sequence_length
     validate_args = cfg.distribution.validate_args
     recurrent_state_size = cfg.algo.world_model.recurrent_model.recurrent_state_size
     stochastic_size = cfg.algo.world_model.stochastic_size
@@ -108,22 +119,15 @@ def train(
     stoch_state_size = stochastic_size * discrete_size
     recurrent_state = torch.zeros(1, batch_size, recurrent_state_size, device=device)
     posterior = torch.zeros(1, batch_size, stochastic_size, discrete_size, device=device)
-    recurrent_states = torch.empty(sequence_length, batch_size, recurrent_state_size, device=device)
-    priors_logits = torch.empty(sequence_length, batch_size, stoch_state_size, device=device)
-    posteriors = torch.empty(sequence_length, batch_size, stochastic_size, discrete_size, device=device)
-    posteriors_logits = torch.empty(sequence_length, batch_size, stoch_state_size, device=device)
 
     # Embed observations from the environment
     embedded_obs = world_model.encoder(batch_obs)
 
-    for i in range(0, sequence_length):
-        recurrent_state, posterior, _, posterior_logits, prior_logits = world_model.rssm.dynamic(
-            posterior, recurrent_state, batch_actions[i : i + 1], embedded_obs[i : i + 1], data["is_first"][i : i + 1]
-        )
-        recurrent_states[i] = recurrent_state
-        priors_logits[i] = prior_logits
-        posteriors[i] = posterior
-        posteriors_logits[i] = posterior_logits
+    # Only the recurrent and the representation models are run step by step,
+    # while the priors of the whole sequence are computed at once
+    recurrent_states, posteriors, _, posteriors_logits, priors_logits = world_model.rssm.dynamic_sequence(
+        posterior, recurrent_state, batch_actions, embedded_obs, data["is_first"]
+    )
     latent_states = torch.cat((posteriors.view(*posteriors.shape[:-2], -1), recurrent_states), -1)
 
     # Compute predictions for the observations
@@ -158,7 +162,16 @@ def train(
 
     # World model optimization step. Eq. 4 in the paper
     world_optimizer.zero_grad(set_to_none=True)
-    rec_loss, kl, state_loss, reward_loss, observation_loss, continue_loss, observation_losses_dict = reconstruction_loss(
+    (
+        rec_loss,
+        kl,
+        state_loss,
+        reward_loss,
+        observation_loss,
+        continue_loss,
+        observation_losses_dict,
+        sequence_loss,
+    ) = reconstruction_loss(
         po,
         batch_obs,
         pr,
@@ -174,6 +187,7 @@ def train(
         continue_targets,
         cfg.algo.world_model.continue_scale_factor,
         validate_args=validate_args,
+        weights=data["weights"][..., 0] if "weights" in data else None,
     )
     fabric.backward(rec_loss)
     world_model_grads = None
@@ -189,22 +203,6 @@ def train(
     # Behaviour Learning
     imagined_prior = posteriors.detach().reshape(1, -1, stoch_state_size)
     recurrent_state = recurrent_states.detach().reshape(1, -1, recurrent_state_size)
-    imagined_latent_state = torch.cat((imagined_prior, recurrent_state), -1)
-    imagined_trajectories = torch.empty(
-        cfg.algo.horizon + 1,
-        batch_size * sequence_length,
-        stoch_state_size + recurrent_state_size,
-        device=device,
-    )
-    imagined_trajectories[0] = imagined_latent_state
-    imagined_actions = torch.empty(
-        cfg.algo.horizon + 1,
-        batch_size * sequence_length,
-        data["actions"].shape[-1],
-        device=device,
-    )
-    actions = torch.cat(actor(imagined_latent_state.detach())[0], dim=-1)
-    imagined_actions[0] = actions
 
     # The imagination goes like this, with H=3:
     # Actions:           a'0      a'1      a'2     a'4
@@ -219,13 +217,7 @@ def train(
     # where z0 comes from the posterior, while z'i is the imagined states (prior)
 
     # Imagine trajectories in the latent space
-    for i in range(1, cfg.algo.horizon + 1):
-        imagined_prior, recurrent_state = world_model.rssm.imagination(imagined_prior, recurrent_state, actions)
-        imagined_prior = imagined_prior.view(1, -1, stoch_state_size)
-        imagined_latent_state = torch.cat((imagined_prior, recurrent_state), -1)
-        imagined_trajectories[i] = imagined_latent_state
-        actions = torch.cat(actor(imagined_latent_state.detach())[0], dim=-1)
-        imagined_actions[i] = actions
+    imagined_trajectories, imagined_actions = imagination(imagined_prior, recurrent_state)
 
     # Predict values, rewards and continues
     predicted_values = TwoHotEncodingDistribution(critic(imagined_trajectories), dims=1).mean
@@ -359,6 +351,7 @@ def train(
     actor_optimizer.zero_grad(set_to_none=True)
     critic_optimizer.zero_grad(set_to_none=True)
     world_optimizer.zero_grad(set_to_none=True)
+    return sequence_loss
 
 
 @register_algorithm()
@@ -387,8 +380,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             partial(
                 RestartOnException,
@@ -399,10 +392,13 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                     log_dir if rank == 0 else None,
                     "train",
                     vector_env_idx=i,
+                    batched_preprocessing=cfg.env.batched_preprocessing,
                 ),
+                hot_spare=cfg.env.get("restart_hot_spare", False),
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
+        partial_batches=True,
     )
     action_space = envs.single_action_space
     observation_space = envs.single_observation_space
@@ -482,6 +478,17 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     )
     if cfg.checkpoint.resume_from:
         moments.load_state_dict(state["moments"])
+    imagination = ImaginationEngine(
+        world_model.rssm,
+        actor,
+        cfg.algo.horizon,
+        cfg.algo.world_model.stochastic_size,
+        cfg.algo.world_model.discrete_size,
+        cfg.algo.world_model.recurrent_model.recurrent_state_size,
+        actions_dim,
+        compile=cfg.algo.imagination.compile,
+        mode=cfg.algo.imagination.mode,
+    )
 
     if fabric.is_global_zero:
         save_configs(cfg, log_dir)
@@ -498,7 +505,12 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         n_envs=cfg.env.num_envs,
         memmap=cfg.buffer.memmap,
         memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
-        buffer_cls=SequentialReplayBuffer,
+        compression=cfg.buffer.compression,
+        compression_threads=cfg.buffer.compression_threads,
+        buffer_cls=PrioritizedSequentialReplayBuffer if cfg.buffer.prioritized.enabled else SequentialReplayBuffer,
+        alpha=cfg.buffer.prioritized.alpha,
+        beta=cfg.buffer.prioritized.beta,
+        eps=cfg.buffer.prioritized.eps,
     )
     if cfg.checkpoint.resume_from and cfg.buffer.checkpoint:
         if isinstance(state["rb"], list) and fabric.world_size == len(state["rb"]):
@@ -507,6 +519,11 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             rb = state["rb"]
         else:
             raise RuntimeError(f"Given {len(state['rb'])}, but {fabric.world_size} processes are instantiated")
+    if cfg.buffer.arena_slabs > 0:
+        rb.arena = SampleArena(cfg.buffer.arena_slabs, pin_memory=cfg.buffer.pin_memory)
+    prefetcher = ReplayPrefetcher(
+        rb, prefetch=cfg.buffer.prefetch, device=fabric.device, from_numpy=cfg.buffer.from_numpy
+    )
     expl_decay_steps = state["expl_decay_steps"] if cfg.checkpoint.resume_from else 0
 
     # Global variables
@@ -520,10 +537,13 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         if cfg.checkpoint.resume_from
         else 1
     )
-    policy_step = state["update"] * cfg.env.num_envs if cfg.checkpoint.resume_from else 0
+    # With the partial batches, only 'async_batch_size' environments are stepped at every update
+    partial_batches = cfg.env.async_batch_size is not None
+    env_batch_size = cfg.env.async_batch_size if partial_batches else cfg.env.num_envs
+    policy_step = state["update"] * env_batch_size if cfg.checkpoint.resume_from else 0
     last_log = state["last_log"] if cfg.checkpoint.resume_from else 0
     last_checkpoint = state["last_checkpoint"] if cfg.checkpoint.resume_from else 0
-    policy_steps_per_update = int(cfg.env.num_envs * fabric.world_size)
+    policy_steps_per_update = int(env_batch_size * fabric.world_size)
     updates_before_training = cfg.algo.train_every // policy_steps_per_update
     num_updates = int(cfg.algo.total_steps // policy_steps_per_update) if not cfg.dry_run else 1
     learning_starts = cfg.algo.learning_starts // policy_steps_per_update if not cfg.dry_run else 0
@@ -564,10 +584,12 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     step_data["rewards"] = np.zeros((1, cfg.env.num_envs, 1))
     step_data["is_first"] = np.ones_like(step_data["dones"])
     player.init_states()
+    # The environments whose observations are in 'obs'
+    env_ids = np.arange(cfg.env.num_envs)
 
     per_rank_gradient_steps = 0
     for update in range(start_step, num_updates + 1):
-        policy_step += cfg.env.num_envs * world_size
+        policy_step += env_batch_size * world_size
 
         # Measure environment interaction time: this considers both the model forward
         # to get the action given the observation and the time taken into the environment
@@ -578,7 +600,7 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 and cfg.checkpoint.resume_from is None
                 and "minedojo" not in cfg.env.wrapper._target_.lower()
             ):
-                real_actions = actions = np.array(envs.action_space.sample())
+                real_actions = actions = np.array(envs.action_space.sample())[: len(env_ids)]
                 if not is_continuous:
                     actions = np.concatenate(
                         [
@@ -597,7 +619,9 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                     mask = {k: v for k, v in preprocessed_obs.items() if k.startswith("mask")}
                     if len(mask) == 0:
                         mask = None
-                    real_actions = actions = player.get_exploration_action(preprocessed_obs, mask)
+                    real_actions = actions = player.get_exploration_action(
+                        preprocessed_obs, mask, env_idxes=env_ids if partial_batches else None
+                    )
                     actions = torch.cat(actions, -1).cpu().numpy()
                     if is_continuous:
                         real_actions = torch.cat(real_actions, dim=-1).cpu().numpy()
@@ -606,22 +630,29 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                             torch.cat([real_act.argmax(dim=-1) for real_act in real_actions], dim=-1).cpu().numpy()
                         )
 
-            step_data["actions"] = actions.reshape((1, cfg.env.num_envs, -1))
-            rb.add(step_data, validate_args=cfg.buffer.validate_args)
+            step_data["actions"] = actions.reshape((1, len(env_ids), -1))
+            rb.add(step_data, env_ids, validate_args=cfg.buffer.validate_args)
 
-            next_obs, rewards, dones, truncated, infos = envs.step(real_actions.reshape(envs.action_space.shape))
+            if partial_batches:
+                # Step the environments asynchronously and get the first ready ones
+                envs.send(real_actions.reshape((len(env_ids), *action_space.shape)), env_ids)
+                next_obs, rewards, dones, truncated, infos, env_ids = envs.recv()
+            else:
+                next_obs, rewards, dones, truncated, infos = envs.step(real_actions.reshape(envs.action_space.shape))
             dones = np.logical_or(dones, truncated).astype(np.uint8)
 
-        step_data["is_first"] = np.zeros_like(step_data["dones"])
+        step_data["is_first"] = np.zeros((1, len(env_ids), 1))
         if "restart_on_exception" in infos:
             for i, agent_roe in enumerate(infos["restart_on_exception"]):
+                if agent_roe and aggregator and not aggregator.disabled:
+                    aggregator.update("Env/restarts", 1)
+                    aggregator.update("Env/restart_latency", infos["restart_latency"][i])
                 if agent_roe and not dones[i]:
-                    last_inserted_idx = (rb.buffer[i]._pos - 1) % rb.buffer[i].buffer_size
-                    rb.buffer[i]["dones"][last_inserted_idx] = np.ones_like(rb.buffer[i]["dones"][last_inserted_idx])
-                    rb.buffer[i]["is_first"][last_inserted_idx] = np.zeros_like(
-                        rb.buffer[i]["is_first"][last_inserted_idx]
-                    )
-                    step_data["is_first"][i] = np.ones_like(step_data["is_first"][i])
+                    env_rb = rb.buffer[env_ids[i]]
+                    last_inserted_idx = (env_rb._pos - 1) % env_rb.buffer_size
+                    env_rb["dones"][last_inserted_idx] = np.ones_like(env_rb["dones"][last_inserted_idx])
+                    env_rb["is_first"][last_inserted_idx] = np.zeros_like(env_rb["is_first"][last_inserted_idx])
+                    step_data["is_first"][:, i] = np.ones_like(step_data["is_first"][:, i])
 
         if cfg.metric.log_level > 0 and "final_info" in infos:
             for i, agent_ep_info in enumerate(infos["final_info"]):
@@ -631,7 +662,7 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                     if aggregator and not aggregator.disabled:
                         aggregator.update("Rewards/rew_avg", ep_rew)
                         aggregator.update("Game/ep_len_avg", ep_len)
-                    fabric.print(f"Rank-0: policy_step={policy_step}, reward_env_{i}={ep_rew[-1]}")
+                    fabric.print(f"Rank-0: policy_step={policy_step}, reward_env_{env_ids[i]}={ep_rew[-1]}")
 
         # Save the real next observation
         real_next_obs = copy.deepcopy(next_obs)
@@ -647,8 +678,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         # next_obs becomes the new obs
         obs = next_obs
 
-        rewards = rewards.reshape((1, cfg.env.num_envs, -1))
-        step_data["dones"] = dones.reshape((1, cfg.env.num_envs, -1))
+        rewards = rewards.reshape((1, len(env_ids), -1))
+        step_data["dones"] = dones.reshape((1, len(env_ids), -1))
         step_data["rewards"] = clip_rewards_fn(rewards)
 
         dones_idxes = dones.nonzero()[0].tolist()
@@ -661,36 +692,34 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             reset_data["actions"] = np.zeros((1, reset_envs, np.sum(actions_dim)))
             reset_data["rewards"] = step_data["rewards"][:, dones_idxes]
             reset_data["is_first"] = np.zeros_like(reset_data["dones"])
-            rb.add(reset_data, dones_idxes, validate_args=cfg.buffer.validate_args)
+            rb.add(reset_data, env_ids[dones_idxes], validate_args=cfg.buffer.validate_args)
 
             # Reset already inserted step data
             step_data["rewards"][:, dones_idxes] = np.zeros_like(reset_data["rewards"])
             step_data["dones"][:, dones_idxes] = np.zeros_like(step_data["dones"][:, dones_idxes])
             step_data["is_first"][:, dones_idxes] = np.ones_like(step_data["is_first"][:, dones_idxes])
-            player.init_states(dones_idxes)
+            player.init_states(env_ids[dones_idxes].tolist())
 
         updates_before_training -= 1
 
         # Train the agent
         if update >= learning_starts and updates_before_training <= 0:
-            local_data = rb.sample_tensors(
+            local_data = prefetcher.iterate(
                 cfg.algo.per_rank_batch_size,
                 sequence_length=cfg.algo.per_rank_sequence_length,
                 n_samples=(
                     cfg.algo.per_rank_pretrain_steps if update == learning_starts else cfg.algo.per_rank_gradient_steps
                 ),
-                dtype=None,
-                device=fabric.device,
-                from_numpy=cfg.buffer.from_numpy,
             )
             with timer("Time/train_time", SumMetric, sync_on_compute=cfg.metric.sync_on_compute):
-                for i in range(next(iter(local_data.values())).shape[0]):
+                for batch in local_data:
                     if per_rank_gradient_steps % cfg.algo.critic.target_network_update_freq == 0:
                         tau = 1 if per_rank_gradient_steps == 0 else cfg.algo.critic.tau
                         for cp, tcp in zip(critic.module.parameters(), target_critic.parameters()):
                             tcp.data.copy_(tau * cp.data + (1 - tau) * tcp.data)
-                    batch = {k: v[i].float() for k, v in local_data.items()}
-                    train(
+                    sampled_idxes = batch.pop("idxes", None)
+                    batch = {k: v.float() for k, v in batch.items()}
+                    sequence_loss = train(
                         fabric,
                         world_model,
                         actor,
@@ -705,7 +734,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                         is_continuous,
                         actions_dim,
                         moments,
+                        imagination,
                     )
+                    if sampled_idxes is not None:
+                        rb.update_priorities(sampled_idxes.cpu().numpy(), sequence_loss.cpu().numpy())
                     per_rank_gradient_steps += 1
                 train_step += world_size
             updates_before_training = cfg.algo.train_every // policy_steps_per_update
@@ -745,11 +777,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                         policy_step,
                     )
                 timer.reset()
-            
+
             # Eval run during training
             # if cfg.algo.run_test:
             #     test(player, fabric, cfg, log_dir, sample_actions=True, train_step=policy_step)
-            
 
             # Reset counters
             last_log = policy_step
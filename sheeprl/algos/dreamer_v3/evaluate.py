@@ -1,19 +1,20 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import gymnasium as gym
 from lightning import Fabric
 
+from sheeprl.algos.dreamer_v2.utils import evaluate_episodes
 from sheeprl.algos.dreamer_v3.agent import PlayerDV3, build_agent
-from sheeprl.algos.dreamer_v3.utils import test
-from sheeprl.utils.env import make_env
+from sheeprl.algos.dreamer_v3.utils import normalize_pixels
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.registry import register_evaluation
 
 
-@register_evaluation(algorithms="dreamer_v3")
-def evaluate(fabric: Fabric, cfg: Dict[str, Any], state: Dict[str, Any]):
+@register_evaluation(algorithms="dreamer_v3", batched=True)
+def evaluate(fabric: Fabric, cfg: Dict[str, Any], state: Dict[str, Any]) -> List[Dict[str, Any]]:
     logger = get_logger(fabric, cfg)
     if logger and fabric.is_global_zero:
         fabric._loggers = [logger]
@@ -21,16 +22,24 @@ def evaluate(fabric: Fabric, cfg: Dict[str, Any], state: Dict[str, Any]):
     log_dir = get_log_dir(fabric, cfg.root_dir, cfg.run_name)
     fabric.print(f"Log dir: {log_dir}")
 
-    env = make_env(
+    # The environments are built once and play all the evaluation episodes
+    envs = make_vector_env(
         cfg,
-        cfg.seed,
-        0,
-        log_dir,
-        "test",
-        vector_env_idx=0,
-    )()
-    observation_space = env.observation_space
-    action_space = env.action_space
+        [
+            make_env(
+                cfg,
+                cfg.seed + i,
+                0,
+                log_dir,
+                "test",
+                vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
+            )
+            for i in range(cfg.env.num_envs)
+        ],
+    )
+    observation_space = envs.single_observation_space
+    action_space = envs.single_action_space
 
     if not isinstance(observation_space, gym.spaces.Dict):
         raise RuntimeError(f"Unexpected observation type, should be of type Dict, got: {observation_space}")
@@ -65,4 +74,12 @@ def evaluate(fabric: Fabric, cfg: Dict[str, Any], state: Dict[str, Any]):
         discrete_size=cfg.algo.world_model.discrete_size,
     )
 
-    test(player, fabric, cfg, log_dir, sample_actions=True)
+    results = evaluate_episodes(
+        player, fabric, cfg, envs, cfg.num_evals, sample_actions=True, cnn_preprocessing=normalize_pixels
+    )
+    envs.close()
+    for result in results:
+        fabric.print(f"Test - Episode {result['episode']} - Reward: {result['cumulative_reward']}")
+        if cfg.metric.log_level > 0 and len(fabric.loggers) > 0:
+            fabric.logger.log_metrics({"Test/cumulative_reward": result["cumulative_reward"]}, result["episode"])
+    return results
@@ -24,7 +24,8 @@ def reconstruction_loss(
     continue_targets: Optional[Tensor] = None,
     continue_scale_factor: float = 1.0,
     validate_args: bool = False,
-) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor, Tensor]:
+    weights: Optional[Tensor] = None,
+) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Dict[str, Tensor], Tensor]:
     """
     Compute the reconstruction loss as described in Eq. 5 in
     [https://arxiv.org/abs/2301.04104](https://arxiv.org/abs/2301.04104).
@@ -55,6 +56,9 @@ def reconstruction_loss(
             Default to 10.
         validate_args (bool): Whether or not to validate distributions arguments.
             Default to False.
+        weights (Tensor, optional): the importance-sampling weights of the sequences, of shape [1, batch_size],
+            used to weight the per-step losses when the sequences are sampled from a prioritized buffer.
+            Default to None.
 
     Returns:
         observation_loss (Tensor): the value of the observation loss.
@@ -63,6 +67,9 @@ def reconstruction_loss(
         state_loss (Tensor): the value of the state loss.
         continue_loss (Tensor): the value of the continue loss (0 if it is not computed).
         reconstruction_loss (Tensor): the value of the overall reconstruction loss.
+        observation_losses (Dict[str, Tensor]): the value of the observation loss of every observation key.
+        sequence_loss (Tensor): the (unweighted and detached) overall reconstruction loss
+            of every sequence, of shape [batch_size].
     """
     rewards.device
     # obs loss weights: 1.0 for all except objects_position which is obs_loss_regularizer
@@ -112,7 +119,11 @@ def reconstruction_loss(
         continue_loss = continue_scale_factor * -pc.log_prob(continue_targets)
     else:
         continue_loss = torch.zeros_like(reward_loss)
-    reconstruction_loss = (kl_regularizer * kl_loss + observation_loss + reward_loss + continue_loss).mean()
+    step_loss = kl_regularizer * kl_loss + observation_loss + reward_loss + continue_loss
+    if weights is not None:
+        reconstruction_loss = (weights * step_loss).mean()
+    else:
+        reconstruction_loss = step_loss.mean()
     return (
         reconstruction_loss,
         kl.mean(),
@@ -121,4 +132,5 @@ def reconstruction_loss(
         observation_loss.mean(),
         continue_loss.mean(),
         observation_mean_losses_dict,
+        step_loss.detach().mean(dim=0),
     )
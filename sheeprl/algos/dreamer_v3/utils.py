@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Dict, Sequence
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Sequence, Tuple
 
 import gymnasium as gym
 import numpy as np
@@ -8,14 +8,15 @@ import torch
 from lightning import Fabric
 from torch import Tensor, nn
 
-from sheeprl.utils.env import make_env
-from sheeprl.utils.imports import _IS_MLFLOW_AVAILABLE
+from sheeprl.algos.dreamer_v2.utils import evaluate_episodes
+from sheeprl.utils.env import make_env, make_vector_env
+from sheeprl.utils.imports import _IS_MLFLOW_AVAILABLE, _IS_TORCH_GREATER_EQUAL_2_2
 from sheeprl.utils.utils import unwrap_fabric
 
 if TYPE_CHECKING:
     from mlflow.models.model import ModelInfo
 
-    from sheeprl.algos.dreamer_v3.agent import PlayerDV3
+    from sheeprl.algos.dreamer_v3.agent import RSSM, PlayerDV3
 
 AGGREGATOR_KEYS = {
     "Rewards/rew_avg",
@@ -66,6 +67,108 @@ class Moments(nn.Module):
         return self.low.detach(), invscale.detach()
 
 
+class ImaginationEngine:
+    """Imagine the trajectories of the behaviour learning, starting from the latent states of the world model.
+    The shapes of the imagined trajectories are the same at every gradient step, so the trajectories and the actions
+    are written in buffers allocated once. If `compile` is True, the whole rollout over the horizon is compiled
+    with `torch.compile` as a single static-shape graph: on CUDA the graph is captured with CUDA graphs
+    (the `reduce-overhead` mode), so that the small kernels of the rollout are not launched one by one.
+
+    Args:
+        rssm (RSSM): the RSSM of the world model.
+        actor (nn.Module): the actor.
+        horizon (int): the number of imagined steps.
+        stochastic_size (int): the number of the Categorical variables of the stochastic state.
+        discrete_size (int): the number of the classes of every Categorical variable.
+        recurrent_state_size (int): the size of the recurrent state.
+        actions_dim (Sequence[int]): the actions dimension.
+        compile (bool): whether or not to compile the rollout.
+            Default to False.
+        mode (str, optional): the mode of `torch.compile`. If None, the `reduce-overhead` mode is used
+            on CUDA and the default one otherwise.
+            Default to None.
+    """
+
+    def __init__(
+        self,
+        rssm: "RSSM",
+        actor: nn.Module,
+        horizon: int,
+        stochastic_size: int,
+        discrete_size: int,
+        recurrent_state_size: int,
+        actions_dim: Sequence[int],
+        compile: bool = False,
+        mode: Optional[str] = None,
+    ) -> None:
+        if compile and not _IS_TORCH_GREATER_EQUAL_2_2:
+            raise RuntimeError("Compiling the imagination requires 'torch>=2.2'")
+        self.rssm = rssm
+        self.actor = actor
+        self.horizon = horizon
+        self.stoch_state_size = stochastic_size * discrete_size
+        self.recurrent_state_size = recurrent_state_size
+        self.actions_size = sum(actions_dim)
+        self.compile = compile
+        self.mode = mode
+        self._compiled_imagine: Optional[Callable[[Tensor, Tensor], Tuple[Tensor, Tensor]]] = None
+        self._trajectories: Optional[Tensor] = None
+        self._actions: Optional[Tensor] = None
+
+    def __call__(self, prior: Tensor, recurrent_state: Tensor) -> Tuple[Tensor, Tensor]:
+        """Imagine the trajectories.
+
+        Args:
+            prior (Tensor): the starting stochastic states of shape (1, batch_size, stoch_state_size).
+            recurrent_state (Tensor): the starting recurrent states of shape (1, batch_size, recurrent_state_size).
+
+        Returns:
+            The imagined trajectories (Tensor) of shape
+                (horizon + 1, batch_size, stoch_state_size + recurrent_state_size).
+            The imagined actions (Tensor) of shape (horizon + 1, batch_size, sum(actions_dim)).
+        """
+        if self.compile:
+            if self._compiled_imagine is None:
+                mode = self.mode
+                if mode is None and prior.device.type == "cuda":
+                    mode = "reduce-overhead"
+                self._compiled_imagine = torch.compile(self._static_imagine, mode=mode, dynamic=False)
+            if prior.device.type == "cuda":
+                # The outputs of the previous rollout are not used anymore: their memory can be reused by the graph
+                torch.compiler.cudagraph_mark_step_begin()
+            return self._compiled_imagine(prior, recurrent_state)
+        trajectories_shape = (self.horizon + 1, prior.shape[1], self.stoch_state_size + self.recurrent_state_size)
+        if self._trajectories is None or self._trajectories.shape != trajectories_shape:
+            self._trajectories = torch.empty(trajectories_shape, device=prior.device)
+            self._actions = torch.empty(self.horizon + 1, prior.shape[1], self.actions_size, device=prior.device)
+        # The buffers are detached, so that the autograd graph of the previous rollout is not extended
+        return self._imagine(prior, recurrent_state, self._trajectories.detach(), self._actions.detach())
+
+    def _static_imagine(self, prior: Tensor, recurrent_state: Tensor) -> Tuple[Tensor, Tensor]:
+        # The buffers are allocated inside the graph, which owns (and reuses) their memory
+        trajectories = torch.empty(
+            self.horizon + 1, prior.shape[1], self.stoch_state_size + self.recurrent_state_size, device=prior.device
+        )
+        actions = torch.empty(self.horizon + 1, prior.shape[1], self.actions_size, device=prior.device)
+        return self._imagine(prior, recurrent_state, trajectories, actions)
+
+    def _imagine(
+        self, prior: Tensor, recurrent_state: Tensor, trajectories: Tensor, actions: Tensor
+    ) -> Tuple[Tensor, Tensor]:
+        latent_state = torch.cat((prior, recurrent_state), -1)
+        trajectories[0] = latent_state
+        action = torch.cat(self.actor(latent_state.detach())[0], dim=-1)
+        actions[0] = action
+        for i in range(1, self.horizon + 1):
+            prior, recurrent_state = self.rssm.imagination(prior, recurrent_state, action)
+            prior = prior.view(1, -1, self.stoch_state_size)
+            latent_state = torch.cat((prior, recurrent_state), -1)
+            trajectories[i] = latent_state
+            action = torch.cat(self.actor(latent_state.detach())[0], dim=-1)
+            actions[i] = action
+        return trajectories, actions
+
+
 def compute_lambda_values(
     rewards: Tensor,
     values: Tensor,
@@ -90,7 +193,9 @@ def test(
     sample_actions: bool = False,
     train_step: int = None,
 ):
-    """Test the model on the environment with the frozen model.
+    """Test the model on the environment with the frozen model: the 'cfg.algo.test_episodes' episodes
+    are played in parallel by as many environments (see `evaluate_episodes`) and
+    their mean cumulative reward is logged.
 
     Args:
         player (PlayerDV3): the agent which contains all the models needed to play.
@@ -103,44 +208,40 @@ def test(
             Default to False.
         train_step (int): the number of steps the frozen model was trained on.
     """
-    env: gym.Env = make_env(cfg, cfg.seed, 0, log_dir, "test" + (f"_{test_name}" if test_name != "" else ""))()
-    done = False
-    cumulative_rew = 0
-    device = fabric.device
-    next_obs = env.reset(seed=cfg.seed)[0]
-    for k in next_obs.keys():
-        next_obs[k] = torch.from_numpy(next_obs[k]).view(1, *next_obs[k].shape).float()
-    player.num_envs = 1
-    player.init_states()
-    while not done:
-        # Act greedly through the environment
-        preprocessed_obs = {}
-        for k, v in next_obs.items():
-            if k in cfg.algo.cnn_keys.encoder:
-                preprocessed_obs[k] = v[None, ...].to(device) / 255
-            elif k in cfg.algo.mlp_keys.encoder:
-                preprocessed_obs[k] = v[None, ...].to(device)
-        real_actions = player.get_greedy_action(
-            preprocessed_obs, sample_actions, {k: v for k, v in preprocessed_obs.items() if k.startswith("mask")}
-        )
-        if player.actor.is_continuous:
-            real_actions = torch.cat(real_actions, -1).cpu().numpy()
-        else:
-            real_actions = torch.cat([real_act.argmax(dim=-1) for real_act in real_actions], dim=-1).cpu().numpy()
-
-        # Single environment step
-        next_obs, reward, done, truncated, _ = env.step(real_actions.reshape(env.action_space.shape))
-        for k in next_obs.keys():
-            next_obs[k] = torch.from_numpy(next_obs[k]).view(1, *next_obs[k].shape).float()
-        done = done or truncated or cfg.dry_run
-        cumulative_rew += reward
+    num_episodes = cfg.algo.get("test_episodes", 1)
+    envs = make_vector_env(
+        cfg,
+        [
+            make_env(
+                cfg,
+                cfg.seed + i,
+                0,
+                log_dir,
+                "test" + (f"_{test_name}" if test_name != "" else ""),
+                vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
+            )
+            for i in range(num_episodes)
+        ],
+    )
+    results = evaluate_episodes(
+        player, fabric, cfg, envs, num_episodes, sample_actions=sample_actions, cnn_preprocessing=normalize_pixels
+    )
+    envs.close()
+    cumulative_rew = np.mean([r["cumulative_reward"] for r in results])
+    if num_episodes > 1:
+        fabric.print("Test - Rewards:", [r["cumulative_reward"] for r in results])
     fabric.print("Test - Reward:", cumulative_rew)
     if cfg.metric.log_level > 0 and len(fabric.loggers) > 0:
         if train_step is None:
             fabric.logger.log_metrics({"Test/cumulative_reward": cumulative_rew}, 0)
         else:
             fabric.logger.log_metrics({"Train/cumulative_reward": cumulative_rew}, train_step)
-    env.close()
+
+
+def normalize_pixels(obs: Tensor) -> Tensor:
+    """Normalize the pixels of the image observations in [0, 1], as expected by the encoder of DreamerV3."""
+    return obs / 255
 
 
 # Adapted from: https://github.com/NM512/dreamerv3-torch/blob/main/tools.py#L929
@@ -19,8 +19,8 @@ from torchmetrics import SumMetric
 from sheeprl.algos.droq.agent import DROQAgent, build_agent
 from sheeprl.algos.sac.loss import entropy_loss, policy_loss
 from sheeprl.algos.sac.sac import test
-from sheeprl.data.buffers import ReplayBuffer
-from sheeprl.utils.env import make_env
+from sheeprl.data.buffers import PrioritizedReplayBuffer, ReplayBuffer
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -40,16 +40,23 @@ def train(
 ):
     # Sample a minibatch in a distributed way: Line 5 - Algorithm 2
     # We sample one time to reduce the communications between processes
+    prioritized = isinstance(rb, PrioritizedReplayBuffer)
     sample = rb.sample_tensors(
         cfg.algo.per_rank_gradient_steps * cfg.algo.per_rank_batch_size,
         sample_next_obs=cfg.buffer.sample_next_obs,
         from_numpy=cfg.buffer.from_numpy,
     )
-    critic_data = fabric.all_gather(sample)
     flatten_dim = 3 if fabric.world_size > 1 else 2
-    critic_data = {k: v.view(-1, *v.shape[flatten_dim:]) for k, v in critic_data.items()}
+    if prioritized:
+        # Every rank trains the critics on its own samples, so that their TD-errors
+        # update the priorities of the local buffer without any communication
+        sampled_idxes = sample.pop("idxes").view(-1)
+        critic_data = {k: v.view(-1, *v.shape[2:]) for k, v in sample.items()}
+    else:
+        critic_data = fabric.all_gather(sample)
+        critic_data = {k: v.view(-1, *v.shape[flatten_dim:]) for k, v in critic_data.items()}
     critic_idxes = range(len(critic_data[next(iter(critic_data.keys()))]))
-    if fabric.world_size > 1:
+    if fabric.world_size > 1 and not prioritized:
         dist_sampler: DistributedSampler = DistributedSampler(
             critic_idxes,
             num_replicas=fabric.world_size,
@@ -66,6 +73,9 @@ def train(
 
     # Sample a different minibatch in a distributed way to update actor and alpha parameter
     sample = rb.sample_tensors(cfg.algo.per_rank_batch_size, from_numpy=cfg.buffer.from_numpy)
+    if prioritized:
+        sample.pop("idxes")
+        sample.pop("weights")
     actor_data = fabric.all_gather(sample)
     actor_data = {k: v.view(-1, *v.shape[flatten_dim:]) for k, v in actor_data.items()}
     if fabric.world_size > 1:
@@ -89,14 +99,18 @@ def train(
                 critic_batch_data["dones"],
                 cfg.algo.gamma,
             )
+            td_errors = 0
             for qf_value_idx in range(agent.num_critics):
                 # Line 8 - Algorithm 2
-                qf_loss = F.mse_loss(
-                    agent.get_ith_q_value(
-                        critic_batch_data["observations"], critic_batch_data["actions"], qf_value_idx
-                    ),
-                    next_target_qf_value,
+                qf_value = agent.get_ith_q_value(
+                    critic_batch_data["observations"], critic_batch_data["actions"], qf_value_idx
                 )
+                if prioritized:
+                    # Importance-sampling weights of the prioritized replay buffer
+                    qf_loss = (critic_batch_data["weights"] * (qf_value - next_target_qf_value) ** 2).mean()
+                    td_errors += (qf_value.detach() - next_target_qf_value).abs() / agent.num_critics
+                else:
+                    qf_loss = F.mse_loss(qf_value, next_target_qf_value)
                 qf_optimizer.zero_grad(set_to_none=True)
                 fabric.backward(qf_loss)
                 qf_optimizer.step()
@@ -105,6 +119,8 @@ def train(
 
                 # Update the target networks with EMA
                 agent.qfs_target_ema(critic_idx=qf_value_idx)
+            if prioritized:
+                rb.update_priorities(sampled_idxes[batch_idxes].cpu().numpy(), td_errors.cpu().numpy())
 
         # Update the actor
         actions, logprobs = agent.get_actions_and_log_probs(actor_data["observations"])
@@ -161,8 +177,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -171,9 +187,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     action_space = envs.single_action_space
     observation_space = envs.single_observation_space
@@ -221,12 +238,15 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
 
     # Local data
     buffer_size = cfg.buffer.size // int(cfg.env.num_envs * fabric.world_size) if not cfg.dry_run else 1
-    rb = ReplayBuffer(
+    rb = (PrioritizedReplayBuffer if cfg.buffer.prioritized.enabled else ReplayBuffer)(
         buffer_size,
         cfg.env.num_envs,
         device=device,
         memmap=cfg.buffer.memmap,
         memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
+        alpha=cfg.buffer.prioritized.alpha,
+        beta=cfg.buffer.prioritized.beta,
+        eps=cfg.buffer.prioritized.eps,
     )
     if cfg.checkpoint.resume_from and cfg.buffer.checkpoint:
         if isinstance(state["rb"], list) and fabric.world_size == len(state["rb"]):
@@ -21,9 +21,15 @@ from sheeprl.algos.dreamer_v2.agent import PlayerDV2, WorldModel
 from sheeprl.algos.dreamer_v2.loss import reconstruction_loss
 from sheeprl.algos.dreamer_v2.utils import compute_lambda_values, test
 from sheeprl.algos.p2e_dv2.agent import build_agent
-from sheeprl.data.buffers import EnvIndependentReplayBuffer, EpisodeBuffer, SequentialReplayBuffer
+from sheeprl.data.buffers import (
+    EnvIndependentReplayBuffer,
+    EpisodeBuffer,
+    ReplayPrefetcher,
+    SampleArena,
+    SequentialReplayBuffer,
+)
 from sheeprl.utils.distribution import OneHotCategoricalValidateArgs
-from sheeprl.utils.env import make_env
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -119,24 +125,13 @@ def train(
     # Dynamic Learning
     recurrent_state = torch.zeros(1, batch_size, recurrent_state_size, device=device)
     posterior = torch.zeros(1, batch_size, stochastic_size, discrete_size, device=device)
-    recurrent_states = torch.zeros(sequence_length, batch_size, recurrent_state_size, device=device)
-    priors = torch.empty(sequence_length, batch_size, stochastic_size, discrete_size, device=device)
-    priors_logits = torch.empty(sequence_length, batch_size, stochastic_size * discrete_size, device=device)
-    posteriors = torch.empty(sequence_length, batch_size, stochastic_size, discrete_size, device=device)
-    posteriors_logits = torch.empty(sequence_length, batch_size, stochastic_size * discrete_size, device=device)
 
     # embedded observations from the environment
     embedded_obs = world_model.encoder(batch_obs)
 
-    for i in range(0, sequence_length):
-        recurrent_state, posterior, prior, posterior_logits, prior_logits = world_model.rssm.dynamic(
-            posterior, recurrent_state, data["actions"][i : i + 1], embedded_obs[i : i + 1], data["is_first"][i : i + 1]
-        )
-        recurrent_states[i] = recurrent_state
-        priors[i] = prior
-        priors_logits[i] = prior_logits
-        posteriors[i] = posterior
-        posteriors_logits[i] = posterior_logits
+    recurrent_states, posteriors, priors, posteriors_logits, priors_logits = world_model.rssm.dynamic_sequence(
+        posterior, recurrent_state, data["actions"], embedded_obs, data["is_first"]
+    )
 
     # concatenate the posteriors with the recurrent states on the last dimension
     # latent_states has dimension (sequence_length, batch_size, recurrent_state_size + stochastic_size * discrete_size)
@@ -535,8 +530,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -545,9 +540,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     action_space = envs.single_action_space
     observation_space = envs.single_observation_space
@@ -682,6 +678,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             obs_keys=obs_keys,
             memmap=cfg.buffer.memmap,
             memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
+            compression=cfg.buffer.compression,
+            compression_threads=cfg.buffer.compression_threads,
             buffer_cls=SequentialReplayBuffer,
         )
     elif buffer_type == "episode":
@@ -693,6 +691,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             prioritize_ends=cfg.buffer.prioritize_ends,
             memmap=cfg.buffer.memmap,
             memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
+            compression=cfg.buffer.compression,
+            compression_threads=cfg.buffer.compression_threads,
         )
     else:
         raise ValueError(f"Unrecognized buffer type: must be one of `sequential` or `episode`, received: {buffer_type}")
@@ -703,6 +703,11 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             rb = state["rb"]
         else:
             raise RuntimeError(f"Given {len(state['rb'])}, but {world_size} processes are instantiated")
+    if cfg.buffer.arena_slabs > 0:
+        rb.arena = SampleArena(cfg.buffer.arena_slabs, pin_memory=cfg.buffer.pin_memory)
+    prefetcher = ReplayPrefetcher(
+        rb, prefetch=cfg.buffer.prefetch, device=fabric.device, from_numpy=cfg.buffer.from_numpy
+    )
     expl_decay_steps = state["expl_decay_steps"] if cfg.checkpoint.resume_from else 0
 
     # Global variables
@@ -873,17 +878,14 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             n_samples = (
                 cfg.algo.per_rank_pretrain_steps if update == learning_starts else cfg.algo.per_rank_gradient_steps
             )
-            local_data = rb.sample_tensors(
+            local_data = prefetcher.iterate(
                 batch_size=cfg.algo.per_rank_batch_size,
                 sequence_length=cfg.algo.per_rank_sequence_length,
                 n_samples=n_samples,
-                dtype=None,
-                device=fabric.device,
-                from_numpy=cfg.buffer.from_numpy,
             )
             # Start training
             with timer("Time/train_time", SumMetric, sync_on_compute=cfg.metric.sync_on_compute):
-                for i in range(next(iter(local_data.values())).shape[0]):
+                for batch in local_data:
                     if per_rank_gradient_steps % cfg.algo.critic.target_network_update_freq == 0:
                         for cp, tcp in zip(critic_task.module.parameters(), target_critic_task.parameters()):
                             tcp.data.copy_(cp.data)
@@ -891,7 +893,7 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                             critic_exploration.module.parameters(), target_critic_exploration.parameters()
                         ):
                             tcp.data.copy_(cp.data)
-                    batch = {k: v[i].float() for k, v in local_data.items()}
+                    batch = {k: v.float() for k, v in batch.items()}
                     train(
                         fabric,
                         world_model,
@@ -19,7 +19,13 @@ from sheeprl.algos.dreamer_v3.agent import PlayerDV3, WorldModel
 from sheeprl.algos.dreamer_v3.loss import reconstruction_loss
 from sheeprl.algos.dreamer_v3.utils import Moments, compute_lambda_values, test
 from sheeprl.algos.p2e_dv3.agent import build_agent
-from sheeprl.data.buffers import EnvIndependentReplayBuffer, SequentialReplayBuffer
+from sheeprl.data.buffers import (
+    EnvIndependentReplayBuffer,
+    PrioritizedSequentialReplayBuffer,
+    ReplayPrefetcher,
+    SampleArena,
+    SequentialReplayBuffer,
+)
 from sheeprl.utils.distribution import (
     BernoulliSafeMode,
     MSEDistribution,
@@ -27,7 +33,7 @@ from sheeprl.utils.distribution import (
     SymlogDistribution,
     TwoHotEncodingDistribution,
 )
-from sheeprl.utils.env import make_env
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -59,7 +65,7 @@ def train(
     moments_task: Moments,
     is_continuous: bool,
     actions_dim: Sequence[int],
-) -> None:
+) -> Tensor:
     """Runs one-step update of the agent.
 
     In particular, it updates the agent as specified by Algorithm 1 in
@@ -104,6 +110,10 @@ def train(
         actor_exploration_optimizer (_FabricOptimizer): the optimizer of the actor for exploration.
         is_continuous (bool): whether or not are continuous actions.
         actions_dim (Sequence[int]): the actions dimension.
+
+    Returns:
+        Tensor: the reconstruction loss of every sequence in the batch, which is the new priority
+        of the sequences when they are sampled from a prioritized buffer.
     """
     batch_size = cfg.algo.per_rank_batch_size
     sequence_length = cfg.algo.per_rank_sequence_length
@@ -125,22 +135,15 @@ def train(
     stoch_state_size = stochastic_size * discrete_size
     recurrent_state = torch.zeros(1, batch_size, recurrent_state_size, device=device)
     posterior = torch.zeros(1, batch_size, stochastic_size, discrete_size, device=device)
-    recurrent_states = torch.empty(sequence_length, batch_size, recurrent_state_size, device=device)
-    priors_logits = torch.empty(sequence_length, batch_size, stoch_state_size, device=device)
-    posteriors = torch.empty(sequence_length, batch_size, stochastic_size, discrete_size, device=device)
-    posteriors_logits = torch.empty(sequence_length, batch_size, stoch_state_size, device=device)
 
     # embedded observations from the environment
     embedded_obs = world_model.encoder(batch_obs)
 
-    for i in range(0, sequence_length):
-        recurrent_state, posterior, _, posterior_logits, prior_logits = world_model.rssm.dynamic(
-            posterior, recurrent_state, batch_actions[i : i + 1], embedded_obs[i : i + 1], data["is_first"][i : i + 1]
-        )
-        recurrent_states[i] = recurrent_state
-        priors_logits[i] = prior_logits
-        posteriors[i] = posterior
-        posteriors_logits[i] = posterior_logits
+    # Only the recurrent and the representation models are run step by step,
+    # while the priors of the whole sequence are computed at once
+    recurrent_states, posteriors, _, posteriors_logits, priors_logits = world_model.rssm.dynamic_sequence(
+        posterior, recurrent_state, batch_actions, embedded_obs, data["is_first"]
+    )
     latent_states = torch.cat((posteriors.view(*posteriors.shape[:-2], -1), recurrent_states), -1)
 
     # compute predictions for the observations
@@ -174,7 +177,16 @@ def train(
 
     # world model optimization step
     world_optimizer.zero_grad(set_to_none=True)
-    rec_loss, kl, state_loss, reward_loss, observation_loss, continue_loss = reconstruction_loss(
+    (
+        rec_loss,
+        kl,
+        state_loss,
+        reward_loss,
+        observation_loss,
+        continue_loss,
+        _,
+        sequence_loss,
+    ) = reconstruction_loss(
         po,
         batch_obs,
         pr,
@@ -185,9 +197,12 @@ def train(
         cfg.algo.world_model.kl_representation,
         cfg.algo.world_model.kl_free_nats,
         cfg.algo.world_model.kl_regularizer,
+        cfg.algo.world_model.obs_loss_regularizer,
         pc,
         continue_targets,
         cfg.algo.world_model.continue_scale_factor,
+        validate_args=validate_args,
+        weights=data["weights"][..., 0] if "weights" in data else None,
     )
     fabric.backward(rec_loss)
     world_model_grads = None
@@ -202,9 +217,7 @@ def train(
 
     # Free up space
     del posterior
-    del prior_logits
     del recurrent_state
-    del posterior_logits
     world_optimizer.zero_grad(set_to_none=True)
 
     # Ensemble Learning
@@ -543,6 +556,7 @@ def train(
     ensemble_optimizer.zero_grad(set_to_none=True)
     for c in critics_exploration.values():
         c["optimizer"].zero_grad(set_to_none=True)
+    return sequence_loss
 
 
 @register_algorithm()
@@ -570,8 +584,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -580,9 +594,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     action_space = envs.single_action_space
     observation_space = envs.single_observation_space
@@ -760,7 +775,12 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         n_envs=cfg.env.num_envs,
         memmap=cfg.buffer.memmap,
         memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
-        buffer_cls=SequentialReplayBuffer,
+        compression=cfg.buffer.compression,
+        compression_threads=cfg.buffer.compression_threads,
+        buffer_cls=PrioritizedSequentialReplayBuffer if cfg.buffer.prioritized.enabled else SequentialReplayBuffer,
+        alpha=cfg.buffer.prioritized.alpha,
+        beta=cfg.buffer.prioritized.beta,
+        eps=cfg.buffer.prioritized.eps,
     )
     if cfg.checkpoint.resume_from and cfg.buffer.checkpoint:
         if isinstance(state["rb"], list) and world_size == len(state["rb"]):
@@ -769,6 +789,11 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             rb = state["rb"]
         else:
             raise RuntimeError(f"Given {len(state['rb'])}, but {world_size} processes are instantiated")
+    if cfg.buffer.arena_slabs > 0:
+        rb.arena = SampleArena(cfg.buffer.arena_slabs, pin_memory=cfg.buffer.pin_memory)
+    prefetcher = ReplayPrefetcher(
+        rb, prefetch=cfg.buffer.prefetch, device=fabric.device, from_numpy=cfg.buffer.from_numpy
+    )
     expl_decay_steps = state["expl_decay_steps"] if cfg.checkpoint.resume_from else 0
 
     # Global variables
@@ -941,19 +966,16 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
 
         # Train the agent
         if update >= learning_starts and updates_before_training <= 0:
-            local_data = rb.sample_tensors(
+            local_data = prefetcher.iterate(
                 cfg.algo.per_rank_batch_size,
                 sequence_length=cfg.algo.per_rank_sequence_length,
                 n_samples=(
                     cfg.algo.per_rank_pretrain_steps if update == learning_starts else cfg.algo.per_rank_gradient_steps
                 ),
-                dtype=None,
-                device=fabric.device,
-                from_numpy=cfg.buffer.from_numpy,
             )
             # Start training
             with timer("Time/train_time", SumMetric, sync_on_compute=cfg.metric.sync_on_compute):
-                for i in range(next(iter(local_data.values())).shape[0]):
+                for batch in local_data:
                     if per_rank_gradient_steps % cfg.algo.critic.target_network_update_freq == 0:
                         tau = 1 if per_rank_gradient_steps == 0 else cfg.algo.critic.tau
                         for cp, tcp in zip(critic_task.module.parameters(), target_critic_task.parameters()):
@@ -964,8 +986,9 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                                 critics_exploration[k]["target_module"].parameters(),
                             ):
                                 tcp.data.copy_(tau * cp.data + (1 - tau) * tcp.data)
-                    batch = {k: v[i].float() for k, v in local_data.items()}
-                    train(
+                    sampled_idxes = batch.pop("idxes", None)
+                    batch = {k: v.float() for k, v in batch.items()}
+                    sequence_loss = train(
                         fabric,
                         world_model,
                         actor_task,
@@ -987,6 +1010,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                         moments_exploration=moments_exploration,
                         moments_task=moments_task,
                     )
+                    if sampled_idxes is not None:
+                        rb.update_priorities(sampled_idxes.cpu().numpy(), sequence_loss.cpu().numpy())
                 train_step += world_size
             updates_before_training = cfg.algo.train_every // policy_steps_per_update
             if cfg.algo.actor.expl_decay:
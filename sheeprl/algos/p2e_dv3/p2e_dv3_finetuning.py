@@ -13,10 +13,16 @@ from torchmetrics import SumMetric
 
 from sheeprl.algos.dreamer_v3.agent import PlayerDV3
 from sheeprl.algos.dreamer_v3.dreamer_v3 import train
-from sheeprl.algos.dreamer_v3.utils import Moments, test
+from sheeprl.algos.dreamer_v3.utils import ImaginationEngine, Moments, test
 from sheeprl.algos.p2e_dv3.agent import build_agent
-from sheeprl.data.buffers import EnvIndependentReplayBuffer, SequentialReplayBuffer
-from sheeprl.utils.env import make_env
+from sheeprl.data.buffers import (
+    EnvIndependentReplayBuffer,
+    PrioritizedSequentialReplayBuffer,
+    ReplayPrefetcher,
+    SampleArena,
+    SequentialReplayBuffer,
+)
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -80,8 +86,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any], exploration_cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -90,9 +96,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any], exploration_cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     action_space = envs.single_action_space
     observation_space = envs.single_observation_space
@@ -188,6 +195,17 @@ def main(fabric: Fabric, cfg: Dict[str, Any], exploration_cfg: Dict[str, Any]):
         cfg.algo.actor.moments.percentile.high,
     )
     moments_task.load_state_dict(state["moments_task"])
+    imagination_task = ImaginationEngine(
+        world_model.rssm,
+        actor_task,
+        cfg.algo.horizon,
+        cfg.algo.world_model.stochastic_size,
+        cfg.algo.world_model.discrete_size,
+        cfg.algo.world_model.recurrent_model.recurrent_state_size,
+        actions_dim,
+        compile=cfg.algo.imagination.compile,
+        mode=cfg.algo.imagination.mode,
+    )
 
     if fabric.is_global_zero:
         save_configs(cfg, log_dir)
@@ -204,7 +222,12 @@ def main(fabric: Fabric, cfg: Dict[str, Any], exploration_cfg: Dict[str, Any]):
         n_envs=cfg.env.num_envs,
         memmap=cfg.buffer.memmap,
         memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
-        buffer_cls=SequentialReplayBuffer,
+        compression=cfg.buffer.compression,
+        compression_threads=cfg.buffer.compression_threads,
+        buffer_cls=PrioritizedSequentialReplayBuffer if cfg.buffer.prioritized.enabled else SequentialReplayBuffer,
+        alpha=cfg.buffer.prioritized.alpha,
+        beta=cfg.buffer.prioritized.beta,
+        eps=cfg.buffer.prioritized.eps,
     )
     if resume_from_checkpoint or (cfg.buffer.load_from_exploration and exploration_cfg.buffer.checkpoint):
         if isinstance(state["rb"], list) and world_size == len(state["rb"]):
@@ -213,6 +236,11 @@ def main(fabric: Fabric, cfg: Dict[str, Any], exploration_cfg: Dict[str, Any]):
             rb = state["rb"]
         else:
             raise RuntimeError(f"Given {len(state['rb'])}, but {world_size} processes are instantiated")
+    if cfg.buffer.arena_slabs > 0:
+        rb.arena = SampleArena(cfg.buffer.arena_slabs, pin_memory=cfg.buffer.pin_memory)
+    prefetcher = ReplayPrefetcher(
+        rb, prefetch=cfg.buffer.prefetch, device=fabric.device, from_numpy=cfg.buffer.from_numpy
+    )
     expl_decay_steps = state["expl_decay_steps"] if resume_from_checkpoint else 0
 
     # Global variables
@@ -372,25 +400,23 @@ def main(fabric: Fabric, cfg: Dict[str, Any], exploration_cfg: Dict[str, Any]):
             if player.actor_type == "exploration":
                 player.actor = actor_task.module
                 player.actor_type = "task"
-            local_data = rb.sample_tensors(
+            local_data = prefetcher.iterate(
                 cfg.algo.per_rank_batch_size,
                 sequence_length=cfg.algo.per_rank_sequence_length,
                 n_samples=(
                     cfg.algo.per_rank_pretrain_steps if update == learning_starts else cfg.algo.per_rank_gradient_steps
                 ),
-                dtype=None,
-                device=fabric.device,
-                from_numpy=cfg.buffer.from_numpy,
             )
             # Start training
             with timer("Time/train_time", SumMetric, sync_on_compute=cfg.metric.sync_on_compute):
-                for i in range(next(iter(local_data.values())).shape[0]):
+                for batch in local_data:
                     tau = 1 if per_rank_gradient_steps == 0 else cfg.algo.critic.tau
                     if per_rank_gradient_steps % cfg.algo.critic.target_network_update_freq == 0:
                         for cp, tcp in zip(critic_task.module.parameters(), target_critic_task.parameters()):
                             tcp.data.copy_(tau * cp.data + (1 - tau) * tcp.data)
-                    batch = {k: v[i].float() for k, v in local_data.items()}
-                    train(
+                    sampled_idxes = batch.pop("idxes", None)
+                    batch = {k: v.float() for k, v in batch.items()}
+                    sequence_loss = train(
                         fabric,
                         world_model,
                         actor_task,
@@ -405,7 +431,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any], exploration_cfg: Dict[str, Any]):
                         is_continuous=is_continuous,
                         actions_dim=actions_dim,
                         moments=moments_task,
+                        imagination=imagination_task,
                     )
+                    if sampled_idxes is not None:
+                        rb.update_priorities(sampled_idxes.cpu().numpy(), sequence_loss.cpu().numpy())
                 train_step += world_size
             updates_before_training = cfg.algo.train_every // policy_steps_per_update
             if cfg.algo.actor.expl_decay:
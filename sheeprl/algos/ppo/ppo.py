@@ -3,7 +3,7 @@ from __future__ import annotations
 import copy
 import os
 import warnings
-from typing import Any, Dict, Union
+from typing import Any, Dict, Sequence, Tuple, Union
 
 import gymnasium as gym
 import hydra
@@ -19,7 +19,7 @@ from sheeprl.algos.ppo.agent import build_agent
 from sheeprl.algos.ppo.loss import entropy_loss, policy_loss, value_loss
 from sheeprl.algos.ppo.utils import normalize_obs, test
 from sheeprl.data.buffers import ReplayBuffer
-from sheeprl.utils.env import make_env
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -102,6 +102,211 @@ def train(
                 aggregator.update("Loss/entropy_loss", ent_loss.detach())
 
 
+def sample_actions(
+    agent: _FabricModule,
+    obs: Dict[str, np.ndarray],
+    obs_keys: Sequence[str],
+    is_continuous: bool,
+    device: torch.device,
+    cfg: Dict[str, Any],
+) -> Tuple[np.ndarray, np.ndarray, torch.Tensor, torch.Tensor]:
+    """Sample the actions of the agent given the observations of a batch of environments.
+
+    Args:
+        agent (_FabricModule): the agent.
+        obs (Dict[str, np.ndarray]): the observations of the environments.
+        obs_keys (Sequence[str]): the keys of the observations.
+        is_continuous (bool): whether the actions are continuous.
+        device (torch.device): the device of the agent.
+        cfg (Dict[str, Any]): the configs.
+
+    Returns:
+        The actions to store in the buffer, the actions to send to the environments,
+        the log-probabilities of the actions and the values of the observations.
+    """
+    with torch.no_grad():
+        normalized_obs = normalize_obs(obs, cfg.algo.cnn_keys.encoder, obs_keys)
+        torch_obs = {k: torch.as_tensor(normalized_obs[k], dtype=torch.float32, device=device) for k in obs_keys}
+        actions, logprobs, _, values = agent.module(torch_obs)
+        if is_continuous:
+            real_actions = torch.cat(actions, -1).cpu().numpy()
+        else:
+            real_actions = torch.cat([act.argmax(dim=-1) for act in actions], dim=-1).cpu().numpy()
+        actions = torch.cat(actions, -1).cpu().numpy()
+    return actions, real_actions, logprobs, values
+
+
+def process_step(
+    fabric: Fabric,
+    agent: _FabricModule,
+    obs: Dict[str, np.ndarray],
+    rewards: np.ndarray,
+    dones: np.ndarray,
+    truncated: np.ndarray,
+    info: Dict[str, Any],
+    env_ids: np.ndarray,
+    observation_space: gym.spaces.Dict,
+    obs_keys: Sequence[str],
+    aggregator: MetricAggregator | None,
+    policy_step: int,
+    cfg: Dict[str, Any],
+) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+    """Process the results of a step of a batch of environments: the rewards of the truncated episodes
+    are bootstrapped with the value of their final observations, the stacked frames of the pixel observations
+    are merged into the channels and the rewards and the lengths of the finished episodes are logged.
+
+    Args:
+        fabric (Fabric): the fabric instance.
+        agent (_FabricModule): the agent.
+        obs (Dict[str, np.ndarray]): the observations returned by the environments.
+        rewards (np.ndarray): the rewards returned by the environments.
+        dones (np.ndarray): the terminated flags returned by the environments.
+        truncated (np.ndarray): the truncated flags returned by the environments.
+        info (Dict[str, Any]): the infos returned by the environments.
+        env_ids (np.ndarray): the ids of the environments.
+        observation_space (gym.spaces.Dict): the observation space of a single environment.
+        obs_keys (Sequence[str]): the keys of the observations.
+        aggregator (MetricAggregator, optional): the metric aggregator.
+        policy_step (int): the current policy step.
+        cfg (Dict[str, Any]): the configs.
+
+    Returns:
+        The observations, the dones and the rewards of the environments,
+        the last two with shape [len(env_ids), 1].
+    """
+    truncated_envs = np.nonzero(truncated)[0]
+    if len(truncated_envs) > 0:
+        real_next_obs = {
+            k: torch.empty(
+                len(truncated_envs),
+                *observation_space[k].shape,
+                dtype=torch.float32,
+                device=fabric.device,
+            )
+            for k in obs_keys
+        }
+        for i, truncated_env in enumerate(truncated_envs):
+            for k, v in info["final_observation"][truncated_env].items():
+                torch_v = torch.as_tensor(v, dtype=torch.float32, device=fabric.device)
+                if k in cfg.algo.cnn_keys.encoder:
+                    torch_v = torch_v.view(-1, *v.shape[-2:])
+                    torch_v = torch_v / 255.0 - 0.5
+                real_next_obs[k][i] = torch_v
+        with torch.no_grad():
+            vals = agent.module.get_value(real_next_obs).cpu().numpy()
+            rewards[truncated_envs] += vals.reshape(rewards[truncated_envs].shape)
+    dones = np.logical_or(dones, truncated).reshape(len(env_ids), -1).astype(np.uint8)
+    rewards = rewards.reshape(len(env_ids), -1)
+
+    next_obs = {}
+    for k in obs_keys:
+        _obs = obs[k]
+        if k in cfg.algo.cnn_keys.encoder:
+            _obs = _obs.reshape(len(env_ids), -1, *_obs.shape[-2:])
+        next_obs[k] = _obs
+
+    if cfg.metric.log_level > 0 and "final_info" in info:
+        for i, agent_ep_info in enumerate(info["final_info"]):
+            if agent_ep_info is not None:
+                ep_rew = agent_ep_info["episode"]["r"]
+                ep_len = agent_ep_info["episode"]["l"]
+                if aggregator and "Rewards/rew_avg" in aggregator:
+                    aggregator.update("Rewards/rew_avg", ep_rew)
+                if aggregator and "Game/ep_len_avg" in aggregator:
+                    aggregator.update("Game/ep_len_avg", ep_len)
+                fabric.print(f"Rank-0: policy_step={policy_step}, reward_env_{env_ids[i]}={ep_rew[-1]}")
+    return next_obs, dones, rewards
+
+
+def collect_rollout_in_partial_batches(
+    fabric: Fabric,
+    agent: _FabricModule,
+    envs: gym.vector.VectorEnv,
+    rb: ReplayBuffer,
+    next_obs: Dict[str, np.ndarray],
+    obs_keys: Sequence[str],
+    is_continuous: bool,
+    aggregator: MetricAggregator | None,
+    policy_step: int,
+    cfg: Dict[str, Any],
+) -> Tuple[Dict[str, np.ndarray], int]:
+    """Collect the rollout from an `AsyncBatchVectorEnv`: every batch of ready environments is stepped again
+    as soon as it is received, while the others are still stepping, until every environment has done
+    `cfg.algo.rollout_steps` steps. The rollout is added to the buffer at the end, with the same layout
+    of the rollouts collected by stepping all the environments together.
+
+    Args:
+        fabric (Fabric): the fabric instance.
+        agent (_FabricModule): the agent.
+        envs (gym.vector.VectorEnv): the environments, stepped in partial batches.
+        rb (ReplayBuffer): the buffer where to add the rollout.
+        next_obs (Dict[str, np.ndarray]): the observations of all the environments.
+        obs_keys (Sequence[str]): the keys of the observations.
+        is_continuous (bool): whether the actions are continuous.
+        aggregator (MetricAggregator, optional): the metric aggregator.
+        policy_step (int): the current policy step.
+        cfg (Dict[str, Any]): the configs.
+
+    Returns:
+        The observations of all the environments at the end of the rollout and the updated policy step.
+    """
+    num_envs, rollout_steps = cfg.env.num_envs, cfg.algo.rollout_steps
+    next_obs = {k: np.array(v) for k, v in next_obs.items()}
+    rollout: Dict[str, np.ndarray] = {}
+
+    def add_to_rollout(data: Dict[str, np.ndarray], env_ids: np.ndarray) -> None:
+        for k, v in data.items():
+            if k not in rollout:
+                rollout[k] = np.zeros((rollout_steps, num_envs, *v.shape[1:]), dtype=v.dtype)
+            rollout[k][env_steps[env_ids], env_ids] = v
+
+    # The number of steps done by every environment and the environments waiting for the actions
+    env_steps = np.zeros(num_envs, dtype=np.int64)
+    env_ids = np.arange(num_envs)
+    while (env_steps < rollout_steps).any():
+        with timer("Time/env_interaction_time", SumMetric, sync_on_compute=False):
+            if len(env_ids) > 0:
+                batch_obs = {k: next_obs[k][env_ids] for k in obs_keys}
+                actions, real_actions, logprobs, values = sample_actions(
+                    agent, batch_obs, obs_keys, is_continuous, fabric.device, cfg
+                )
+                batch_obs.update(values=values.cpu().numpy(), actions=actions, logprobs=logprobs.cpu().numpy())
+                add_to_rollout(batch_obs, env_ids)
+                envs.send(real_actions.reshape((len(env_ids), *envs.single_action_space.shape)), env_ids)
+
+            obs, rewards, dones, truncated, info, env_ids = envs.recv()
+            policy_step += len(env_ids) * fabric.world_size
+            obs, dones, rewards = process_step(
+                fabric,
+                agent,
+                obs,
+                rewards,
+                dones,
+                truncated,
+                info,
+                env_ids,
+                envs.single_observation_space,
+                obs_keys,
+                aggregator,
+                policy_step,
+                cfg,
+            )
+
+        add_to_rollout({"dones": dones, "rewards": rewards}, env_ids)
+        env_steps[env_ids] += 1
+        for k in obs_keys:
+            next_obs[k][env_ids] = obs[k]
+
+        # The environments that have done all their steps wait for the next rollout
+        env_ids = env_ids[env_steps[env_ids] < rollout_steps]
+
+    if cfg.buffer.memmap:
+        rollout["returns"] = np.zeros_like(rollout["rewards"])
+        rollout["advantages"] = np.zeros_like(rollout["rewards"])
+    rb.add(rollout, validate_args=cfg.buffer.validate_args)
+    return next_obs, policy_step
+
+
 @register_algorithm()
 def main(fabric: Fabric, cfg: Dict[str, Any]):
     if "minedojo" in cfg.env.wrapper._target_.lower():
@@ -136,8 +341,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -146,9 +351,11 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
+        partial_batches=True,
     )
     observation_space = envs.single_observation_space
 
@@ -256,6 +463,9 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         if cfg.checkpoint.resume_from:
             scheduler.load_state_dict(state["scheduler"])
 
+    # With the partial batches, the environments are stepped asynchronously during the rollouts
+    partial_batches = cfg.env.async_batch_size is not None
+
     # Get the first environment observation and start the optimization
     step_data = {}
     next_obs = envs.reset(seed=cfg.seed)[0]  # [N_envs, N_obs]
@@ -265,83 +475,56 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         step_data[k] = next_obs[k][np.newaxis]
 
     for update in range(start_step, num_updates + 1):
-        for _ in range(0, cfg.algo.rollout_steps):
-            policy_step += cfg.env.num_envs * world_size
+        if partial_batches:
+            next_obs, policy_step = collect_rollout_in_partial_batches(
+                fabric, agent, envs, rb, next_obs, obs_keys, is_continuous, aggregator, policy_step, cfg
+            )
+        else:
+            for _ in range(0, cfg.algo.rollout_steps):
+                policy_step += cfg.env.num_envs * world_size
 
-            # Measure environment interaction time: this considers both the model forward
-            # to get the action given the observation and the time taken into the environment
-            with timer("Time/env_interaction_time", SumMetric, sync_on_compute=False):
-                with torch.no_grad():
+                # Measure environment interaction time: this considers both the model forward
+                # to get the action given the observation and the time taken into the environment
+                with timer("Time/env_interaction_time", SumMetric, sync_on_compute=False):
                     # Sample an action given the observation received by the environment
-                    normalized_obs = normalize_obs(next_obs, cfg.algo.cnn_keys.encoder, obs_keys)
-                    torch_obs = {
-                        k: torch.as_tensor(normalized_obs[k], dtype=torch.float32, device=device) for k in obs_keys
-                    }
-                    actions, logprobs, _, values = agent.module(torch_obs)
-                    if is_continuous:
-                        real_actions = torch.cat(actions, -1).cpu().numpy()
-                    else:
-                        real_actions = torch.cat([act.argmax(dim=-1) for act in actions], dim=-1).cpu().numpy()
-                    actions = torch.cat(actions, -1).cpu().numpy()
-
-                # Single environment step
-                obs, rewards, dones, truncated, info = envs.step(real_actions.reshape(envs.action_space.shape))
-                truncated_envs = np.nonzero(truncated)[0]
-                if len(truncated_envs) > 0:
-                    real_next_obs = {
-                        k: torch.empty(
-                            len(truncated_envs),
-                            *observation_space[k].shape,
-                            dtype=torch.float32,
-                            device=device,
-                        )
-                        for k in obs_keys
-                    }
-                    for i, truncated_env in enumerate(truncated_envs):
-                        for k, v in info["final_observation"][truncated_env].items():
-                            torch_v = torch.as_tensor(v, dtype=torch.float32, device=device)
-                            if k in cfg.algo.cnn_keys.encoder:
-                                torch_v = torch_v.view(-1, *v.shape[-2:])
-                                torch_v = torch_v / 255.0 - 0.5
-                            real_next_obs[k][i] = torch_v
-                    with torch.no_grad():
-                        vals = agent.module.get_value(real_next_obs).cpu().numpy()
-                        rewards[truncated_envs] += vals.reshape(rewards[truncated_envs].shape)
-                dones = np.logical_or(dones, truncated).reshape(cfg.env.num_envs, -1).astype(np.uint8)
-                rewards = rewards.reshape(cfg.env.num_envs, -1)
-
-            # Update the step data
-            step_data["dones"] = dones[np.newaxis]
-            step_data["values"] = values.cpu().numpy()[np.newaxis]
-            step_data["actions"] = actions[np.newaxis]
-            step_data["logprobs"] = logprobs.cpu().numpy()[np.newaxis]
-            step_data["rewards"] = rewards[np.newaxis]
-            if cfg.buffer.memmap:
-                step_data["returns"] = np.zeros_like(rewards, shape=(1, *rewards.shape))
-                step_data["advantages"] = np.zeros_like(rewards, shape=(1, *rewards.shape))
-
-            # Append data to buffer
-            rb.add(step_data, validate_args=cfg.buffer.validate_args)
-
-            # Update the observation and dones
-            next_obs = {}
-            for k in obs_keys:
-                _obs = obs[k]
-                if k in cfg.algo.cnn_keys.encoder:
-                    _obs = _obs.reshape(cfg.env.num_envs, -1, *_obs.shape[-2:])
-                step_data[k] = _obs[np.newaxis]
-                next_obs[k] = _obs
-
-            if cfg.metric.log_level > 0 and "final_info" in info:
-                for i, agent_ep_info in enumerate(info["final_info"]):
-                    if agent_ep_info is not None:
-                        ep_rew = agent_ep_info["episode"]["r"]
-                        ep_len = agent_ep_info["episode"]["l"]
-                        if aggregator and "Rewards/rew_avg" in aggregator:
-                            aggregator.update("Rewards/rew_avg", ep_rew)
-                        if aggregator and "Game/ep_len_avg" in aggregator:
-                            aggregator.update("Game/ep_len_avg", ep_len)
-                        fabric.print(f"Rank-0: policy_step={policy_step}, reward_env_{i}={ep_rew[-1]}")
+                    actions, real_actions, logprobs, values = sample_actions(
+                        agent, next_obs, obs_keys, is_continuous, device, cfg
+                    )
+
+                    # Single environment step
+                    obs, rewards, dones, truncated, info = envs.step(real_actions.reshape(envs.action_space.shape))
+                    next_obs, dones, rewards = process_step(
+                        fabric,
+                        agent,
+                        obs,
+                        rewards,
+                        dones,
+                        truncated,
+                        info,
+                        np.arange(cfg.env.num_envs),
+                        observation_space,
+                        obs_keys,
+                        aggregator,
+                        policy_step,
+                        cfg,
+                    )
+
+                # Update the step data
+                step_data["dones"] = dones[np.newaxis]
+                step_data["values"] = values.cpu().numpy()[np.newaxis]
+                step_data["actions"] = actions[np.newaxis]
+                step_data["logprobs"] = logprobs.cpu().numpy()[np.newaxis]
+                step_data["rewards"] = rewards[np.newaxis]
+                if cfg.buffer.memmap:
+                    step_data["returns"] = np.zeros_like(rewards, shape=(1, *rewards.shape))
+                    step_data["advantages"] = np.zeros_like(rewards, shape=(1, *rewards.shape))
+
+                # Append data to buffer
+                rb.add(step_data, validate_args=cfg.buffer.validate_args)
+
+                # Update the observation
+                for k in obs_keys:
+                    step_data[k] = next_obs[k][np.newaxis]
 
         # Transform the data into PyTorch Tensors
         local_data = rb.to_tensor(dtype=None, device=device, from_numpy=cfg.buffer.from_numpy)
@@ -2,6 +2,7 @@
 """
 
 from numbers import Number
+from typing import Optional
 
 import torch.nn.functional as F
 from torch import Tensor
@@ -12,11 +13,18 @@ def policy_loss(alpha: Number, logprobs: Tensor, qf_values: Tensor) -> Tensor:
     return ((alpha * logprobs) - qf_values).mean()
 
 
-def critic_loss(qf_values: Tensor, next_qf_value: Tensor, num_critics: int) -> Tensor:
+def critic_loss(qf_values: Tensor, next_qf_value: Tensor, num_critics: int, weights: Optional[Tensor] = None) -> Tensor:
     # Eq. 5
-    qf_loss = sum(
-        F.mse_loss(qf_values[..., qf_value_idx].unsqueeze(-1), next_qf_value) for qf_value_idx in range(num_critics)
-    )
+    if weights is None:
+        qf_loss = sum(
+            F.mse_loss(qf_values[..., qf_value_idx].unsqueeze(-1), next_qf_value) for qf_value_idx in range(num_critics)
+        )
+    else:
+        # Importance-sampling weights of the prioritized replay buffer
+        qf_loss = sum(
+            (weights * (qf_values[..., qf_value_idx].unsqueeze(-1) - next_qf_value) ** 2).mean()
+            for qf_value_idx in range(num_critics)
+        )
     return qf_loss
 
 
@@ -20,8 +20,8 @@ from torchmetrics import SumMetric
 from sheeprl.algos.sac.agent import SACAgent, build_agent
 from sheeprl.algos.sac.loss import critic_loss, entropy_loss, policy_loss
 from sheeprl.algos.sac.utils import test
-from sheeprl.data.buffers import ReplayBuffer
-from sheeprl.utils.env import make_env
+from sheeprl.data.buffers import PrioritizedReplayBuffer, ReplayBuffer
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -41,13 +41,15 @@ def train(
     cfg: Dict[str, Any],
     policy_steps_per_update: int,
     group: Optional[CollectibleGroup] = None,
-):
+) -> Tensor:
     # Update the soft-critic
     next_target_qf_value = agent.get_next_target_q_values(
         data["next_observations"], data["rewards"], data["dones"], cfg.algo.gamma
     )
     qf_values = agent.get_q_values(data["observations"], data["actions"])
-    qf_loss = critic_loss(qf_values, next_target_qf_value, agent.num_critics)
+    qf_loss = critic_loss(qf_values, next_target_qf_value, agent.num_critics, data.get("weights", None))
+    # The TD-errors, averaged over the critics, are the new priorities of the samples
+    td_errors = (qf_values.detach() - next_target_qf_value).abs().mean(dim=-1, keepdim=True)
     qf_optimizer.zero_grad(set_to_none=True)
     fabric.backward(qf_loss)
     qf_optimizer.step()
@@ -77,6 +79,8 @@ def train(
         aggregator.update("Loss/policy_loss", actor_loss)
         aggregator.update("Loss/alpha_loss", alpha_loss)
 
+    return td_errors
+
 
 @register_algorithm()
 def main(fabric: Fabric, cfg: Dict[str, Any]):
@@ -112,8 +116,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -122,9 +126,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     action_space = envs.single_action_space
     observation_space = envs.single_observation_space
@@ -173,11 +178,14 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
 
     # Local data
     buffer_size = cfg.buffer.size // int(cfg.env.num_envs * world_size) if not cfg.dry_run else 1
-    rb = ReplayBuffer(
+    rb = (PrioritizedReplayBuffer if cfg.buffer.prioritized.enabled else ReplayBuffer)(
         buffer_size,
         cfg.env.num_envs,
         memmap=cfg.buffer.memmap,
         memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
+        alpha=cfg.buffer.prioritized.alpha,
+        beta=cfg.buffer.prioritized.beta,
+        eps=cfg.buffer.prioritized.eps,
     )
     if cfg.checkpoint.resume_from and cfg.buffer.checkpoint:
         if isinstance(state["rb"], list) and fabric.world_size == len(state["rb"]):
@@ -186,6 +194,7 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             rb = state["rb"]
         else:
             raise RuntimeError(f"Given {len(state['rb'])}, but {fabric.world_size} processes are instantiated")
+    prioritized = isinstance(rb, PrioritizedReplayBuffer)
 
     # Global variables
     last_train = 0
@@ -290,15 +299,21 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 device=device,
                 from_numpy=cfg.buffer.from_numpy,
             )  # [G*B]
-            gathered_data: Dict[str, torch.Tensor] = fabric.all_gather(sample)  # [World, G*B]
-            for k, v in gathered_data.items():
-                gathered_data[k] = v.float()  # [G*B*World]
-                if fabric.world_size > 1:
-                    gathered_data[k] = gathered_data[k].flatten(start_dim=0, end_dim=2)
-                else:
-                    gathered_data[k] = gathered_data[k].flatten(start_dim=0, end_dim=1)
+            if prioritized:
+                # Every rank trains on its own samples, so that their TD-errors
+                # update the priorities of the local buffer without any communication
+                sampled_idxes = sample.pop("idxes").flatten(start_dim=0, end_dim=1)
+                gathered_data = {k: v.float().flatten(start_dim=0, end_dim=1) for k, v in sample.items()}  # [G*B]
+            else:
+                gathered_data: Dict[str, torch.Tensor] = fabric.all_gather(sample)  # [World, G*B]
+                for k, v in gathered_data.items():
+                    gathered_data[k] = v.float()  # [G*B*World]
+                    if fabric.world_size > 1:
+                        gathered_data[k] = gathered_data[k].flatten(start_dim=0, end_dim=2)
+                    else:
+                        gathered_data[k] = gathered_data[k].flatten(start_dim=0, end_dim=1)
             idxes_to_sample = list(range(next(iter(gathered_data.values())).shape[0]))
-            if world_size > 1:
+            if world_size > 1 and not prioritized:
                 dist_sampler: DistributedSampler = DistributedSampler(
                     idxes_to_sample,
                     num_replicas=world_size,
@@ -319,7 +334,7 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             with timer("Time/train_time", SumMetric, sync_on_compute=cfg.metric.sync_on_compute):
                 for batch_idxes in sampler:
                     batch = {k: v[batch_idxes] for k, v in gathered_data.items()}
-                    train(
+                    td_errors = train(
                         fabric,
                         agent,
                         actor_optimizer,
@@ -331,6 +346,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                         cfg,
                         policy_steps_per_update,
                     )
+                    if prioritized:
+                        rb.update_priorities(sampled_idxes[batch_idxes].cpu().numpy(), td_errors.cpu().numpy())
                 train_step += world_size
 
         # Log metrics
@@ -3,7 +3,7 @@ import os
 import warnings
 from datetime import timedelta
 from math import prod
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import gymnasium as gym
 import hydra
@@ -19,8 +19,8 @@ from torchmetrics import SumMetric
 from sheeprl.algos.sac.agent import SACActor, SACAgent, SACCritic, build_agent
 from sheeprl.algos.sac.sac import train
 from sheeprl.algos.sac.utils import test
-from sheeprl.data.buffers import ReplayBuffer
-from sheeprl.utils.env import make_env
+from sheeprl.data.buffers import ReplayBuffer, SharedReplayBuffer
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -47,8 +47,8 @@ def player(
         cfg.algo.cnn_keys.encoder = []
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -57,9 +57,10 @@ def player(
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     action_space = envs.single_action_space
     observation_space = envs.single_observation_space
@@ -114,14 +115,22 @@ def player(
 
     # Local data
     buffer_size = cfg.buffer.size // cfg.env.num_envs if not cfg.dry_run else 1
-    rb = ReplayBuffer(
-        buffer_size,
-        cfg.env.num_envs,
-        memmap=cfg.buffer.memmap,
-        memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
-    )
+    if cfg.buffer.shared_memory:
+        # The trainers sample directly from the buffer of the player
+        if cfg.fabric.num_nodes > 1:
+            raise ValueError("The replay buffer can be shared only when all the processes run on the same node")
+        rb = SharedReplayBuffer(buffer_size, cfg.env.num_envs)
+    else:
+        rb = ReplayBuffer(
+            buffer_size,
+            cfg.env.num_envs,
+            memmap=cfg.buffer.memmap,
+            memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
+        )
     if cfg.checkpoint.resume_from and cfg.buffer.checkpoint:
-        if isinstance(state["rb"], ReplayBuffer):
+        if isinstance(state["rb"], ReplayBuffer) and cfg.buffer.shared_memory:
+            rb.add(state["rb"])
+        elif isinstance(state["rb"], ReplayBuffer):
             rb = state["rb"]
         else:
             raise RuntimeError(
@@ -220,31 +229,46 @@ def player(
         if update >= learning_starts:
             # Send local info to the trainers
             if not first_info_sent:
+                # Only the names of the shared memory blocks of the shared buffer are sent
                 world_collective.broadcast_object_list(
-                    [{"update": update, "last_log": last_log, "last_checkpoint": last_checkpoint}], src=0
+                    [
+                        {
+                            "update": update,
+                            "last_log": last_log,
+                            "last_checkpoint": last_checkpoint,
+                            "rb": rb if cfg.buffer.shared_memory else None,
+                        }
+                    ],
+                    src=0,
                 )
                 first_info_sent = True
 
-            # Sample data to be sent to the trainers
             training_steps = learning_starts if update == learning_starts else 1
-            sample = rb.sample_tensors(
-                batch_size=training_steps
-                * cfg.algo.per_rank_gradient_steps
-                * cfg.algo.per_rank_batch_size
-                * (fabric.world_size - 1),
-                sample_next_obs=cfg.buffer.sample_next_obs,
-                dtype=None,
-                device=device,
-                from_numpy=cfg.buffer.from_numpy,
-            )
-            # chunks = {k1: [k1_chunk_1, k1_chunk_2, ...], k2: [k2_chunk_1, k2_chunk_2, ...]}
-            chunks = {
-                k: v.float().split(training_steps * cfg.algo.per_rank_gradient_steps * cfg.algo.per_rank_batch_size)
-                for k, v in sample.items()
-            }
-            # chunks = [{k1: k1_chunk_1, k2: k2_chunk_1}, {k1: k1_chunk_2, k2: k2_chunk_2}, ...]
-            chunks = [{k: v[i] for k, v in chunks.items()} for i in range(len(chunks[next(iter(chunks.keys()))]))]
-            world_collective.scatter_object_list([None], [None] + chunks, src=0)
+            if cfg.buffer.shared_memory:
+                # The trainers sample their data from the shared buffer: only the number of training steps is sent
+                world_collective.scatter_object_list(
+                    [None], [None] + [training_steps] * (world_collective.world_size - 1), src=0
+                )
+            else:
+                # Sample data to be sent to the trainers
+                sample = rb.sample_tensors(
+                    batch_size=training_steps
+                    * cfg.algo.per_rank_gradient_steps
+                    * cfg.algo.per_rank_batch_size
+                    * (fabric.world_size - 1),
+                    sample_next_obs=cfg.buffer.sample_next_obs,
+                    dtype=None,
+                    device=device,
+                    from_numpy=cfg.buffer.from_numpy,
+                )
+                # chunks = {k1: [k1_chunk_1, k1_chunk_2, ...], k2: [k2_chunk_1, k2_chunk_2, ...]}
+                chunks = {
+                    k: v.float().split(training_steps * cfg.algo.per_rank_gradient_steps * cfg.algo.per_rank_batch_size)
+                    for k, v in sample.items()
+                }
+                # chunks = [{k1: k1_chunk_1, k2: k2_chunk_1}, {k1: k1_chunk_2, k2: k2_chunk_2}, ...]
+                chunks = [{k: v[i] for k, v in chunks.items()} for i in range(len(chunks[next(iter(chunks.keys()))]))]
+                world_collective.scatter_object_list([None], [None] + chunks, src=0)
 
             # Wait the trainers to finish
             player_trainer_collective.broadcast(flattened_parameters, src=1)
@@ -288,12 +312,14 @@ def player(
         ):
             last_checkpoint = policy_step
             ckpt_path = log_dir + f"/checkpoint/ckpt_{policy_step}_{fabric.global_rank}.ckpt"
+            # The shared buffer would pickle only the names of its shared memory blocks
+            rb_to_save = rb.to_replay_buffer() if cfg.buffer.shared_memory and cfg.buffer.checkpoint else rb
             fabric.call(
                 "on_checkpoint_player",
                 fabric=fabric,
                 player_trainer_collective=player_trainer_collective,
                 ckpt_path=ckpt_path,
-                replay_buffer=rb if cfg.buffer.checkpoint else None,
+                replay_buffer=rb_to_save if cfg.buffer.checkpoint else None,
             )
 
     world_collective.scatter_object_list([None], [None] + [-1] * (world_collective.world_size - 1), src=0)
@@ -301,15 +327,18 @@ def player(
     # Last Checkpoint
     if cfg.checkpoint.save_last:
         ckpt_path = log_dir + f"/checkpoint/ckpt_{policy_step}_{fabric.global_rank}.ckpt"
+        rb_to_save = rb.to_replay_buffer() if cfg.buffer.shared_memory and cfg.buffer.checkpoint else rb
         fabric.call(
             "on_checkpoint_player",
             fabric=fabric,
             player_trainer_collective=player_trainer_collective,
             ckpt_path=ckpt_path,
-            replay_buffer=rb if cfg.buffer.checkpoint else None,
+            replay_buffer=rb_to_save if cfg.buffer.checkpoint else None,
         )
 
     envs.close()
+    if cfg.buffer.shared_memory:
+        rb.close()
     if fabric.is_global_zero and cfg.algo.run_test:
         test(actor, fabric, cfg, log_dir)
 
@@ -363,8 +392,7 @@ def trainer(
     cfg: Dict[str, Any] = data[0]
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env([make_env(cfg, 0, 0, None)])
+    envs = make_vector_env(cfg, [make_env(cfg, 0, 0, None, batched_preprocessing=cfg.env.batched_preprocessing)])
     assert isinstance(envs.single_action_space, gym.spaces.Box), "only continuous action space is supported"
 
     # Define the agent and the optimizer and setup them with Fabric
@@ -410,6 +438,8 @@ def trainer(
     update = data[0]["update"]
     last_log = data[0]["last_log"]
     last_checkpoint = data[0]["last_checkpoint"]
+    # The buffer shared by the player, if any
+    rb: Optional[SharedReplayBuffer] = data[0]["rb"]
 
     # Start training
     train_step = 0
@@ -446,7 +476,19 @@ def trainer(
                 player_trainer_collective.broadcast(
                     torch.nn.utils.convert_parameters.parameters_to_vector(agent.parameters()), src=1
                 )
+            if rb is not None:
+                rb.close()
             return
+        if rb is not None:
+            # Only the number of training steps has been sent: sample the data from the shared buffer
+            sample = rb.sample_tensors(
+                batch_size=data * cfg.algo.per_rank_gradient_steps * cfg.algo.per_rank_batch_size,
+                sample_next_obs=cfg.buffer.sample_next_obs,
+                dtype=None,
+                device=device,
+                from_numpy=cfg.buffer.from_numpy,
+            )
+            data = {k: v.float() for k, v in sample.items()}
         sampler = BatchSampler(
             range(len(data[next(iter(data.keys()))])), batch_size=cfg.algo.per_rank_batch_size, drop_last=False
         )
@@ -25,7 +25,7 @@ from sheeprl.algos.sac_ae.agent import SACAEAgent, build_agent
 from sheeprl.algos.sac_ae.utils import preprocess_obs, test
 from sheeprl.data.buffers import ReplayBuffer
 from sheeprl.models.models import MultiDecoder, MultiEncoder
-from sheeprl.utils.env import make_env
+from sheeprl.utils.env import make_env, make_vector_env
 from sheeprl.utils.logger import get_log_dir, get_logger
 from sheeprl.utils.metric import MetricAggregator
 from sheeprl.utils.registry import register_algorithm
@@ -154,8 +154,8 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
     fabric.print(f"Log dir: {log_dir}")
 
     # Environment setup
-    vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
-    envs = vectorized_env(
+    envs = make_vector_env(
+        cfg,
         [
             make_env(
                 cfg,
@@ -164,9 +164,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 log_dir if rank == 0 else None,
                 "train",
                 vector_env_idx=i,
+                batched_preprocessing=cfg.env.batched_preprocessing,
             )
             for i in range(cfg.env.num_envs)
-        ]
+        ],
     )
     observation_space = envs.single_observation_space
 
@@ -244,6 +245,11 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
 
     # Local data
     buffer_size = cfg.buffer.size // int(cfg.env.num_envs * fabric.world_size) if not cfg.dry_run else 1
+    frame_stack_keys = []
+    if cfg.buffer.dedup_frame_stack and cfg.env.frame_stack > 1:
+        # Only the last frame of every stack is stored: the buffer must hold all the frames spanned by a stack
+        frame_stack_keys = cfg.algo.cnn_keys.encoder
+        buffer_size = max(buffer_size, (cfg.env.frame_stack - 1) * cfg.env.frame_stack_dilation + 1)
     rb = ReplayBuffer(
         buffer_size,
         cfg.env.num_envs,
@@ -251,6 +257,9 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
         memmap=cfg.buffer.memmap,
         memmap_dir=os.path.join(log_dir, "memmap_buffer", f"rank_{fabric.global_rank}"),
         obs_keys=cfg.algo.cnn_keys.encoder + cfg.algo.mlp_keys.encoder,
+        frame_stack=cfg.env.frame_stack if frame_stack_keys else 1,
+        frame_stack_dilation=cfg.env.frame_stack_dilation,
+        frame_stack_keys=frame_stack_keys,
     )
     if cfg.checkpoint.resume_from and cfg.buffer.checkpoint:
         if isinstance(state["rb"], list) and fabric.world_size == len(state["rb"]):
@@ -345,6 +354,9 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
             if k in cfg.algo.cnn_keys.encoder:
                 next_obs[k] = next_obs[k].reshape(cfg.env.num_envs, -1, *next_obs[k].shape[-2:])
             step_data[k] = obs[k][np.newaxis]
+            if k in frame_stack_keys:
+                # The buffer keeps the frames of the stack separated, so that it can store only the last one
+                step_data[k] = step_data[k].reshape(1, cfg.env.num_envs, cfg.env.frame_stack, -1, *obs[k].shape[-2:])
 
             if not cfg.buffer.sample_next_obs:
                 step_data[f"next_{k}"] = real_next_obs[k][np.newaxis]
@@ -371,6 +383,10 @@ def main(fabric: Fabric, cfg: Dict[str, Any]):
                 sample_next_obs=cfg.buffer.sample_next_obs,
                 from_numpy=cfg.buffer.from_numpy,
             )  # [G*B, 1]
+            for k in frame_stack_keys:
+                sample[k] = sample[k].flatten(-4, -3)
+                if cfg.buffer.sample_next_obs:
+                    sample[f"next_{k}"] = sample[f"next_{k}"].flatten(-4, -3)
             gathered_data = fabric.all_gather(sample)  # [G*B, World, 1]
             flatten_dim = 3 if fabric.world_size > 1 else 2
             gathered_data = {k: v.view(-1, *v.shape[flatten_dim:]) for k, v in gathered_data.items()}  # [G*B*World]
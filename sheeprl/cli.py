@@ -1,11 +1,13 @@
 import importlib
+import json
 import os
 import pathlib
 import warnings
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import hydra
+import numpy as np
 from lightning import Fabric
 from lightning.fabric.strategies import STRATEGY_REGISTRY, DDPStrategy, SingleDeviceStrategy, Strategy
 from omegaconf import DictConfig, OmegaConf, open_dict
@@ -186,12 +188,14 @@ def eval_algorithm(cfg: DictConfig):
     # the entrypoint will be launched by Fabric with `fabric.launch(entrypoint)`
     module = None
     entrypoint = None
+    batched = False
     algo_name = cfg.algo.name
     for _module, _algos in evaluation_registry.items():
         for _algo in _algos:
             if algo_name == _algo["name"]:
                 module = _module
                 entrypoint = _algo["entrypoint"]
+                batched = _algo.get("batched", False)
                 break
     if module is None:
         raise RuntimeError(f"Given the algorithm named `{algo_name}`, no module has been found to be imported.")
@@ -200,9 +204,45 @@ def eval_algorithm(cfg: DictConfig):
             f"Given the module and algorithm named `{module}` and `{algo_name}` respectively, "
             "no entrypoint has been found to be imported."
         )
+    if not batched and (cfg.num_evals > 1 or cfg.env.num_envs > 1):
+        raise ValueError(
+            f"The evaluation of the algorithm `{algo_name}` runs a single episode in a single environment: "
+            "set 'num_evals=1' and 'env.num_envs=1'"
+        )
     task = importlib.import_module(f"{module}.evaluate")
     command = task.__dict__[entrypoint]
-    fabric.launch(command, cfg, state)
+    results = fabric.launch(command, cfg, state)
+    if batched and cfg.results_path is not None:
+        save_evaluation_results(cfg, results)
+
+
+def save_evaluation_results(cfg: Dict[str, Any], results: List[Dict[str, Any]]):
+    """Save the results of the evaluation episodes, together with their statistics, in the JSON file
+    'cfg.results_path'.
+
+    Args:
+        cfg (Dict[str, Any]): the loaded configuration.
+        results (List[Dict[str, Any]]): the results of the episodes, as returned by the evaluation entrypoint.
+    """
+    rewards = np.array([r["cumulative_reward"] for r in results], dtype=np.float64)
+    summary = {
+        "checkpoint_path": str(cfg.checkpoint_path),
+        "algo": cfg.algo.name,
+        "env": cfg.env.id,
+        "seed": cfg.seed,
+        "num_evals": len(results),
+        "cumulative_reward": {
+            "mean": float(rewards.mean()),
+            "std": float(rewards.std()),
+            "min": float(rewards.min()),
+            "max": float(rewards.max()),
+        },
+        "episodes": results,
+    }
+    results_path = Path(cfg.results_path)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w") as f:
+        json.dump(summary, f, indent=2)
 
 
 def check_configs(cfg: Dict[str, Any]):
@@ -275,6 +315,11 @@ def check_configs(cfg: Dict[str, Any]):
 def check_configs_evaluation(cfg: DictConfig):
     if cfg.checkpoint_path is None:
         raise ValueError("You must specify the evaluation checkpoint path")
+    if cfg.num_evals <= 0 or cfg.env.num_envs <= 0:
+        raise ValueError(
+            "The number of evaluation episodes ('num_evals') and of environments ('env.num_envs') "
+            f"must be greater than zero, got {cfg.num_evals} and {cfg.env.num_envs}"
+        )
 
 
 @hydra.main(version_base="1.3", config_path="configs", config_name="config")
@@ -297,7 +342,8 @@ def evaluation(cfg: DictConfig):
     # Merge the two configs
     with open_dict(cfg):
         capture_video = getattr(cfg.env, "capture_video", True)
-        cfg.env = {"capture_video": capture_video, "num_envs": 1}
+        num_envs = getattr(cfg.env, "num_envs", 1)
+        cfg.env = {"capture_video": capture_video, "num_envs": num_envs}
         cfg.exp = {}
         cfg.algo = {}
         cfg.fabric = {
@@ -1,4 +1,10 @@
 from sheeprl.data.buffers import EnvIndependentReplayBuffer as EnvIndependentReplayBuffer
 from sheeprl.data.buffers import EpisodeBuffer as EpisodeBuffer
+from sheeprl.data.buffers import PrioritizedReplayBuffer as PrioritizedReplayBuffer
+from sheeprl.data.buffers import PrioritizedSequentialReplayBuffer as PrioritizedSequentialReplayBuffer
 from sheeprl.data.buffers import ReplayBuffer as ReplayBuffer
+from sheeprl.data.buffers import ReplayPrefetcher as ReplayPrefetcher
+from sheeprl.data.buffers import SampleArena as SampleArena
 from sheeprl.data.buffers import SequentialReplayBuffer as SequentialReplayBuffer
+from sheeprl.data.buffers import SharedReplayBuffer as SharedReplayBuffer
+from sheeprl.data.snapshot import BufferSnapshot as BufferSnapshot
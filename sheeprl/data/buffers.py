@@ -1,24 +1,103 @@
 from __future__ import annotations
 
-import logging
 import os
-import shutil
+import sys
+import threading
 import typing
 import uuid
-from itertools import compress
+from multiprocessing.shared_memory import SharedMemory
 from pathlib import Path
-from typing import Dict, Optional, Sequence, Type
+from queue import Full, Queue
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple, Type
 
 import numpy as np
 import torch
 from torch import Tensor
 
+from sheeprl.utils.compression import CompressedArray
 from sheeprl.utils.memmap import MemmapArray
+from sheeprl.utils.segment_tree import MinSegmentTree, SumSegmentTree
 from sheeprl.utils.utils import NUMPY_TO_TORCH_DTYPE_DICT
 
 
+class SampleArena:
+    def __init__(self, num_slabs: int = 2, pin_memory: bool = False):
+        """A ring of reusable memory slabs where a buffer writes its samples, so that
+        no new array is allocated at every call of the 'sample' method. Every slab is made of
+        one growable block of memory per sampled key.
+
+        Every call of the 'sample' method of the buffer owning the arena moves to the next slab of the ring:
+        the arrays returned by a call remain valid until the following 'num_slabs - 1' calls,
+        after which they are overwritten. Sample with 'clone=True' to get arrays that are never overwritten.
+
+        Args:
+            num_slabs (int, optional): the number of slabs in the ring. Defaults to 2.
+            pin_memory (bool, optional): whether to allocate the slabs in page-locked memory, so that
+                they can be copied to a CUDA device asynchronously. It has effect only if CUDA is available.
+                Defaults to False.
+        """
+        if num_slabs <= 0:
+            raise ValueError(f"The number of slabs must be greater than zero, got: {num_slabs}")
+        self._num_slabs = num_slabs
+        self._pin_memory = pin_memory
+        self._slabs: Sequence[Dict[str, np.ndarray]] = [{} for _ in range(num_slabs)]
+        self._current = 0
+
+    @property
+    def num_slabs(self) -> int:
+        return self._num_slabs
+
+    @property
+    def pin_memory(self) -> bool:
+        return self._pin_memory
+
+    def advance(self) -> None:
+        """Move to the next slab of the ring. It must be called once at the beginning of every 'sample' call."""
+        self._current = (self._current + 1) % self._num_slabs
+
+    def empty(self, key: str, shape: Sequence[int], dtype: np.dtype) -> np.ndarray:
+        """Return an uninitialized array from the memory reserved to 'key' in the current slab.
+        The memory is grown (and never shrunk) when the requested array does not fit into it.
+
+        Args:
+            key (str): the key of the sampled array.
+            shape (Sequence[int]): the shape of the array.
+            dtype (np.dtype): the dtype of the array.
+
+        Returns:
+            np.ndarray: a contiguous array of shape 'shape' and dtype 'dtype'.
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        slab = self._slabs[self._current]
+        memory = slab.get(key, None)
+        if memory is None or memory.nbytes < nbytes:
+            if self._pin_memory and torch.cuda.is_available():
+                memory = torch.empty((nbytes,), dtype=torch.uint8, pin_memory=True).numpy()
+            else:
+                memory = np.empty((nbytes,), dtype=np.uint8)
+            slab[key] = memory
+        return memory[:nbytes].view(dtype).reshape(shape)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The slabs are only a cache: do not save them
+        state = self.__dict__.copy()
+        state["_slabs"] = [{} for _ in range(self._num_slabs)]
+        return state
+
+
+def _empty(arena: SampleArena | None, key: str, shape: Sequence[int], dtype: np.dtype) -> np.ndarray:
+    if arena is None:
+        return np.empty(shape, dtype=dtype)
+    return arena.empty(key, shape, dtype)
+
+
 class ReplayBuffer:
     batch_axis: int = 1
+    _arena: SampleArena | None = None
+    _frame_stack_keys: Tuple[str, ...] = ()
+    # The number of elements added since the creation of the buffer
+    _n_added: int = 0
 
     def __init__(
         self,
@@ -28,6 +107,11 @@ class ReplayBuffer:
         memmap: bool = False,
         memmap_dir: str | os.PathLike | None = None,
         memmap_mode: str = "r+",
+        compression: Dict[str, str] | None = None,
+        compression_threads: int | None = None,
+        frame_stack: int = 1,
+        frame_stack_dilation: int = 1,
+        frame_stack_keys: Sequence[str] = (),
         **kwargs,
     ):
         """A standard replay buffer implementation. Internally this is represented by a
@@ -45,19 +129,60 @@ class ReplayBuffer:
             memmap_mode (str, optional): memory-map mode.
                 Possible values are: "r+", "w+", "c", "copyonwrite", "readwrite", "write".
                 Defaults to "r+".
+            compression (Dict[str, str], optional): the compression codec of the keys to store compressed,
+                e.g. {"rgb": "zlib"}. The elements of those keys are compressed one by one in RAM,
+                even if the buffer is memory-mapped, and they are decompressed when sampled.
+                See 'sheeprl.utils.compression.CompressedArray' for the available codecs.
+                Defaults to None.
+            compression_threads (int, optional): the number of threads used to (de)compress the elements.
+                If None, then the number of CPUs is used.
+                Defaults to None.
+            frame_stack (int, optional): the number of frames stacked by the 'FrameStack' wrapper
+                in the 'frame_stack_keys' observations. If greater than one, then only the last frame
+                of every stack is stored and the stacks are rebuilt when sampled, from the frames of the
+                previous steps of the same episode: the episodes start where 'is_first' is True or,
+                if the 'is_first' key is not added to the buffer, right after the steps where 'dones' is True.
+                The added stacks must have shape [sequence_length, n_envs, frame_stack, ...], as the sampled ones,
+                while indexing the buffer returns the stored frames.
+                Defaults to 1.
+            frame_stack_dilation (int, optional): the dilation of the 'FrameStack' wrapper,
+                i.e. the number of steps between two consecutive frames of a stack. Defaults to 1.
+            frame_stack_keys (Sequence[str], optional): the keys of the stacked observations. Defaults to ().
             kwargs: additional keyword arguments.
         """
         if buffer_size <= 0:
             raise ValueError(f"The buffer size must be greater than zero, got: {buffer_size}")
         if n_envs <= 0:
             raise ValueError(f"The number of environments must be greater than zero, got: {n_envs}")
+        if frame_stack <= 0 or frame_stack_dilation <= 0:
+            raise ValueError(
+                f"'frame_stack' ({frame_stack}) and 'frame_stack_dilation' ({frame_stack_dilation}) "
+                "must be both greater than zero"
+            )
+        if (frame_stack - 1) * frame_stack_dilation >= buffer_size:
+            raise ValueError(
+                f"The buffer size ({buffer_size}) must be greater than the number of steps spanned "
+                f"by a stack of frames ({(frame_stack - 1) * frame_stack_dilation})"
+            )
         self._buffer_size = buffer_size
         self._n_envs = n_envs
         self._obs_keys = obs_keys
         self._memmap = memmap
         self._memmap_dir = memmap_dir
         self._memmap_mode = memmap_mode
-        self._buf: Dict[str, np.ndarray | MemmapArray] = {}
+        self._compression = dict(compression or {})
+        self._compression_threads = compression_threads
+        self._frame_stack = frame_stack
+        self._frame_stack_keys = tuple(frame_stack_keys) if frame_stack > 1 else ()
+        # How many steps back the frames of a stack are, from the oldest to the newest one
+        self._frame_stack_offsets = np.arange(frame_stack - 1, -1, -1, dtype=np.intp) * frame_stack_dilation
+        # The number of steps since the beginning of the episode of every stored element,
+        # clipped to the number of steps spanned by a stack: the frames of a stack preceding
+        # the beginning of the episode are replaced by its first frame, as the 'FrameStack' wrapper does
+        self._episode_steps: np.ndarray | None = None
+        self._last_episode_steps = np.full((n_envs,), -1, dtype=np.intp)
+        self._last_dones = np.zeros((n_envs,), dtype=bool)
+        self._buf: Dict[str, np.ndarray | MemmapArray | CompressedArray] = {}
         if self._memmap:
             if self._memmap_mode not in ("r+", "w+", "c", "copyonwrite", "readwrite", "write"):
                 raise ValueError(
@@ -102,6 +227,15 @@ class ReplayBuffer:
     def is_memmap(self) -> bool:
         return self._memmap
 
+    @property
+    def arena(self) -> SampleArena | None:
+        """The arena where the samples are written. If None, then new arrays are allocated at every sample."""
+        return self._arena
+
+    @arena.setter
+    def arena(self, arena: SampleArena | None) -> None:
+        self._arena = arena
+
     def __len__(self) -> int:
         return self.buffer_size
 
@@ -190,35 +324,121 @@ class ReplayBuffer:
                         )
                     last_key = current_key
                     last_batch_shape = current_batch_shape
+        episode_steps = None
+        if len(self._frame_stack_keys) > 0:
+            data, episode_steps = self._unstack_frames(data)
         data_len = next(iter(data.values())).shape[0]
         next_pos = (self._pos + data_len) % self._buffer_size
-        if next_pos <= self._pos or (data_len > self._buffer_size and not self._full):
-            idxes = np.array(list(range(self._pos, self._buffer_size)) + list(range(0, next_pos)))
-        else:
-            idxes = np.array(range(self._pos, next_pos))
-        if data_len > self._buffer_size:
-            data_to_store = {k: v[-self._buffer_size - next_pos :] for k, v in data.items()}
+        if data_len >= self._buffer_size:
+            # Only the last 'buffer_size' elements survive: they are written
+            # starting from 'next_pos', which is where the oldest of them would land
+            data_to_store = {k: v[-self._buffer_size :] for k, v in data.items()}
+            start, n_items = next_pos, self._buffer_size
         else:
             data_to_store = data
-        if self._memmap and self.empty:
-            for k, v in data_to_store.items():
-                self.buffer[k] = MemmapArray(
-                    filename=Path(self._memmap_dir / f"{k}.memmap"),
-                    dtype=v.dtype,
-                    shape=(self._buffer_size, self._n_envs, *v.shape[2:]),
-                    mode=self._memmap_mode,
-                )
-                self.buffer[k][idxes] = data_to_store[k]
-        elif self.empty:
-            for k, v in data_to_store.items():
-                self.buffer[k] = np.empty(shape=(self._buffer_size, self._n_envs, *v.shape[2:]), dtype=v.dtype)
-                self.buffer[k][idxes] = data_to_store[k]
-        else:
+            start, n_items = self._pos, data_len
+        if episode_steps is not None:
+            if self._episode_steps is None:
+                self._episode_steps = np.zeros((self._buffer_size, self._n_envs), dtype=np.intp)
+            data_to_store = {**data_to_store, "_episode_steps": episode_steps[-n_items:]}
+        if self.empty:
             for k, v in data_to_store.items():
-                self.buffer[k][idxes] = data_to_store[k]
+                if k == "_episode_steps":
+                    continue
+                if k in self._compression:
+                    self.buffer[k] = CompressedArray(
+                        shape=(self._buffer_size, self._n_envs, *v.shape[2:]),
+                        dtype=v.dtype,
+                        batch_dims=2,
+                        codec=self._compression[k],
+                        num_threads=self._compression_threads,
+                    )
+                elif self._memmap:
+                    self.buffer[k] = MemmapArray(
+                        filename=Path(self._memmap_dir / f"{k}.memmap"),
+                        dtype=v.dtype,
+                        shape=(self._buffer_size, self._n_envs, *v.shape[2:]),
+                        mode=self._memmap_mode,
+                    )
+                else:
+                    self.buffer[k] = np.empty(shape=(self._buffer_size, self._n_envs, *v.shape[2:]), dtype=v.dtype)
+        # Write with at most two contiguous slices, so that no index array is ever built
+        first_chunk = min(n_items, self._buffer_size - start)
+        for k, v in data_to_store.items():
+            array = self._episode_steps if k == "_episode_steps" else self.buffer[k]
+            array[start : start + first_chunk] = v[:first_chunk]
+            if first_chunk < n_items:
+                array[: n_items - first_chunk] = v[first_chunk:]
         if self._pos + data_len >= self._buffer_size:
             self._full = True
         self._pos = next_pos
+        self._n_added += data_len
+
+    def _unstack_frames(self, data: Dict[str, np.ndarray]) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """Keep only the last frame of the stacked observations and compute the number of steps
+        since the beginning of the episode of every added element.
+
+        Args:
+            data (Dict[str, np.ndarray]): the data to add to the buffer.
+
+        Returns:
+            Tuple[Dict[str, np.ndarray], np.ndarray]: the data to store and the episode steps,
+            with shape [sequence_length, n_envs].
+        """
+        data_len = next(iter(data.values())).shape[0]
+        if "is_first" in data:
+            is_first = np.reshape(data["is_first"], (data_len, self._n_envs)) != 0
+        elif "dones" in data:
+            dones = np.reshape(data["dones"], (data_len, self._n_envs)) != 0
+            is_first = np.concatenate([self._last_dones[np.newaxis], dones[:-1]], axis=0)
+            self._last_dones = dones[-1]
+        else:
+            raise RuntimeError(
+                "The 'is_first' or the 'dones' key must be added to the buffer to find the beginning of the episodes, "
+                f"got: {list(data.keys())}"
+            )
+        max_steps = self._frame_stack_offsets[0]
+        episode_steps = np.empty((data_len, self._n_envs), dtype=np.intp)
+        last_episode_steps = self._last_episode_steps
+        for i in range(data_len):
+            last_episode_steps = np.where(is_first[i], 0, np.minimum(last_episode_steps + 1, max_steps))
+            episode_steps[i] = last_episode_steps
+        self._last_episode_steps = last_episode_steps
+        data = dict(data)
+        for k in self._frame_stack_keys:
+            if k not in data:
+                continue
+            if data[k].ndim < 3 or data[k].shape[2] != self._frame_stack:
+                raise RuntimeError(
+                    f"The stacked observations must have shape [sequence_length, n_envs, {self._frame_stack}, ...], "
+                    f"got: {data[k].shape} for the '{k}' key"
+                )
+            data[k] = data[k][:, :, -1]
+        return data, episode_steps
+
+    def _gather_frame_stacks(
+        self,
+        array: np.ndarray | MemmapArray | CompressedArray,
+        flattened_idxes: np.ndarray,
+        out: np.ndarray,
+    ) -> np.ndarray:
+        """Rebuild the stacks of frames ending at the 'flattened_idxes' elements.
+
+        Args:
+            array (np.ndarray | MemmapArray | CompressedArray): the stored frames.
+            flattened_idxes (np.ndarray): the indexes of the last frames of the stacks in the flattened buffer.
+            out (np.ndarray): the contiguous array, with shape [len(flattened_idxes), frame_stack, ...],
+                where to write the stacks.
+
+        Returns:
+            np.ndarray: the stacks of frames.
+        """
+        episode_steps = self._episode_steps.reshape(-1)[flattened_idxes]
+        offsets = np.minimum(self._frame_stack_offsets, episode_steps[:, np.newaxis]) * self._n_envs
+        stack_idxes = np.ravel((flattened_idxes[:, np.newaxis] - offsets) % (self._buffer_size * self._n_envs))
+        order = _sorting_permutation(stack_idxes) if self._memmap else None
+        _gather(array, stack_idxes, order, out=np.reshape(out, (-1, *array.shape[2:])))
+        return out
 
     def sample(
         self, batch_size: int, sample_next_obs: bool = False, clone: bool = False, n_samples: int = 1, **kwargs
@@ -245,44 +465,134 @@ class ReplayBuffer:
             raise ValueError(
                 "No sample has been added to the buffer. Please add at least one sample calling 'self.add()'"
             )
-        if self._full:
-            first_range_end = self._pos - 1 if sample_next_obs else self._pos
-            second_range_end = self.buffer_size if first_range_end >= 0 else self.buffer_size + first_range_end
-            valid_idxes = np.array(
-                list(range(0, first_range_end)) + list(range(self._pos, second_range_end)), dtype=np.intp
+        n_valid, offset = self._valid_range(sample_next_obs=sample_next_obs)
+        if not self._full and n_valid == 0:
+            raise RuntimeError(
+                "You want to sample the next observations, but one sample has been added to the buffer. "
+                "Make sure that at least two samples are added."
             )
-            batch_idxes = valid_idxes[
-                self._rng.integers(0, len(valid_idxes), size=(batch_size * n_samples,), dtype=np.intp)
-            ]
-        else:
-            max_pos_to_sample = self._pos - 1 if sample_next_obs else self._pos
-            if max_pos_to_sample == 0:
-                raise RuntimeError(
-                    "You want to sample the next observations, but one sample has been added to the buffer. "
-                    "Make sure that at least two samples are added."
-                )
-            batch_idxes = self._rng.integers(0, max_pos_to_sample, size=(batch_size * n_samples,), dtype=np.intp)
-        return {
+        if self._arena is not None:
+            self._arena.advance()
+        idxes, weights = self._draw_idxes(batch_size * n_samples, n_valid, offset)
+        batch_idxes, env_idxes = np.divmod(idxes, self._n_envs)
+        samples = {
             k: v.reshape(n_samples, batch_size, *v.shape[1:])
-            for k, v in self._get_samples(batch_idxes=batch_idxes, sample_next_obs=sample_next_obs, clone=clone).items()
+            for k, v in self._get_samples(
+                batch_idxes=batch_idxes, sample_next_obs=sample_next_obs, clone=clone, env_idxes=env_idxes
+            ).items()
         }
+        return self._add_sampling_weights(samples, idxes, weights, batch_size, n_samples)
+
+    def _valid_range(self, sample_next_obs: bool = False, **kwargs) -> Tuple[int, int]:
+        """The time indexes that can be sampled right now, i.e. the 'n_valid' consecutive (modulo 'buffer_size')
+        positions starting from 'offset'. See 'ReplayBuffer.sample' for the arguments.
+
+        Returns:
+            Tuple[int, int]: the number of valid time indexes and the first valid time index.
+        """
+        if self._full:
+            # The valid indexes are the 'n_valid' consecutive (modulo 'buffer_size') positions
+            # starting from 'self._pos', i.e. from the oldest element in the buffer.
+            # When 'sample_next_obs' is True, the last inserted element is excluded
+            n_valid = self.buffer_size - 1 if sample_next_obs else self.buffer_size
+            offset = self._pos
+            if len(self._frame_stack_keys) > 0:
+                # The stacks of the oldest elements could need frames that have already been overwritten
+                n_valid -= self._frame_stack_offsets[0]
+                offset = (offset + self._frame_stack_offsets[0]) % self._buffer_size
+        else:
+            n_valid = self._pos - 1 if sample_next_obs else self._pos
+            offset = 0
+        return max(n_valid, 0), offset
+
+    def _draw_idxes(self, n: int, n_valid: int, offset: int) -> Tuple[np.ndarray, np.ndarray | None]:
+        """Draw uniformly 'n' indexes of the buffer flattened on its first two dimensions
+        ([buffer_size * n_envs]), where the time indexes are taken from the 'n_valid' consecutive
+        (modulo 'buffer_size') positions starting from 'offset'.
+        Both the time and the environment indexes are drawn with a single call to the random number generator.
+
+        Args:
+            n (int): the number of indexes to draw.
+            n_valid (int): the number of valid time indexes.
+            offset (int): the first valid time index.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray | None]: the flattened indexes, of shape [n], and their
+            importance-sampling weights, which are None since the indexes are drawn uniformly.
+        """
+        idxes = self._rng.integers(0, n_valid * self._n_envs, size=(n,), dtype=np.intp)
+        if offset > 0:
+            idxes += offset * self._n_envs
+            idxes %= self._buffer_size * self._n_envs
+        return idxes, None
+
+    def _add_sampling_weights(
+        self,
+        samples: Dict[str, np.ndarray],
+        idxes: np.ndarray,
+        weights: np.ndarray | None,
+        batch_size: int,
+        n_samples: int,
+    ) -> Dict[str, np.ndarray]:
+        """Add the 'idxes' and the 'weights' keys to the samples, if the indexes have been drawn
+        with importance-sampling weights (see 'PrioritizedReplayBuffer').
+
+        Args:
+            samples (Dict[str, np.ndarray]): the samples.
+            idxes (np.ndarray): the flattened indexes of the samples, as returned by '_draw_idxes'.
+            weights (np.ndarray, optional): the importance-sampling weights of the samples,
+                as returned by '_draw_idxes'.
+            batch_size (int): the batch size.
+            n_samples (int): the number of samples.
+
+        Returns:
+            Dict[str, np.ndarray]: the samples, where the 'idxes' and 'weights' keys have a shape of
+            [n_samples, batch_size, 1] ([n_samples, 1, batch_size, 1] for sequential buffers).
+        """
+        if weights is None:
+            return samples
+        shape = (n_samples, *([1] * (self.batch_axis - 1)), batch_size, 1)
+        samples["idxes"] = idxes.reshape(shape)
+        samples["weights"] = weights.reshape(shape).astype(np.float32)
+        return samples
 
     def _get_samples(
-        self, batch_idxes: np.ndarray, sample_next_obs: bool = False, clone: bool = False
+        self,
+        batch_idxes: np.ndarray,
+        sample_next_obs: bool = False,
+        clone: bool = False,
+        env_idxes: np.ndarray | None = None,
     ) -> Dict[str, np.ndarray]:
         if self.empty:
             raise RuntimeError("The buffer has not been initialized. Try to add some data first.")
-        samples: Dict[str, np.ndarray] = {}
-        env_idxes = self._rng.integers(0, self.n_envs, size=(len(batch_idxes),), dtype=np.intp)
-        flattened_idxes = (batch_idxes * self.n_envs + env_idxes).flat
+        if env_idxes is None:
+            env_idxes = self._rng.integers(0, self.n_envs, size=(len(batch_idxes),), dtype=np.intp)
+        flattened_idxes = np.ravel(batch_idxes * self.n_envs + env_idxes).astype(np.intp, copy=False)
+        flattened_next_idxes = None
         if sample_next_obs:
-            flattened_next_idxes = (((batch_idxes + 1) % self._buffer_size) * self.n_envs + env_idxes).flat
+            # The next element of the same environment is 'n_envs' positions ahead in the flattened buffer
+            flattened_next_idxes = (flattened_idxes + self.n_envs) % (self._buffer_size * self.n_envs)
+        # Memory-mapped arrays are read in sorted order, so that random page faults
+        # become (almost) sequential reads: the permutation is computed once for all the keys
+        order = _sorting_permutation(flattened_idxes) if self._memmap else None
+        samples: Dict[str, np.ndarray] = {}
         for k, v in self.buffer.items():
-            samples[k] = np.take(np.reshape(v, (-1, *v.shape[2:])), flattened_idxes, axis=0)
+            if k in self._frame_stack_keys:
+                output_shape = (len(flattened_idxes), self._frame_stack, *v.shape[2:])
+                samples[k] = self._gather_frame_stacks(
+                    v, flattened_idxes, out=_empty(self._arena, k, output_shape, v.dtype)
+                )
+            else:
+                output_shape = (len(flattened_idxes), *v.shape[2:])
+                samples[k] = _gather(v, flattened_idxes, order, out=_empty(self._arena, k, output_shape, v.dtype))
             if clone:
                 samples[k] = samples[k].copy()
             if k in self._obs_keys and sample_next_obs:
-                samples[f"next_{k}"] = np.take(np.reshape(v, (-1, *v.shape[2:])), flattened_next_idxes, axis=0)
+                next_out = _empty(self._arena, f"next_{k}", output_shape, v.dtype)
+                if k in self._frame_stack_keys:
+                    samples[f"next_{k}"] = self._gather_frame_stacks(v, flattened_next_idxes, out=next_out)
+                else:
+                    samples[f"next_{k}"] = _gather(v, flattened_next_idxes, order, out=next_out)
                 if clone:
                     samples[f"next_{k}"] = samples[f"next_{k}"].copy()
         return samples
@@ -310,7 +620,9 @@ class ReplayBuffer:
             device (str | torch.dtype, optional): the torch device to move the tensors to. Defaults to "cpu".
             from_numpy (bool, optional): whether to convert the numpy arrays to torch tensors
                 with the 'torch.from_numpy' function. If False, then the numpy arrays are converted
-                with the 'torch.as_tensor' function. Defaults to False.
+                with the 'torch.as_tensor' function. If the buffer has an arena, then the arrays are always
+                converted with 'torch.from_numpy', so that the tensors are views of the arena slabs
+                (as long as no dtype or device conversion is needed). Defaults to False.
             kwargs: additional keyword arguments to be passed to the 'self.sample' method.
 
         Returns:
@@ -319,7 +631,8 @@ class ReplayBuffer:
         """
         samples = self.sample(batch_size=batch_size, sample_next_obs=sample_next_obs, clone=clone, **kwargs)
         return {
-            k: get_tensor(v, dtype=dtype, clone=clone, device=device, from_numpy=from_numpy) for k, v in samples.items()
+            k: get_tensor(v, dtype=dtype, clone=clone, device=device, from_numpy=from_numpy or self._arena is not None)
+            for k, v in samples.items()
         }
 
     def __getitem__(self, key: str) -> np.ndarray | np.memmap | MemmapArray:
@@ -432,34 +745,53 @@ class SequentialReplayBuffer(ReplayBuffer):
                 f"The sequence length ({sequence_length}) is greater than the buffer size ({self.__len__()})"
             )
 
-        # Do not sample the element with index 'self.pos' as the transitions is invalid
-        if self.full:
-            # when the buffer is full, it is necessary to avoid the starting index
-            # to be between (self.pos - sequence_length)
-            # and self.pos, so it is possible to sample
-            # the starting index between (0, self.pos - sequence_length) and (self.pos, self.buffer_size)
-            first_range_end = self._pos - sequence_length + 1
-            # end of the second range, if the first range is empty, then the second range ends
-            # in (buffer_size + (self._pos - sequence_length + 1)), otherwise the sequence will contain
-            # invalid values
-            second_range_end = self.buffer_size if first_range_end >= 0 else self.buffer_size + first_range_end
-            valid_idxes = np.array(
-                list(range(0, first_range_end)) + list(range(self._pos, second_range_end)), dtype=np.intp
-            )
-            # start_idxes are the indices of the first elements of the sequences
-            start_idxes = valid_idxes[self._rng.integers(0, len(valid_idxes), size=(batch_dim,), dtype=np.intp)]
-        else:
-            # when the buffer is not full, we need to start the sequence so that it does not go out of bounds
-            start_idxes = self._rng.integers(0, self._pos - sequence_length + 1, size=(batch_dim,), dtype=np.intp)
+        n_valid, offset = self._valid_range(sequence_length=sequence_length)
+        if self._arena is not None:
+            self._arena.advance()
+        # start_idxes are the indices of the first elements of the sequences:
+        # they are drawn together with the environment of every sequence
+        flattened_start_idxes, weights = self._draw_idxes(batch_dim, n_valid, offset)
+        start_idxes, env_idxes = np.divmod(flattened_start_idxes, self._n_envs)
 
         # chunk_length contains the relative indices of the sequence (0, 1, ..., sequence_length-1)
         chunk_length = np.arange(sequence_length, dtype=np.intp).reshape(1, -1)
         idxes = (start_idxes.reshape(-1, 1) + chunk_length) % self.buffer_size
 
         # (n_samples, sequence_length, batch_size)
-        return self._get_samples(
-            idxes, batch_size, n_samples, sequence_length, sample_next_obs=sample_next_obs, clone=clone
+        samples = self._get_samples(
+            idxes,
+            batch_size,
+            n_samples,
+            sequence_length,
+            sample_next_obs=sample_next_obs,
+            clone=clone,
+            env_idxes=env_idxes,
         )
+        return self._add_sampling_weights(samples, flattened_start_idxes, weights, batch_size, n_samples)
+
+    def _valid_range(self, sequence_length: int = 1, **kwargs) -> Tuple[int, int]:
+        """The time indexes from which a sequence of 'sequence_length' elements can be sampled right now.
+        See 'ReplayBuffer._valid_range'."""
+        # Do not sample the element with index 'self.pos' as the transitions is invalid
+        if self.full:
+            # when the buffer is full, it is necessary to avoid the starting index
+            # to be between (self.pos - sequence_length)
+            # and self.pos, so it is possible to sample
+            # the starting index between (0, self.pos - sequence_length) and (self.pos, self.buffer_size).
+            # Those are exactly the (buffer_size - sequence_length + 1) consecutive (modulo buffer_size)
+            # positions starting from self.pos, so the starting indices are computed
+            # as an offset from self.pos, without materializing the valid indices
+            n_valid = self.buffer_size - sequence_length + 1
+            offset = self._pos
+            if len(self._frame_stack_keys) > 0:
+                # The stacks of the oldest elements could need frames that have already been overwritten
+                n_valid -= self._frame_stack_offsets[0]
+                offset = (offset + self._frame_stack_offsets[0]) % self._buffer_size
+        else:
+            # when the buffer is not full, we need to start the sequence so that it does not go out of bounds
+            n_valid = self._pos - sequence_length + 1
+            offset = 0
+        return max(n_valid, 0), offset
 
     def _get_samples(
         self,
@@ -469,61 +801,529 @@ class SequentialReplayBuffer(ReplayBuffer):
         sequence_length: int,
         sample_next_obs: bool = False,
         clone: bool = False,
+        env_idxes: np.ndarray | None = None,
     ) -> Dict[str, np.ndarray]:
-        batch_shape = (batch_size * n_samples, sequence_length)  # [Batch_size * N_samples, Seq_len]
-        flattened_batch_idxes = np.ravel(batch_idxes)
-
         # Each sequence must come from the same environment
-        if self._n_envs == 1:
-            env_idxes = np.zeros((np.prod(batch_shape),), dtype=np.intp)
-        else:
-            env_idxes = self._rng.integers(0, self.n_envs, size=(batch_shape[0],), dtype=np.intp)
-            env_idxes = np.reshape(env_idxes, (-1, 1))
-            env_idxes = np.tile(env_idxes, (1, sequence_length))
-            env_idxes = np.ravel(env_idxes)
+        if env_idxes is None:
+            env_idxes = self._rng.integers(0, self.n_envs, size=(batch_size * n_samples,), dtype=np.intp)
+
+        # Compute the flattened indexes directly in the output layout:
+        # batch_idxes has shape [N_samples * Batch_size, Seq_len], so it is reshaped to
+        # [N_samples, Seq_len, Batch_size] where the element (n, s, b) is the s-th element
+        # of the sequence of the b-th batch in the n-th sample
+        batch_idxes = np.swapaxes(np.reshape(batch_idxes, (n_samples, batch_size, sequence_length)), 1, 2)
+        env_idxes = np.reshape(env_idxes, (n_samples, 1, batch_size))
+        flattened_idxes = np.ravel(batch_idxes * self._n_envs + env_idxes).astype(np.intp, copy=False)
+        flattened_next_idxes = None
+        if sample_next_obs:
+            # The next element of the same environment is 'n_envs' positions ahead in the flattened buffer
+            flattened_next_idxes = (flattened_idxes + self._n_envs) % (self._buffer_size * self._n_envs)
 
-        # Flatten indexes
-        flattened_idxes = (flattened_batch_idxes * self._n_envs + env_idxes).flat
+        # The indexes are not sorted: every sequence is already read as a run of
+        # consecutive elements, so sorting would only add the cost of the un-permutation
+        output_shape = (n_samples, sequence_length, batch_size)
 
         # Get samples
         samples: Dict[str, np.ndarray] = {}
         for k, v in self.buffer.items():
-            # Retrieve the items by flattening the indices
-            # (b1_s1, b1_s2, b1_s3, ..., bn_s1, bn_s2, bn_s3, ...)
-            # where bm_sk is the k-th elements in the sequence of the m-th batch
-            flattened_v = np.take(np.reshape(v, (-1, *v.shape[2:])), flattened_idxes, axis=0)
-            # Properly reshape the items:
-            # [
-            #   [b1_s1, b1_s2, ...],
-            #   [b2_s1, b2_s2, ...],
-            #   ...,
-            #   [bn_s1, bn_s2, ...]
-            # ]
-            batched_v = np.reshape(flattened_v, (n_samples, batch_size, sequence_length) + flattened_v.shape[1:])
-            # Reshape back to # [N_samples, Seq_len, Batch_size]
-            samples[k] = np.swapaxes(
-                batched_v,
-                axis1=1,
-                axis2=2,
-            )
+            element_shape = (self._frame_stack, *v.shape[2:]) if k in self._frame_stack_keys else v.shape[2:]
+            samples[k] = _empty(self._arena, k, output_shape + element_shape, v.dtype)
+            if k in self._frame_stack_keys:
+                self._gather_frame_stacks(v, flattened_idxes, out=samples[k])
+            else:
+                _gather(v, flattened_idxes, out=np.reshape(samples[k], (-1, *v.shape[2:])))
             if clone:
                 samples[k] = samples[k].copy()
             if sample_next_obs:
-                flattened_next_v = v[(flattened_batch_idxes + 1) % self._buffer_size, env_idxes]
-                batched_next_v = np.reshape(
-                    flattened_next_v, (n_samples, batch_size, sequence_length) + flattened_next_v.shape[1:]
-                )
-                samples[f"next_{k}"] = np.swapaxes(
-                    batched_next_v,
-                    axis1=1,
-                    axis2=2,
-                )
+                samples[f"next_{k}"] = _empty(self._arena, f"next_{k}", output_shape + element_shape, v.dtype)
+                if k in self._frame_stack_keys:
+                    self._gather_frame_stacks(v, flattened_next_idxes, out=samples[f"next_{k}"])
+                else:
+                    _gather(v, flattened_next_idxes, out=np.reshape(samples[f"next_{k}"], (-1, *v.shape[2:])))
                 if clone:
                     samples[f"next_{k}"] = samples[f"next_{k}"].copy()
         return samples
 
 
+class _Priorities:
+    def __init__(self, capacity: int, alpha: float, eps: float):
+        """The priorities of the elements of a prioritized replay buffer, stored in a sum and a min segment tree
+        whose leaves are the flattened [buffer_size * n_envs] indexes of the buffer.
+        The trees are guarded by a lock, so that the priorities can be updated by the training loop
+        while a 'ReplayPrefetcher' thread samples from the buffer."""
+        self._sum_tree = SumSegmentTree(capacity)
+        self._min_tree = MinSegmentTree(capacity)
+        self._alpha = alpha
+        self._eps = eps
+        self._max_priority = 1.0
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> float:
+        return self._sum_tree.sum()
+
+    @property
+    def min(self) -> float:
+        return self._min_tree.min()
+
+    def sum(self, idxes: np.ndarray) -> float:
+        with self._lock:
+            return float(self._sum_tree[idxes].sum())
+
+    def set_max(self, idxes: np.ndarray) -> None:
+        """Give to the new elements the maximum priority seen so far, so that they are sampled at least once."""
+        with self._lock:
+            self._sum_tree[idxes] = self._max_priority**self._alpha
+            self._min_tree[idxes] = self._max_priority**self._alpha
+
+    def update(self, idxes: np.ndarray, priorities: np.ndarray) -> None:
+        priorities = np.abs(np.asarray(priorities, dtype=np.float64).ravel()) + self._eps
+        with self._lock:
+            self._max_priority = max(self._max_priority, float(priorities.max(initial=0.0)))
+            self._sum_tree[idxes] = priorities**self._alpha
+            self._min_tree[idxes] = priorities**self._alpha
+
+    def sample(
+        self, n: int, rng: np.random.Generator, beta: float, excluded: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Draw 'n' indexes with a probability proportional to their priority, with stratified sampling:
+        the total priority is split in 'n' segments and one index is drawn from every segment.
+        The 'excluded' indexes, which cannot be sampled right now, are removed from the trees
+        for the time of the draw.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: the sampled indexes and their importance-sampling weights,
+            normalized by the maximum weight among the stored elements.
+        """
+        with self._lock:
+            min_priority = self._min_tree.min()
+            if excluded.size > 0:
+                excluded_priorities = self._sum_tree[excluded]
+                self._sum_tree[excluded] = 0.0
+                self._min_tree[excluded] = float("inf")
+            prefixsums = (np.arange(n) + rng.random(n)) * (self._sum_tree.sum() / n)
+            idxes = self._sum_tree.find_prefixsum_idx(prefixsums)
+            priorities = self._sum_tree[idxes]
+            if excluded.size > 0:
+                self._sum_tree[excluded] = excluded_priorities
+                self._min_tree[excluded] = excluded_priorities
+        # Since P(i) = p_i / sum_k(p_k), the normalized weight (N * P(i))^-beta / max_j (N * P(j))^-beta
+        # is equal to (p_i / min_j(p_j))^-beta
+        weights = (priorities / min_priority) ** -beta
+        # The stratified indexes are sorted: shuffle them, so that every one of the
+        # 'n_samples' batches covers the whole buffer
+        permutation = rng.permutation(n)
+        return idxes[permutation], weights[permutation]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    def __init__(
+        self,
+        buffer_size: int,
+        n_envs: int = 1,
+        obs_keys: Sequence[str] = ("observations",),
+        memmap: bool = False,
+        memmap_dir: str | os.PathLike | None = None,
+        memmap_mode: str = "r+",
+        alpha: float = 0.6,
+        beta: float = 0.4,
+        eps: float = 1e-6,
+        **kwargs,
+    ):
+        """A replay buffer with proportional prioritized sampling, as described in
+        https://arxiv.org/abs/1511.05952. The priorities are kept in RAM in two segment trees,
+        independently of whether the buffer is memory-mapped, so that both the sampling and
+        the update of 'N' priorities cost O(N log(buffer_size * n_envs)).
+        Every element added to the buffer gets the maximum priority seen so far; the priorities of
+        the sampled elements must then be updated with the 'update_priorities' method.
+        Besides the buffer keys, the samples contain the 'idxes' key, i.e. the indexes to pass to
+        'update_priorities', and the 'weights' key, i.e. the importance-sampling weights of the elements.
+
+        Args:
+            buffer_size (int): the buffer size.
+            n_envs (int, optional): the number of environments. Defaults to 1.
+            obs_keys (Sequence[str], optional): names of the observation keys. Those are used
+                to sample the next-observation. Defaults to ("observations",).
+            memmap (bool, optional): whether to memory-map the numpy arrays saved in the buffer. Defaults to False.
+            memmap_dir (str | os.PathLike | None, optional): the memory-mapped files directory.
+                Defaults to None.
+            memmap_mode (str, optional): memory-map mode. Possible values are: "r+", "w+", "c", "copyonwrite",
+                "readwrite", "write". Defaults to "r+".
+            alpha (float, optional): how much the priorities are used, where 0 corresponds to uniform sampling.
+                Defaults to 0.6.
+            beta (float, optional): how much the importance-sampling weights compensate for the non-uniform
+                sampling, where 1 corresponds to full compensation. Defaults to 0.4.
+            eps (float, optional): the constant added to the priorities, so that every element
+                has a non-zero probability of being sampled. Defaults to 1e-6.
+            kwargs: additional keyword arguments.
+        """
+        super().__init__(buffer_size, n_envs, obs_keys, memmap, memmap_dir, memmap_mode, **kwargs)
+        if alpha < 0:
+            raise ValueError(f"'alpha' must be greater than or equal to zero, got: {alpha}")
+        if eps <= 0:
+            raise ValueError(f"'eps' must be greater than zero, got: {eps}")
+        self.beta = beta
+        self._priorities = _Priorities(self._buffer_size * self._n_envs, alpha, eps)
+
+    @property
+    def beta(self) -> float:
+        return self._beta
+
+    @beta.setter
+    def beta(self, beta: float) -> None:
+        if beta < 0:
+            raise ValueError(f"'beta' must be greater than or equal to zero, got: {beta}")
+        self._beta = beta
+
+    def add(self, data: "ReplayBuffer" | Dict[str, np.ndarray], validate_args: bool = False) -> None:
+        """Add data to the replay buffer and give the maximum priority to the new elements.
+        See 'ReplayBuffer.add' for the details."""
+        super().add(data, validate_args=validate_args)
+        if isinstance(data, ReplayBuffer):
+            data = data.buffer
+        n_items = min(next(iter(data.values())).shape[0], self._buffer_size)
+        time_idxes = (self._pos - n_items + np.arange(n_items, dtype=np.intp)) % self._buffer_size
+        self._priorities.set_max(np.ravel(time_idxes.reshape(-1, 1) * self._n_envs + np.arange(self._n_envs)))
+
+    def update_priorities(self, idxes: np.ndarray, priorities: np.ndarray) -> None:
+        """Update the priorities of the sampled elements.
+
+        Args:
+            idxes (np.ndarray): the 'idxes' returned together with the samples.
+            priorities (np.ndarray): the new priorities (e.g. the absolute TD-errors) of the elements,
+                with the same number of elements of 'idxes'.
+        """
+        idxes = np.asarray(idxes, dtype=np.intp).ravel()
+        priorities = np.asarray(priorities).ravel()
+        if idxes.shape != priorities.shape:
+            raise ValueError(
+                f"'idxes' ({idxes.shape[0]} elements) and 'priorities' ({priorities.shape[0]} elements) "
+                "must have the same number of elements"
+            )
+        self._priorities.update(idxes, priorities)
+
+    def sampleable_priority(self, **kwargs) -> float:
+        """The total priority of the elements that can be sampled right now.
+
+        Args:
+            kwargs: the sampling arguments (e.g. 'sample_next_obs' or 'sequence_length'),
+                which define the elements that can be sampled (see 'sample').
+
+        Returns:
+            float: the sum of the priorities of the sampleable elements.
+        """
+        n_valid, offset = self._valid_range(**kwargs)
+        if n_valid == 0:
+            return 0.0
+        return self._priorities.total - self._priorities.sum(self._excluded_idxes(n_valid, offset))
+
+    def _excluded_idxes(self, n_valid: int, offset: int) -> np.ndarray:
+        """The flattened indexes of the stored elements outside of the valid range."""
+        n_stored = self._buffer_size if self._full else self._pos
+        excluded_time_idxes = (offset + n_valid + np.arange(n_stored - n_valid, dtype=np.intp)) % self._buffer_size
+        return np.ravel(excluded_time_idxes.reshape(-1, 1) * self._n_envs + np.arange(self._n_envs))
+
+    def _draw_idxes(self, n: int, n_valid: int, offset: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Draw 'n' indexes of the flattened buffer with a probability proportional to their priority,
+        together with their importance-sampling weights. See 'ReplayBuffer._draw_idxes' for the arguments."""
+        # The stored elements outside of the valid range are removed from the trees for the time of the draw
+        return self._priorities.sample(n, self._rng, self._beta, self._excluded_idxes(n_valid, offset))
+
+
+class PrioritizedSequentialReplayBuffer(PrioritizedReplayBuffer, SequentialReplayBuffer):
+    """A sequential replay buffer with proportional prioritized sampling of the sequences:
+    the priority of a sequence is the priority of its first element.
+    See 'PrioritizedReplayBuffer' and 'SequentialReplayBuffer' for the details."""
+
+
+class SharedReplayBuffer(ReplayBuffer):
+    # The maximum number of times a sample is drawn again because some of
+    # its elements have been overwritten by a writer while they were read
+    _max_sample_attempts: int = 100
+
+    def __init__(
+        self,
+        buffer_size: int,
+        n_envs: int = 1,
+        obs_keys: Sequence[str] = ("observations",),
+        n_writers: int = 1,
+        name: str | None = None,
+        **kwargs,
+    ):
+        """A replay buffer whose arrays live in shared memory (see 'multiprocessing.shared_memory'),
+        so that several processes of the same node can add elements to it and sample from it
+        without exchanging the data. Pickling the buffer records only the names of the shared memory blocks:
+        the unpickled buffer is attached to the same arrays.
+
+        The environments are split among 'n_writers' writers: the writer 'i' adds the elements
+        of the environments in [i * n_envs / n_writers, (i + 1) * n_envs / n_writers) and keeps its own
+        write cursors in shared memory, i.e. the number of elements whose writing has started and the number of
+        elements that have been completely written. Since every cursor has a single writer, no lock is needed:
+        the writer advances the first cursor before writing the elements and the second one after.
+        The readers sample only completely written elements and, after having read them, check that the writers
+        have not started overwriting them in the meantime, otherwise the sample is drawn again.
+
+        The arrays are allocated by the process that creates the buffer, when it adds elements for the first time:
+        the buffer must be shared with the other processes after that.
+        Memory-mapping, compression and frame stack deduplication are not supported.
+
+        Args:
+            buffer_size (int): the buffer size.
+            n_envs (int, optional): the number of environments. Defaults to 1.
+            obs_keys (Sequence[str], optional): names of the observation keys. Those are used
+                to sample the next-observation. Defaults to ("observations",).
+            n_writers (int, optional): the number of processes adding elements to the buffer.
+                It must divide 'n_envs'. Defaults to 1.
+            name (str, optional): the prefix of the names of the shared memory blocks.
+                If None, then a random one is generated.
+                Defaults to None.
+            kwargs: additional keyword arguments.
+        """
+        if kwargs.get("memmap", False) or kwargs.get("compression", None) or kwargs.get("frame_stack", 1) > 1:
+            raise ValueError(
+                "The shared replay buffer does not support memory-mapping, compression and frame stack deduplication"
+            )
+        super().__init__(buffer_size, n_envs, obs_keys, **kwargs)
+        if n_writers <= 0 or n_envs % n_writers != 0:
+            raise ValueError(
+                f"The number of writers ({n_writers}) must be greater than zero "
+                f"and divide the number of environments ({n_envs})"
+            )
+        self._n_writers = n_writers
+        self._writer_id = 0
+        self._name = name or f"srb_{uuid.uuid4().hex[:12]}"
+        self._owner = True
+        # The shape and the dtype of the array of every key, in the order of allocation
+        self._specs: Dict[str, Tuple[Tuple[int, ...], str]] = {}
+        self._shms: Dict[str, SharedMemory] = {}
+        self._cursors_shm = SharedMemory(name=f"{self._name}_c", create=True, size=n_writers * 2 * 8)
+        # The number of elements whose writing has started ('[:, 0]') and completed ('[:, 1]') for every writer
+        self._cursors = np.ndarray((n_writers, 2), dtype=np.int64, buffer=self._cursors_shm.buf)
+        self._cursors[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def n_writers(self) -> int:
+        return self._n_writers
+
+    @property
+    def writer_id(self) -> int:
+        """The writer whose environments are added by this process."""
+        return self._writer_id
+
+    @writer_id.setter
+    def writer_id(self, writer_id: int) -> None:
+        if writer_id < 0 or writer_id >= self._n_writers:
+            raise ValueError(f"'writer_id' must be in [0, {self._n_writers}), got: {writer_id}")
+        self._writer_id = writer_id
+
+    @property
+    def n_added(self) -> np.ndarray:
+        """The number of elements completely written by every writer."""
+        return self._cursors[:, 1].copy()
+
+    @property
+    def empty(self) -> bool:
+        return len(self._specs) == 0 or not (self._cursors[:, 1] > 0).any()
+
+    def _allocate(self, key: str, shape: Tuple[int, ...], dtype: np.dtype) -> None:
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        shm = SharedMemory(name=f"{self._name}_{len(self._specs)}", create=True, size=max(nbytes, 1))
+        self._shms[key] = shm
+        self._specs[key] = (shape, dtype.str)
+        self._buf[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def add(self, data: ReplayBuffer | Dict[str, np.ndarray], validate_args: bool = False) -> None:
+        """Add the elements of the environments of the writer 'self.writer_id' to the buffer.
+        If data is a dictionary, then the values must be numpy arrays of shape
+        [sequence_length, n_envs / n_writers, ...]. If data is a replay buffer,
+        then its elements are added from the oldest to the newest.
+
+        Args:
+            data (ReplayBuffer | Dict[str, np.ndarray]): the data to add to the replay buffer.
+            validate_args (bool, optional): whether to validate the arguments. Defaults to False.
+
+        Raises:
+            ValueError: if the data is not a dictionary containing numpy arrays.
+            RuntimeError: if the data does not have shape [sequence_length, n_envs / n_writers, ...].
+            RuntimeError: if a key has not been allocated by the process that created the buffer.
+        """
+        if isinstance(data, ReplayBuffer):
+            n_stored = data.buffer_size if data.full else data._pos
+            order = (np.arange(n_stored) + (data._pos if data.full else 0)) % data.buffer_size
+            data = {k: np.asarray(v)[order] for k, v in data.buffer.items()}
+        n_envs_per_writer = self._n_envs // self._n_writers
+        if validate_args:
+            if not isinstance(data, dict) or not all(isinstance(v, np.ndarray) for v in data.values()):
+                raise ValueError(f"'data' must be a dictionary containing Numpy arrays, got: {type(data)}")
+            data_len = next(iter(data.values())).shape[0]
+            for k, v in data.items():
+                if v.ndim < 2 or v.shape[:2] != (data_len, n_envs_per_writer):
+                    raise RuntimeError(
+                        f"Every array in 'data' must have shape [sequence_length, {n_envs_per_writer}, ...]: "
+                        f"found key '{k}' with shape '{v.shape}'"
+                    )
+        for k, v in data.items():
+            if k not in self._specs:
+                if not self._owner:
+                    raise RuntimeError(
+                        f"The '{k}' key can be added only by the process that created the buffer, "
+                        "before sharing it with the other processes"
+                    )
+                self._allocate(k, (self._buffer_size, self._n_envs, *v.shape[2:]), v.dtype)
+        data_len = next(iter(data.values())).shape[0]
+        n_items = min(data_len, self._buffer_size)
+        envs = slice(self._writer_id * n_envs_per_writer, (self._writer_id + 1) * n_envs_per_writer)
+        n_written = int(self._cursors[self._writer_id, 1])
+        start = (n_written + data_len - n_items) % self._buffer_size
+        first_chunk = min(n_items, self._buffer_size - start)
+        # The readers must not sample the elements that are going to be overwritten
+        self._cursors[self._writer_id, 0] = n_written + data_len
+        for k, v in data.items():
+            v = v[data_len - n_items :]
+            self._buf[k][start : start + first_chunk, envs] = v[:first_chunk]
+            if first_chunk < n_items:
+                self._buf[k][: n_items - first_chunk, envs] = v[first_chunk:]
+        # The new elements can be sampled
+        self._cursors[self._writer_id, 1] = n_written + data_len
+        self._pos = (n_written + data_len) % self._buffer_size
+        self._full = self._full or n_written + data_len >= self._buffer_size
+        self._n_added += data_len
+
+    def sample(
+        self, batch_size: int, sample_next_obs: bool = False, clone: bool = False, n_samples: int = 1, **kwargs
+    ) -> Dict[str, np.ndarray]:
+        """Sample uniformly the elements completely written by all the writers.
+        When 'sample_next_obs' is True, the last element written by every writer is never sampled.
+
+        Args:
+            batch_size (int): Number of element to sample
+            sample_next_obs (bool): whether to sample the next observations from the 'self.obs_keys' keys.
+                Defaults to False.
+            clone (bool): whether to clone the sampled numpy arrays. Defaults to False.
+            n_samples (int): the number of samples to perform. Defaults to 1.
+
+        Returns:
+            Dict[str, np.ndarray]: the sampled dictionary with a shape of [n_samples, batch_size, ...].
+
+        Raises:
+            RuntimeError: if the writers keep overwriting the sampled elements while they are read.
+        """
+        if batch_size <= 0 or n_samples <= 0:
+            raise ValueError(f"'batch_size' ({batch_size}) and 'n_samples' ({n_samples}) must be both greater than 0")
+        if self.empty:
+            raise ValueError(
+                "No sample has been added to the buffer. Please add at least one sample calling 'self.add()'"
+            )
+        n_envs_per_writer = self._n_envs // self._n_writers
+        for _ in range(self._max_sample_attempts):
+            started, completed = self._cursors[:, 0].copy(), self._cursors[:, 1].copy()
+            # The oldest element of every writer that is not being overwritten
+            oldest = np.maximum(started - self._buffer_size, 0)
+            n_valid = np.maximum(completed - oldest - int(sample_next_obs), 0) * n_envs_per_writer
+            if n_valid.sum() == 0:
+                raise RuntimeError(
+                    "You want to sample the next observations, but one sample has been added to the buffer. "
+                    "Make sure that at least two samples are added."
+                )
+            # Every writer is drawn with probability proportional to its number of valid elements
+            ends = np.cumsum(n_valid)
+            idxes = self._rng.integers(0, ends[-1], size=(batch_size * n_samples,), dtype=np.int64)
+            writers = np.searchsorted(ends, idxes, side="right")
+            time_steps, env_idxes = np.divmod(idxes - (ends - n_valid)[writers], n_envs_per_writer)
+            time_steps += oldest[writers]
+            env_idxes += writers * n_envs_per_writer
+            if self._arena is not None:
+                self._arena.advance()
+            samples = self._get_samples(
+                batch_idxes=(time_steps % self._buffer_size).astype(np.intp),
+                sample_next_obs=sample_next_obs,
+                clone=clone,
+                env_idxes=env_idxes.astype(np.intp),
+            )
+            # The sample is valid only if no writer has started overwriting its elements while they were read
+            if (time_steps >= self._cursors[writers, 0] - self._buffer_size).all():
+                return {k: v.reshape(n_samples, batch_size, *v.shape[1:]) for k, v in samples.items()}
+        raise RuntimeError(
+            f"The sampled elements have been overwritten while they were read for {self._max_sample_attempts} times: "
+            "increase the buffer size"
+        )
+
+    def __setitem__(self, key: str, value: np.ndarray | np.memmap | MemmapArray) -> None:
+        raise RuntimeError("The arrays of the shared replay buffer cannot be replaced")
+
+    def to_replay_buffer(self) -> ReplayBuffer:
+        """Copy the elements of the buffer in a new, private, replay buffer, e.g. to checkpoint it.
+        The writers should not add elements in the meantime.
+
+        Returns:
+            ReplayBuffer: the copy of the buffer.
+
+        Raises:
+            RuntimeError: if the writers have not added the same number of elements.
+        """
+        completed = self._cursors[:, 1]
+        if (completed != completed[0]).any():
+            raise RuntimeError(
+                "The shared replay buffer can be copied only when all the writers have added the same number "
+                f"of elements, got: {completed.tolist()}"
+            )
+        rb = ReplayBuffer(self._buffer_size, self._n_envs, self._obs_keys)
+        for k, v in self._buf.items():
+            rb._buf[k] = np.copy(v)
+        rb._pos = int(completed[0]) % self._buffer_size
+        rb._full = int(completed[0]) >= self._buffer_size
+        rb._n_added = int(completed[0])
+        return rb
+
+    def close(self) -> None:
+        """Detach the buffer from the shared memory blocks, which are also destroyed
+        if the buffer has been created by this process."""
+        self._buf = {}
+        self._cursors = np.zeros((self._n_writers, 2), dtype=np.int64)
+        for shm in (*self._shms.values(), self._cursors_shm):
+            try:
+                shm.close()
+            except BufferError:
+                # Some sampled arrays are still views of the block: it will be closed when they are deleted
+                pass
+            if self._owner:
+                shm.unlink()
+        self._shms = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_buf"], state["_shms"], state["_cursors_shm"], state["_cursors"]
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._cursors_shm = _attach_shared_memory(f"{self._name}_c")
+        self._cursors = np.ndarray((self._n_writers, 2), dtype=np.int64, buffer=self._cursors_shm.buf)
+        self._shms = {}
+        self._buf = {}
+        for i, (k, (shape, dtype)) in enumerate(self._specs.items()):
+            self._shms[k] = _attach_shared_memory(f"{self._name}_{i}")
+            self._buf[k] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self._shms[k].buf)
+
+
 class EnvIndependentReplayBuffer:
+    _arena: SampleArena | None = None
+    _prioritized: bool = False
+
     def __init__(
         self,
         buffer_size: int,
@@ -548,6 +1348,9 @@ class EnvIndependentReplayBuffer:
             memmap_mode (str, optional): memory-map mode. Possible values are: "r+", "w+", "c", "copyonwrite",
                 "readwrite", "write". Defaults to "r+".
             buffer_cls (Type[ReplayBuffer], optional): the replay buffer class to use. Defaults to ReplayBuffer.
+                If it is a prioritized buffer, then the elements are sampled with a probability proportional
+                to their priority across all the buffers, and the priorities are updated with
+                the 'update_priorities' method.
             kwargs: additional keyword arguments.
         """
         if buffer_size <= 0:
@@ -585,6 +1388,7 @@ class EnvIndependentReplayBuffer:
         self._n_envs = n_envs
         self._rng: np.random.Generator = np.random.default_rng()
         self._concat_along_axis = buffer_cls.batch_axis
+        self._prioritized = issubclass(buffer_cls, PrioritizedReplayBuffer)
 
     @property
     def buffer(self) -> Sequence[ReplayBuffer]:
@@ -610,6 +1414,16 @@ class EnvIndependentReplayBuffer:
     def is_memmap(self) -> Sequence[bool]:
         return tuple([b.is_memmap for b in self.buffer])
 
+    @property
+    def arena(self) -> SampleArena | None:
+        """The arena where the concatenated samples are written.
+        If None, then new arrays are allocated at every sample."""
+        return self._arena
+
+    @arena.setter
+    def arena(self, arena: SampleArena | None) -> None:
+        self._arena = arena
+
     def __len__(self) -> int:
         return self.buffer_size
 
@@ -624,29 +1438,32 @@ class EnvIndependentReplayBuffer:
     def add(
         self,
         data: "ReplayBuffer" | Dict[str, np.ndarray],
-        indices: Optional[Sequence[int]] = None,
+        env_idxes: Optional[Sequence[int]] = None,
         validate_args: bool = False,
     ) -> None:
-        """Add data to the replay buffers specified by the 'indices'. If 'indices' is None, then the data is added
-        one for every environment. The length of indices must be equal to the second dimension of the arrays in 'data',
-        which is the number of environments. If data is a dictionary, then the keys must be strings
+        """Add data to the replay buffers specified by the 'env_idxes'. If 'env_idxes' is None, then the data is
+        added one for every environment. The length of 'env_idxes' must be equal to the second dimension of the arrays
+        in 'data', which is the number of environments. If data is a dictionary, then the keys must be strings
         and the values must be numpy arrays of shape [sequence_length, n_envs, ...].
+        In this way the data of a partial batch of environments, e.g. the ones returned by
+        the `sheeprl.envs.vector.AsyncBatchVectorEnv`, can be added to their buffers.
 
 
         Args:
             data (Union[ReplayBuffer, Dict[str, np.ndarray]]): the data to add to the replay buffers.
-            indices (Optional[Sequence[int]], optional): the indices of the replay buffers to add the data to.
+            env_idxes (Optional[Sequence[int]], optional): the indices of the replay buffers
+                (i.e. of the environments) to add the data to.
                 Defaults to None.
             validate_args (bool, optional): whether to validate the arguments. Defaults to False.
         """
-        if indices is None:
-            indices = tuple(range(self.n_envs))
-        elif len(indices) != next(iter(data.values())).shape[1]:
+        if env_idxes is None:
+            env_idxes = tuple(range(self.n_envs))
+        elif len(env_idxes) != next(iter(data.values())).shape[1]:
             raise ValueError(
-                f"The length of 'indices' ({len(indices)}) must be equal to the second dimension of the "
+                f"The length of 'env_idxes' ({len(env_idxes)}) must be equal to the second dimension of the "
                 f"arrays in 'data' ({next(iter(data.values())).shape[1]})"
             )
-        for env_data_idx, env_idx in enumerate(indices):
+        for env_data_idx, env_idx in enumerate(env_idxes):
             env_data = {k: v[:, env_data_idx : env_data_idx + 1] for k, v in data.items()}
             self._buf[env_idx].add(env_data, validate_args=validate_args)
 
@@ -678,23 +1495,78 @@ class EnvIndependentReplayBuffer:
         if self._buf is None:
             raise RuntimeError("The buffer has not been initialized. Try to add some data first.")
 
-        bs_per_buf = np.bincount(self._rng.integers(0, self._n_envs, (batch_size,)))
-        per_buf_samples = [
-            b.sample(
-                batch_size=bs,
-                sample_next_obs=sample_next_obs,
-                clone=clone,
-                n_samples=n_samples,
-                **kwargs,
+        if self._prioritized:
+            # The batch is split proportionally to the total priority of the elements that every buffer
+            # can sample right now, so that every element is sampled with a probability proportional to its priority
+            priority_mass = np.array(
+                [b.sampleable_priority(sample_next_obs=sample_next_obs, **kwargs) for b in self._buf]
             )
-            for b, bs in zip(self._buf, bs_per_buf)
-            if bs > 0
-        ]
+            if priority_mass.sum() > 0:
+                bs_per_buf = self._rng.multinomial(batch_size, priority_mass / priority_mass.sum())
+            else:
+                # No buffer can be sampled: let the buffers raise the error
+                bs_per_buf = np.full((self._n_envs,), batch_size)
+        else:
+            bs_per_buf = np.bincount(self._rng.integers(0, self._n_envs, (batch_size,)))
+        env_idxes, per_buf_samples = [], []
+        for env_idx, (b, bs) in enumerate(zip(self._buf, bs_per_buf)):
+            if bs > 0:
+                env_idxes.append(env_idx)
+                per_buf_samples.append(
+                    b.sample(
+                        batch_size=bs,
+                        sample_next_obs=sample_next_obs,
+                        clone=clone,
+                        n_samples=n_samples,
+                        **kwargs,
+                    )
+                )
+        if self._prioritized:
+            # The weights of every buffer are normalized with the minimum priority of that buffer:
+            # they are re-normalized with the minimum priority among all the buffers, while the indexes
+            # are made global, so that 'update_priorities' can route them to the right buffer
+            min_priority = min(b._priorities.min for b in self._buf)
+            for env_idx, s in zip(env_idxes, per_buf_samples):
+                s["weights"] *= (self._buf[env_idx]._priorities.min / min_priority) ** -self._buf[env_idx].beta
+                s["idxes"] += env_idx * self._buffer_size
+        if self._arena is not None:
+            self._arena.advance()
         samples = {}
         for k in per_buf_samples[0].keys():
-            samples[k] = np.concatenate([s[k] for s in per_buf_samples], axis=self._concat_along_axis)
+            to_concat = [s[k] for s in per_buf_samples]
+            output_shape = list(to_concat[0].shape)
+            output_shape[self._concat_along_axis] = sum(v.shape[self._concat_along_axis] for v in to_concat)
+            samples[k] = np.concatenate(
+                to_concat,
+                axis=self._concat_along_axis,
+                out=_empty(self._arena, k, output_shape, to_concat[0].dtype),
+            )
+            if clone and self._arena is not None:
+                samples[k] = samples[k].copy()
         return samples
 
+    def update_priorities(self, idxes: np.ndarray, priorities: np.ndarray) -> None:
+        """Update the priorities of the sampled elements, when the buffers are prioritized.
+
+        Args:
+            idxes (np.ndarray): the 'idxes' returned together with the samples.
+            priorities (np.ndarray): the new priorities of the elements,
+                with the same number of elements of 'idxes'.
+        """
+        if not self._prioritized:
+            raise RuntimeError("The priorities can be updated only if the 'buffer_cls' is a prioritized buffer")
+        idxes = np.asarray(idxes, dtype=np.intp).ravel()
+        priorities = np.asarray(priorities).ravel()
+        if idxes.shape != priorities.shape:
+            raise ValueError(
+                f"'idxes' ({idxes.shape[0]} elements) and 'priorities' ({priorities.shape[0]} elements) "
+                "must have the same number of elements"
+            )
+        env_idxes, idxes = np.divmod(idxes, self._buffer_size)
+        for env_idx in np.unique(env_idxes):
+            mask = env_idxes == env_idx
+            self._buf[env_idx].update_priorities(idxes[mask], priorities[mask])
+
     @torch.no_grad()
     def sample_tensors(
         self,
@@ -720,7 +1592,9 @@ class EnvIndependentReplayBuffer:
             device (str | torch.dtype, optional): the torch device to move the tensors to. Defaults to "cpu".
             from_numpy (bool, optional): whether to convert the numpy arrays to torch tensors
                 with the 'torch.from_numpy' function. If False, then the numpy arrays are converted
-                with the 'torch.as_tensor' function. Defaults to False.
+                with the 'torch.as_tensor' function. If the buffer has an arena, then the arrays are always
+                converted with 'torch.from_numpy', so that the tensors are views of the arena slabs
+                (as long as no dtype or device conversion is needed). Defaults to False.
             kwargs: additional keyword arguments to be passed to the 'self.sample' method.
 
         Returns:
@@ -736,12 +1610,18 @@ class EnvIndependentReplayBuffer:
             **kwargs,
         )
         return {
-            k: get_tensor(v, dtype=dtype, clone=clone, device=device, from_numpy=from_numpy) for k, v in samples.items()
+            k: get_tensor(v, dtype=dtype, clone=clone, device=device, from_numpy=from_numpy or self._arena is not None)
+            for k, v in samples.items()
         }
 
 
 class EpisodeBuffer:
     """A replay buffer that stores separately the episodes.
+    The episodes are stored one after the other in a circular storage of 'buffer_size' steps,
+    indexed by the start position and the cumulative length of every episode: in this way, the sequences
+    of a whole batch are sampled with a single gather, whatever the number of stored episodes.
+    The episodes can wrap around the end of the storage, so the buffer holds the most recent episodes
+    whose total length is at most 'buffer_size' steps.
 
     Args:
         buffer_size (int): The capacity of the buffer.
@@ -760,9 +1640,16 @@ class EpisodeBuffer:
         memmap_mode (str, optional): memory-map mode.
             Possible values are: "r+", "w+", "c", "copyonwrite", "readwrite", "write".
             Defaults to "r+".
+        compression (Dict[str, str], optional): the compression codec of the keys to store compressed,
+            e.g. {"rgb": "zlib"}. See 'ReplayBuffer' for the details.
+            Default to None.
+        compression_threads (int, optional): the number of threads used to (de)compress the elements.
+            If None, then the number of CPUs is used.
+            Default to None.
     """
 
     batch_axis: int = 2
+    _arena: SampleArena | None = None
 
     def __init__(
         self,
@@ -774,6 +1661,8 @@ class EpisodeBuffer:
         memmap: bool = False,
         memmap_dir: str | os.PathLike | None = None,
         memmap_mode: str = "r+",
+        compression: Dict[str, str] | None = None,
+        compression_threads: int | None = None,
     ) -> None:
         if buffer_size <= 0:
             raise ValueError(f"The buffer size must be greater than zero, got: {buffer_size}")
@@ -793,10 +1682,21 @@ class EpisodeBuffer:
         # One list for each environment that contains open episodes:
         # one open episode per environment
         self._open_episodes = [[] for _ in range(n_envs)]
-        # Contain the cumulative length of the episodes in the buffer
-        self._cum_lengths: Sequence[int] = []
-        # List of stored episodes
-        self._buf: Sequence[Dict[str, np.ndarray | MemmapArray]] = []
+        # Circular storage of the episodes, with one array of 'buffer_size' steps for every key:
+        # the episodes are stored one after the other and can wrap around the end of the storage
+        self._storage: Dict[str, np.ndarray | MemmapArray] = {}
+        # Position in the storage where the next episode is written
+        self._tail = 0
+        # Index of the stored episodes, from the oldest to the newest:
+        # the position in the storage of the first step and the cumulative length of the episodes
+        self._episode_starts: np.ndarray = np.zeros((0,), dtype=np.intp)
+        self._cum_lengths: np.ndarray = np.zeros((0,), dtype=np.intp)
+        # List of stored episodes (views of the storage)
+        self._buf: Sequence[Dict[str, np.ndarray]] = []
+        self._rng: np.random.Generator = np.random.default_rng()
+
+        self._compression = dict(compression or {})
+        self._compression_threads = compression_threads
 
         self._memmap = memmap
         self._memmap_dir = memmap_dir
@@ -849,12 +1749,61 @@ class EpisodeBuffer:
     def is_memmap(self) -> bool:
         return self._memmap
 
+    @property
+    def arena(self) -> SampleArena | None:
+        """The arena where the samples are written. If None, then new arrays are allocated at every sample."""
+        return self._arena
+
+    @arena.setter
+    def arena(self, arena: SampleArena | None) -> None:
+        self._arena = arena
+
     @property
     def full(self) -> bool:
-        return self._cum_lengths[-1] + self._minimum_episode_length > self._buffer_size if len(self._buf) > 0 else False
+        return len(self) + self._minimum_episode_length > self._buffer_size if len(self._buf) > 0 else False
 
     def __len__(self) -> int:
-        return self._cum_lengths[-1] if len(self._buf) > 0 else 0
+        return int(self._cum_lengths[-1]) if len(self._cum_lengths) > 0 else 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The episodes are views of the storage: do not save them twice
+        state = self.__dict__.copy()
+        state["_buf"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        if "_storage" not in state:
+            # The buffer has been saved when every episode was stored in its own arrays:
+            # move the episodes in the contiguous storage
+            episodes = state["_buf"]
+            self._storage = {}
+            self._tail = 0
+            self._episode_starts = np.zeros((0,), dtype=np.intp)
+            self._cum_lengths = np.zeros((0,), dtype=np.intp)
+            self._buf = []
+            self._rng = np.random.default_rng()
+            self._compression = {}
+            self._compression_threads = None
+            for episode in episodes:
+                self._save_episode([{k: np.asarray(v) for k, v in episode.items()}])
+        else:
+            ep_lengths = np.diff(self._cum_lengths, prepend=0)
+            self._buf = [self._episode_view(start, length) for start, length in zip(self._episode_starts, ep_lengths)]
+
+    def _episode_view(self, start: int, length: int) -> Dict[str, np.ndarray]:
+        if start + length <= self._buffer_size:
+            return {k: v[start : start + length] for k, v in self._storage.items()}
+        # The episodes that wrap around the end of the storage are copied
+        idxes = np.arange(start, start + length) % self._buffer_size
+        return {k: v[idxes] for k, v in self._storage.items()}
+
+    def _remove_oldest_episodes(self, n: int) -> None:
+        if n <= 0:
+            return
+        self._buf = self._buf[n:]
+        self._episode_starts = self._episode_starts[n:]
+        self._cum_lengths = self._cum_lengths[n:] - self._cum_lengths[n - 1]
 
     @typing.overload
     def add(self, data: "ReplayBuffer", env_idxes: Sequence[int] | None = None, validate_args: bool = False) -> None:
@@ -984,42 +1933,40 @@ class EpisodeBuffer:
         # If the buffer is full, then remove the oldest episodes
         if self.full or len(self) + ep_len > self._buffer_size:
             # Compute the index of the last episode to remove
-            cum_lengths = np.array(self._cum_lengths)
-            mask = (len(self) - cum_lengths + ep_len) <= self._buffer_size
-            last_to_remove = mask.argmax()
-            # Remove all memmaped episodes
-            if self._memmap and self._memmap_dir is not None:
-                for _ in range(last_to_remove + 1):
-                    dirname = os.path.dirname(self._buf[0][next(iter(self._buf[0].keys()))].filename)
-                    for v in self._buf[0].values():
-                        del v
-                    del self._buf[0]
-                    try:
-                        shutil.rmtree(dirname)
-                    except Exception as e:
-                        logging.error(e)
-            else:
-                self._buf = self._buf[last_to_remove + 1 :]
-            # Update the cum_lengths lists
-            cum_lengths = cum_lengths[last_to_remove + 1 :] - cum_lengths[last_to_remove]
-            self._cum_lengths = cum_lengths.tolist()
-        self._cum_lengths.append(len(self) + ep_len)
-        episode_to_store = episode
-        if self._memmap:
-            episode_dir = self._memmap_dir / f"episode_{str(uuid.uuid4())}"
-            episode_dir.mkdir(parents=True, exist_ok=True)
-            episode_to_store = {}
+            mask = (len(self) - self._cum_lengths + ep_len) <= self._buffer_size
+            self._remove_oldest_episodes(mask.argmax() + 1)
+
+        if len(self._storage) == 0:
             for k, v in episode.items():
-                path = Path(episode_dir / f"{k}.memmap")
-                filename = str(path)
-                episode_to_store[k] = MemmapArray(
-                    filename=str(filename),
-                    dtype=v.dtype,
-                    shape=v.shape,
-                    mode=self._memmap_mode,
-                )
-                episode_to_store[k][:] = episode[k]
-        self._buf.append(episode_to_store)
+                if k in self._compression:
+                    self._storage[k] = CompressedArray(
+                        shape=(self._buffer_size, *v.shape[1:]),
+                        dtype=v.dtype,
+                        batch_dims=1,
+                        codec=self._compression[k],
+                        num_threads=self._compression_threads,
+                    )
+                elif self._memmap:
+                    self._storage[k] = MemmapArray(
+                        filename=Path(self._memmap_dir / f"{k}.memmap"),
+                        dtype=v.dtype,
+                        shape=(self._buffer_size, *v.shape[1:]),
+                        mode=self._memmap_mode,
+                    )
+                else:
+                    self._storage[k] = np.empty(shape=(self._buffer_size, *v.shape[1:]), dtype=v.dtype)
+        # The stored episodes are the steps before the tail: the new episode is written after them,
+        # from the beginning of the storage if it does not fit before the end
+        start = self._tail
+        first_chunk_len = min(ep_len, self._buffer_size - start)
+        for k, v in episode.items():
+            self._storage[k][start : start + first_chunk_len] = v[:first_chunk_len]
+            if first_chunk_len < ep_len:
+                self._storage[k][: ep_len - first_chunk_len] = v[first_chunk_len:]
+        self._tail = (start + ep_len) % self._buffer_size
+        self._episode_starts = np.append(self._episode_starts, start)
+        self._cum_lengths = np.append(self._cum_lengths, len(self) + ep_len)
+        self._buf.append(self._episode_view(start, ep_len))
 
     def sample(
         self,
@@ -1051,63 +1998,50 @@ class EpisodeBuffer:
             raise ValueError(f"Batch size must be greater than 0, got: {batch_size}")
         if n_samples <= 0:
             raise ValueError(f"The number of samples must be greater than 0, got: {n_samples}")
+        # The number of steps of every episode that can be part of a sequence
+        ep_lens = np.diff(self._cum_lengths, prepend=0)
         if sample_next_obs:
-            valid_episode_idxes = np.array(self._cum_lengths) - np.array([0] + self._cum_lengths[:-1]) > sequence_length
-        else:
-            valid_episode_idxes = (
-                np.array(self._cum_lengths) - np.array([0] + self._cum_lengths[:-1]) >= sequence_length
-            )
-        valid_episodes = list(compress(self._buf, valid_episode_idxes))
-        if len(valid_episodes) == 0:
+            ep_lens -= 1
+        valid_episode_idxes = np.flatnonzero(ep_lens >= sequence_length)
+        if len(valid_episode_idxes) == 0:
             raise RuntimeError(
                 "No valid episodes has been added to the buffer. Please add at least one episode of length greater "
                 f"than or equal to {sequence_length} calling `self.add()`"
             )
+        if self._arena is not None:
+            self._arena.advance()
 
-        chunk_length = np.arange(sequence_length, dtype=np.intp).reshape(1, -1)
-        nsample_per_eps = np.bincount(np.random.randint(0, len(valid_episodes), (batch_size * n_samples,))).astype(
-            np.intp
-        )
-        samples_per_eps = {k: [] for k in valid_episodes[0].keys()}
-        if sample_next_obs:
-            samples_per_eps.update({f"next_{k}": [] for k in self._obs_keys})
-        for i, n in enumerate(nsample_per_eps):
-            if n > 0:
-                ep_len = valid_episodes[i]["dones"].shape[0]
-                if sample_next_obs:
-                    ep_len -= 1
-                # Define the maximum index that can be sampled in the episodes
-                upper = ep_len - sequence_length + 1
-                # If you want to prioritize ends, then all the indices of the episode
-                # can be sampled as starting index
-                if self._prioritize_ends:
-                    upper += sequence_length
-                # Sample the starting indices and upper bound with `ep_len - sequence_length`
-                start_idxes = np.minimum(
-                    np.random.randint(0, upper, size=(n,)).reshape(-1, 1), ep_len - sequence_length, dtype=np.intp
-                )
-                # Compute the indices of the sequences
-                indices = start_idxes + chunk_length
-                # Retrieve the data
-                for k in valid_episodes[0].keys():
-                    samples_per_eps[k].append(
-                        np.take(valid_episodes[i][k], indices.flat, axis=0).reshape(
-                            n, sequence_length, *valid_episodes[i][k].shape[1:]
-                        )
-                    )
-                    if sample_next_obs and k in self._obs_keys:
-                        samples_per_eps[f"next_{k}"].append(valid_episodes[i][k][indices + 1])
-        # Concatenate all the trajectories on the batch dimension and properly reshape them
+        # Sample the episodes uniformly, then the starting index of the sequences in every episode
+        batch_dim = batch_size * n_samples
+        episode_idxes = valid_episode_idxes[self._rng.integers(0, len(valid_episode_idxes), size=(batch_dim,))]
+        ep_lens = ep_lens[episode_idxes]
+        # Define the maximum index that can be sampled in the episodes
+        upper = ep_lens - sequence_length + 1
+        # If you want to prioritize ends, then all the indices of the episode
+        # can be sampled as starting index
+        if self._prioritize_ends:
+            upper += sequence_length
+        # Sample the starting indices and upper bound with `ep_len - sequence_length`
+        start_idxes = np.minimum(self._rng.integers(0, upper), ep_lens - sequence_length)
+
+        # Compute the indices of the sequences in the storage directly in the output layout:
+        # [N_samples, Seq_len, Batch_size]
+        start_idxes = np.reshape(self._episode_starts[episode_idxes] + start_idxes, (n_samples, 1, batch_size))
+        chunk_length = np.arange(sequence_length, dtype=np.intp).reshape(1, -1, 1)
+        flattened_idxes = np.ravel(start_idxes + chunk_length) % self._buffer_size
+        flattened_next_idxes = (flattened_idxes + 1) % self._buffer_size if sample_next_obs else None
+
+        # Retrieve the data with a single gather for every key
         samples = {}
-        for k, v in samples_per_eps.items():
-            if len(v) > 0:
-                samples[k] = np.moveaxis(
-                    np.concatenate(v, axis=0).reshape(n_samples, batch_size, sequence_length, *v[0].shape[2:]),
-                    2,
-                    1,
-                )
-                if clone:
-                    samples[k] = samples[k].copy()
+        for k, v in self._storage.items():
+            output_shape = (n_samples, sequence_length, batch_size, *v.shape[1:])
+            samples[k] = _empty(self._arena, k, output_shape, v.dtype)
+            _take(v, flattened_idxes, out=np.reshape(samples[k], (-1, *v.shape[1:])))
+            if sample_next_obs and k in self._obs_keys:
+                samples[f"next_{k}"] = _empty(self._arena, f"next_{k}", output_shape, v.dtype)
+                _take(v, flattened_next_idxes, out=np.reshape(samples[f"next_{k}"], (-1, *v.shape[1:])))
+        if clone:
+            samples = {k: v.copy() for k, v in samples.items()}
         return samples
 
     @torch.no_grad()
@@ -1137,15 +2071,245 @@ class EpisodeBuffer:
             device (str | torch.dtype, optional): the torch device to move the tensors to. Defaults to "cpu".
             from_numpy (bool, optional): whether to convert the numpy arrays to torch tensors
                 with the 'torch.from_numpy' function. If False, then the numpy arrays are converted
-                with the 'torch.as_tensor' function. Defaults to False.
+                with the 'torch.as_tensor' function. If the buffer has an arena, then the arrays are always
+                converted with 'torch.from_numpy', so that the tensors are views of the arena slabs
+                (as long as no dtype or device conversion is needed). Defaults to False.
             kwargs: additional keyword arguments to be passed to the 'self.sample' method.
         """
         samples = self.sample(batch_size, sample_next_obs, n_samples, clone, sequence_length)
         return {
-            k: get_tensor(v, dtype=dtype, clone=clone, device=device, from_numpy=from_numpy) for k, v in samples.items()
+            k: get_tensor(v, dtype=dtype, clone=clone, device=device, from_numpy=from_numpy or self._arena is not None)
+            for k, v in samples.items()
         }
 
 
+class ReplayPrefetcher:
+    def __init__(
+        self,
+        buffer: ReplayBuffer | EnvIndependentReplayBuffer | EpisodeBuffer,
+        prefetch: int = 0,
+        dtype: Optional[torch.dtype] = None,
+        device: str | torch.device = "cpu",
+        from_numpy: bool = False,
+    ):
+        """Iterate over batches sampled from a replay buffer, one batch per gradient step.
+        If 'prefetch' is greater than zero, then a background thread samples the next 'prefetch' batches
+        while the current one is being consumed: every batch is gathered into pinned host memory
+        (if the device is a CUDA one) and transferred to the device with a non-blocking copy
+        on a side CUDA stream. Otherwise, every batch is sampled with the 'sample_tensors' method of the buffer
+        only when it is requested.
+
+        The buffer must not be modified while iterating over the sampled batches. If the buffer
+        writes its samples into an arena, then the arena must have at least 'prefetch + 2' slabs,
+        since up to 'prefetch' batches wait in the queue while one is consumed and another one is sampled.
+
+        Args:
+            buffer (ReplayBuffer | EnvIndependentReplayBuffer | EpisodeBuffer): the buffer to sample from.
+            prefetch (int, optional): the number of batches to prefetch in background.
+                If 0, then no prefetching is done. Defaults to 0.
+            dtype (Optional[torch.dtype], optional): the torch dtype to convert the arrays to. If None,
+                then the dtypes of the numpy arrays is maintained. Defaults to None.
+            device (str | torch.device, optional): the torch device to move the tensors to. Defaults to "cpu".
+            from_numpy (bool, optional): whether to convert the numpy arrays to torch tensors
+                with the 'torch.from_numpy' function. If False, then the numpy arrays are converted
+                with the 'torch.as_tensor' function. Defaults to False.
+        """
+        if prefetch < 0:
+            raise ValueError(f"The number of batches to prefetch must be non-negative, got: {prefetch}")
+        arena: SampleArena | None = getattr(buffer, "arena", None)
+        if prefetch > 0 and arena is not None and arena.num_slabs < prefetch + 2:
+            raise ValueError(
+                f"The arena of the buffer must have at least {prefetch + 2} slabs to prefetch {prefetch} batches, "
+                f"got: {arena.num_slabs}"
+            )
+        self._buffer = buffer
+        self._prefetch = prefetch
+        self._dtype = dtype
+        self._device = torch.device(device)
+        self._from_numpy = from_numpy
+        self._pin_memory = self._device.type == "cuda" and torch.cuda.is_available()
+        self._stream: torch.cuda.Stream | None = None
+        if self._pin_memory and self._prefetch > 0:
+            self._stream = torch.cuda.Stream(device=self._device)
+
+    @property
+    def buffer(self) -> ReplayBuffer | EnvIndependentReplayBuffer | EpisodeBuffer:
+        return self._buffer
+
+    @property
+    def prefetch(self) -> int:
+        return self._prefetch
+
+    def iterate(self, batch_size: int, n_samples: int = 1, **kwargs) -> Iterator[Dict[str, Tensor]]:
+        """Sample 'n_samples' batches from the buffer and return an iterator over them.
+        If prefetching is enabled, the background sampling starts when the first batch is requested and
+        stops when the iterator is exhausted, closed or garbage collected, otherwise every batch is sampled
+        when requested.
+
+        Args:
+            batch_size (int): the number of elements in every batch.
+            n_samples (int, optional): the number of batches to sample. Defaults to 1.
+            kwargs: additional keyword arguments to be passed to the 'sample' method of the buffer
+                (e.g. 'sequence_length' or 'sample_next_obs').
+
+        Returns:
+            Iterator[Dict[str, Tensor]]: an iterator over 'n_samples' batches, every one of them with the
+            shape of a single sample of the buffer, i.e. without the leading 'n_samples' dimension.
+        """
+        if batch_size <= 0 or n_samples <= 0:
+            raise ValueError(f"'batch_size' ({batch_size}) and 'n_samples' ({n_samples}) must be both greater than 0")
+        if self._prefetch == 0:
+            return self._sample_on_demand(batch_size, n_samples, kwargs)
+        return self._consume(batch_size, n_samples, kwargs)
+
+    def _sample_on_demand(self, batch_size: int, n_samples: int, kwargs: Dict[str, Any]) -> Iterator[Dict[str, Tensor]]:
+        for _ in range(n_samples):
+            samples = self._buffer.sample_tensors(
+                batch_size=batch_size,
+                n_samples=1,
+                dtype=self._dtype,
+                device=self._device,
+                from_numpy=self._from_numpy,
+                **kwargs,
+            )
+            yield {k: v[0] for k, v in samples.items()}
+
+    def _worker(
+        self, queue: Queue, stop: threading.Event, batch_size: int, n_samples: int, kwargs: Dict[str, Any]
+    ) -> None:
+        try:
+            for _ in range(n_samples):
+                if stop.is_set():
+                    return
+                samples = self._buffer.sample(batch_size=batch_size, n_samples=1, **kwargs)
+                batch = {}
+                for k, v in samples.items():
+                    batch[k] = get_tensor(v[0], dtype=self._dtype, from_numpy=self._from_numpy)
+                    if self._pin_memory and not batch[k].is_pinned():
+                        batch[k] = batch[k].pin_memory()
+                event = None
+                if self._stream is not None:
+                    with torch.cuda.stream(self._stream):
+                        batch = {k: v.to(self._device, non_blocking=True) for k, v in batch.items()}
+                        event = torch.cuda.Event()
+                        event.record(self._stream)
+                else:
+                    batch = {k: v.to(self._device, non_blocking=True) for k, v in batch.items()}
+                if not self._put(queue, stop, (batch, event)):
+                    return
+        except BaseException as e:
+            self._put(queue, stop, e)
+
+    @staticmethod
+    def _put(queue: Queue, stop: threading.Event, item: Any) -> bool:
+        # Wait until there is room in the queue, giving up if the consumer has stopped iterating
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _consume(self, batch_size: int, n_samples: int, kwargs: Dict[str, Any]) -> Iterator[Dict[str, Tensor]]:
+        # The worker is started by the generator, so that it is always stopped in the 'finally' clause:
+        # a generator that has never been advanced does not run it when it is closed
+        queue: Queue = Queue(maxsize=self._prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._worker, args=(queue, stop, batch_size, n_samples, kwargs), daemon=True)
+        worker.start()
+        try:
+            for _ in range(n_samples):
+                item = queue.get()
+                if isinstance(item, BaseException):
+                    raise item
+                batch, event = item
+                if event is not None:
+                    # Make the compute stream wait for the copy and prevent the caching allocator
+                    # from reusing the memory of the batch while it is still in use
+                    current_stream = torch.cuda.current_stream(self._device)
+                    current_stream.wait_event(event)
+                    for v in batch.values():
+                        v.record_stream(current_stream)
+                yield batch
+        finally:
+            stop.set()
+            worker.join()
+
+
+def _attach_shared_memory(name: str) -> SharedMemory:
+    """Attach to an existing shared memory block without registering it to the resource tracker,
+    which would destroy it when this process exits, even if the block has been created by another process."""
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    from multiprocessing import resource_tracker
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _sorting_permutation(idxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the permutation that sorts 'idxes' together with its inverse.
+
+    Args:
+        idxes (np.ndarray): the indexes to be sorted.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the sorting permutation and its inverse.
+    """
+    order = np.argsort(idxes, kind="stable")
+    inverse_order = np.empty_like(order)
+    inverse_order[order] = np.arange(len(order))
+    return order, inverse_order
+
+
+def _take(array: np.ndarray | MemmapArray | CompressedArray, idxes: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Take the 'idxes' elements of 'array' along its first axis and write them in 'out'.
+    Compressed arrays decompress the elements directly in 'out'."""
+    if isinstance(array, CompressedArray):
+        return array.take(idxes, out=out)
+    return np.take(array, idxes, axis=0, out=out)
+
+
+def _gather(
+    array: np.ndarray | MemmapArray | CompressedArray,
+    flattened_idxes: np.ndarray,
+    order: Tuple[np.ndarray, np.ndarray] | None = None,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Gather the elements of 'array' flattened on its first two dimensions ([buffer_size, n_envs])
+    with a single `np.take`, so that the output is contiguous and already in the requested layout.
+    If 'order' is given, the elements are read following the sorted indexes and
+    then are put back in the original order.
+
+    Args:
+        array (np.ndarray | MemmapArray): the array to gather the elements from.
+        flattened_idxes (np.ndarray): the indexes of the elements to gather in the flattened array.
+        order (Tuple[np.ndarray, np.ndarray], optional): the permutation that sorts 'flattened_idxes'
+            and its inverse, as returned by `_sorting_permutation`.
+            Default to None.
+        out (np.ndarray, optional): the contiguous array where to write the gathered elements.
+            If None, a new array is allocated.
+            Default to None.
+
+    Returns:
+        np.ndarray: the gathered elements, with shape [len(flattened_idxes), *array.shape[2:]].
+    """
+    if isinstance(array, CompressedArray):
+        # The elements are decompressed one by one, so there is no need to read them in order
+        return array.take(flattened_idxes, out=out)
+    flattened_array = np.reshape(array, (-1, *array.shape[2:]))
+    if order is not None:
+        sorting_order, inverse_order = order
+        flattened_array = np.take(flattened_array, flattened_idxes[sorting_order], axis=0)
+        flattened_idxes = inverse_order
+    return np.take(flattened_array, flattened_idxes, axis=0, out=out)
+
+
 def get_tensor(
     array: np.ndarray | MemmapArray,
     dtype: Optional[torch.dtype] = None,
@@ -1155,6 +2319,8 @@ def get_tensor(
 ) -> Tensor:
     if isinstance(array, MemmapArray):
         array = array.array
+    elif isinstance(array, CompressedArray):
+        array = np.asarray(array)
     if clone:
         array = array.copy()
     if from_numpy:
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import copy
+import os
+import threading
+import weakref
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from sheeprl.data.buffers import EnvIndependentReplayBuffer, ReplayBuffer
+from sheeprl.utils.memmap import MemmapArray
+
+
+class BufferSnapshot:
+    def __init__(self, snapshot_dir: str | os.PathLike):
+        """An incremental snapshot of a replay buffer, kept in memory-mapped files, so that the buffer
+        can be checkpointed without pickling its content.
+
+        Every call of the 'save' method copies into the snapshot files only the elements added to the buffer
+        since the previous call (all the elements added so far the first time, the whole array when the array
+        of a key is replaced), then flushes the files to disk in a background thread, so that the training
+        can go on in the meantime. The 'save' method returns a shallow copy of the buffer whose arrays are
+        the snapshot files: pickling it records only the paths of the files, the write position and
+        the other small attributes of the buffer, so it can be put in the checkpoint in place of the buffer itself.
+        When the checkpoint is loaded, the snapshot files are mapped again in copy-on-write mode, also if
+        the snapshotted buffer was memory-mapped: the loaded buffer keeps its modifications in RAM and never
+        writes into the files of the checkpoint it was loaded from.
+        The file of a replaced array is removed only once it is unmapped, i.e. when the buffers
+        of the previous snapshots backed by it are garbage collected.
+
+        Since the snapshot files are updated in place, only the checkpoint saved last
+        has a buffer consistent with the snapshot files.
+
+        Args:
+            snapshot_dir (str | os.PathLike): the directory of the snapshot files.
+        """
+        self._snapshot_dir = Path(snapshot_dir)
+        self._arrays: Dict[Tuple[int, str], MemmapArray] = {}
+        self._sources: Dict[Tuple[int, str], weakref.ref] = {}
+        self._n_added: Dict[int, int] = {}
+        self._flush_thread: threading.Thread | None = None
+
+    @property
+    def snapshot_dir(self) -> Path:
+        return self._snapshot_dir
+
+    def wait(self) -> None:
+        """Wait for the files of the last snapshot to be flushed to disk."""
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+
+    def save(self, rb: ReplayBuffer | EnvIndependentReplayBuffer) -> ReplayBuffer | EnvIndependentReplayBuffer:
+        """Update the snapshot with the elements added to the buffer since the last call and start
+        flushing the snapshot files to disk in background.
+
+        Args:
+            rb (ReplayBuffer | EnvIndependentReplayBuffer): the buffer to snapshot.
+
+        Returns:
+            ReplayBuffer | EnvIndependentReplayBuffer: a copy of the buffer backed by the snapshot files.
+        """
+        if not isinstance(rb, (ReplayBuffer, EnvIndependentReplayBuffer)):
+            raise TypeError(
+                f"Only the 'ReplayBuffer' and the 'EnvIndependentReplayBuffer' can be snapshotted, got: {type(rb)}"
+            )
+        # The files of the previous snapshot must not be flushed while they are updated
+        self.wait()
+        if isinstance(rb, EnvIndependentReplayBuffer):
+            snapshot = copy.copy(rb)
+            snapshot._buf = [self._save_buffer(i, b, self._snapshot_dir / f"env_{i}") for i, b in enumerate(rb.buffer)]
+        else:
+            snapshot = self._save_buffer(0, rb, self._snapshot_dir)
+        arrays = list(self._arrays.values())
+        self._flush_thread = threading.Thread(target=_flush, args=(arrays,), name="buffer-snapshot-flush")
+        self._flush_thread.start()
+        return snapshot
+
+    def _save_buffer(self, buffer_idx: int, rb: ReplayBuffer, snapshot_dir: Path) -> ReplayBuffer:
+        snapshot = copy.copy(rb)
+        if rb.empty:
+            return snapshot
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        # The element preceding the new ones is copied again, since its 'dones' could have been
+        # set to True by the checkpoint callback, when the previous snapshot was saved
+        n_new = rb._n_added - self._n_added.get(buffer_idx, 0) + 1
+        self._n_added[buffer_idx] = rb._n_added
+        snapshot._buf = {}
+        for k, v in rb.buffer.items():
+            if not isinstance(v, (np.ndarray, MemmapArray)):
+                # e.g. the compressed arrays, which are pickled with the checkpoint
+                snapshot._buf[k] = v
+                continue
+            key = (buffer_idx, k)
+            array = self._arrays.get(key, None)
+            if array is None:
+                # The first snapshot of the key: copy all the elements added so far
+                array = self._new_array(key, v, snapshot_dir)
+                _copy_last_elements(v, array, rb._pos, min(rb._n_added, rb.buffer_size))
+            elif self._sources[key]() is not v or array.shape != v.shape or array.dtype != v.dtype:
+                # The array of the key has been replaced: copy it entirely. The file of the previous array
+                # can still be mapped by the buffers of the previous snapshots: it is removed once unmapped
+                weakref.finalize(array.array._mmap, array.filename.unlink, missing_ok=True)
+                del self._arrays[key], array
+                array = self._new_array(key, v, snapshot_dir)
+                array[:] = v[:]
+            else:
+                _copy_last_elements(v, array, rb._pos, min(n_new, rb.buffer_size))
+            snapshot._buf[k] = _remap(array, mode="c")
+        return snapshot
+
+    def _new_array(self, key: Tuple[int, str], src: np.ndarray | MemmapArray, snapshot_dir: Path) -> MemmapArray:
+        """Create the snapshot file of the 'src' array of the key. The files already in the snapshot directory
+        are never overwritten, since they could be still mapped."""
+        filename, version = snapshot_dir / f"{key[1]}.memmap", 0
+        while filename.exists():
+            version += 1
+            filename = snapshot_dir / f"{key[1]}_{version}.memmap"
+        array = MemmapArray(filename=filename, dtype=src.dtype, shape=src.shape, mode="r+")
+        self._arrays[key] = array
+        self._sources[key] = weakref.ref(src)
+        return array
+
+
+def _copy_last_elements(src: np.ndarray | MemmapArray, dst: MemmapArray, pos: int, n_elements: int) -> None:
+    """Copy the 'n_elements' elements preceding the 'pos' position (modulo the buffer size) from 'src' to 'dst',
+    with at most two contiguous slices."""
+    start = (pos - n_elements) % len(dst)
+    first_chunk = min(n_elements, len(dst) - start)
+    dst[start : start + first_chunk] = src[start : start + first_chunk]
+    if first_chunk < n_elements:
+        dst[: n_elements - first_chunk] = src[: n_elements - first_chunk]
+
+
+def _remap(array: MemmapArray, mode: str) -> MemmapArray:
+    """A view of the memory-mapped 'array' that does not own its file and is mapped in 'mode' when unpickled.
+    In this process, the view shares the mapping of 'array', so that the file is unmapped when both are gone."""
+    remapped = copy.copy(array)
+    remapped._file = array.file
+    remapped._array = array.array
+    remapped._has_ownership = False
+    remapped._mode = mode
+    return remapped
+
+
+def _flush(arrays: List[MemmapArray]) -> None:
+    for array in arrays:
+        array.array.flush()
@@ -151,6 +151,7 @@ class DMCWrapper(gym.Wrapper):
         # state space
         self._state_space = _spec_to_box(self.env.observation_spec().values(), np.float64)
         self.current_state = None
+        self._time_step = None
         # render
         self._render_mode: str = "rgb_array"
         # metadata
@@ -211,24 +212,33 @@ class DMCWrapper(gym.Wrapper):
     def step(
         self, action: Any
     ) -> Tuple[Union[Dict[str, np.ndarray], np.ndarray], SupportsFloat, bool, bool, Dict[str, Any]]:
+        reward, done, truncated, extra = self.step_without_obs(action)
+        return self.observe(), reward, done, truncated, extra
+
+    def step_without_obs(self, action: Any) -> Tuple[SupportsFloat, bool, bool, Dict[str, Any]]:
+        """Step the environment without computing the observation, i.e. without rendering the frame.
+        It is used by the `ActionRepeat` wrapper for the intermediate steps, whose observations are discarded.
+        """
         action = self._convert_action(action)
-        time_step = self.env.step(action)
-        reward = time_step.reward or 0.0
-        done = time_step.last()
-        obs = self._get_obs(time_step)
-        self.current_state = _flatten_obs(time_step.observation)
+        self._time_step = self.env.step(action)
+        reward = self._time_step.reward or 0.0
+        done = self._time_step.last()
+        self.current_state = _flatten_obs(self._time_step.observation)
         extra = {}
-        extra["discount"] = time_step.discount
+        extra["discount"] = self._time_step.discount
         extra["internal_state"] = self.env.physics.get_state().copy()
-        return obs, reward, done, False, extra
+        return reward, done, False, extra
+
+    def observe(self) -> Dict[str, np.ndarray]:
+        """The observation of the current state of the environment."""
+        return self._get_obs(self._time_step)
 
     def reset(
         self, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None
     ) -> Tuple[Union[Dict[str, np.ndarray], np.ndarray], Dict[str, Any]]:
-        time_step = self.env.reset()
-        self.current_state = _flatten_obs(time_step.observation)
-        obs = self._get_obs(time_step)
-        return obs, {}
+        self._time_step = self.env.reset()
+        self.current_state = _flatten_obs(self._time_step.observation)
+        return self.observe(), {}
 
     def render(self, camera_id: Optional[int] = None) -> np.ndarray:
         return self.env.physics.render(height=self._height, width=self._width, camera_id=camera_id or self._camera_id)
@@ -0,0 +1,353 @@
+"""Observation perturbations to evaluate the robustness of the agents.
+
+The perturbations are applied to whole batches of observations at once, so that they can be used both inside
+an environment (e.g. by the 'OCAtariWrapper', on a single observation) and on the observations recorded in a
+replay buffer or in an episode file: in the latter case every perturbation setting can be scored
+against the same recorded rollouts in a single vectorized pass, instead of re-running the environments once
+for every setting. This module does not depend on OCAtari, so it can be used where OCAtari is not installed.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Sequence
+
+import numpy as np
+import torch
+
+from sheeprl.data.buffers import EnvIndependentReplayBuffer, EpisodeBuffer, ReplayBuffer
+
+OBJ_SIZE = 2
+NOISE_SCALE = 2
+FRAME_NOISE_SCALE = 8
+
+
+# ENUM perturbation cateogry
+class Perturbation:
+    NONE = 0
+    NOISE = 1
+    OCCLUSION = 2
+    FALSE_POSITIVE = 3
+    NOISE_OCCLUSION = 4
+    NOISE_FALSE_POSITIVE = 5
+    OCCLUSION_FALSE_POSITIVE = 6
+    ALL = 7
+
+
+# The perturbation modes that add noise, occlude objects and add a false positive object
+NOISE_PERTURBATIONS = (
+    Perturbation.NOISE,
+    Perturbation.NOISE_OCCLUSION,
+    Perturbation.NOISE_FALSE_POSITIVE,
+    Perturbation.ALL,
+)
+OCCLUSION_PERTURBATIONS = (
+    Perturbation.OCCLUSION,
+    Perturbation.NOISE_OCCLUSION,
+    Perturbation.OCCLUSION_FALSE_POSITIVE,
+    Perturbation.ALL,
+)
+FALSE_POSITIVE_PERTURBATIONS = (
+    Perturbation.FALSE_POSITIVE,
+    Perturbation.NOISE_FALSE_POSITIVE,
+    Perturbation.OCCLUSION_FALSE_POSITIVE,
+    Perturbation.ALL,
+)
+
+
+def _perturbation_masks(perturbation: int | np.ndarray, batch_shape: Sequence[int]) -> Dict[str, np.ndarray]:
+    """The flattened masks of the samples to which the noise, the occlusion and the false positive are applied.
+
+    Args:
+        perturbation (int | np.ndarray): the perturbation mode of every sample, aligned with
+            the leading dimensions of 'batch_shape' and broadcasted to the remaining ones.
+        batch_shape (Sequence[int]): the batch dimensions of the observations.
+
+    Returns:
+        Dict[str, np.ndarray]: the boolean masks of shape [prod(batch_shape)].
+    """
+    perturbation = np.asarray(perturbation)
+    if perturbation.ndim > len(batch_shape):
+        raise ValueError(
+            f"The perturbation has shape {perturbation.shape}, "
+            f"which is not compatible with the batch dimensions {tuple(batch_shape)}"
+        )
+    if np.any((perturbation < Perturbation.NONE) | (perturbation > Perturbation.ALL)):
+        raise ValueError(
+            f"Invalid perturbation {perturbation}\n "
+            "Choose 0 for no perturbation, 1 for noise, 2 for occlusion, 3 for false positive."
+        )
+    perturbation = perturbation.reshape(perturbation.shape + (1,) * (len(batch_shape) - perturbation.ndim))
+    perturbation = np.broadcast_to(perturbation, batch_shape).reshape(-1)
+    return {
+        "noise": np.isin(perturbation, NOISE_PERTURBATIONS),
+        "occlusion": np.isin(perturbation, OCCLUSION_PERTURBATIONS),
+        "false_positive": np.isin(perturbation, FALSE_POSITIVE_PERTURBATIONS),
+    }
+
+
+def perturb_objects(
+    objects: np.ndarray,
+    perturbation: int | np.ndarray,
+    rng: np.random.Generator,
+    noise_scale: float = NOISE_SCALE,
+) -> np.ndarray:
+    """Perturb a batch of object vectors, i.e. of (x, y) positions of the objects, one slot per object.
+    The noise is added only to the positions of the detected objects (the non-zero ones),
+    the occlusion zeroes out the positions of a random number of objects (less than a third of the slots)
+    and the false positive adds an object with a random position in the first empty slot.
+
+    Args:
+        objects (np.ndarray): the uint8 object vectors, with shape [..., n_slots * OBJ_SIZE].
+        perturbation (int | np.ndarray): the perturbation mode (see 'Perturbation'). If an array, then it is
+            the perturbation mode of every vector, aligned with the leading dimensions of 'objects',
+            e.g. with shape [P] to apply P perturbation modes to objects with shape [P, N, n_slots * OBJ_SIZE].
+        rng (np.random.Generator): the generator of the perturbations.
+        noise_scale (float): the standard deviation of the noise.
+            Default to NOISE_SCALE.
+
+    Returns:
+        np.ndarray: the perturbed object vectors, always a new array.
+    """
+    batch_shape = objects.shape[:-1]
+    masks = _perturbation_masks(perturbation, batch_shape)
+    obj = np.array(objects, dtype=np.uint8).reshape(-1, objects.shape[-1])
+    if masks["noise"].any():
+        noise = rng.normal(0, noise_scale, obj.shape)
+        noisy = np.clip(obj + noise, 0, 255).astype(np.uint8)
+        obj = np.where(masks["noise"][:, None] & (obj != 0), noisy, obj)
+    slots = obj.reshape(len(obj), -1, OBJ_SIZE)
+    n_slots = slots.shape[1]
+    max_occlusions = n_slots // 3
+    if masks["occlusion"].any() and max_occlusions > 0:
+        # A uniformly random subset of 'num_occlusions' slots: the ones with the lowest random keys
+        num_occlusions = rng.integers(0, max_occlusions, len(slots))
+        ranks = rng.random((len(slots), n_slots)).argsort(axis=1).argsort(axis=1)
+        occluded = masks["occlusion"][:, None] & (ranks < num_occlusions[:, None])
+        slots[occluded] = 0
+    if masks["false_positive"].any():
+        empty_slots = ~slots.any(axis=-1)
+        idxes = np.flatnonzero(masks["false_positive"] & empty_slots.any(axis=-1))
+        positions = rng.integers(0, 255, (len(idxes), OBJ_SIZE), dtype=np.uint8)
+        slots[idxes, empty_slots[idxes].argmax(axis=-1)] = positions
+    return obj.reshape(objects.shape)
+
+
+def _random_patches(
+    n: int, height: int, width: int, max_height: int, max_width: int, rng: np.random.Generator
+) -> np.ndarray:
+    """The masks of 'n' rectangles with random sizes (at most 'max_height' x 'max_width') and positions.
+
+    Returns:
+        np.ndarray: the boolean masks of shape [n, height, width].
+    """
+    h = rng.integers(1, max(max_height, 1) + 1, n)
+    w = rng.integers(1, max(max_width, 1) + 1, n)
+    y = rng.integers(0, height - h + 1)
+    x = rng.integers(0, width - w + 1)
+    rows = np.arange(height)
+    cols = np.arange(width)
+    rows_mask = (rows >= y[:, None]) & (rows < (y + h)[:, None])
+    cols_mask = (cols >= x[:, None]) & (cols < (x + w)[:, None])
+    return rows_mask[:, :, None] & cols_mask[:, None, :]
+
+
+def perturb_frames(
+    frames: np.ndarray,
+    perturbation: int | np.ndarray,
+    rng: np.random.Generator,
+    noise_scale: float = FRAME_NOISE_SCALE,
+) -> np.ndarray:
+    """Perturb a batch of channel-first frames, the pixel counterpart of `perturb_objects`:
+    the noise is added to every pixel, the occlusion zeroes out a random rectangle
+    (at most a third of the height and of the width of the frame) and the false positive draws a rectangle
+    of a random color (at most a tenth of the height and of the width of the frame), like a fake object.
+
+    Args:
+        frames (np.ndarray): the uint8 frames, with shape [..., C, H, W].
+        perturbation (int | np.ndarray): the perturbation mode (see 'Perturbation'). If an array, then it is
+            the perturbation mode of every frame, aligned with the leading dimensions of 'frames'.
+        rng (np.random.Generator): the generator of the perturbations.
+        noise_scale (float): the standard deviation of the noise.
+            Default to FRAME_NOISE_SCALE.
+
+    Returns:
+        np.ndarray: the perturbed frames, always a new array.
+    """
+    if frames.ndim < 3:
+        raise ValueError(f"The frames must have shape [..., C, H, W], got {frames.shape}")
+    masks = _perturbation_masks(perturbation, frames.shape[:-3])
+    c, height, width = frames.shape[-3:]
+    out = np.array(frames, dtype=np.uint8).reshape(-1, c, height, width)
+    if masks["noise"].any():
+        idxes = np.flatnonzero(masks["noise"])
+        noise = rng.standard_normal((len(idxes), c, height, width), dtype=np.float32) * noise_scale
+        out[idxes] = np.clip(out[idxes] + noise, 0, 255).astype(np.uint8)
+    if masks["occlusion"].any():
+        idxes = np.flatnonzero(masks["occlusion"])
+        occluded = _random_patches(len(idxes), height, width, height // 3, width // 3, rng)
+        out[idxes] = np.where(occluded[:, None], 0, out[idxes])
+    if masks["false_positive"].any():
+        idxes = np.flatnonzero(masks["false_positive"])
+        patches = _random_patches(len(idxes), height, width, height // 10, width // 10, rng)
+        colors = rng.integers(0, 255, (len(idxes), c, 1, 1), dtype=np.uint8)
+        out[idxes] = np.where(patches[:, None], colors, out[idxes])
+    return out.reshape(frames.shape)
+
+
+def perturb_observations(
+    obs: Dict[str, np.ndarray],
+    perturbation: int | np.ndarray,
+    rng: np.random.Generator,
+    objects_keys: Sequence[str] = ("objects_position",),
+    rgb_keys: Sequence[str] = ("rgb",),
+) -> Dict[str, np.ndarray]:
+    """Perturb a batch of observations: the 'objects_keys' with `perturb_objects` and
+    the 'rgb_keys' with `perturb_frames`. The other keys are returned as they are.
+
+    Args:
+        obs (Dict[str, np.ndarray]): the batch of observations.
+        perturbation (int | np.ndarray): the perturbation mode (see 'Perturbation'). If an array, then it is
+            the perturbation mode of every observation, aligned with the leading dimensions of the observations.
+        rng (np.random.Generator): the generator of the perturbations.
+        objects_keys (Sequence[str]): the keys of the object vectors.
+            Default to ("objects_position",).
+        rgb_keys (Sequence[str]): the keys of the frames.
+            Default to ("rgb",).
+
+    Returns:
+        Dict[str, np.ndarray]: the perturbed observations.
+    """
+    perturbed = dict(obs)
+    for k in objects_keys:
+        if k in obs:
+            perturbed[k] = perturb_objects(obs[k], perturbation, rng)
+    for k in rgb_keys:
+        if k in obs:
+            perturbed[k] = perturb_frames(obs[k], perturbation, rng)
+    return perturbed
+
+
+def sweep_perturbations(
+    obs: Dict[str, np.ndarray],
+    perturbations: Sequence[int],
+    rng: np.random.Generator,
+    objects_keys: Sequence[str] = ("objects_position",),
+    rgb_keys: Sequence[str] = ("rgb",),
+) -> Dict[str, np.ndarray]:
+    """Apply every perturbation mode in 'perturbations' to the same batch of observations in a single pass.
+
+    Args:
+        obs (Dict[str, np.ndarray]): the batch of observations, with shape [N, ...].
+        perturbations (Sequence[int]): the P perturbation modes to apply.
+        rng (np.random.Generator): the generator of the perturbations.
+        objects_keys (Sequence[str]): the keys of the object vectors.
+            Default to ("objects_position",).
+        rgb_keys (Sequence[str]): the keys of the frames.
+            Default to ("rgb",).
+
+    Returns:
+        Dict[str, np.ndarray]: the perturbed observations, with shape [P, N, ...]: the i-th element
+            of the first dimension is perturbed with 'perturbations[i]'.
+            The keys that are not perturbed are read-only views of the original observations.
+    """
+    perturbations = np.asarray(perturbations)
+    if perturbations.ndim != 1:
+        raise ValueError(f"'perturbations' must be a sequence of perturbation modes, got {perturbations}")
+    swept = {k: np.broadcast_to(v, (len(perturbations), *v.shape)) for k, v in obs.items()}
+    return perturb_observations(swept, perturbations, rng, objects_keys=objects_keys, rgb_keys=rgb_keys)
+
+
+def score_perturbations(
+    obs: Dict[str, np.ndarray],
+    score_fn: Callable[[Dict[str, np.ndarray]], Any],
+    perturbations: Sequence[int] = tuple(range(Perturbation.ALL + 1)),
+    seed: int | None = None,
+    objects_keys: Sequence[str] = ("objects_position",),
+    rgb_keys: Sequence[str] = ("rgb",),
+) -> Dict[int, float]:
+    """Score every perturbation mode against the same recorded observations: the observations are perturbed with
+    all the modes at once (see `sweep_perturbations`) and 'score_fn' is called only once on the whole batch.
+
+    Args:
+        obs (Dict[str, np.ndarray]): the recorded observations, with shape [N, ...],
+            e.g. the ones returned by `load_recorded_observations`.
+        score_fn (Callable[[Dict[str, np.ndarray]], Any]): the function that scores the observations:
+            it receives a batch of P * N observations and returns the P * N scores,
+            e.g. the reconstruction error of the world model or the agreement of the actions
+            of the agent with the ones it takes on the unperturbed observations.
+        perturbations (Sequence[int]): the P perturbation modes to score.
+            Default to all the modes.
+        seed (int, optional): the seed of the perturbations.
+            Default to None.
+        objects_keys (Sequence[str]): the keys of the object vectors.
+            Default to ("objects_position",).
+        rgb_keys (Sequence[str]): the keys of the frames.
+            Default to ("rgb",).
+
+    Returns:
+        Dict[int, float]: the mean score of every perturbation mode.
+    """
+    rng = np.random.default_rng(seed)
+    swept = sweep_perturbations(obs, perturbations, rng, objects_keys=objects_keys, rgb_keys=rgb_keys)
+    scores = score_fn({k: v.reshape(-1, *v.shape[2:]) for k, v in swept.items()})
+    if isinstance(scores, torch.Tensor):
+        scores = scores.detach().cpu().numpy()
+    scores = np.asarray(scores, dtype=np.float64).reshape(len(perturbations), -1)
+    return {int(p): float(s) for p, s in zip(perturbations, scores.mean(axis=1))}
+
+
+def _buffer_observations(
+    rb: ReplayBuffer | EnvIndependentReplayBuffer | EpisodeBuffer, keys: Sequence[str] | None
+) -> Dict[str, np.ndarray] | None:
+    """The observations stored in 'rb', flattened in a single batch dimension, or None if 'rb' is empty."""
+    if isinstance(rb, EnvIndependentReplayBuffer):
+        buffers = [_buffer_observations(b, keys) for b in rb.buffer if not b.empty]
+        if len(buffers) == 0:
+            return None
+        return {k: np.concatenate([b[k] for b in buffers]) for k in buffers[0]}
+    if isinstance(rb, EpisodeBuffer):
+        if len(rb.buffer) == 0:
+            return None
+        keys = [k for k in (keys if keys is not None else rb.buffer[0].keys()) if k in rb.buffer[0]]
+        return {k: np.concatenate([np.asarray(ep[k]) for ep in rb.buffer]) for k in keys}
+    if rb.empty:
+        return None
+    n = rb.buffer_size if rb.full else rb._pos
+    keys = [k for k in (keys if keys is not None else rb.buffer.keys()) if k in rb.buffer]
+    obs = {k: np.asarray(rb[k])[:n] for k in keys}
+    # The steps of all the environments, flattened in a single batch dimension
+    return {k: v.reshape(-1, *v.shape[2:]) for k, v in obs.items()}
+
+
+def load_recorded_observations(path: str | os.PathLike, keys: Sequence[str] | None = None) -> Dict[str, np.ndarray]:
+    """Load the observations recorded in an episode file or in the replay buffer of a checkpoint.
+
+    Args:
+        path (str | os.PathLike): the path of the episode file (a '.npz' file with an array for every key)
+            or of a checkpoint saved with the replay buffer (i.e. with `buffer.checkpoint=True`).
+        keys (Sequence[str], optional): the keys to load. If None, then all the keys are loaded.
+            Default to None.
+
+    Returns:
+        Dict[str, np.ndarray]: the recorded observations, with the steps of all the environments
+            (or of all the episodes) flattened in the first dimension.
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        with np.load(path) as data:
+            keys = keys if keys is not None else list(data.keys())
+            return {k: data[k] for k in keys}
+    state = torch.load(path, map_location="cpu", weights_only=False)
+    if state.get("rb", None) is None:
+        raise ValueError(f"The checkpoint '{path}' has no replay buffer: save it with `buffer.checkpoint=True`")
+    rbs = state["rb"] if isinstance(state["rb"], list) else [state["rb"]]
+    obs = [_buffer_observations(rb, keys) for rb in rbs]
+    obs = [o for o in obs if o is not None]
+    if len(obs) == 0:
+        raise ValueError(f"The replay buffer of the checkpoint '{path}' is empty")
+    missing_keys = set(keys or ()) - set(obs[0].keys())
+    if len(missing_keys) > 0:
+        raise ValueError(f"The keys {sorted(missing_keys)} are not in the replay buffer of the checkpoint '{path}'")
+    return {k: np.concatenate([o[k] for o in obs]) for k in obs[0].keys()}
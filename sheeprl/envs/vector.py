@@ -0,0 +1,454 @@
+import multiprocessing as mp
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import gymnasium as gym
+import numpy as np
+from gymnasium.error import AlreadyPendingCallError, NoAsyncCallError
+from gymnasium.vector.async_vector_env import AsyncState
+from gymnasium.vector.utils import (
+    CloudpickleWrapper,
+    batch_space,
+    clear_mpi_env_vars,
+    create_shared_memory,
+    iterate,
+    read_from_shared_memory,
+    write_to_shared_memory,
+)
+
+
+def _map_structure(fn: Callable[[np.ndarray], np.ndarray], obs: Any) -> Any:
+    """Apply 'fn' to every array of a (possibly nested) observation."""
+    if isinstance(obs, dict):
+        return type(obs)((k, _map_structure(fn, v)) for k, v in obs.items())
+    if isinstance(obs, tuple):
+        return tuple(_map_structure(fn, v) for v in obs)
+    return fn(obs)
+
+
+def _select_info(infos: Dict[str, Any], n: int) -> Dict[str, Any]:
+    """Keep the first 'n' elements of the (possibly nested) info arrays."""
+    return {k: _select_info(v, n) if isinstance(v, dict) else v[:n] for k, v in infos.items()}
+
+
+def _shared_memory_worker(
+    index: int,
+    env_fn: CloudpickleWrapper,
+    pipe: mp.connection.Connection,
+    parent_pipe: mp.connection.Connection,
+    shared_memory: Tuple[Any, Any],
+    error_queue: mp.Queue,
+) -> None:
+    """The worker of the `SharedMemoryVectorEnv`: the commands 'reset' and 'step' carry the position
+    where to write the observation (and the final observation, when the episode ends) in shared memory."""
+    observations_memory, final_observations_memory = shared_memory
+    env = env_fn()
+    observation_space = env.observation_space
+    parent_pipe.close()
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == "reset":
+                kwargs, position = data
+                observation, info = env.reset(**kwargs)
+                write_to_shared_memory(observation_space, position, observation, observations_memory)
+                pipe.send(((None, info), True))
+            elif command == "step":
+                action, position = data
+                observation, reward, terminated, truncated, info = env.step(action)
+                if terminated or truncated:
+                    write_to_shared_memory(observation_space, position, observation, final_observations_memory)
+                    old_info = info
+                    observation, info = env.reset()
+                    # The final observation is read from shared memory by the main process
+                    info["final_observation"] = None
+                    info["final_info"] = old_info
+                write_to_shared_memory(observation_space, position, observation, observations_memory)
+                pipe.send(((None, reward, terminated, truncated, info), True))
+            elif command == "close":
+                pipe.send((None, True))
+                break
+            elif command == "_call":
+                name, args, kwargs = data
+                if name in ["reset", "step", "seed", "close"]:
+                    raise ValueError(f"Trying to call function `{name}` with `_call`. Use `{name}` directly instead.")
+                function = getattr(env, name)
+                if callable(function):
+                    pipe.send((function(*args, **kwargs), True))
+                else:
+                    pipe.send((function, True))
+            elif command == "_setattr":
+                name, value = data
+                setattr(env, name, value)
+                pipe.send((None, True))
+            elif command == "_check_spaces":
+                pipe.send(((data[0] == observation_space, data[1] == env.action_space), True))
+            else:
+                raise RuntimeError(
+                    f"Received unknown command `{command}`. Must be one of "
+                    "{`reset`, `step`, `close`, `_call`, `_setattr`, `_check_spaces`}."
+                )
+    except (KeyboardInterrupt, Exception):
+        error_queue.put((index,) + sys.exc_info()[:2])
+        pipe.send((None, False))
+    finally:
+        env.close()
+
+
+class SharedMemoryVectorEnv(gym.vector.AsyncVectorEnv):
+    def __init__(
+        self,
+        env_fns: Sequence[Callable[[], gym.Env]],
+        observation_space: Optional[gym.Space] = None,
+        action_space: Optional[gym.Space] = None,
+        context: Optional[str] = None,
+        daemon: bool = True,
+    ):
+        """An asynchronous vectorized environment whose observations are never copied nor pickled:
+        every worker writes its observations directly into its slot of shared-memory arrays, one for every
+        observation key, and the main process receives views of those arrays.
+        The final observations of the terminated episodes are written into other shared-memory arrays
+        as well, so `infos["final_observation"]` contains views instead of the pickled observations.
+
+        The shared-memory arrays are double-buffered: the observations returned by a step (or reset)
+        are overwritten by the ones of the step after the next one, so they must be copied if they
+        have to be kept longer.
+
+        Args:
+            env_fns (Sequence[Callable[[], gym.Env]]): the functions creating the environments.
+            observation_space (gym.Space, optional): the observation space of a single environment.
+                If None, then the observation space of the first environment is taken.
+                Default to None.
+            action_space (gym.Space, optional): the action space of a single environment.
+                If None, then the action space of the first environment is taken.
+                Default to None.
+            context (str, optional): the context of `multiprocessing`. If None, then the default context is used.
+                Default to None.
+            daemon (bool): whether the worker processes are daemonic. Default to True.
+        """
+        ctx = mp.get_context(context)
+        self.env_fns = env_fns
+        self.shared_memory = True
+        self.copy = False
+        dummy_env = env_fns[0]()
+        self.metadata = dummy_env.metadata
+        observation_space = observation_space or dummy_env.observation_space
+        action_space = action_space or dummy_env.action_space
+        dummy_env.close()
+        del dummy_env
+        gym.vector.VectorEnv.__init__(
+            self, num_envs=len(env_fns), observation_space=observation_space, action_space=action_space
+        )
+
+        # Two slots of 'num_envs' observations for both the observations and the final observations
+        observations_memory = create_shared_memory(self.single_observation_space, n=2 * self.num_envs, ctx=ctx)
+        final_observations_memory = create_shared_memory(self.single_observation_space, n=2 * self.num_envs, ctx=ctx)
+        self._shared_observations = read_from_shared_memory(
+            self.single_observation_space, observations_memory, 2 * self.num_envs
+        )
+        self._shared_final_observations = read_from_shared_memory(
+            self.single_observation_space, final_observations_memory, 2 * self.num_envs
+        )
+        self._slots = [
+            _map_structure(lambda v, s=slot: v[s * self.num_envs : (s + 1) * self.num_envs], self._shared_observations)
+            for slot in range(2)
+        ]
+        self._final_slots = [
+            [
+                _map_structure(lambda v, i=slot * self.num_envs + env_idx: v[i], self._shared_final_observations)
+                for env_idx in range(self.num_envs)
+            ]
+            for slot in range(2)
+        ]
+        self._slot = 0
+        self.observations = self._slots[self._slot]
+
+        self.parent_pipes, self.processes = [], []
+        self.error_queue = ctx.Queue()
+        with clear_mpi_env_vars():
+            for idx, env_fn in enumerate(self.env_fns):
+                parent_pipe, child_pipe = ctx.Pipe()
+                process = ctx.Process(
+                    target=_shared_memory_worker,
+                    name=f"Worker<{type(self).__name__}>-{idx}",
+                    args=(
+                        idx,
+                        CloudpickleWrapper(env_fn),
+                        child_pipe,
+                        parent_pipe,
+                        (observations_memory, final_observations_memory),
+                        self.error_queue,
+                    ),
+                )
+                self.parent_pipes.append(parent_pipe)
+                self.processes.append(process)
+                process.daemon = daemon
+                process.start()
+                child_pipe.close()
+
+        self._state = AsyncState.DEFAULT
+        self._check_spaces()
+
+    def _next_slot(self) -> int:
+        self._slot = 1 - self._slot
+        return self._slot
+
+    def reset_async(self, seed: Optional[Union[int, List[int]]] = None, options: Optional[dict] = None) -> None:
+        self._assert_is_running()
+        if seed is None:
+            seed = [None for _ in range(self.num_envs)]
+        if isinstance(seed, int):
+            seed = [seed + i for i in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+        if self._state != AsyncState.DEFAULT:
+            raise AlreadyPendingCallError(
+                f"Calling `reset_async` while waiting for a pending call to `{self._state.value}` to complete",
+                self._state.value,
+            )
+        slot = self._next_slot()
+        for i, (pipe, single_seed) in enumerate(zip(self.parent_pipes, seed)):
+            single_kwargs = {}
+            if single_seed is not None:
+                single_kwargs["seed"] = single_seed
+            if options is not None:
+                single_kwargs["options"] = options
+            pipe.send(("reset", (single_kwargs, slot * self.num_envs + i)))
+        self._state = AsyncState.WAITING_RESET
+
+    def reset_wait(
+        self,
+        timeout: Optional[Union[int, float]] = None,
+        seed: Optional[int] = None,
+        options: Optional[dict] = None,
+    ) -> Tuple[Any, Dict[str, Any]]:
+        self._assert_is_running()
+        if self._state != AsyncState.WAITING_RESET:
+            raise NoAsyncCallError(
+                "Calling `reset_wait` without any prior call to `reset_async`.", AsyncState.WAITING_RESET.value
+            )
+        if not self._poll(timeout):
+            self._state = AsyncState.DEFAULT
+            raise mp.TimeoutError(f"The call to `reset_wait` has timed out after {timeout} second(s).")
+        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
+        self._raise_if_errors(successes)
+        self._state = AsyncState.DEFAULT
+        infos = {}
+        for i, (_, info) in enumerate(results):
+            infos = self._add_info(infos, info, i)
+        self.observations = self._slots[self._slot]
+        return self.observations, infos
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._assert_is_running()
+        if self._state != AsyncState.DEFAULT:
+            raise AlreadyPendingCallError(
+                f"Calling `step_async` while waiting for a pending call to `{self._state.value}` to complete.",
+                self._state.value,
+            )
+        slot = self._next_slot()
+        for i, (pipe, action) in enumerate(zip(self.parent_pipes, iterate(self.action_space, actions))):
+            pipe.send(("step", (action, slot * self.num_envs + i)))
+        self._state = AsyncState.WAITING_STEP
+
+    def step_wait(
+        self, timeout: Optional[Union[int, float]] = None
+    ) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+        self._assert_is_running()
+        if self._state != AsyncState.WAITING_STEP:
+            raise NoAsyncCallError(
+                "Calling `step_wait` without any prior call to `step_async`.", AsyncState.WAITING_STEP.value
+            )
+        if not self._poll(timeout):
+            self._state = AsyncState.DEFAULT
+            raise mp.TimeoutError(f"The call to `step_wait` has timed out after {timeout} second(s).")
+        rewards, terminateds, truncateds, infos = [], [], [], {}
+        successes = []
+        for i, pipe in enumerate(self.parent_pipes):
+            result, success = pipe.recv()
+            successes.append(success)
+            if success:
+                _, reward, terminated, truncated, info = result
+                rewards.append(reward)
+                terminateds.append(terminated)
+                truncateds.append(truncated)
+                infos = self._add_info(infos, info, i)
+        self._raise_if_errors(successes)
+        self._state = AsyncState.DEFAULT
+        if "final_observation" in infos:
+            for i in np.flatnonzero(infos["_final_observation"]):
+                infos["final_observation"][i] = self._final_slots[self._slot][i]
+        self.observations = self._slots[self._slot]
+        return (
+            self.observations,
+            np.array(rewards),
+            np.array(terminateds, dtype=np.bool_),
+            np.array(truncateds, dtype=np.bool_),
+            infos,
+        )
+
+
+class AsyncBatchVectorEnv(SharedMemoryVectorEnv):
+    def __init__(
+        self,
+        env_fns: Sequence[Callable[[], gym.Env]],
+        batch_size: int,
+        observation_space: Optional[gym.Space] = None,
+        action_space: Optional[gym.Space] = None,
+        context: Optional[str] = None,
+        daemon: bool = True,
+    ):
+        """An asynchronous vectorized environment stepped in partial batches, like the EnvPool's one:
+        the actions of some environments are sent with the 'send' method, then the 'recv' method returns the
+        results of the first `batch_size` environments that have finished their step, together with their ids,
+        while the other environments keep stepping. In this way the throughput is bound by the average
+        latency of the steps, instead of the one of the slowest environment.
+
+        The observations are transported through shared memory, as in the `SharedMemoryVectorEnv`:
+        the ones returned by 'recv' are gathered into new arrays, while the final observations
+        in `infos["final_observation"]` are views, valid until the step after the next one of their environments.
+        The 'reset' and 'step' methods step all the environments together and can be called
+        only when no environment is stepping asynchronously.
+
+        Args:
+            env_fns (Sequence[Callable[[], gym.Env]]): the functions creating the environments.
+            batch_size (int): the number of environments whose results are returned by 'recv'.
+                It must be in (0, num_envs].
+            observation_space (gym.Space, optional): the observation space of a single environment.
+                If None, then the observation space of the first environment is taken.
+                Default to None.
+            action_space (gym.Space, optional): the action space of a single environment.
+                If None, then the action space of the first environment is taken.
+                Default to None.
+            context (str, optional): the context of `multiprocessing`. If None, then the default context is used.
+                Default to None.
+            daemon (bool): whether the worker processes are daemonic. Default to True.
+        """
+        if batch_size <= 0 or batch_size > len(env_fns):
+            raise ValueError(
+                f"The batch size must be in (0, {len(env_fns)}] (the number of environments), got: {batch_size}"
+            )
+        self.batch_size = batch_size
+        # Whether the environments are stepping and in which slot they write their observations
+        self._pending = np.zeros(len(env_fns), dtype=np.bool_)
+        self._env_slots = np.zeros(len(env_fns), dtype=np.int64)
+        # The 'send' call that has started the last step of every environment, to serve the ready ones in FIFO order
+        self._send_ids = np.zeros(len(env_fns), dtype=np.int64)
+        self._num_sends = 0
+        self._action_spaces: Dict[int, gym.Space] = {}
+        super().__init__(
+            env_fns, observation_space=observation_space, action_space=action_space, context=context, daemon=daemon
+        )
+
+    def _next_slot(self) -> int:
+        if self._pending.any():
+            raise AlreadyPendingCallError(
+                "Calling `reset_async` or `step_async` while some environments are stepping: call `recv` first",
+                "send",
+            )
+        slot = super()._next_slot()
+        self._env_slots[:] = slot
+        return slot
+
+    def send(self, actions: np.ndarray, env_ids: Optional[Sequence[int]] = None) -> None:
+        """Send the actions to the environments, which start stepping asynchronously.
+
+        Args:
+            actions (np.ndarray): the actions of the environments, batched along the first dimension.
+            env_ids (Sequence[int], optional): the ids of the environments to step. They must not be stepping.
+                If None, then all the environments are stepped.
+                Default to None.
+        """
+        self._assert_is_running()
+        if self._state != AsyncState.DEFAULT:
+            raise AlreadyPendingCallError(
+                f"Calling `send` while waiting for a pending call to `{self._state.value}` to complete.",
+                self._state.value,
+            )
+        env_ids = np.arange(self.num_envs) if env_ids is None else np.asarray(env_ids, dtype=np.int64)
+        if self._pending[env_ids].any():
+            raise AlreadyPendingCallError(
+                f"Calling `send` for the environments {env_ids[self._pending[env_ids]].tolist()}, "
+                "which are already stepping: call `recv` first",
+                "send",
+            )
+        if len(env_ids) not in self._action_spaces:
+            self._action_spaces[len(env_ids)] = batch_space(self.single_action_space, len(env_ids))
+        for env_id, action in zip(env_ids, iterate(self._action_spaces[len(env_ids)], actions)):
+            self._env_slots[env_id] = 1 - self._env_slots[env_id]
+            self.parent_pipes[env_id].send(("step", (action, self._env_slots[env_id] * self.num_envs + env_id)))
+            self._pending[env_id] = True
+        self._send_ids[env_ids] = self._num_sends
+        self._num_sends += 1
+
+    def recv(
+        self, timeout: Optional[Union[int, float]] = None
+    ) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray, Dict[str, Any], np.ndarray]:
+        """Wait for `batch_size` environments (or all the stepping ones, if they are fewer)
+        to finish their step and return their results. If more than `batch_size` environments are ready,
+        then the ones that have been waiting the longest, i.e. whose step has been sent first, are returned,
+        so that no environment is starved by the others.
+
+        Args:
+            timeout (int | float, optional): the number of seconds to wait for the environments.
+                If None, then it waits indefinitely.
+                Default to None.
+
+        Returns:
+            The observations, the rewards, the terminated and truncated flags and the infos
+            of the environments, as returned by the 'step' method, and the ids of the environments (sorted).
+        """
+        self._assert_is_running()
+        waiting = {self.parent_pipes[env_id]: env_id for env_id in np.flatnonzero(self._pending)}
+        if len(waiting) == 0:
+            raise NoAsyncCallError("Calling `recv` without any prior call to `send`.", "send")
+        batch_size = min(self.batch_size, len(waiting))
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        ready = []
+        while len(ready) < batch_size:
+            remaining = None if deadline is None else max(deadline - time.perf_counter(), 0)
+            pipes = mp.connection.wait(list(waiting), timeout=remaining)
+            if len(pipes) == 0:
+                raise mp.TimeoutError(f"The call to `recv` has timed out after {timeout} second(s).")
+            ready.extend(waiting.pop(pipe) for pipe in pipes)
+        if len(waiting) > 0:
+            ready.extend(waiting.pop(pipe) for pipe in mp.connection.wait(list(waiting), timeout=0))
+        ready = np.array(ready, dtype=np.int64)
+        env_ids = np.sort(ready[np.lexsort((ready, self._send_ids[ready]))[:batch_size]])
+
+        rewards, terminateds, truncateds, infos = [], [], [], {}
+        successes = [True] * self.num_envs
+        for i, env_id in enumerate(env_ids):
+            result, successes[env_id] = self.parent_pipes[env_id].recv()
+            self._pending[env_id] = False
+            if successes[env_id]:
+                _, reward, terminated, truncated, info = result
+                rewards.append(reward)
+                terminateds.append(terminated)
+                truncateds.append(truncated)
+                infos = self._add_info(infos, info, i)
+        self._raise_if_errors(successes)
+        infos = _select_info(infos, batch_size)
+        if "final_observation" in infos:
+            for i in np.flatnonzero(infos["_final_observation"]):
+                infos["final_observation"][i] = self._final_slots[self._env_slots[env_ids[i]]][env_ids[i]]
+        positions = self._env_slots[env_ids] * self.num_envs + env_ids
+        observations = _map_structure(lambda v: v[positions], self._shared_observations)
+        return (
+            observations,
+            np.array(rewards),
+            np.array(terminateds, dtype=np.bool_),
+            np.array(truncateds, dtype=np.bool_),
+            infos,
+            env_ids,
+        )
+
+    def close_extras(self, timeout: Optional[Union[int, float]] = None, terminate: bool = False) -> None:
+        # The results of the stepping environments are received before closing them
+        if not terminate:
+            try:
+                while self._pending.any():
+                    self.recv(timeout)
+            except mp.TimeoutError:
+                terminate = True
+        super().close_extras(timeout=timeout, terminate=terminate)
@@ -1,8 +1,10 @@
 import copy
+import os
 import time
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Callable, Dict, List, Optional, Sequence, SupportsFloat, Tuple, Union
 
+import cv2
 import gymnasium as gym
 import numpy as np
 from gymnasium.core import Env, RenderFrame
@@ -44,11 +46,37 @@ class MaskVelocityWrapper(gym.ObservationWrapper):
 
 
 class ActionRepeat(gym.Wrapper):
-    def __init__(self, env: gym.Env, amount: int = 1):
+    """Repeat the same action for `amount` steps, summing up the rewards.
+
+    Only the observation of the last step is returned, so the observations of the intermediate steps can be
+    skipped with `skip_obs=True`: in that case the wrapped environment must expose a
+    `step_without_obs(action) -> (reward, done, truncated, info)` method, which steps the environment without
+    computing the observation (e.g. without rendering the frame), and an `observe()` method, which returns the
+    observation of the current state of the environment (used if the episode ends during the intermediate steps).
+
+    Args:
+        env (gym.Env): the environment to wrap.
+        amount (int): the number of times the action is repeated.
+            Default to 1.
+        skip_obs (bool): whether to skip the observations of the intermediate steps.
+            Default to False.
+        max_pool_keys (Sequence[str]): the keys of the observations that are max-pooled over the last two steps,
+            whose observations are always computed.
+            Default to ().
+    """
+
+    def __init__(self, env: gym.Env, amount: int = 1, skip_obs: bool = False, max_pool_keys: Sequence[str] = ()):
         super().__init__(env)
         if amount <= 0:
             raise ValueError("`amount` should be a positive integer")
+        if skip_obs and not (hasattr(env, "step_without_obs") and hasattr(env, "observe")):
+            raise ValueError(
+                f"The environment {env} must expose the `step_without_obs` and `observe` methods "
+                "to skip the observations of the intermediate steps"
+            )
         self._amount = amount
+        self._skip_obs = skip_obs
+        self._max_pool_keys = tuple(max_pool_keys)
 
     @property
     def action_repeat(self) -> int:
@@ -62,15 +90,59 @@ class ActionRepeat(gym.Wrapper):
         truncated = False
         current_step = 0
         total_reward = 0.0
+        # The steps whose observations are computed
+        first_observed_step = self._amount - (2 if self._max_pool_keys else 1) if self._skip_obs else 0
+        obs = prev_obs = None
         while current_step < self._amount and not (done or truncated):
-            obs, reward, done, truncated, info = self.env.step(action)
+            if current_step < first_observed_step:
+                reward, done, truncated, info = self.env.step_without_obs(action)
+                if done or truncated:
+                    obs = self.env.observe()
+            else:
+                if self._max_pool_keys and current_step == self._amount - 1:
+                    prev_obs = obs
+                obs, reward, done, truncated, info = self.env.step(action)
             total_reward += reward
             current_step += 1
+        if prev_obs is not None:
+            obs = {**obs, **{k: np.maximum(prev_obs[k], obs[k]) for k in self._max_pool_keys}}
         return obs, total_reward, done, truncated, info
 
 
 class RestartOnException(gym.Wrapper):
-    def __init__(self, env_fn: Callable[..., gym.Env], exceptions=(Exception,), window=300, maxfails=2, wait=20):
+    """Restart the environment when it raises one of the `exceptions`, for at most `maxfails` times
+    in a `window` of seconds.
+
+    The environment is restarted synchronously, after a `wait` of seconds, unless `hot_spare=True`:
+    in that case a replacement environment is built in a background thread ahead of time and swapped in
+    as soon as the environment crashes, so that slow environments (e.g. MineDojo or MineRL) do not block the
+    whole vector step while they are being rebuilt. The info returned after a restart contains the
+    `restart_on_exception` flag, the `restart_latency` (the seconds needed to swap in the new environment) and
+    the total number of `restarts`.
+
+    Args:
+        env_fn (Callable[..., gym.Env]): the function that builds the environment.
+        exceptions (Union[Type[Exception], Sequence[Type[Exception]]]): the exceptions that trigger a restart.
+            Default to (Exception,).
+        window (float): the window of seconds in which at most `maxfails` restarts are allowed.
+            Default to 300.
+        maxfails (int): the maximum number of restarts allowed in the `window`.
+            Default to 2.
+        wait (float): the seconds to wait before rebuilding the environment, ignored with a hot spare.
+            Default to 20.
+        hot_spare (bool): whether to build the replacement environment in background ahead of time.
+            Default to False.
+    """
+
+    def __init__(
+        self,
+        env_fn: Callable[..., gym.Env],
+        exceptions=(Exception,),
+        window=300,
+        maxfails=2,
+        wait=20,
+        hot_spare: bool = False,
+    ):
         if not isinstance(exceptions, (tuple, list)):
             exceptions = [exceptions]
         self._env_fn = env_fn
@@ -80,24 +152,61 @@ class RestartOnException(gym.Wrapper):
         self._wait = wait
         self._last = time.time()
         self._fails = 0
+        self._restarts = 0
+        self._spare_executor = ThreadPoolExecutor(max_workers=1) if hot_spare else None
+        self._spare = None
         super().__init__(self._env_fn())
+        self._spawn_spare()
+
+    @property
+    def restarts(self) -> int:
+        return self._restarts
+
+    def _spawn_spare(self) -> None:
+        if self._spare_executor is not None:
+            self._spare = self._spare_executor.submit(self._env_fn)
+
+    def _restart(self, e: Exception, where: str) -> Tuple[Any, Dict[str, Any]]:
+        if time.time() > self._last + self._window:
+            self._last = time.time()
+            self._fails = 1
+        else:
+            self._fails += 1
+        if self._fails > self._maxfails:
+            raise RuntimeError(f"The env crashed too many times: {self._fails}")
+        gym.logger.warn(f"{where} - Restarting env after crash with {type(e).__name__}: {e}")
+        tic = time.perf_counter()
+        try:
+            self.env.close()
+        except Exception:
+            pass
+        new_env = None
+        if self._spare is not None:
+            try:
+                new_env = self._spare.result()
+            except Exception as spare_e:
+                gym.logger.warn(f"{where} - The spare env could not be built: {type(spare_e).__name__}: {spare_e}")
+            self._spawn_spare()
+        if new_env is None:
+            time.sleep(self._wait)
+            new_env = self._env_fn()
+        self.env = new_env
+        new_obs, info = self.env.reset()
+        self._restarts += 1
+        info.update(
+            {
+                "restart_on_exception": True,
+                "restart_latency": time.perf_counter() - tic,
+                "restarts": self._restarts,
+            }
+        )
+        return new_obs, info
 
     def step(self, action) -> Tuple[Any, SupportsFloat, bool, bool, Dict[str, Any]]:
         try:
             return self.env.step(action)
         except self._exceptions as e:
-            if time.time() > self._last + self._window:
-                self._last = time.time()
-                self._fails = 1
-            else:
-                self._fails += 1
-            if self._fails > self._maxfails:
-                raise RuntimeError(f"The env crashed too many times: {self._fails}")
-            gym.logger.warn(f"STEP - Restarting env after crash with {type(e).__name__}: {e}")
-            time.sleep(self._wait)
-            self.env = self._env_fn()
-            new_obs, info = self.env.reset()
-            info.update({"restart_on_exception": True})
+            new_obs, info = self._restart(e, "STEP")
             return new_obs, 0.0, False, False, info
 
     def reset(
@@ -106,19 +215,15 @@ class RestartOnException(gym.Wrapper):
         try:
             return self.env.reset(seed=seed, options=options)
         except self._exceptions as e:
-            if time.time() > self._last + self._window:
-                self._last = time.time()
-                self._fails = 1
-            else:
-                self._fails += 1
-            if self._fails > self._maxfails:
-                raise RuntimeError(f"The env crashed too many times: {self._fails}")
-            gym.logger.warn(f"RESET - Restarting env after crash with {type(e).__name__}: {e}")
-            time.sleep(self._wait)
-            self.env = self._env_fn()
-            new_obs, info = self.env.reset()
-            info.update({"restart_on_exception": True})
-            return new_obs, info
+            return self._restart(e, "RESET")
+
+    def close(self):
+        if self._spare_executor is not None:
+            self._spare_executor.shutdown(wait=True)
+            self._spare_executor = None
+            if self._spare.exception() is None:
+                self._spare.result().close()
+        return super().close()
 
 
 class FrameStack(gym.Wrapper):
@@ -146,26 +251,42 @@ class FrameStack(gym.Wrapper):
 
         if self._cnn_keys is None or len(self._cnn_keys) == 0:
             raise RuntimeError("Specify at least one valid cnn key to be stacked")
-        self._frames = {k: deque(maxlen=num_stack * dilation) for k in self._cnn_keys}
+        # The last 'num_stack * dilation' frames of every key are kept in a circular buffer, where '_pos'
+        # is the position of the oldest frame, i.e. the one overwritten by the next frame
+        self._frames = {
+            k: np.empty(
+                (num_stack * dilation, *self.env.observation_space[k].shape), self.env.observation_space[k].dtype
+            )
+            for k in self._cnn_keys
+        }
+        self._pos = 0
+        # The positions in the circular buffer of the stacked frames (from the oldest to the newest),
+        # for every position of the oldest frame
+        self._stack_idxes = (
+            np.arange(num_stack * dilation)[:, None] + np.arange(dilation - 1, num_stack * dilation, dilation)
+        ) % (num_stack * dilation)
 
     def _get_obs(self, key):
-        frames_subset = list(self._frames[key])[self._dilation - 1 :: self._dilation]
-        assert len(frames_subset) == self._num_stack
-        return np.stack(list(frames_subset), axis=0)
+        # The only copy of the frames: the observation never shares the memory with the circular buffer
+        return np.take(self._frames[key], self._stack_idxes[self._pos], axis=0)
 
     def step(self, action: Any) -> Tuple[Any, SupportsFloat, bool, bool, Dict[str, Any]]:
         obs, reward, done, truncated, infos = self.env.step(action)
+        # When a DIAMBRA round, stage or game ends, the stacks are filled with the new frame
+        fill_stack = (
+            "env_domain" in infos
+            and infos["env_domain"] == "DIAMBRA"
+            and len(set(["round_done", "stage_done", "game_done"]).intersection(infos.keys())) == 3
+            and (infos["round_done"] or infos["stage_done"] or infos["game_done"])
+            and not (done or truncated)
+        )
+        for k in self._cnn_keys:
+            if fill_stack:
+                self._frames[k][:] = obs[k]
+            else:
+                self._frames[k][self._pos] = obs[k]
+        self._pos = (self._pos + 1) % (self._num_stack * self._dilation)
         for k in self._cnn_keys:
-            self._frames[k].append(obs[k])
-            if (
-                "env_domain" in infos
-                and infos["env_domain"] == "DIAMBRA"
-                and len(set(["round_done", "stage_done", "game_done"]).intersection(infos.keys())) == 3
-                and (infos["round_done"] or infos["stage_done"] or infos["game_done"])
-                and not (done or truncated)
-            ):
-                for _ in range(self._num_stack * self._dilation - 1):
-                    self._frames[k].append(obs[k])
             obs[k] = self._get_obs(k)
         return obs, reward, done, truncated, infos
 
@@ -173,9 +294,9 @@ class FrameStack(gym.Wrapper):
         self, *, seed: Optional[int] = None, options: Optional[Dict[str, Any]] = None, **kwargs
     ) -> Tuple[Any, Dict[str, Any]]:
         obs, infos = self.env.reset(seed=seed, **kwargs)
-        [self._frames[k].clear() for k in self._cnn_keys]
+        self._pos = 0
         for k in self._cnn_keys:
-            [self._frames[k].append(obs[k]) for _ in range(self._num_stack * self._dilation)]
+            self._frames[k][:] = obs[k]
             obs[k] = self._get_obs(k)
         return obs, infos
 
@@ -251,3 +372,257 @@ class GrayscaleRenderWrapper(gym.Wrapper):
             if len(frame.shape) == 3 and frame.shape[-1] == 1:
                 frame = frame.repeat(3, axis=-1)
         return frame
+
+
+class BatchedPreprocessObservation(gym.vector.VectorEnvWrapper):
+    """It resizes (and converts to grayscale, if required) the pixel observations of all the environments
+    of a vectorized environment at once, after every step, instead of doing it inside every environment.
+    The frames are processed by a pool of threads, since OpenCV releases the GIL, and every frame is written
+    straight into a preallocated output, with the same result of the per-environment preprocessing
+    of `sheeprl.utils.env.make_env`.
+
+    The observations of the `cnn_keys` keys must have shape [num_envs, ..., C, H, W] or [num_envs, ..., H, W, C],
+    where the optional dimensions between the environments and the frame are, for instance, the stacked frames.
+    The preprocessed observations have shape [num_envs, ..., 1 if grayscale else 3, screen_size, screen_size].
+    The output arrays are reused every two steps (or resets), so the observations of a step are overwritten
+    by the ones of the step after the next one: copy them if they must be kept longer.
+    The vectorized environment can be created with `copy=False`, since the raw frames are never returned.
+
+    Args:
+        env (gym.vector.VectorEnv): the vectorized environment to wrap.
+        cnn_keys (Sequence[str]): the keys of the pixel observations.
+        screen_size (int): the size of the preprocessed frames.
+        grayscale (bool): whether to convert the frames to grayscale.
+        num_threads (int, optional): the number of threads preprocessing the frames.
+            If None, then the number of CPUs is used.
+            Default to None.
+    """
+
+    # Number of frames preprocessed by every task submitted to the thread pool
+    _chunk_size: int = 8
+
+    def __init__(
+        self,
+        env: gym.vector.VectorEnv,
+        cnn_keys: Sequence[str],
+        screen_size: int,
+        grayscale: bool,
+        num_threads: Optional[int] = None,
+    ) -> None:
+        super().__init__(env)
+        self.num_envs = env.num_envs
+        self.is_vector_env = True
+        self.single_action_space = env.single_action_space
+        self.action_space = env.action_space
+        self.single_observation_space = copy.deepcopy(env.single_observation_space)
+        self._cnn_keys = tuple(cnn_keys)
+        self._screen_size = screen_size
+        self._grayscale = grayscale
+        self._out_channels = 1 if grayscale else 3
+        self._num_threads = num_threads or os.cpu_count() or 1
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # The shape of the frames and whether their channels come first
+        self._frame_layouts: Dict[str, Tuple[Tuple[int, ...], bool]] = {}
+        for k in self._cnn_keys:
+            shape = env.single_observation_space[k].shape
+            if len(shape) < 3:
+                raise ValueError(f"The '{k}' observations must have at least 3 dimensions, got: {shape}")
+            self._frame_layouts[k] = (shape[-3:], shape[-3] in (1, 3))
+            self.single_observation_space[k] = gym.spaces.Box(
+                0, 255, (*shape[:-3], self._out_channels, screen_size, screen_size), np.uint8
+            )
+        self.observation_space = gym.vector.utils.batch_space(self.single_observation_space, self.num_envs)
+        self._outputs = [self._empty_outputs(self.num_envs) for _ in range(2)]
+        self._next_output = 0
+
+    def _empty_outputs(self, n: int) -> Dict[str, np.ndarray]:
+        return {k: np.empty((n, *self.single_observation_space[k].shape), dtype=np.uint8) for k in self._cnn_keys}
+
+    def _preprocess_frame(self, frame: np.ndarray, out: np.ndarray, channel_first: bool) -> None:
+        if channel_first:
+            frame = frame.transpose(1, 2, 0)
+        if frame.shape[:2] != (self._screen_size, self._screen_size):
+            frame = cv2.resize(frame, (self._screen_size, self._screen_size), interpolation=cv2.INTER_AREA)
+        if frame.ndim == 3 and frame.shape[-1] == 1:
+            frame = frame[..., 0]
+        if frame.ndim == 2:
+            out[:] = frame
+        elif self._grayscale:
+            cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY, dst=out[0])
+        else:
+            out[:] = frame.transpose(2, 0, 1)
+
+    def _preprocess(self, obs: Dict[str, np.ndarray], outputs: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        for k in self._cnn_keys:
+            frame_shape, channel_first = self._frame_layouts[k]
+            frames = np.reshape(obs[k], (-1, *frame_shape))
+            out = outputs[k].reshape(-1, self._out_channels, self._screen_size, self._screen_size)
+
+            def preprocess(start: int, stop: int) -> None:
+                for i in range(start, stop):
+                    self._preprocess_frame(frames[i], out[i], channel_first)
+
+            chunks = [(s, min(s + self._chunk_size, len(frames))) for s in range(0, len(frames), self._chunk_size)]
+            if self._num_threads == 1 or len(chunks) == 1:
+                for start, stop in chunks:
+                    preprocess(start, stop)
+            else:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._num_threads)
+                for future in [self._executor.submit(preprocess, start, stop) for start, stop in chunks]:
+                    future.result()
+            obs[k] = outputs[k]
+        return obs
+
+    def _preprocess_batch(self, obs: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        outputs = self._outputs[self._next_output]
+        self._next_output = 1 - self._next_output
+        # The vectorized environment can return the observations of a subset of the environments
+        n = len(obs[self._cnn_keys[0]])
+        if n != self.num_envs:
+            outputs = {k: v[:n] for k, v in outputs.items()}
+        # The other observations could be views of the buffers of the vectorized environment
+        obs = {k: v if k in self._cnn_keys else np.copy(v) for k, v in obs.items()}
+        return self._preprocess(obs, outputs)
+
+    def _preprocess_final_observations(self, infos: Dict[str, Any]) -> Dict[str, Any]:
+        if "final_observation" in infos:
+            for i in np.flatnonzero(infos["_final_observation"]):
+                final_obs = {k: v[np.newaxis] for k, v in infos["final_observation"][i].items()}
+                final_obs = self._preprocess(final_obs, self._empty_outputs(1))
+                infos["final_observation"][i] = {k: v[0] for k, v in final_obs.items()}
+        return infos
+
+    def reset_wait(self, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+        obs, infos = self.env.reset_wait(**kwargs)
+        return self._preprocess_batch(obs), infos
+
+    def step_wait(self) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+        obs, rewards, terminated, truncated, infos = self.env.step_wait()
+        return self._preprocess_batch(obs), rewards, terminated, truncated, self._preprocess_final_observations(infos)
+
+    def recv(self, **kwargs) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray, Dict[str, Any], np.ndarray]:
+        """Receive the results of a batch of the environments of a `sheeprl.envs.vector.AsyncBatchVectorEnv`
+        and preprocess their observations."""
+        obs, rewards, terminated, truncated, infos, env_ids = self.env.recv(**kwargs)
+        obs = self._preprocess_batch(obs)
+        return obs, rewards, terminated, truncated, self._preprocess_final_observations(infos), env_ids
+
+    def close(self, **kwargs) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        return self.env.close(**kwargs)
+
+
+class BatchedFrameStack(gym.vector.VectorEnvWrapper):
+    """It stacks the pixel observations of all the environments of a vectorized environment,
+    with the same result of wrapping every environment with `FrameStack`. Wrapping a `BatchedPreprocessObservation`,
+    the frames are stacked after they have been preprocessed, so that only the new frame of every environment
+    is preprocessed at every step and the stacks of frames are kept at the preprocessed resolution.
+
+    The stacks are filled with the first frame of every episode: the final observations in
+    `infos["final_observation"]` are stacked too. The environments can be stepped in partial batches,
+    as with the `sheeprl.envs.vector.AsyncBatchVectorEnv`.
+
+    Args:
+        env (gym.vector.VectorEnv): the vectorized environment to wrap.
+        num_stack (int): the number of frames to stack.
+        cnn_keys (Sequence[str]): the keys of the pixel observations, with shape [num_envs, C, H, W].
+        dilation (int, optional): the number of steps between two stacked frames.
+            Default to 1.
+    """
+
+    def __init__(self, env: gym.vector.VectorEnv, num_stack: int, cnn_keys: Sequence[str], dilation: int = 1) -> None:
+        super().__init__(env)
+        if num_stack <= 0:
+            raise ValueError(f"Invalid value for num_stack, expected a value greater than zero, got {num_stack}")
+        if dilation <= 0:
+            raise ValueError(f"The frame stack dilation argument must be greater than zero, got: {dilation}")
+        if len(cnn_keys) == 0:
+            raise RuntimeError("Specify at least one valid cnn key to be stacked")
+        self.num_envs = env.num_envs
+        self.is_vector_env = True
+        self.single_action_space = env.single_action_space
+        self.action_space = env.action_space
+        self.single_observation_space = copy.deepcopy(env.single_observation_space)
+        self._cnn_keys = tuple(cnn_keys)
+        self._num_frames = num_stack * dilation
+        self._frames: Dict[str, np.ndarray] = {}
+        for k in self._cnn_keys:
+            space = env.single_observation_space[k]
+            self.single_observation_space[k] = gym.spaces.Box(
+                np.repeat(space.low[None, ...], num_stack, axis=0),
+                np.repeat(space.high[None, ...], num_stack, axis=0),
+                (num_stack, *space.shape),
+                space.dtype,
+            )
+            self._frames[k] = np.empty((self.num_envs, self._num_frames, *space.shape), space.dtype)
+        self.observation_space = gym.vector.utils.batch_space(self.single_observation_space, self.num_envs)
+        # The position of the oldest frame of every environment in its circular buffer
+        self._pos = np.zeros(self.num_envs, dtype=np.intp)
+        # The positions in the circular buffer of the stacked frames (from the oldest to the newest),
+        # for every position of the oldest frame
+        self._stack_idxes = (
+            np.arange(self._num_frames)[:, None] + np.arange(dilation - 1, self._num_frames, dilation)
+        ) % self._num_frames
+
+    def _get_obs(self, key: str, env_ids: np.ndarray) -> np.ndarray:
+        return self._frames[key][env_ids[:, None], self._stack_idxes[self._pos[env_ids]]]
+
+    def _push(self, obs: Dict[str, np.ndarray], env_ids: np.ndarray) -> None:
+        for k in self._cnn_keys:
+            self._frames[k][env_ids, self._pos[env_ids]] = obs[k]
+        self._pos[env_ids] = (self._pos[env_ids] + 1) % self._num_frames
+
+    def _fill(self, obs: Dict[str, np.ndarray], env_ids: np.ndarray) -> None:
+        for k in self._cnn_keys:
+            self._frames[k][env_ids] = obs[k][:, None]
+        self._pos[env_ids] = 0
+
+    def _stack(
+        self, obs: Dict[str, np.ndarray], dones: np.ndarray, infos: Dict[str, Any], env_ids: np.ndarray
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        if "final_observation" in infos:
+            for i in np.flatnonzero(infos["_final_observation"]):
+                final_obs = dict(infos["final_observation"][i])
+                env_id = env_ids[i : i + 1]
+                self._push({k: final_obs[k][None] for k in self._cnn_keys}, env_id)
+                for k in self._cnn_keys:
+                    final_obs[k] = self._get_obs(k, env_id)[0]
+                infos["final_observation"][i] = final_obs
+        # The stacks are filled with the new frame when an episode starts and
+        # when a DIAMBRA round, stage or game ends
+        fill_stack = np.asarray(dones, dtype=np.bool_)
+        if all(k in infos for k in ("env_domain", "round_done", "stage_done", "game_done")):
+            fill_stack = fill_stack | (
+                (np.asarray(infos["env_domain"]) == "DIAMBRA")
+                & (
+                    np.asarray(infos["round_done"], dtype=np.bool_)
+                    | np.asarray(infos["stage_done"], dtype=np.bool_)
+                    | np.asarray(infos["game_done"], dtype=np.bool_)
+                )
+            )
+        obs = dict(obs)
+        self._push({k: obs[k][~fill_stack] for k in self._cnn_keys}, env_ids[~fill_stack])
+        self._fill({k: obs[k][fill_stack] for k in self._cnn_keys}, env_ids[fill_stack])
+        for k in self._cnn_keys:
+            obs[k] = self._get_obs(k, env_ids)
+        return obs, infos
+
+    def reset_wait(self, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+        obs, infos = self.env.reset_wait(**kwargs)
+        obs, infos = self._stack(obs, np.ones(self.num_envs, dtype=np.bool_), infos, np.arange(self.num_envs))
+        return obs, infos
+
+    def step_wait(self) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+        obs, rewards, terminated, truncated, infos = self.env.step_wait()
+        obs, infos = self._stack(obs, terminated | truncated, infos, np.arange(self.num_envs))
+        return obs, rewards, terminated, truncated, infos
+
+    def recv(self, **kwargs) -> Tuple[Any, np.ndarray, np.ndarray, np.ndarray, Dict[str, Any], np.ndarray]:
+        """Receive the results of a batch of the environments of a `sheeprl.envs.vector.AsyncBatchVectorEnv`
+        and stack their observations."""
+        obs, rewards, terminated, truncated, infos, env_ids = self.env.recv(**kwargs)
+        obs, infos = self._stack(obs, terminated | truncated, infos, env_ids)
+        return obs, rewards, terminated, truncated, infos, env_ids
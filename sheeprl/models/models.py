@@ -327,12 +327,33 @@ class NatureCNN(CNN):
         return x
 
 
+def _layer_norm_gru_gates(x: Tensor, hx: Tensor) -> Tensor:
+    reset, cand, update = torch.chunk(x, 3, -1)
+    reset = torch.sigmoid(reset)
+    cand = torch.tanh(reset * cand)
+    update = torch.sigmoid(update - 1)
+    return update * cand + (1 - update) * hx
+
+
+_scripted_layer_norm_gru_gates = None
+
+
+def _fused_layer_norm_gru_gates(x: Tensor, hx: Tensor) -> Tensor:
+    # Scripted lazily, so that TorchScript is only used (and compiled) when requested
+    global _scripted_layer_norm_gru_gates
+    if _scripted_layer_norm_gru_gates is None:
+        _scripted_layer_norm_gru_gates = torch.jit.script(_layer_norm_gru_gates)
+    return _scripted_layer_norm_gru_gates(x, hx)
+
+
 class LayerNormGRUCell(nn.Module):
     """A GRU cell with a LayerNorm, taken
     from https://github.com/danijar/dreamerv2/blob/main/dreamerv2/common/nets.py#L317.
 
     This particular GRU cell accepts 3-D inputs, with a sequence of length 1, and applies
     a LayerNorm after the projection of the inputs.
+    When the inputs of all the steps are known in advance, the `forward_sequence` method
+    computes the projection of the inputs of the whole sequence at once.
 
     Args:
         input_size (int): the input size.
@@ -343,22 +364,37 @@ class LayerNormGRUCell(nn.Module):
             Defaults to False.
         layer_norm (bool, optional): whether to apply a LayerNorm after the input projection.
             Defaults to False.
+        fused (bool, optional): whether to fuse the elementwise operations of the gates with TorchScript,
+            which generates fused kernels on GPU.
+            Defaults to False.
     """
 
     def __init__(
-        self, input_size: int, hidden_size: int, bias: bool = True, batch_first: bool = False, layer_norm: bool = False
+        self,
+        input_size: int,
+        hidden_size: int,
+        bias: bool = True,
+        batch_first: bool = False,
+        layer_norm: bool = False,
+        fused: bool = False,
     ) -> None:
         super().__init__()
         self.input_size = input_size
         self.hidden_size = hidden_size
         self.bias = bias
         self.batch_first = batch_first
+        self.fused = fused
         self.linear = nn.Linear(input_size + hidden_size, 3 * hidden_size, bias=self.bias)
         if layer_norm:
             self.layer_norm = torch.nn.LayerNorm(3 * hidden_size)
         else:
             self.layer_norm = nn.Identity()
 
+    def _gates(self, x: Tensor, hx: Tensor) -> Tensor:
+        if self.fused:
+            return _fused_layer_norm_gru_gates(x, hx)
+        return _layer_norm_gru_gates(x, hx)
+
     def forward(self, input: Tensor, hx: Optional[Tensor] = None) -> Tensor:
         is_3d = input.dim() == 3
         if is_3d:
@@ -369,7 +405,7 @@ class LayerNormGRUCell(nn.Module):
                     "LayerNormGRUCell: Expected input to be 3-D with sequence length equal to 1 but received "
                     f"a sequence of length {input.shape[int(self.batch_first)]}"
                 )
-        if hx.dim() == 3:
+        if hx is not None and hx.dim() == 3:
             hx = hx.squeeze(0)
         assert input.dim() in (
             1,
@@ -388,11 +424,7 @@ class LayerNormGRUCell(nn.Module):
         input = torch.cat((hx, input), -1)
         x = self.linear(input)
         x = self.layer_norm(x)
-        reset, cand, update = torch.chunk(x, 3, -1)
-        reset = torch.sigmoid(reset)
-        cand = torch.tanh(reset * cand)
-        update = torch.sigmoid(update - 1)
-        hx = update * cand + (1 - update) * hx
+        hx = self._gates(x, hx)
 
         if not is_batched:
             hx = hx.squeeze(0)
@@ -401,6 +433,42 @@ class LayerNormGRUCell(nn.Module):
 
         return hx
 
+    def forward_sequence(self, input: Tensor, hx: Optional[Tensor] = None) -> Tensor:
+        """Run the cell on a whole sequence, equivalent to calling `forward` for every step.
+        The projection of the inputs of all the steps is computed at once, so that only the
+        projection of the hidden state is computed step by step.
+
+        Args:
+            input (Tensor): the inputs of the sequence, of shape `[sequence_length, batch_size, input_size]`
+                (`[batch_size, sequence_length, input_size]` if `batch_first=True`).
+            hx (Tensor, optional): the initial hidden state, of shape `[batch_size, hidden_size]`
+                or `[1, batch_size, hidden_size]`.
+                Defaults to zeros.
+
+        Returns:
+            The hidden states of all the steps, with the same layout of the inputs.
+        """
+        if input.dim() != 3:
+            raise ValueError(
+                f"LayerNormGRUCell: Expected the input sequence to be 3-D but received {input.dim()}-D tensor"
+            )
+        if self.batch_first:
+            input = input.transpose(0, 1)
+        if hx is None:
+            hx = torch.zeros(input.size(1), self.hidden_size, dtype=input.dtype, device=input.device)
+        elif hx.dim() == 3:
+            hx = hx.squeeze(0)
+        # The hidden state comes first in the input of the linear layer
+        hidden_weight, input_weight = self.linear.weight.split((self.hidden_size, self.input_size), dim=-1)
+        input_projection = F.linear(input, input_weight, self.linear.bias)
+        hxs = []
+        for projection in input_projection.unbind(0):
+            x = self.layer_norm(projection + F.linear(hx, hidden_weight))
+            hx = self._gates(x, hx)
+            hxs.append(hx)
+        hxs = torch.stack(hxs, 0)
+        return hxs.transpose(0, 1) if self.batch_first else hxs
+
 
 class MultiEncoder(nn.Module):
     def __init__(
@@ -9,6 +9,7 @@ from lightning.fabric.plugins.collectives import TorchCollective
 from torch import Tensor
 
 from sheeprl.data.buffers import EnvIndependentReplayBuffer, EpisodeBuffer, ReplayBuffer
+from sheeprl.data.snapshot import BufferSnapshot
 
 
 class CheckpointCallback:
@@ -22,10 +23,23 @@ class CheckpointCallback:
             sends the state to the player process (rank-0).
 
     When the buffer is added to the state of the checkpoint, it is assumed that the episode is truncated.
+
+    Args:
+        keep_last (int, optional): the number of checkpoints to keep. If None, all the checkpoints are kept.
+            Defaults to None.
+        incremental_buffer (bool, optional): whether to checkpoint the `ReplayBuffer` and the
+            `EnvIndependentReplayBuffer` incrementally: the elements added since the last checkpoint are copied
+            into memory-mapped files in the `buffer` folder next to the checkpoints, which are flushed in
+            background, and the checkpoint records only the paths of those files
+            (see `sheeprl.data.snapshot.BufferSnapshot`). Only the last checkpoint has a consistent buffer.
+            The `EpisodeBuffer` is always pickled into the checkpoint.
+            Defaults to False.
     """
 
-    def __init__(self, keep_last: int | None = None) -> None:
+    def __init__(self, keep_last: int | None = None, incremental_buffer: bool = False) -> None:
         self.keep_last = keep_last
+        self.incremental_buffer = incremental_buffer
+        self._snapshots: Dict[pathlib.Path, BufferSnapshot] = {}
 
     def on_checkpoint_coupled(
         self,
@@ -36,7 +50,7 @@ class CheckpointCallback:
     ):
         if replay_buffer is not None:
             rb_state = self._ckpt_rb(replay_buffer)
-            state["rb"] = replay_buffer
+            state["rb"] = self._rb_to_save(fabric, ckpt_path, replay_buffer)
             if fabric.world_size > 1:
                 # We need to collect the buffers from all the ranks
                 # The collective it is needed because the `gather_object` function is not implemented in Fabric
@@ -45,10 +59,10 @@ class CheckpointCallback:
                 checkpoint_collective.create_group(backend="gloo", ranks=list(range(fabric.world_size)))
                 gathered_rb = [None for _ in range(fabric.world_size)]
                 if fabric.global_rank == 0:
-                    checkpoint_collective.gather_object(replay_buffer, gathered_rb)
+                    checkpoint_collective.gather_object(state["rb"], gathered_rb)
                     state["rb"] = gathered_rb
                 else:
-                    checkpoint_collective.gather_object(replay_buffer, None)
+                    checkpoint_collective.gather_object(state["rb"], None)
         fabric.save(ckpt_path, state)
         if replay_buffer is not None:
             self._experiment_consistent_rb(replay_buffer, rb_state)
@@ -67,7 +81,7 @@ class CheckpointCallback:
         state = state[0]
         if replay_buffer is not None:
             rb_state = self._ckpt_rb(replay_buffer)
-            state["rb"] = replay_buffer
+            state["rb"] = self._rb_to_save(fabric, ckpt_path, replay_buffer)
         fabric.save(ckpt_path, state)
         if replay_buffer is not None:
             self._experiment_consistent_rb(replay_buffer, rb_state)
@@ -81,6 +95,18 @@ class CheckpointCallback:
             player_trainer_collective.broadcast_object_list([state], src=1)
         fabric.save(ckpt_path, state)
 
+    def _rb_to_save(
+        self, fabric: Fabric, ckpt_path: str, rb: ReplayBuffer | EnvIndependentReplayBuffer | EpisodeBuffer
+    ) -> ReplayBuffer | EnvIndependentReplayBuffer | EpisodeBuffer:
+        """Return the buffer to put in the state of the checkpoint: either the buffer itself or,
+        if the buffer is checkpointed incrementally, a copy of the buffer backed by its snapshot files."""
+        if not self.incremental_buffer or isinstance(rb, EpisodeBuffer):
+            return rb
+        snapshot_dir = pathlib.Path(ckpt_path).parent / "buffer" / f"rank_{fabric.global_rank}"
+        if snapshot_dir not in self._snapshots:
+            self._snapshots[snapshot_dir] = BufferSnapshot(snapshot_dir)
+        return self._snapshots[snapshot_dir].save(rb)
+
     def _ckpt_rb(
         self, rb: ReplayBuffer | EnvIndependentReplayBuffer | EpisodeBuffer
     ) -> Tensor | Sequence[Tensor] | Sequence[Sequence[Tensor]]:
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import warnings
+from typing import Any, Dict, Sequence
+
+import torch
+from lightning.fabric.wrappers import _FabricModule
+from torch import nn
+
+from sheeprl.utils.imports import _IS_TORCH_GREATER_EQUAL_2_2
+
+# The modules of the agents that can be compiled
+COMPILABLE_MODULES = ("encoder", "rssm", "actor", "critic", "decoder")
+
+
+def setup_compile_cache(cache_dir: str | None) -> None:
+    """Enable the on-disk cache of the graphs compiled by Inductor, so that the compiled kernels are reused
+    across the runs instead of being compiled again.
+
+    Args:
+        cache_dir (str, optional): the directory of the cache. If None, the default one of PyTorch is used.
+    """
+    if cache_dir is not None:
+        cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        os.makedirs(cache_dir, exist_ok=True)
+        os.environ["TORCHINDUCTOR_CACHE_DIR"] = cache_dir
+    import torch._inductor.config as inductor_config
+
+    inductor_config.fx_graph_cache = True
+
+
+def compile_modules(modules: Dict[str, Sequence[nn.Module]], cfg: Dict[str, Any]) -> None:
+    """Compile in place the selected modules of an agent with `torch.compile`.
+    The modules are compiled in place (with `nn.Module.compile`), so that their state dicts,
+    the Fabric wrappers and the players sharing them are not affected.
+
+    Args:
+        modules (Dict[str, Sequence[nn.Module]]): the modules of the agent, grouped by their name
+            (one of 'encoder', 'rssm', 'actor', 'critic' or 'decoder'): Fabric modules are compiled
+            through the module they wrap.
+        cfg (Dict[str, Any]): the configs of the experiment. The modules are compiled only if `cfg.compile.enabled`
+            is True, with the mode of `cfg.compile.modes` for every module, falling back to `cfg.compile.mode`.
+    """
+    compile_cfg = cfg.get("compile", None)
+    if compile_cfg is None or not compile_cfg.enabled:
+        return
+    if not _IS_TORCH_GREATER_EQUAL_2_2:
+        raise RuntimeError("Compiling the modules of the agents requires 'torch>=2.2'")
+    unknown_modules = set(compile_cfg.modules) - set(COMPILABLE_MODULES)
+    if len(unknown_modules) > 0:
+        raise ValueError(
+            f"Unknown modules to compile: {sorted(unknown_modules)}. The modules must be in {COMPILABLE_MODULES}"
+        )
+    setup_compile_cache(compile_cfg.cache_dir)
+    # The modules are recompiled for every new shape (e.g. a different number of environments in the player)
+    # until the limit is reached, then they fall back to eager mode
+    torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, compile_cfg.cache_size_limit)
+    modes = compile_cfg.get("modes", None) or {}
+    for name in compile_cfg.modules:
+        if name not in modules:
+            warnings.warn(f"The agent has no '{name}' module to compile, it is skipped", UserWarning)
+            continue
+        for module in modules[name]:
+            if module is None:
+                continue
+            if isinstance(module, _FabricModule):
+                module = module.module
+            module.compile(
+                mode=modes.get(name, compile_cfg.mode),
+                fullgraph=compile_cfg.fullgraph,
+                dynamic=compile_cfg.dynamic,
+                backend=compile_cfg.backend,
+            )
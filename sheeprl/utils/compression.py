@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import DTypeLike
+
+from sheeprl.utils.imports import _IS_LZ4_AVAILABLE, _IS_ZSTD_AVAILABLE
+
+# Number of elements (de)compressed by every task submitted to the thread pool
+_CHUNK_SIZE = 64
+
+
+def _get_codec(codec: str) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    if codec == "zlib":
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    elif codec == "lz4":
+        if not _IS_LZ4_AVAILABLE:
+            raise ModuleNotFoundError(_IS_LZ4_AVAILABLE)
+        import lz4.block
+
+        return lz4.block.compress, lz4.block.decompress
+    elif codec == "zstd":
+        if not _IS_ZSTD_AVAILABLE:
+            raise ModuleNotFoundError(_IS_ZSTD_AVAILABLE)
+        import zstandard
+
+        return (lambda data: zstandard.compress(data, 3)), zstandard.decompress
+    raise ValueError(f"Unknown compression codec '{codec}': accepted values are 'zlib', 'lz4' and 'zstd'")
+
+
+class CompressedArray:
+    def __init__(
+        self,
+        shape: Sequence[int],
+        dtype: DTypeLike,
+        batch_dims: int = 1,
+        codec: str = "zlib",
+        num_threads: int | None = None,
+        _frames: np.ndarray | None = None,
+    ):
+        """An array whose elements are compressed one by one, so that they can be read with random access.
+        The first 'batch_dims' dimensions of the array index the elements, e.g. [buffer_size, n_envs]
+        for a replay buffer, while the remaining ones are the shape of every element, e.g. a [3, 64, 64] frame.
+        The elements are compressed when they are written and decompressed when they are read:
+        both the operations run on a pool of threads, since the codecs release the GIL.
+
+        Args:
+            shape (Sequence[int]): the shape of the array.
+            dtype (DTypeLike): the data type of the array.
+            batch_dims (int, optional): the number of leading dimensions that index the compressed elements.
+                Defaults to 1.
+            codec (str, optional): the compression codec. Possible values are: "zlib" (always available),
+                "lz4" (requires the 'lz4' package) and "zstd" (requires the 'zstandard' package).
+                Defaults to "zlib".
+            num_threads (int, optional): the number of threads used to (de)compress the elements.
+                If None, then the number of CPUs is used.
+                Defaults to None.
+        """
+        if batch_dims <= 0 or batch_dims > len(shape):
+            raise ValueError(f"'batch_dims' must be in [1, {len(shape)}], got: {batch_dims}")
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._batch_dims = batch_dims
+        self._codec = codec
+        self._compress, self._decompress = _get_codec(codec)
+        self._num_threads = num_threads or os.cpu_count() or 1
+        self._executor: ThreadPoolExecutor | None = None
+        # The compressed elements: a 'bytes' object for every element, None if it has never been written
+        self._frames = np.full(self._shape[:batch_dims], None, dtype=object) if _frames is None else _frames
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._frames.shape + self.element_shape
+
+    @property
+    def element_shape(self) -> Tuple[int, ...]:
+        return self._shape[self._batch_dims :]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def codec(self) -> str:
+        return self._codec
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of the compressed elements."""
+        return sum(len(frame) for frame in self._frames.flat if frame is not None)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def _map(self, fn: Callable[[int, int], Any], n: int) -> None:
+        # Split the 'n' elements in chunks, so that the overhead of the pool is amortized
+        chunks = [(start, min(start + _CHUNK_SIZE, n)) for start in range(0, n, _CHUNK_SIZE)]
+        if self._num_threads == 1 or len(chunks) == 1:
+            for start, stop in chunks:
+                fn(start, stop)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._num_threads)
+        for future in [self._executor.submit(fn, start, stop) for start, stop in chunks]:
+            future.result()
+
+    def take(self, idxes: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """Decompress the elements at the 'idxes' positions of the array flattened on its batch dimensions.
+
+        Args:
+            idxes (np.ndarray): the indexes of the elements to decompress.
+            out (np.ndarray, optional): the contiguous array where to write the decompressed elements.
+                If None, a new array is allocated.
+                Default to None.
+
+        Returns:
+            np.ndarray: the decompressed elements, with shape [len(idxes), *element_shape].
+        """
+        idxes = np.ravel(idxes)
+        frames = self._frames.reshape(-1)[idxes]
+        if out is None:
+            out = np.empty((len(idxes), *self.element_shape), dtype=self._dtype)
+        flat_out = np.reshape(out, (len(idxes), -1)).view(np.uint8)
+
+        def decompress(start: int, stop: int) -> None:
+            for i in range(start, stop):
+                if frames[i] is None:
+                    raise RuntimeError("Reading an element of a compressed array that has never been written")
+                flat_out[i] = np.frombuffer(self._decompress(frames[i]), dtype=np.uint8)
+
+        self._map(decompress, len(idxes))
+        return out
+
+    def __setitem__(self, key: Any, value: np.ndarray) -> None:
+        frames_shape = np.shape(self._frames[key])
+        values = np.broadcast_to(np.asarray(value, dtype=self._dtype), frames_shape + self.element_shape)
+        values = np.reshape(values, (-1, *self.element_shape))
+        compressed = np.empty(len(values), dtype=object)
+
+        def compress(start: int, stop: int) -> None:
+            for i in range(start, stop):
+                compressed[i] = self._compress(np.ascontiguousarray(values[i]).tobytes())
+
+        self._map(compress, len(values))
+        self._frames[key] = compressed.reshape(frames_shape) if len(frames_shape) > 0 else compressed[0]
+
+    def __getitem__(self, key: Any) -> CompressedArray | np.ndarray:
+        """Slicing the first dimension returns a compressed array sharing the elements with this one,
+        as a view of a numpy array would do; any other key returns the decompressed elements."""
+        if isinstance(key, slice):
+            return CompressedArray(
+                self.shape,
+                self._dtype,
+                self._batch_dims,
+                self._codec,
+                self._num_threads,
+                _frames=self._frames[key],
+            )
+        if not isinstance(key, tuple):
+            key = (key,)
+        frames = self._frames[key[: self._batch_dims]]
+        flat_idxes = np.arange(self._frames.size).reshape(self._frames.shape)[key[: self._batch_dims]]
+        element_key = key[self._batch_dims :]
+        values = self.take(np.ravel(flat_idxes)).reshape(np.shape(frames) + self.element_shape)
+        return values[(slice(None),) * np.ndim(frames) + element_key]
+
+    def __array__(self, dtype: DTypeLike = None) -> np.ndarray:
+        array = self.take(np.arange(self._frames.size)).reshape(self.shape)
+        return array if dtype is None else array.astype(dtype, copy=False)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_compress"], state["_decompress"], state["_executor"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._compress, self._decompress = _get_codec(self._codec)
+        self._executor = None
@@ -1,14 +1,17 @@
 import os
 import warnings
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Sequence
 
 import cv2
 import gymnasium as gym
 import hydra
 import numpy as np
 
+from sheeprl.envs.vector import AsyncBatchVectorEnv, SharedMemoryVectorEnv
 from sheeprl.envs.wrappers import (
     ActionRepeat,
+    BatchedFrameStack,
+    BatchedPreprocessObservation,
     FrameStack,
     GrayscaleRenderWrapper,
     MaskVelocityWrapper,
@@ -16,7 +19,6 @@ from sheeprl.envs.wrappers import (
 )
 from sheeprl.utils.imports import _IS_DIAMBRA_ARENA_AVAILABLE, _IS_DIAMBRA_AVAILABLE, _IS_DMC_AVAILABLE
 
-
 if _IS_DIAMBRA_ARENA_AVAILABLE and _IS_DIAMBRA_AVAILABLE:
     from sheeprl.envs.diambra import DiambraWrapper
 if _IS_DMC_AVAILABLE:
@@ -30,6 +32,7 @@ def make_env(
     run_name: Optional[str] = None,
     prefix: str = "",
     vector_env_idx: int = 0,
+    batched_preprocessing: bool = False,
 ) -> Callable[[], gym.Env]:
     """
     Create the callable function to create environment and
@@ -45,6 +48,11 @@ def make_env(
         prefix (str): the prefix to add to the video folder.
             Default to "".
         vector_env_idx (int): the index of the environment.
+        batched_preprocessing (bool): whether to leave the preprocessing of the pixel observations
+            to the vectorized environment created by `make_vector_env`, which preprocesses
+            the observations of all the environments at once and then stacks them:
+            the frames are only converted to 3D here.
+            Default to False.
 
     Returns:
         The callable function that initializes the environment.
@@ -80,7 +88,12 @@ def make_env(
             and "atari" not in env_spec
             and (not (_IS_DIAMBRA_ARENA_AVAILABLE and _IS_DIAMBRA_AVAILABLE) or not isinstance(env, DiambraWrapper))
         ):
-            env = ActionRepeat(env, cfg.env.action_repeat)
+            env = ActionRepeat(
+                env,
+                cfg.env.action_repeat,
+                skip_obs=cfg.env.get("action_repeat_skip_obs", False),
+                max_pool_keys=cfg.env.get("action_repeat_max_pool_keys", None) or (),
+            )
 
         if "mask_velocities" in cfg.env and cfg.env.mask_velocities:
             env = MaskVelocityWrapper(env)
@@ -160,6 +173,12 @@ def make_env(
         )
         cnn_keys = env_cnn_keys.intersection(set(cfg.algo.cnn_keys.encoder))
 
+        def to_3d_obs(obs: Dict[str, Any]):
+            for k in cnn_keys:
+                if len(obs[k].shape) == 2:
+                    obs[k] = obs[k][np.newaxis]
+            return obs
+
         def transform_obs(obs: Dict[str, Any]):
             for k in cnn_keys:
                 current_obs = obs[k]
@@ -197,13 +216,24 @@ def make_env(
 
             return obs
 
-        env = gym.wrappers.TransformObservation(env, transform_obs)
-        for k in cnn_keys:
-            env.observation_space[k] = gym.spaces.Box(
-                0, 255, (1 if cfg.env.grayscale else 3, cfg.env.screen_size, cfg.env.screen_size), np.uint8
-            )
+        if batched_preprocessing:
+            env = gym.wrappers.TransformObservation(env, to_3d_obs)
+            for k in cnn_keys:
+                space = env.observation_space[k]
+                if len(space.shape) == 2:
+                    env.observation_space[k] = gym.spaces.Box(
+                        space.low[np.newaxis], space.high[np.newaxis], (1, *space.shape), space.dtype
+                    )
+        else:
+            env = gym.wrappers.TransformObservation(env, transform_obs)
+            for k in cnn_keys:
+                env.observation_space[k] = gym.spaces.Box(
+                    0, 255, (1 if cfg.env.grayscale else 3, cfg.env.screen_size, cfg.env.screen_size), np.uint8
+                )
 
-        if cnn_keys is not None and len(cnn_keys) > 0 and cfg.env.frame_stack > 1:
+        # With the batched preprocessing, the frames are stacked by the vectorized environment after having
+        # been preprocessed, so that only the new frame of every environment is preprocessed at every step
+        if cnn_keys is not None and len(cnn_keys) > 0 and cfg.env.frame_stack > 1 and not batched_preprocessing:
             if cfg.env.frame_stack_dilation <= 0:
                 raise ValueError(
                     f"The frame stack dilation argument must be greater than zero, got: {cfg.env.frame_stack_dilation}"
@@ -230,6 +260,60 @@ def make_env(
     return thunk
 
 
+def make_vector_env(
+    cfg: Dict[str, Any], env_fns: Sequence[Callable[[], gym.Env]], partial_batches: bool = False
+) -> gym.vector.VectorEnv:
+    """
+    Create the vectorized environment: a `gymnasium.vector.SyncVectorEnv` if `cfg.env.sync_env` is True,
+    otherwise a `sheeprl.envs.vector.SharedMemoryVectorEnv` if `cfg.env.zero_copy` is True, whose observations
+    are views of the shared memory written by the workers and are valid until the step after the next one,
+    or a `gymnasium.vector.AsyncVectorEnv`. If `partial_batches` is True and `cfg.env.async_batch_size`
+    is not None, then it is a `sheeprl.envs.vector.AsyncBatchVectorEnv`, whose 'send' and 'recv' methods
+    step the environments asynchronously and return the results of the first `cfg.env.async_batch_size` ready ones.
+    If `cfg.env.batched_preprocessing` is True, then the pixel observations of all the environments
+    are preprocessed at once after every step and then stacked (if `cfg.env.frame_stack` is greater than 1),
+    so the environments must be created by `make_env` with `batched_preprocessing=True`.
+
+    Args:
+        cfg (Dict[str, Any]): the configs of the environments.
+        env_fns (Sequence[Callable[[], gym.Env]]): the functions creating the environments.
+        partial_batches (bool): whether the caller steps the environments in partial batches
+            with the 'send' and 'recv' methods, e.g. the training environments of PPO and DreamerV3.
+            The other environments (e.g. the test ones) ignore `cfg.env.async_batch_size`.
+            Default to False.
+
+    Returns:
+        The vectorized environment.
+    """
+    async_batch_size = cfg.env.get("async_batch_size", None) if partial_batches else None
+    if async_batch_size is not None:
+        if cfg.env.sync_env:
+            raise ValueError(
+                "The environments can be stepped in partial batches ('env.async_batch_size') "
+                "only if they are asynchronous: set 'env.sync_env=False'"
+            )
+        envs = AsyncBatchVectorEnv(env_fns, async_batch_size)
+    elif not cfg.env.sync_env and cfg.env.get("zero_copy", False):
+        envs = SharedMemoryVectorEnv(env_fns)
+    else:
+        vectorized_env = gym.vector.SyncVectorEnv if cfg.env.sync_env else gym.vector.AsyncVectorEnv
+        envs = vectorized_env(env_fns)
+    if cfg.env.batched_preprocessing:
+        cnn_keys = [
+            k
+            for k in cfg.algo.cnn_keys.encoder
+            if k in envs.single_observation_space.keys() and len(envs.single_observation_space[k].shape) >= 3
+        ]
+        if len(cnn_keys) > 0:
+            # The batched preprocessing reads the raw frames from the buffers of the vectorized environment,
+            # without copying them first, and copies the other observations
+            envs.copy = False
+            envs = BatchedPreprocessObservation(envs, cnn_keys, cfg.env.screen_size, cfg.env.grayscale)
+            if cfg.env.frame_stack > 1:
+                envs = BatchedFrameStack(envs, cfg.env.frame_stack, cnn_keys, cfg.env.frame_stack_dilation)
+    return envs
+
+
 def get_dummy_env(id: str):
     if "continuous" in id:
         from sheeprl.envs.dummy import ContinuousDummyEnv
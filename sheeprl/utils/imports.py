@@ -9,8 +9,11 @@ _IS_CRAFTER_AVAILABLE = RequirementCache("crafter")
 _IS_DIAMBRA_AVAILABLE = RequirementCache("diambra")
 _IS_DIAMBRA_ARENA_AVAILABLE = RequirementCache("diambra-arena")
 _IS_DMC_AVAILABLE = RequirementCache("dm_control")
+_IS_LZ4_AVAILABLE = RequirementCache("lz4")
 _IS_MINEDOJO_AVAILABLE = RequirementCache("minedojo")
 _IS_MINERL_0_4_4_AVAILABLE = RequirementCache("minerl==0.4.4")
 _IS_MLFLOW_AVAILABLE = RequirementCache("mlflow>=2.8", "mlflow")
 _IS_TORCH_GREATER_EQUAL_2_0 = RequirementCache("torch>=2.0")
+_IS_TORCH_GREATER_EQUAL_2_2 = RequirementCache("torch>=2.2")
 _IS_WINDOWS = platform.system() == "Windows"
+_IS_ZSTD_AVAILABLE = RequirementCache("zstandard")
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import types
+from typing import Any, Dict, Sequence
+
+import torch
+from lightning.fabric.wrappers import _FabricModule
+from lightning_utilities.core.apply_func import apply_to_collection
+from torch import Tensor, nn
+
+# The modules of the agents whose precision can be set
+PRECISION_MODULES = ("encoder", "rssm", "decoder", "reward", "continue", "actor", "critic")
+
+
+def _cast_floating(tensor: Tensor, dtype: torch.dtype) -> Tensor:
+    return tensor.to(dtype) if torch.is_floating_point(tensor) else tensor
+
+
+def _precision_forward(self: nn.Module, *args: Any, **kwargs: Any) -> Any:
+    # The forward of the modules with a precision policy: it replaces the `forward` of the instance,
+    # so that it follows the module when it is deep-copied and it is traced by `torch.compile`
+    if self._precision_dtype is None:
+        args, kwargs = apply_to_collection((args, kwargs), Tensor, _cast_floating, self._precision_input_dtype)
+        with torch.autocast(self._precision_device_type, enabled=False):
+            return type(self).forward(self, *args, **kwargs)
+    with torch.autocast(self._precision_device_type, dtype=self._precision_dtype):
+        output = type(self).forward(self, *args, **kwargs)
+    return apply_to_collection(output, Tensor, _cast_floating, self._precision_output_dtype)
+
+
+def set_module_precision(
+    module: nn.Module,
+    device_type: str,
+    dtype: torch.dtype | None = None,
+    output_dtype: torch.dtype = torch.float32,
+) -> None:
+    """Set in place the precision of the forward of a module.
+
+    Args:
+        module (nn.Module): the module. Fabric modules are set through the module they wrap.
+        device_type (str): the type of the device of the module, e.g. 'cpu' or 'cuda'.
+        dtype (torch.dtype, optional): the dtype the forward is run in, with autocast.
+            If None, the forward is run in the precision of the parameters, with autocast disabled
+            (also when Fabric runs the module with mixed precision): the floating point inputs are
+            cast to the dtype of the parameters.
+            Default to None.
+        output_dtype (torch.dtype): the dtype the floating point outputs are cast to, if `dtype` is not None.
+            Default to torch.float32.
+    """
+    if isinstance(module, _FabricModule):
+        module = module.module
+    module._precision_device_type = device_type
+    module._precision_dtype = dtype
+    module._precision_input_dtype = next(module.parameters()).dtype
+    module._precision_output_dtype = output_dtype
+    module.forward = types.MethodType(_precision_forward, module)
+
+
+def set_modules_precision(modules: Dict[str, Sequence[nn.Module]], cfg: Dict[str, Any], device: torch.device) -> None:
+    """Set in place the precision of the selected modules of an agent: the modules in `cfg.precision.modules`
+    run in `cfg.precision.dtype` (with autocast) and their outputs are cast to `cfg.distribution.dtype`,
+    the dtype of the distributions and of the losses, while the modules in `cfg.precision.full_precision_modules`
+    always run in full precision. The other modules run in the precision of Fabric (`cfg.fabric.precision`).
+
+    Args:
+        modules (Dict[str, Sequence[nn.Module]]): the modules of the agent, grouped by their name
+            (one of 'encoder', 'rssm', 'decoder', 'reward', 'continue', 'actor' or 'critic').
+        cfg (Dict[str, Any]): the configs of the experiment. The precision is set only if `cfg.precision.enabled`
+            is True.
+        device (torch.device): the device of the modules.
+    """
+    precision_cfg = cfg.get("precision", None)
+    if precision_cfg is None or not precision_cfg.enabled:
+        return
+    low_precision_modules = set(precision_cfg.modules)
+    full_precision_modules = set(precision_cfg.full_precision_modules)
+    unknown_modules = (low_precision_modules | full_precision_modules) - set(PRECISION_MODULES)
+    if len(unknown_modules) > 0:
+        raise ValueError(
+            f"Unknown modules to set the precision of: {sorted(unknown_modules)}. "
+            f"The modules must be in {PRECISION_MODULES}"
+        )
+    if len(low_precision_modules & full_precision_modules) > 0:
+        raise ValueError(
+            "The modules cannot run both in low and in full precision: "
+            f"{sorted(low_precision_modules & full_precision_modules)}"
+        )
+    fabric_precision = str(cfg.fabric.precision)
+    if fabric_precision in ("bf16-true", "16-true"):
+        raise ValueError(
+            "The precision of the modules cannot be set when the parameters are in half precision: "
+            f"got 'fabric.precision={fabric_precision}'. Set 'fabric.precision=32-true' instead"
+        )
+    dtype = getattr(torch, precision_cfg.dtype, None)
+    if dtype not in (torch.bfloat16, torch.float16):
+        raise ValueError(f"The dtype of the modules must be 'bfloat16' or 'float16', got '{precision_cfg.dtype}'")
+    if dtype == torch.float16 and fabric_precision not in ("16-mixed", "16"):
+        raise ValueError(
+            "Running the modules in 'float16' requires the gradient scaling of Fabric: set 'fabric.precision=16-mixed'"
+        )
+    output_dtype = getattr(torch, cfg.distribution.get("dtype", "float32"))
+    for name, group in modules.items():
+        if name in low_precision_modules:
+            module_dtype = dtype
+        elif name in full_precision_modules:
+            module_dtype = None
+        else:
+            continue
+        for module in group:
+            if module is not None:
+                set_module_precision(module, device.type, module_dtype, output_dtype)
@@ -9,6 +9,10 @@ from typing import Any, Callable, Dict, List
 # where `module` and `algorithm` are respectively taken from sheeprl/algos/{module}/{algorithm}.py,
 # while `entrypoint` is the decorated function
 algorithm_registry: Dict[str, List[Dict[str, Any]]] = {}
+# The evaluation functions are registered in the same way, as
+# evals[module] = [..., {"name": algorithm, "evaluation_file": file, "entrypoint": entrypoint, "batched": batched}]
+# where `batched` tells whether the entrypoint evaluates `cfg.num_evals` episodes in `cfg.env.num_envs`
+# environments and returns their results, instead of running a single episode
 evaluation_registry: Dict[str, List[Dict[str, Any]]] = {}
 
 
@@ -35,7 +39,9 @@ def _register_algorithm(fn: Callable[..., Any], decoupled: bool = False) -> Call
     return fn
 
 
-def _register_evaluation(fn: Callable[..., Any], algorithms: str | List[str]) -> Callable[..., Any]:
+def _register_evaluation(
+    fn: Callable[..., Any], algorithms: str | List[str], batched: bool = False
+) -> Callable[..., Any]:
     # lookup containing module
     if fn.__module__ == "__main__":
         return fn
@@ -66,7 +72,7 @@ def _register_evaluation(fn: Callable[..., Any], algorithms: str | List[str]) ->
         evaluation_registry[module] = []
         for algorithm in algorithms:
             evaluation_registry[module].append(
-                {"name": algorithm, "evaluation_file": evaluation_file, "entrypoint": entrypoint}
+                {"name": algorithm, "evaluation_file": evaluation_file, "entrypoint": entrypoint, "batched": batched}
             )
     else:
         for registered_eval in registered_evals:
@@ -80,7 +86,7 @@ def _register_evaluation(fn: Callable[..., Any], algorithms: str | List[str]) ->
                 )
         evaluation_registry[module].extend(
             [
-                {"name": algorithm, "evaluation_file": evaluation_file, "entrypoint": entrypoint}
+                {"name": algorithm, "evaluation_file": evaluation_file, "entrypoint": entrypoint, "batched": batched}
                 for algorithm in algorithms
             ]
         )
@@ -101,8 +107,8 @@ def register_algorithm(decoupled: bool = False):
     return inner_decorator
 
 
-def register_evaluation(algorithms: str | List[str]):
+def register_evaluation(algorithms: str | List[str], batched: bool = False):
     def inner_decorator(fn):
-        return _register_evaluation(fn, algorithms=algorithms)
+        return _register_evaluation(fn, algorithms=algorithms, batched=batched)
 
     return inner_decorator
@@ -0,0 +1,94 @@
+"""Array-based segment trees, used by the prioritized replay buffers.
+Inspired by: https://github.com/openai/baselines/blob/master/baselines/common/segment_tree.py
+
+Differently from the original implementation, every operation works on a batch of indexes:
+the internal nodes touched by an update are recomputed level by level, with one vectorized
+operation per level of the tree, so that updating or querying 'N' elements costs
+O(log(capacity)) numpy calls instead of O(N * log(capacity)) python operations.
+"""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+
+class SegmentTree:
+    def __init__(self, capacity: int, operation: np.ufunc, neutral_element: float):
+        """A segment tree stored in a flat array: the node 'i' has children '2 * i' and '2 * i + 1',
+        while the leaves, i.e. the stored values, are the nodes in [capacity, 2 * capacity).
+
+        Args:
+            capacity (int): the number of elements of the tree. It is rounded up to the next power of two.
+            operation (np.ufunc): the associative binary operation used to reduce the elements.
+            neutral_element (float): the neutral element of the operation, which is also the
+                initial value of every element.
+        """
+        if capacity <= 0:
+            raise ValueError(f"The capacity must be greater than zero, got: {capacity}")
+        self._depth = int(capacity - 1).bit_length()
+        self._capacity = 1 << self._depth
+        self._operation = operation
+        self._neutral_element = neutral_element
+        self._value = np.full(2 * self._capacity, neutral_element, dtype=np.float64)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def reduce(self) -> float:
+        """Reduce all the elements of the tree with the tree operation."""
+        return float(self._value[1])
+
+    def __setitem__(self, idxes: int | Sequence[int] | np.ndarray, values: float | np.ndarray) -> None:
+        nodes = np.asarray(idxes, dtype=np.intp).ravel() + self._capacity
+        self._value[nodes] = values
+        for _ in range(self._depth):
+            nodes = np.unique(nodes >> 1)
+            self._value[nodes] = self._operation(self._value[2 * nodes], self._value[2 * nodes + 1])
+
+    def __getitem__(self, idxes: int | Sequence[int] | np.ndarray) -> float | np.ndarray:
+        return self._value[np.asarray(idxes, dtype=np.intp) + self._capacity]
+
+
+class SumSegmentTree(SegmentTree):
+    def __init__(self, capacity: int):
+        super().__init__(capacity, np.add, 0.0)
+
+    def sum(self) -> float:
+        """Returns the sum of all the elements of the tree."""
+        return self.reduce()
+
+    def find_prefixsum_idx(self, prefixsums: np.ndarray) -> np.ndarray:
+        """Find, for every prefix sum 'p', the highest index 'i' such that
+        'sum(tree[0], ..., tree[i - 1]) <= p'. If the values are non-negative, then this is the index
+        'i' of the element such that sampling 'p' uniformly in [0, tree.sum()) selects 'i' with
+        a probability proportional to 'tree[i]'.
+        The descent never enters a subtree whose sum is zero, so an element with a value of zero is never
+        returned as long as the total sum is positive, even if rounding errors push 'p' past the total sum.
+
+        Args:
+            prefixsums (np.ndarray): the prefix sums to look up.
+
+        Returns:
+            np.ndarray: the indexes of the elements, with the same shape of 'prefixsums'.
+        """
+        prefixsums = np.array(prefixsums, dtype=np.float64)
+        nodes = np.ones(prefixsums.shape, dtype=np.intp)
+        for _ in range(self._depth):
+            left = 2 * nodes
+            left_sum = self._value[left]
+            go_right = (prefixsums >= left_sum) & (self._value[left + 1] > 0)
+            prefixsums -= np.where(go_right, left_sum, 0.0)
+            nodes = left + go_right
+        return nodes - self._capacity
+
+
+class MinSegmentTree(SegmentTree):
+    def __init__(self, capacity: int):
+        super().__init__(capacity, np.minimum, float("inf"))
+
+    def min(self) -> float:
+        """Returns the minimum of all the elements of the tree."""
+        return self.reduce()
@@ -49,6 +49,7 @@ def restore_env_variables():
         "XRT_MESH_SERVICE_ADDRESS",
         # set by torchdynamo
         "TRITON_CACHE_DIR",
+        "_TORCHINDUCTOR_PYOBJECT_TENSOR_DATA_PTR",
         # set by Pygame
         "SDL_VIDEO_X11_WMCLASS",
         # set by us
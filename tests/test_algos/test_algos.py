@@ -182,6 +182,33 @@ def test_ppo(standard_args, start_time, env_id):
     remove_test_dir(os.path.join("logs", "runs", f"pytest_{start_time}"))
 
 
+def test_ppo_partial_batches(standard_args, start_time):
+    root_dir = os.path.join(f"pytest_{start_time}", "ppo", os.environ["LT_DEVICES"])
+    run_name = "test_ppo_partial_batches"
+    # Several updates are run, so that the environments are stepped in partial batches for several rollouts,
+    # and the episodes are truncated, so that the rewards of the partial batches are bootstrapped
+    args = [arg for arg in standard_args if arg not in ("dry_run=True", "env.num_envs=1")] + [
+        "exp=ppo",
+        "env=dummy",
+        "env.num_envs=4",
+        "env.async_batch_size=2",
+        "env.sync_env=False",
+        "env.max_episode_steps=3",
+        "algo.rollout_steps=4",
+        "algo.per_rank_batch_size=4",
+        f"algo.total_steps={64 * int(os.environ['LT_DEVICES'])}",
+        f"root_dir={root_dir}",
+        f"run_name={run_name}",
+        "env.id=discrete_dummy",
+        "algo.cnn_keys.encoder=[rgb]",
+        "algo.mlp_keys.encoder=[]",
+    ]
+
+    with mock.patch.object(sys, "argv", args):
+        run()
+    remove_test_dir(os.path.join("logs", "runs", f"pytest_{start_time}"))
+
+
 @pytest.mark.parametrize("env_id", ["discrete_dummy", "multidiscrete_dummy", "continuous_dummy"])
 def test_ppo_decoupled(standard_args, start_time, env_id):
     root_dir = os.path.join(f"pytest_{start_time}", "ppo_decoupled", os.environ["LT_DEVICES"])
@@ -460,6 +487,75 @@ def test_dreamer_v3(standard_args, env_id, start_time):
         "algo.train_every=1",
         "algo.cnn_keys.encoder=[rgb]",
         "algo.cnn_keys.decoder=[rgb]",
+        "algo.test_episodes=2",
+    ]
+
+    with mock.patch.object(sys, "argv", args):
+        run()
+    remove_test_dir(os.path.join("logs", "runs", f"pytest_{start_time}"))
+
+
+def test_dreamer_v3_partial_batches(standard_args, start_time):
+    root_dir = os.path.join(f"pytest_{start_time}", "dreamer_v3", os.environ["LT_DEVICES"])
+    run_name = "test_dreamer_v3_partial_batches"
+    # The agent is trained on sequences sampled from the buffers of all the environments,
+    # so every environment must be stepped as often as the others
+    args = [arg for arg in standard_args if arg not in ("dry_run=True", "env.num_envs=1")] + [
+        "exp=dreamer_v3",
+        "env=dummy",
+        "env.num_envs=4",
+        "env.async_batch_size=2",
+        "env.sync_env=False",
+        "algo.per_rank_batch_size=2",
+        "algo.per_rank_sequence_length=4",
+        "buffer.size=64",
+        f"algo.learning_starts={16 * int(os.environ['LT_DEVICES'])}",
+        f"algo.total_steps={40 * int(os.environ['LT_DEVICES'])}",
+        f"algo.train_every={8 * int(os.environ['LT_DEVICES'])}",
+        "algo.per_rank_gradient_steps=1",
+        "algo.horizon=4",
+        "env.id=discrete_dummy",
+        f"root_dir={root_dir}",
+        f"run_name={run_name}",
+        "algo.dense_units=8",
+        "algo.world_model.encoder.cnn_channels_multiplier=2",
+        "algo.world_model.recurrent_model.recurrent_state_size=8",
+        "algo.world_model.representation_model.hidden_size=8",
+        "algo.world_model.transition_model.hidden_size=8",
+        "algo.cnn_keys.encoder=[rgb]",
+        "algo.cnn_keys.decoder=[rgb]",
+    ]
+
+    with mock.patch.object(sys, "argv", args):
+        run()
+    remove_test_dir(os.path.join("logs", "runs", f"pytest_{start_time}"))
+
+
+def test_p2e_dv3_prioritized(standard_args, start_time):
+    root_dir = os.path.join(f"pytest_{start_time}", "p2e_dv3", os.environ["LT_DEVICES"])
+    run_name = "test_p2e_dv3_prioritized"
+    args = standard_args + [
+        "exp=p2e_dv3_exploration",
+        "env=dummy",
+        "algo.per_rank_batch_size=1",
+        "algo.per_rank_sequence_length=1",
+        f"buffer.size={int(os.environ['LT_DEVICES'])}",
+        "buffer.prioritized.enabled=True",
+        "algo.learning_starts=0",
+        "algo.per_rank_gradient_steps=1",
+        "algo.horizon=8",
+        "env.id=discrete_dummy",
+        f"root_dir={root_dir}",
+        f"run_name={run_name}",
+        "algo.dense_units=8",
+        "algo.world_model.encoder.cnn_channels_multiplier=2",
+        "algo.world_model.recurrent_model.recurrent_state_size=8",
+        "algo.world_model.representation_model.hidden_size=8",
+        "algo.world_model.transition_model.hidden_size=8",
+        "algo.layer_norm=True",
+        "algo.train_every=1",
+        "algo.cnn_keys.encoder=[rgb]",
+        "algo.cnn_keys.decoder=[rgb]",
     ]
 
     with mock.patch.object(sys, "argv", args):
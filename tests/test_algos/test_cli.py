@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 import subprocess
@@ -306,3 +307,51 @@ def test_evaluate():
         shutil.rmtree(path)
     except (OSError, WindowsError):
         warnings.warn("Unable to delete folder {}.".format(path))
+
+
+def test_evaluate_batched():
+    root_dir = "pytest_test_evaluate_batched"
+    run_name = "test_evaluate_batched"
+    subprocess.run(
+        sys.executable + " sheeprl.py exp=dreamer_v3 env=dummy dry_run=True "
+        "env.capture_video=False algo.dense_units=8 algo.horizon=8 "
+        "algo.cnn_keys.encoder=[rgb] algo.cnn_keys.decoder=[rgb] "
+        "algo.world_model.encoder.cnn_channels_multiplier=2 algo.per_rank_gradient_steps=1 "
+        "algo.world_model.recurrent_model.recurrent_state_size=8 "
+        "algo.world_model.representation_model.hidden_size=8 algo.learning_starts=0 "
+        "algo.world_model.transition_model.hidden_size=8 buffer.size=10 "
+        "algo.layer_norm=True algo.per_rank_batch_size=1 algo.per_rank_sequence_length=1 "
+        f"algo.train_every=1 root_dir={root_dir} run_name={run_name} "
+        "checkpoint.save_last=True metric.log_level=0 metric.disable_timer=True "
+        # The agent is trained stepping the environments in partial batches larger than
+        # the number of the test environments, which must ignore them
+        "env.num_envs=4 env.async_batch_size=3 env.sync_env=False algo.run_test=True",
+        shell=True,
+        check=True,
+    )
+
+    ckpt_root = os.path.join("logs", "runs", root_dir, run_name)
+    ckpt_dir = sorted([d for d in os.listdir(ckpt_root) if "version" in d])[-1]
+    ckpt_path = os.path.join(ckpt_root, ckpt_dir, "checkpoint")
+    ckpt_file_name = os.listdir(ckpt_path)[-1]
+    ckpt_path = os.path.join(ckpt_path, ckpt_file_name)
+    results_path = os.path.join(ckpt_root, "results.json")
+    # All the episodes are evaluated by a single process, with two environments
+    subprocess.run(
+        sys.executable + f" sheeprl_eval.py checkpoint_path={ckpt_path} env.capture_video=False "
+        f"num_evals=3 env.num_envs=2 results_path={results_path}",
+        shell=True,
+        check=True,
+    )
+    with open(results_path) as f:
+        results = json.load(f)
+    assert results["num_evals"] == 3
+    assert [e["episode"] for e in results["episodes"]] == [0, 1, 2]
+    assert [e["env_idx"] for e in results["episodes"]] == [0, 1, 0]
+    assert set(results["cumulative_reward"].keys()) == {"mean", "std", "min", "max"}
+
+    try:
+        path = os.path.join("logs", "runs", root_dir)
+        shutil.rmtree(path)
+    except (OSError, WindowsError):
+        warnings.warn("Unable to delete folder {}.".format(path))
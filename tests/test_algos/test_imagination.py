@@ -0,0 +1,78 @@
+import pytest
+import torch
+
+from sheeprl.algos.dreamer_v3.agent import RSSM, Actor, RecurrentModel
+from sheeprl.algos.dreamer_v3.utils import ImaginationEngine
+from sheeprl.models.models import MLP
+from sheeprl.utils.utils import dotdict
+
+HORIZON, B, STOCH, DISCRETE, RECURRENT, ACTIONS_DIM = 4, 6, 3, 4, 8, (2, 3)
+
+
+@pytest.fixture()
+def models():
+    torch.manual_seed(0)
+    stoch_state_size = STOCH * DISCRETE
+    distribution_cfg = dotdict({"validate_args": False})
+    rssm = RSSM(
+        RecurrentModel(stoch_state_size + sum(ACTIONS_DIM), RECURRENT, 8),
+        MLP(RECURRENT + 5, stoch_state_size, [8]),
+        MLP(RECURRENT, stoch_state_size, [8]),
+        distribution_cfg,
+        discrete=DISCRETE,
+    )
+    actor = Actor(stoch_state_size + RECURRENT, ACTIONS_DIM, False, distribution_cfg, dense_units=8, mlp_layers=1)
+    return rssm, actor
+
+
+def _imagine(rssm, actor, prior, recurrent_state):
+    # The imagination loop of the behaviour learning
+    imagined_latent_state = torch.cat((prior, recurrent_state), -1)
+    imagined_trajectories = [imagined_latent_state]
+    actions = torch.cat(actor(imagined_latent_state.detach())[0], dim=-1)
+    imagined_actions = [actions]
+    for _ in range(HORIZON):
+        prior, recurrent_state = rssm.imagination(prior, recurrent_state, actions)
+        prior = prior.view(1, -1, STOCH * DISCRETE)
+        imagined_latent_state = torch.cat((prior, recurrent_state), -1)
+        imagined_trajectories.append(imagined_latent_state)
+        actions = torch.cat(actor(imagined_latent_state.detach())[0], dim=-1)
+        imagined_actions.append(actions)
+    return torch.cat(imagined_trajectories), torch.cat(imagined_actions)
+
+
+def test_imagination_engine(models):
+    rssm, actor = models
+    imagination = ImaginationEngine(rssm, actor, HORIZON, STOCH, DISCRETE, RECURRENT, ACTIONS_DIM)
+    prior = torch.randn(1, B, STOCH * DISCRETE)
+    recurrent_state = torch.randn(1, B, RECURRENT)
+    params = list(rssm.recurrent_model.parameters()) + list(rssm.transition_model.parameters())
+    for _ in range(2):
+        seed = torch.randint(0, 1000, ()).item()
+        torch.manual_seed(seed)
+        expected_trajectories, expected_actions = _imagine(rssm, actor, prior, recurrent_state)
+        expected_grads = torch.autograd.grad(expected_trajectories.sum(), params)
+        torch.manual_seed(seed)
+        trajectories, actions = imagination(prior, recurrent_state)
+        # The buffers are reused across the rollouts
+        assert trajectories.data_ptr() == imagination._trajectories.data_ptr()
+        torch.testing.assert_close(trajectories, expected_trajectories)
+        torch.testing.assert_close(actions, expected_actions)
+        for grad, expected_grad in zip(torch.autograd.grad(trajectories.sum(), params), expected_grads):
+            torch.testing.assert_close(grad, expected_grad)
+
+
+def test_imagination_engine_compile(models):
+    rssm, actor = models
+    imagination = ImaginationEngine(rssm, actor, HORIZON, STOCH, DISCRETE, RECURRENT, ACTIONS_DIM, compile=True)
+    prior = torch.randn(1, B, STOCH * DISCRETE)
+    recurrent_state = torch.randn(1, B, RECURRENT)
+    for _ in range(2):
+        trajectories, actions = imagination(prior, recurrent_state)
+        assert trajectories.shape == (HORIZON + 1, B, STOCH * DISCRETE + RECURRENT)
+        assert actions.shape == (HORIZON + 1, B, sum(ACTIONS_DIM))
+        torch.testing.assert_close(trajectories[0], torch.cat((prior, recurrent_state), -1)[0])
+        # The actions are one-hot
+        assert torch.all(actions.detach().sum(-1) == len(ACTIONS_DIM))
+        (trajectories.sum() + actions.sum()).backward()
+        assert all(p.grad is not None for p in rssm.transition_model.parameters())
@@ -0,0 +1,84 @@
+import pytest
+import torch
+
+from sheeprl.algos.dreamer_v1 import agent as dv1_agent
+from sheeprl.algos.dreamer_v1.utils import compute_stochastic_state as dv1_compute_stochastic_state
+from sheeprl.algos.dreamer_v2 import agent as dv2_agent
+from sheeprl.algos.dreamer_v2.utils import compute_stochastic_state
+from sheeprl.algos.dreamer_v3 import agent as dv3_agent
+from sheeprl.models.models import MLP
+from sheeprl.utils.utils import dotdict
+
+T, B, STOCH, DISCRETE, RECURRENT, EMBEDDED, ACTIONS = 6, 3, 4, 5, 16, 7, 2
+
+
+@pytest.fixture()
+def inputs():
+    torch.manual_seed(0)
+    is_first = torch.zeros(T, B, 1)
+    is_first[0] = 1
+    is_first[3, 1] = 1
+    return torch.randn(T, B, ACTIONS), torch.randn(T, B, EMBEDDED), is_first
+
+
+def _discrete_mode(logits, discrete=32, sample=True, validate_args=False):
+    # Make the states deterministic, so that the dynamic learning is not affected by the order of the samplings
+    return compute_stochastic_state(logits, discrete=discrete, sample=False, validate_args=validate_args)
+
+
+def _discrete_rssm(agent):
+    stoch_state_size = STOCH * DISCRETE
+    kwargs = {"discrete": DISCRETE, "distribution_cfg": dotdict({"validate_args": False})}
+    return agent.RSSM(
+        agent.RecurrentModel(stoch_state_size + ACTIONS, RECURRENT, 8),
+        MLP(RECURRENT + EMBEDDED, stoch_state_size, [8]),
+        MLP(RECURRENT, stoch_state_size, [8]),
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("agent", [dv2_agent, dv3_agent])
+def test_discrete_rssm_dynamic_sequence(agent, inputs, monkeypatch):
+    monkeypatch.setattr(agent, "compute_stochastic_state", _discrete_mode)
+    actions, embedded_obs, is_first = inputs
+    rssm = _discrete_rssm(agent)
+    posterior = torch.zeros(1, B, STOCH, DISCRETE)
+    recurrent_state = torch.zeros(1, B, RECURRENT)
+    sequence = rssm.dynamic_sequence(posterior, recurrent_state, actions, embedded_obs, is_first)
+    steps = []
+    for i in range(T):
+        recurrent_state, posterior, prior, posterior_logits, prior_logits = rssm.dynamic(
+            posterior, recurrent_state, actions[i : i + 1], embedded_obs[i : i + 1], is_first[i : i + 1]
+        )
+        steps.append((recurrent_state, posterior, prior, posterior_logits, prior_logits))
+    for seq_value, step_values in zip(sequence, zip(*steps)):
+        torch.testing.assert_close(seq_value, torch.cat(step_values))
+
+
+def test_dreamer_v1_rssm_dynamic_sequence(inputs, monkeypatch):
+    def mean_state(state_information, event_shape=1, min_std=0.1, validate_args=False):
+        (mean, std), _ = dv1_compute_stochastic_state(state_information, event_shape, min_std, validate_args)
+        return (mean, std), mean
+
+    monkeypatch.setattr(dv1_agent, "compute_stochastic_state", mean_state)
+    actions, embedded_obs, _ = inputs
+    rssm = dv1_agent.RSSM(
+        dv1_agent.RecurrentModel(STOCH + ACTIONS, RECURRENT),
+        MLP(RECURRENT + EMBEDDED, 2 * STOCH, [8]),
+        MLP(RECURRENT, 2 * STOCH, [8]),
+        dotdict({"validate_args": False}),
+    )
+    posterior = torch.zeros(1, B, STOCH)
+    recurrent_state = torch.zeros(1, B, RECURRENT)
+    recurrent_states, posteriors, priors, posteriors_mean_std, priors_mean_std = rssm.dynamic_sequence(
+        posterior, recurrent_state, actions, embedded_obs
+    )
+    for i in range(T):
+        recurrent_state, posterior, prior, posterior_mean_std, prior_mean_std = rssm.dynamic(
+            posterior, recurrent_state, actions[i : i + 1], embedded_obs[i : i + 1]
+        )
+        torch.testing.assert_close(recurrent_states[i : i + 1], recurrent_state)
+        torch.testing.assert_close(posteriors[i : i + 1], posterior)
+        torch.testing.assert_close(priors[i : i + 1], prior)
+        for seq_value, step_value in zip(posteriors_mean_std + priors_mean_std, posterior_mean_std + prior_mean_std):
+            torch.testing.assert_close(seq_value[i : i + 1], step_value)
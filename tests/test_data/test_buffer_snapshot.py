@@ -0,0 +1,155 @@
+import gc
+import os
+import pickle
+
+import numpy as np
+import pytest
+import torch
+from lightning import Fabric
+
+from sheeprl.data.buffers import EnvIndependentReplayBuffer, EpisodeBuffer, ReplayBuffer, SequentialReplayBuffer
+from sheeprl.data.snapshot import BufferSnapshot
+from sheeprl.utils.callback import CheckpointCallback
+from sheeprl.utils.memmap import MemmapArray
+
+
+def add_steps(rb, start, n, n_envs=2):
+    rb.add(
+        {
+            "observations": np.arange(start, start + n * n_envs).reshape(n, n_envs, 1),
+            "dones": np.zeros((n, n_envs, 1)),
+        }
+    )
+
+
+def assert_buffers_equal(rb, other):
+    assert rb._pos == other._pos and rb.full == other.full
+    assert rb.buffer.keys() == other.buffer.keys()
+    # Only the elements added to the buffer are snapshotted
+    n_elements = rb.buffer_size if rb.full else rb._pos
+    for k in rb.buffer.keys():
+        np.testing.assert_array_equal(np.asarray(rb[k])[:n_elements], np.asarray(other[k])[:n_elements])
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_buffer_snapshot_incremental(memmap, tmp_path):
+    rb = ReplayBuffer(10, 2, memmap=memmap, memmap_dir=tmp_path / "memmap_buffer")
+    snapshot = BufferSnapshot(tmp_path / "snapshot")
+    add_steps(rb, 0, 4)
+    restored = pickle.loads(pickle.dumps(snapshot.save(rb)))
+    snapshot.wait()
+    assert_buffers_equal(rb, restored)
+    assert isinstance(restored["observations"], MemmapArray)
+    assert restored["observations"].filename == (tmp_path / "snapshot" / "observations.memmap").resolve()
+
+    # Only the new elements are copied into the snapshot files
+    add_steps(rb, 100, 3)
+    rb["observations"][0] = -1
+    restored = pickle.loads(pickle.dumps(snapshot.save(rb)))
+    snapshot.wait()
+    assert restored._pos == 7
+    np.testing.assert_array_equal(restored["observations"][0], [[0], [1]])
+    np.testing.assert_array_equal(restored["observations"][1:7], rb["observations"][1:7])
+
+    # More elements than the buffer size are added: the whole buffer is copied
+    add_steps(rb, 200, 13)
+    restored = pickle.loads(pickle.dumps(snapshot.save(rb)))
+    snapshot.wait()
+    assert_buffers_equal(rb, restored)
+
+
+def test_buffer_snapshot_is_small(tmp_path):
+    rb = SequentialReplayBuffer(1000, 2)
+    rb.add({"observations": np.zeros((1000, 2, 3, 16, 16), dtype=np.uint8), "dones": np.zeros((1000, 2, 1))})
+    snapshot = BufferSnapshot(tmp_path / "snapshot")
+    assert len(pickle.dumps(snapshot.save(rb))) < len(pickle.dumps(rb)) // 100
+    snapshot.wait()
+
+
+def test_buffer_snapshot_copies_the_added_elements(tmp_path):
+    rb = ReplayBuffer(10, 2)
+    add_steps(rb, 0, 4)
+    rb["observations"][4:] = -1
+    snapshot = BufferSnapshot(tmp_path / "snapshot")
+    restored = pickle.loads(pickle.dumps(snapshot.save(rb)))
+    snapshot.wait()
+    np.testing.assert_array_equal(restored["observations"][:4], rb["observations"][:4])
+    np.testing.assert_array_equal(restored["observations"][4:], 0)
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_buffer_snapshot_copy_on_write(memmap, tmp_path):
+    rb = ReplayBuffer(10, 2, memmap=memmap, memmap_dir=tmp_path / "memmap_buffer")
+    snapshot = BufferSnapshot(tmp_path / "snapshot")
+    add_steps(rb, 0, 4)
+    saved = pickle.dumps(snapshot.save(rb))
+    snapshot.wait()
+    # The restored buffer does not modify the snapshot files, even if it is memory-mapped
+    restored = pickle.loads(saved)
+    assert restored.is_memmap == memmap
+    add_steps(restored, 100, 10)
+    restored["observations"].flush()
+    del restored
+    np.testing.assert_array_equal(pickle.loads(saved)["observations"][:4], rb["observations"][:4])
+
+
+def test_buffer_snapshot_replaced_key(tmp_path):
+    rb = ReplayBuffer(10, 2)
+    snapshot = BufferSnapshot(tmp_path / "snapshot")
+    add_steps(rb, 0, 4)
+    previous = snapshot.save(rb)
+    previous_filename = previous["observations"].filename
+    rb["observations"] = np.full((10, 2, 1), 7)
+    restored = pickle.loads(pickle.dumps(snapshot.save(rb)))
+    snapshot.wait()
+    np.testing.assert_array_equal(restored["observations"], 7)
+    assert restored["observations"].filename != previous_filename
+
+    # The file of the replaced array is removed only when it is not mapped anymore
+    assert previous_filename.is_file()
+    np.testing.assert_array_equal(previous["observations"][:4, :, 0], np.arange(8).reshape(4, 2))
+    del previous
+    gc.collect()
+    assert not previous_filename.is_file()
+
+
+def test_buffer_snapshot_env_independent(tmp_path):
+    rb = EnvIndependentReplayBuffer(10, 2, memmap=True, memmap_dir=tmp_path / "memmap_buffer")
+    snapshot = BufferSnapshot(tmp_path / "snapshot")
+    add_steps(rb, 0, 4)
+    rb.add({"observations": np.ones((3, 1, 1)), "dones": np.zeros((3, 1, 1))}, env_idxes=[1])
+    restored = pickle.loads(pickle.dumps(snapshot.save(rb)))
+    snapshot.wait()
+    assert isinstance(restored, EnvIndependentReplayBuffer)
+    for b, restored_b in zip(rb.buffer, restored.buffer):
+        assert_buffers_equal(b, restored_b)
+    assert os.path.isfile(tmp_path / "snapshot" / "env_1" / "observations.memmap")
+
+
+def test_buffer_snapshot_wrong_buffer(tmp_path):
+    with pytest.raises(TypeError, match="can be snapshotted"):
+        BufferSnapshot(tmp_path).save(EpisodeBuffer(10, 2))
+
+
+def test_checkpoint_callback_incremental_buffer(tmp_path):
+    fabric = Fabric(accelerator="cpu", devices=1)
+    callback = CheckpointCallback(incremental_buffer=True)
+    rb = ReplayBuffer(10, 2)
+    add_steps(rb, 0, 4)
+    ckpt_path = str(tmp_path / "checkpoint" / "ckpt_0.ckpt")
+    callback.on_checkpoint_coupled(fabric, ckpt_path, {}, replay_buffer=rb)
+    callback._snapshots[tmp_path / "checkpoint" / "buffer" / "rank_0"].wait()
+
+    # The live buffer is left untouched, while the checkpointed one has the last episodes truncated
+    np.testing.assert_array_equal(rb["dones"][:4], 0)
+    restored = torch.load(ckpt_path, weights_only=False)["rb"]
+    assert isinstance(restored, ReplayBuffer)
+    np.testing.assert_array_equal(restored["dones"][3], 1)
+    np.testing.assert_array_equal(restored["observations"][:4], rb["observations"][:4])
+
+    # The next checkpoint restores the true 'dones' of the previously truncated elements
+    add_steps(rb, 100, 2)
+    callback.on_checkpoint_coupled(fabric, ckpt_path, {}, replay_buffer=rb)
+    callback._snapshots[tmp_path / "checkpoint" / "buffer" / "rank_0"].wait()
+    restored = torch.load(ckpt_path, weights_only=False)["rb"]
+    np.testing.assert_array_equal(restored["dones"][:6, :, 0], [[0, 0]] * 5 + [[1, 1]])
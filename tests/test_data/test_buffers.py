@@ -95,6 +95,33 @@ def test_replay_buffer_add_single_td_size_is_multiple():
     np.testing.assert_allclose(rb["a"], td1["a"][-buf_size:])
 
 
+def test_replay_buffer_add_wrapping_around():
+    buf_size = 5
+    n_envs = 2
+    rb = ReplayBuffer(buf_size, n_envs)
+    td1 = {"a": np.arange(3 * n_envs).reshape(3, n_envs, 1)}
+    td2 = {"a": np.arange(3 * n_envs, 7 * n_envs).reshape(4, n_envs, 1)}
+    rb.add(td1)
+    rb.add(td2)
+    assert rb.full
+    assert rb._pos == 2
+    np.testing.assert_allclose(rb["a"][3:], td2["a"][:2])
+    np.testing.assert_allclose(rb["a"][:2], td2["a"][2:])
+    np.testing.assert_allclose(rb["a"][2], td1["a"][2])
+
+
+def test_replay_buffer_add_exceeding_buf_size_when_full():
+    buf_size = 5
+    n_envs = 1
+    rb = ReplayBuffer(buf_size, n_envs)
+    rb.add({"a": np.random.rand(7, 1, 1)})
+    td = {"a": np.arange(17).reshape(-1, 1, 1)}
+    rb.add(td)
+    assert rb.full
+    assert rb._pos == 4
+    np.testing.assert_allclose(np.roll(rb["a"], -rb._pos, axis=0), td["a"][-buf_size:])
+
+
 def test_replay_buffer_add_replay_buffer():
     buf_size = 5
     n_envs = 1
@@ -182,6 +209,15 @@ def test_replay_buffer_get_sample_empty_error():
         rb._get_samples(np.zeros((1,)), sample_next_obs=True)
 
 
+@pytest.mark.parametrize("memmap", [False, True])
+def test_replay_buffer_get_sample_out_of_range_error(memmap, tmp_path):
+    rb = ReplayBuffer(5, 2, memmap=memmap, memmap_dir=tmp_path / "memmap_buffer")
+    rb.add({"a": np.random.rand(5, 2, 1)})
+    # The indexes are not wrapped around the buffer
+    with pytest.raises(IndexError):
+        rb._get_samples(np.array([5]), env_idxes=np.array([0]))
+
+
 def test_replay_buffer_sample_next_obs_not_full():
     buf_size = 5
     n_envs = 1
@@ -204,6 +240,31 @@ def test_replay_buffer_sample_next_obs_full():
     assert td1["observations"][-1] not in s["observations"]
 
 
+@pytest.mark.parametrize("pos", [0, 1, 3])
+def test_replay_buffer_sample_next_obs_full_valid_idxes(pos):
+    buf_size = 5
+    n_envs = 1
+    rb = ReplayBuffer(buf_size, n_envs)
+    rb.add({"observations": np.arange(buf_size + pos).reshape(-1, 1, 1)})
+    assert rb._pos == pos
+    s = rb.sample(1000, sample_next_obs=True)
+    last_inserted = rb["observations"][(pos - 1) % buf_size]
+    assert last_inserted not in s["observations"]
+    assert set(np.unique(s["observations"])) == set(rb["observations"].flat) - {last_inserted.item()}
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_replay_buffer_sample_next_obs_same_env(memmap, tmp_path):
+    buf_size = 7
+    n_envs = 3
+    rb = ReplayBuffer(buf_size, n_envs, memmap=memmap, memmap_dir=tmp_path / "memmap_buffer")
+    rb.add({"observations": np.arange((buf_size + 2) * n_envs).reshape(-1, n_envs, 1)})
+    s = rb.sample(200, sample_next_obs=True)
+    # The next observation is the one of the same environment at the following step
+    assert (s["next_observations"] - s["observations"] == n_envs).all()
+    assert len(np.unique(s["observations"] % n_envs)) == n_envs
+
+
 def test_replay_buffer_sample_full():
     buf_size = 5
     n_envs = 1
@@ -447,3 +508,33 @@ def test_setitem_error():
         rb["wrong_buffer_size"] = np.zeros((buf_size + 3, n_envs, 1))
         rb["wrong_n_envs"] = np.zeros((buf_size, n_envs - 1, 1))
         rb["wrong_dims"] = np.zeros((10,))
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_replay_buffer_compression(memmap, tmp_path):
+    from sheeprl.data.buffers import SequentialReplayBuffer
+    from sheeprl.utils.compression import CompressedArray
+
+    data = {
+        "observations": np.random.randint(0, 255, (30, 2, 3, 8, 8), dtype=np.uint8),
+        "rewards": np.random.rand(30, 2, 1),
+    }
+    for cls in (ReplayBuffer, SequentialReplayBuffer):
+        rb = cls(16, 2)
+        compressed_rb = cls(
+            16, 2, memmap=memmap, memmap_dir=tmp_path / cls.__name__, compression={"observations": "zlib"}
+        )
+        rb.add(data)
+        compressed_rb.add(data)
+        assert isinstance(compressed_rb["observations"], CompressedArray)
+        assert not isinstance(compressed_rb["rewards"], CompressedArray)
+        np.testing.assert_array_equal(np.asarray(compressed_rb["observations"]), rb["observations"])
+
+        seed = np.random.randint(1000)
+        rb._rng, compressed_rb._rng = np.random.default_rng(seed), np.random.default_rng(seed)
+        kwargs = {"sequence_length": 4} if cls is SequentialReplayBuffer else {"sample_next_obs": True}
+        sample = rb.sample(5, n_samples=2, **kwargs)
+        compressed_sample = compressed_rb.sample(5, n_samples=2, **kwargs)
+        assert sample.keys() == compressed_sample.keys()
+        for k in sample.keys():
+            np.testing.assert_array_equal(sample[k], compressed_sample[k])
@@ -47,6 +47,19 @@ def test_env_independent_add_error():
     stps = {"dones": np.zeros((10, 3, 1))}
     with pytest.raises(ValueError):
         rb.add(stps)
+    with pytest.raises(ValueError, match="The length of 'env_idxes'"):
+        rb.add({"dones": np.zeros((1, 2, 1))}, env_idxes=[0, 1, 2])
+
+
+def test_env_independent_add_partial_batches():
+    rb = EnvIndependentReplayBuffer(10, 4)
+    rb.add({"observations": np.arange(4).reshape(1, 4, 1)})
+    # The environments return their results in partial (and unordered) batches
+    rb.add({"observations": np.array([[[13], [11]]])}, env_idxes=np.array([3, 1]))
+    rb.add({"observations": np.array([[[21]]])}, env_idxes=[1])
+    assert [b._pos for b in rb.buffer] == [1, 3, 1, 2]
+    np.testing.assert_array_equal(rb.buffer[1]["observations"][:3, 0, 0], [1, 11, 21])
+    np.testing.assert_array_equal(rb.buffer[3]["observations"][:2, 0, 0], [3, 13])
 
 
 def test_env_independent_sample_shape():
@@ -297,8 +297,9 @@ def test_memmap_episode_buffer():
         }
         ep["dones"][-1] = 1
         rb.add(ep)
-        assert isinstance(rb._buf[-1]["dones"], MemmapArray)
-        assert isinstance(rb._buf[-1]["observations"], MemmapArray)
+        assert isinstance(rb._storage["dones"], MemmapArray)
+        assert isinstance(rb._storage["observations"], MemmapArray)
+        assert np.shares_memory(rb._buf[-1]["observations"], rb._storage["observations"].array)
     assert rb.is_memmap
     del rb
     shutil.rmtree(os.path.abspath("test_episode_buffer"))
@@ -324,9 +325,8 @@ def test_memmap_to_file_episode_buffer():
         ep["dones"][-1] = 1
         rb.add(ep)
         del ep
-        assert isinstance(rb._buf[-1]["dones"], MemmapArray)
-        assert isinstance(rb._buf[-1]["observations"], MemmapArray)
-        memmap_dir = os.path.dirname(rb._buf[-1]["dones"].filename)
+        assert isinstance(rb._storage["dones"], MemmapArray)
+        assert isinstance(rb._storage["observations"], MemmapArray)
         assert os.path.exists(os.path.join(memmap_dir, "dones.memmap"))
         assert os.path.exists(os.path.join(memmap_dir, "observations.memmap"))
     assert rb.is_memmap
@@ -385,3 +385,108 @@ def test_add_rb():
     assert (rb["a"][:, 0] == epb._buf[0]["a"]).all()
     assert (rb["a"][:, 1] == epb._buf[1]["a"]).all()
     assert (rb["a"][:, 2] == epb._buf[2]["a"]).all()
+
+
+def _episode(ep_len, value):
+    ep = {"dones": np.zeros((ep_len, 1, 1)), "a": np.full((ep_len, 1, 1), value, dtype=np.float32)}
+    ep["dones"][-1] = 1
+    return ep
+
+
+def test_episode_buffer_circular_storage_eviction():
+    buf_size = 20
+    rb = EpisodeBuffer(buf_size, 2, obs_keys=("a",))
+    rng = np.random.default_rng(42)
+    added = []
+    for i in range(200):
+        ep_len = int(rng.integers(2, 12))
+        rb.add(_episode(ep_len, i))
+        added.append((ep_len, i))
+        assert len(rb) <= buf_size
+        # The stored episodes are the most recent ones, from the oldest to the newest
+        stored = [(len(ep["a"]), ep["a"][0, 0]) for ep in rb.buffer]
+        assert stored == added[-len(stored) :]
+        for ep, start in zip(rb.buffer, rb._episode_starts):
+            assert (ep["a"] == ep["a"][0]).all()
+            # Only the episodes that wrap around the end of the storage are copied
+            assert np.shares_memory(ep["a"], rb._storage["a"]) == (start + len(ep["a"]) <= buf_size)
+    assert rb._cum_lengths[-1] == len(rb)
+
+
+def test_episode_buffer_capacity():
+    # The buffer holds as many episodes as if every episode was stored in its own arrays:
+    # the oldest episodes are removed only when the new one does not fit in the 'buffer_size' steps
+    buf_size = 44
+    rb = EpisodeBuffer(buf_size, 2, obs_keys=("a",))
+    rng = np.random.default_rng(0)
+    expected = []
+    for i in range(100):
+        ep_len = int(rng.integers(2, 12))
+        rb.add(_episode(ep_len, i))
+        expected.append(ep_len)
+        while sum(expected) > buf_size:
+            expected.pop(0)
+        assert [len(ep["a"]) for ep in rb.buffer] == expected
+        assert len(rb) == sum(expected)
+
+
+def test_episode_buffer_sample_sequences_from_single_episode():
+    rb = EpisodeBuffer(50, 3, obs_keys=("a",))
+    for i in range(12):
+        ep = _episode(3 + i % 5, i)
+        ep["a"] += np.arange(len(ep["a"]), dtype=np.float32).reshape(-1, 1, 1) / 100
+        rb.add(ep)
+    samples = rb.sample(8, sample_next_obs=True, n_samples=4, sequence_length=3)
+    assert samples["a"].shape == (4, 3, 8, 1)
+    # Every sequence is made of consecutive steps of the same episode
+    assert (np.floor(samples["a"]) == np.floor(samples["a"][:, :1])).all()
+    np.testing.assert_allclose(np.diff(samples["a"], axis=1), 0.01, atol=1e-5)
+    np.testing.assert_allclose(samples["next_a"] - samples["a"], 0.01, atol=1e-5)
+
+
+def test_episode_buffer_sample_seeded_rng():
+    rb = EpisodeBuffer(50, 2, obs_keys=("a",))
+    for i in range(10):
+        rb.add(_episode(2 + i % 4, i))
+    rb._rng = np.random.default_rng(0)
+    s1 = rb.sample(8, n_samples=2, sequence_length=2)
+    rb._rng = np.random.default_rng(0)
+    s2 = rb.sample(8, n_samples=2, sequence_length=2)
+    np.testing.assert_array_equal(s1["a"], s2["a"])
+
+
+def test_episode_buffer_pickle():
+    import pickle
+
+    rb = EpisodeBuffer(20, 2, obs_keys=("a",))
+    for i in range(10):
+        rb.add(_episode(2 + i % 4, i))
+    restored = pickle.loads(pickle.dumps(rb))
+    assert len(restored) == len(rb)
+    for ep, restored_ep in zip(rb.buffer, restored.buffer):
+        np.testing.assert_array_equal(ep["a"], restored_ep["a"])
+        assert np.shares_memory(restored_ep["a"], restored._storage["a"]) == np.shares_memory(ep["a"], rb._storage["a"])
+    restored.add(_episode(5, 10))
+    assert restored.buffer[-1]["a"][0, 0] == 10
+
+
+def test_episode_buffer_compression():
+    from sheeprl.utils.compression import CompressedArray
+
+    rb = EpisodeBuffer(30, 4, n_envs=2, obs_keys=("observations",))
+    compressed_rb = EpisodeBuffer(30, 4, n_envs=2, obs_keys=("observations",), compression={"observations": "zlib"})
+    for _ in range(3):
+        episode = {
+            "observations": np.random.randint(0, 255, (8, 2, 3, 8, 8), dtype=np.uint8),
+            "dones": np.zeros((8, 2, 1)),
+        }
+        episode["dones"][-1] = 1
+        rb.add(episode)
+        compressed_rb.add(episode)
+    assert isinstance(compressed_rb._storage["observations"], CompressedArray)
+
+    rb._rng, compressed_rb._rng = np.random.default_rng(0), np.random.default_rng(0)
+    sample = rb.sample(6, n_samples=2, sequence_length=4)
+    compressed_sample = compressed_rb.sample(6, n_samples=2, sequence_length=4)
+    for k in sample.keys():
+        np.testing.assert_array_equal(sample[k], compressed_sample[k])
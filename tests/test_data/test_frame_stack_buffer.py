@@ -0,0 +1,98 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from sheeprl.data.buffers import (
+    EnvIndependentReplayBuffer,
+    PrioritizedReplayBuffer,
+    ReplayBuffer,
+    SequentialReplayBuffer,
+)
+
+
+def stacked_episodes(n_steps, n_envs, num_stack, dilation, rng):
+    """Generate the stacks of frames as the 'FrameStack' wrapper does, with random episode ends."""
+    dones = rng.random((n_steps, n_envs, 1)) < 0.15
+    frames = np.arange(n_steps * n_envs).reshape(n_steps, n_envs, 1, 1)
+    stacks = np.empty((n_steps, n_envs, num_stack, 1, 1), dtype=frames.dtype)
+    for env in range(n_envs):
+        queue = deque(maxlen=num_stack * dilation)
+        for t in range(n_steps):
+            if t == 0 or dones[t - 1, env]:
+                queue.extend([frames[t, env]] * num_stack * dilation)
+            else:
+                queue.append(frames[t, env])
+            stacks[t, env] = np.stack(list(queue)[dilation - 1 :: dilation])
+    return {"observations": stacks, "dones": dones.astype(np.float32)}
+
+
+def test_frame_stack_buffer_wrong_args():
+    with pytest.raises(ValueError, match="must be both greater than zero"):
+        ReplayBuffer(10, frame_stack=0)
+    with pytest.raises(ValueError, match="must be greater than the number of steps spanned"):
+        ReplayBuffer(6, frame_stack=4, frame_stack_dilation=2, frame_stack_keys=("observations",))
+    rb = ReplayBuffer(10, frame_stack=4, frame_stack_keys=("observations",))
+    with pytest.raises(RuntimeError, match="The 'is_first' or the 'dones' key must be added"):
+        rb.add({"observations": np.zeros((2, 1, 4, 1))})
+    with pytest.raises(RuntimeError, match=r"must have shape \[sequence_length, n_envs, 4, ...\]"):
+        rb.add({"observations": np.zeros((2, 1, 3, 1)), "dones": np.zeros((2, 1, 1))})
+
+
+@pytest.mark.parametrize("dilation", [1, 2])
+@pytest.mark.parametrize("memmap", [False, True])
+@pytest.mark.parametrize("buffer_cls", [ReplayBuffer, SequentialReplayBuffer, PrioritizedReplayBuffer])
+def test_frame_stack_buffer_sample(buffer_cls, memmap, dilation, tmp_path):
+    rng = np.random.default_rng(0)
+    data = stacked_episodes(70, 2, 4, dilation, rng)
+    rb = buffer_cls(
+        32,
+        2,
+        memmap=memmap,
+        memmap_dir=tmp_path / "memmap_buffer",
+        frame_stack=4,
+        frame_stack_dilation=dilation,
+        frame_stack_keys=("observations",),
+    )
+    # Add the data in chunks, so that the buffer wraps around and the episodes span several calls
+    for start in range(0, 70, 10):
+        rb.add({k: v[start : start + 10] for k, v in data.items()})
+    assert rb["observations"].shape == (32, 2, 1, 1)
+
+    if buffer_cls is SequentialReplayBuffer:
+        kwargs = {"sequence_length": 3}
+    else:
+        kwargs = {"sample_next_obs": True}
+    for _ in range(10):
+        sample = rb.sample(16, n_samples=2, **kwargs)
+        assert sample["observations"].shape[-3:] == (4, 1, 1)
+        # The frames are unique, so the last frame of a stack identifies the step and the environment
+        time_idxes, env_idxes = np.divmod(sample["observations"][..., -1, 0, 0], 2)
+        np.testing.assert_array_equal(sample["observations"], data["observations"][time_idxes, env_idxes])
+        if "next_observations" in sample:
+            next_observations = data["observations"][time_idxes + 1, env_idxes]
+            np.testing.assert_array_equal(sample["next_observations"], next_observations)
+        # The stacks of the oldest elements would need frames that have been overwritten
+        assert (time_idxes >= 70 - 32 + 3 * dilation).all()
+
+
+def test_frame_stack_buffer_is_first():
+    rb = SequentialReplayBuffer(10, 1, frame_stack=2, frame_stack_keys=("observations",))
+    is_first = np.array([1, 0, 0, 1, 0]).reshape(5, 1, 1)
+    frames = np.arange(5).reshape(5, 1, 1)
+    stacks = np.stack([np.concatenate([[0], frames[:-1, 0, 0]]), frames[:, 0, 0]], axis=-1).reshape(5, 1, 2)
+    rb.add({"observations": stacks, "is_first": is_first, "dones": np.ones((5, 1, 1))})
+    sample = rb.sample(1, sequence_length=5)
+    np.testing.assert_array_equal(sample["observations"][:, :, 0], [[[0, 0], [0, 1], [1, 2], [3, 3], [3, 4]]])
+
+
+def test_frame_stack_env_independent_buffer():
+    rng = np.random.default_rng(0)
+    data = stacked_episodes(30, 3, 3, 1, rng)
+    rb = EnvIndependentReplayBuffer(
+        20, 3, buffer_cls=SequentialReplayBuffer, frame_stack=3, frame_stack_keys=("observations",)
+    )
+    rb.add(data)
+    sample = rb.sample(8, sequence_length=4)
+    time_idxes, env_idxes = np.divmod(sample["observations"][..., -1, 0, 0], 3)
+    np.testing.assert_array_equal(sample["observations"], data["observations"][time_idxes, env_idxes])
@@ -0,0 +1,135 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from sheeprl.data.buffers import (
+    EnvIndependentReplayBuffer,
+    PrioritizedReplayBuffer,
+    PrioritizedSequentialReplayBuffer,
+    SequentialReplayBuffer,
+)
+
+
+def test_prioritized_replay_buffer_wrong_args():
+    with pytest.raises(ValueError, match="'alpha' must be greater than or equal to zero"):
+        PrioritizedReplayBuffer(10, alpha=-1)
+    with pytest.raises(ValueError, match="'beta' must be greater than or equal to zero"):
+        PrioritizedReplayBuffer(10, beta=-1)
+    with pytest.raises(ValueError, match="'eps' must be greater than zero"):
+        PrioritizedReplayBuffer(10, eps=0)
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_prioritized_replay_buffer_sample(memmap, tmp_path):
+    rb = PrioritizedReplayBuffer(10, 2, memmap=memmap, memmap_dir=tmp_path / "memmap_buffer")
+    rb.add({"observations": np.arange(30).reshape(15, 2, 1)})
+    sample = rb.sample(4, sample_next_obs=True, n_samples=3)
+    assert sample["observations"].shape == (3, 4, 1)
+    assert sample["idxes"].shape == (3, 4, 1)
+    assert sample["weights"].shape == (3, 4, 1) and sample["weights"].dtype == np.float32
+    # Every element has the same (maximum) priority
+    np.testing.assert_allclose(sample["weights"], 1.0)
+    assert (sample["next_observations"] - sample["observations"] == 2).all()
+    np.testing.assert_array_equal(sample["observations"], rb["observations"].reshape(-1, 1)[sample["idxes"][..., 0]])
+
+
+def test_prioritized_replay_buffer_never_samples_the_last_obs():
+    rb = PrioritizedReplayBuffer(10, 2)
+    rb.add({"observations": np.arange(30).reshape(15, 2, 1)})
+    rb.update_priorities(np.arange(20), np.ones(20))
+    # The last added row has by far the highest priority, but it has no next observation
+    rb.update_priorities(np.array([8, 9]), np.array([1e6, 1e6]))
+    idxes = rb.sample(1000, sample_next_obs=True)["idxes"]
+    assert not np.isin(idxes, [8, 9]).any()
+    # The priorities of the excluded elements are restored after the sampling
+    assert 8 in rb.sample(100)["idxes"]
+
+
+def test_prioritized_replay_buffer_proportional_sampling():
+    rb = PrioritizedReplayBuffer(4, 1, alpha=1.0, beta=1.0)
+    rb._rng = np.random.default_rng(0)
+    rb.add({"observations": np.zeros((4, 1, 1))})
+    rb.update_priorities(np.arange(4), np.array([1.0, 2.0, 3.0, 4.0]))
+    sample = rb.sample(10000)
+    frequencies = np.bincount(sample["idxes"].ravel(), minlength=4) / 10000
+    np.testing.assert_allclose(frequencies, [0.1, 0.2, 0.3, 0.4], atol=0.01)
+    # The weights are (p_i / min_j(p_j))^-beta
+    np.testing.assert_allclose(sample["weights"].ravel(), 1 / (sample["idxes"].ravel() + 1), rtol=1e-5)
+
+
+def test_prioritized_replay_buffer_new_elements_get_max_priority():
+    rb = PrioritizedReplayBuffer(10, 1, alpha=1.0)
+    rb.add({"observations": np.zeros((4, 1, 1))})
+    rb.update_priorities(np.arange(4), np.array([0.5, 5.0, 0.5, 0.5]))
+    rb.add({"observations": np.zeros((2, 1, 1))})
+    np.testing.assert_allclose(rb._priorities._sum_tree[np.array([4, 5])], 5.0 + 1e-6)
+
+
+def test_prioritized_replay_buffer_update_priorities_wrong_shapes():
+    rb = PrioritizedReplayBuffer(10, 1)
+    rb.add({"observations": np.zeros((4, 1, 1))})
+    with pytest.raises(ValueError, match="must have the same number of elements"):
+        rb.update_priorities(np.arange(4), np.ones(3))
+
+
+def test_prioritized_sequential_replay_buffer_sample():
+    rb = PrioritizedSequentialReplayBuffer(10, 2)
+    rb.add({"a": np.arange(30).reshape(15, 2, 1)})
+    # The sequences starting right before the write position would mix the newest and the oldest elements
+    rb.update_priorities(np.arange(20), np.ones(20))
+    rb.update_priorities(np.array([6, 7, 8, 9]), np.array([1e6] * 4))
+    sample = rb.sample(6, n_samples=2, sequence_length=3)
+    assert sample["a"].shape == (2, 3, 6, 1)
+    assert sample["idxes"].shape == (2, 1, 6, 1)
+    assert (np.diff(sample["a"], axis=1) == 2).all()
+    assert not np.isin(sample["idxes"], [6, 7, 8, 9]).any()
+    np.testing.assert_array_equal(sample["a"][:, :1], rb["a"].reshape(-1, 1)[sample["idxes"][..., 0]])
+
+
+def test_prioritized_replay_buffer_pickle():
+    rb = PrioritizedReplayBuffer(10, 1)
+    rb.add({"observations": np.zeros((4, 1, 1))})
+    rb.update_priorities(np.arange(4), np.arange(4))
+    restored = pickle.loads(pickle.dumps(rb))
+    np.testing.assert_array_equal(restored._priorities._sum_tree[np.arange(4)], rb._priorities._sum_tree[np.arange(4)])
+    restored.update_priorities(np.arange(4), np.ones(4))
+    restored.sample(4)
+
+
+def test_env_independent_prioritized_replay_buffer():
+    rb = EnvIndependentReplayBuffer(10, 3, buffer_cls=PrioritizedSequentialReplayBuffer, alpha=1.0, beta=1.0)
+    rb._rng = np.random.default_rng(0)
+    rb.add({"a": np.arange(45).reshape(15, 3, 1)})
+    sample = rb.sample(5, n_samples=2, sequence_length=4)
+    assert sample["a"].shape == (2, 4, 5, 1)
+    assert sample["idxes"].shape == (2, 1, 5, 1)
+    # The global indexes are 'env_idx * buffer_size + time_idx'
+    env_idxes, time_idxes = np.divmod(sample["idxes"][:, 0, :, 0], 10)
+    # The first 5 rows have been overwritten by the last 5 added elements
+    np.testing.assert_array_equal(sample["a"][:, 0, :, 0], (time_idxes + 10 * (time_idxes < 5)) * 3 + env_idxes)
+
+    # Only the third environment has a non-negligible priority
+    rb.update_priorities(np.arange(30), np.where(np.arange(30) >= 20, 1.0, 0.0))
+    sample = rb.sample(100, sequence_length=2)
+    assert (sample["idxes"] >= 20).all()
+    np.testing.assert_allclose(sample["weights"], 1e-6, rtol=1e-3)
+
+
+def test_env_independent_prioritized_replay_buffer_splits_by_sampleable_priority():
+    rb = EnvIndependentReplayBuffer(10, 2, buffer_cls=PrioritizedSequentialReplayBuffer, alpha=1.0)
+    rb._rng = np.random.default_rng(0)
+    rb.add({"a": np.zeros((10, 2, 1))})
+    rb.update_priorities(np.arange(20), np.ones(20))
+    # The last element of the first environment cannot start a sequence of 4 elements
+    rb.update_priorities(np.array([9]), np.array([1e6]))
+    np.testing.assert_allclose(rb.buffer[0].sampleable_priority(sequence_length=4), 7.0, rtol=1e-5)
+    np.testing.assert_allclose(rb.buffer[0].sampleable_priority(sequence_length=1), 1e6 + 9.0, rtol=1e-5)
+    env_idxes = rb.sample(1000, sequence_length=4)["idxes"].ravel() // 10
+    np.testing.assert_allclose(np.bincount(env_idxes, minlength=2) / 1000, [0.5, 0.5], atol=0.05)
+
+
+def test_env_independent_replay_buffer_update_priorities_not_prioritized():
+    rb = EnvIndependentReplayBuffer(10, 3, buffer_cls=SequentialReplayBuffer)
+    with pytest.raises(RuntimeError, match="is a prioritized buffer"):
+        rb.update_priorities(np.arange(3), np.ones(3))
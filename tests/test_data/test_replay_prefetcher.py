@@ -0,0 +1,68 @@
+import gc
+import threading
+
+import numpy as np
+import pytest
+import torch
+
+from sheeprl.data.buffers import EnvIndependentReplayBuffer, ReplayPrefetcher, SequentialReplayBuffer
+
+
+def _filled_buffer(buf_size=20, n_envs=3):
+    rb = EnvIndependentReplayBuffer(buf_size, n_envs, buffer_cls=SequentialReplayBuffer)
+    rb.add({"a": np.arange(buf_size * n_envs, dtype=np.float32).reshape(buf_size, n_envs, 1)})
+    return rb
+
+
+def test_replay_prefetcher_wrong_prefetch():
+    with pytest.raises(ValueError, match="must be non-negative"):
+        ReplayPrefetcher(_filled_buffer(), prefetch=-1)
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 3])
+def test_replay_prefetcher_iterate(prefetch):
+    rb = _filled_buffer()
+    prefetcher = ReplayPrefetcher(rb, prefetch=prefetch)
+    batches = list(prefetcher.iterate(4, n_samples=5, sequence_length=6))
+    assert len(batches) == 5
+    for batch in batches:
+        assert isinstance(batch["a"], torch.Tensor)
+        assert batch["a"].shape == torch.Size([6, 4, 1])
+        # Sequences are made of consecutive elements of the same environment
+        diffs = torch.diff(batch["a"], dim=0)
+        assert ((diffs == rb.n_envs) | (diffs == rb.n_envs * (1 - rb.buffer_size))).all()
+
+
+def test_replay_prefetcher_dtype():
+    prefetcher = ReplayPrefetcher(_filled_buffer(), prefetch=2, dtype=torch.float64)
+    batch = next(prefetcher.iterate(4, sequence_length=2))
+    assert batch["a"].dtype == torch.float64
+
+
+def test_replay_prefetcher_early_stop():
+    prefetcher = ReplayPrefetcher(_filled_buffer(), prefetch=1)
+    local_data = prefetcher.iterate(4, n_samples=100, sequence_length=2)
+    next(local_data)
+    local_data.close()
+
+
+def test_replay_prefetcher_abandoned_iterator():
+    prefetcher = ReplayPrefetcher(_filled_buffer(), prefetch=1)
+    n_threads = threading.active_count()
+    # The worker is not started until the first batch is requested
+    local_data = prefetcher.iterate(4, n_samples=100, sequence_length=2)
+    assert threading.active_count() == n_threads
+    del local_data
+    local_data = prefetcher.iterate(4, n_samples=100, sequence_length=2)
+    next(local_data)
+    assert threading.active_count() == n_threads + 1
+    # Dropping the iterator stops the worker, which would otherwise block forever on the full queue
+    del local_data
+    gc.collect()
+    assert threading.active_count() == n_threads
+
+
+def test_replay_prefetcher_propagates_errors():
+    prefetcher = ReplayPrefetcher(_filled_buffer(), prefetch=2)
+    with pytest.raises(ValueError, match="is greater than the buffer size"):
+        list(prefetcher.iterate(4, n_samples=2, sequence_length=100))
@@ -0,0 +1,115 @@
+import pickle
+
+import numpy as np
+import pytest
+import torch
+
+from sheeprl.data.buffers import (
+    EnvIndependentReplayBuffer,
+    EpisodeBuffer,
+    ReplayBuffer,
+    ReplayPrefetcher,
+    SampleArena,
+    SequentialReplayBuffer,
+)
+
+
+def test_sample_arena_wrong_num_slabs():
+    with pytest.raises(ValueError, match="must be greater than zero"):
+        SampleArena(0)
+
+
+def test_sample_arena_ring():
+    arena = SampleArena(2)
+    first = arena.empty("a", (3, 4), np.float32)
+    arena.advance()
+    second = arena.empty("a", (3, 4), np.float32)
+    arena.advance()
+    third = arena.empty("a", (3, 4), np.float32)
+    assert not np.shares_memory(first, second)
+    assert np.shares_memory(first, third)
+
+
+def test_sample_arena_reuses_memory_for_smaller_arrays():
+    arena = SampleArena(1)
+    big = arena.empty("a", (10, 4), np.float64)
+    small = arena.empty("a", (2, 3), np.uint8)
+    assert small.shape == (2, 3) and small.dtype == np.uint8
+    assert np.shares_memory(big, small)
+    bigger = arena.empty("a", (20, 4), np.float64)
+    assert not np.shares_memory(big, bigger)
+
+
+def test_sample_arena_pickle_drops_slabs():
+    arena = SampleArena(3)
+    arena.empty("a", (100, 100), np.float32)
+    arena = pickle.loads(pickle.dumps(arena))
+    assert arena.num_slabs == 3
+    assert all(len(slab) == 0 for slab in arena._slabs)
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_replay_buffer_sample_arena(memmap, tmp_path):
+    rb = ReplayBuffer(10, 2, memmap=memmap, memmap_dir=tmp_path / "memmap_buffer")
+    rb.add({"observations": np.arange(30, dtype=np.float32).reshape(15, 2, 1)})
+    rb.arena = SampleArena(2)
+    s1 = rb.sample(4, sample_next_obs=True, n_samples=3)
+    s2 = rb.sample(4, sample_next_obs=True, n_samples=3)
+    s3 = rb.sample(4, sample_next_obs=True, n_samples=3)
+    assert s1["observations"].shape == (3, 4, 1)
+    assert (s3["next_observations"] - s3["observations"] == 2).all()
+    assert not np.shares_memory(s1["observations"], s2["observations"])
+    assert np.shares_memory(s1["observations"], s3["observations"])
+    cloned = rb.sample(4, sample_next_obs=True, n_samples=3, clone=True)
+    assert not np.shares_memory(cloned["observations"], s2["observations"])
+    assert not np.shares_memory(cloned["observations"], s3["observations"])
+
+
+def test_seq_replay_buffer_sample_tensors_arena():
+    rb = SequentialReplayBuffer(10, 2)
+    rb.add({"a": np.arange(30, dtype=np.float32).reshape(15, 2, 1)})
+    rb.arena = SampleArena(1)
+    t1 = rb.sample_tensors(4, n_samples=2, sequence_length=3)["a"]
+    assert t1.shape == torch.Size([2, 3, 4, 1])
+    assert (torch.diff(t1, dim=1) == 2).all()
+    t2 = rb.sample_tensors(4, n_samples=2, sequence_length=3)["a"]
+    # The tensors are views of the single slab of the arena
+    assert t1.data_ptr() == t2.data_ptr()
+
+
+def test_env_independent_replay_buffer_sample_arena():
+    rb = EnvIndependentReplayBuffer(10, 3, buffer_cls=SequentialReplayBuffer)
+    rb.add({"a": np.arange(45, dtype=np.float32).reshape(15, 3, 1)})
+    rb.arena = SampleArena(2)
+    s1 = rb.sample(5, n_samples=2, sequence_length=4)["a"]
+    s2 = rb.sample(5, n_samples=2, sequence_length=4)["a"]
+    s3 = rb.sample(5, n_samples=2, sequence_length=4)["a"]
+    assert s3.shape == (2, 4, 5, 1)
+    assert (np.diff(s3, axis=1) == 3).all()
+    assert not np.shares_memory(s1, s2)
+    assert np.shares_memory(s1, s3)
+
+
+def test_episode_buffer_sample_arena():
+    rb = EpisodeBuffer(30, 5, obs_keys=("observations",))
+    dones = np.zeros((20, 1, 1))
+    dones[[9, 19]] = 1
+    rb.add({"observations": np.arange(20, dtype=np.float32).reshape(20, 1, 1), "dones": dones})
+    rb.arena = SampleArena(2)
+    s1 = rb.sample(6, sample_next_obs=True, n_samples=2, sequence_length=5)
+    s2 = rb.sample(6, sample_next_obs=True, n_samples=2, sequence_length=5)
+    s3 = rb.sample(6, sample_next_obs=True, n_samples=2, sequence_length=5)
+    assert s3["observations"].shape == (2, 5, 6, 1)
+    assert (np.diff(s3["observations"], axis=1) == 1).all()
+    assert (s3["next_observations"] - s3["observations"] == 1).all()
+    assert not np.shares_memory(s1["observations"], s2["observations"])
+    assert np.shares_memory(s1["observations"], s3["observations"])
+
+
+def test_replay_prefetcher_arena_too_few_slabs():
+    rb = SequentialReplayBuffer(10, 1)
+    rb.add({"a": np.zeros((10, 1, 1), dtype=np.float32)})
+    rb.arena = SampleArena(3)
+    with pytest.raises(ValueError, match="must have at least 4 slabs"):
+        ReplayPrefetcher(rb, prefetch=2)
+    ReplayPrefetcher(rb, prefetch=1)
@@ -91,6 +91,19 @@ def test_seq_replay_buffer_sample_full():
     assert not np.logical_and((samples["a"][:, 0, :] < rb._pos), (samples["a"][:, -1, :] >= rb._pos)).any()
 
 
+@pytest.mark.parametrize("memmap", [False, True])
+def test_seq_replay_buffer_sample_consecutive_same_env(memmap, tmp_path):
+    buf_size = 10
+    n_envs = 4
+    rb = SequentialReplayBuffer(buf_size, n_envs, memmap=memmap, memmap_dir=tmp_path / "memmap_buffer")
+    rb.add({"a": np.arange((buf_size + 3) * n_envs).reshape(-1, n_envs, 1)})
+    s = rb.sample(8, sample_next_obs=True, n_samples=3, sequence_length=5)
+    assert s["a"].shape == tuple([3, 5, 8, 1])
+    # Every sequence is made of consecutive elements of the same environment
+    assert (np.diff(s["a"], axis=1) == n_envs).all()
+    np.testing.assert_array_equal(s["next_a"][:, :-1], s["a"][:, 1:])
+
+
 def test_seq_replay_buffer_sample_full_large_sl():
     buf_size = 10000
     n_envs = 1
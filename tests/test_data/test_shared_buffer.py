@@ -0,0 +1,144 @@
+import multiprocessing as mp
+import pickle
+
+import numpy as np
+import pytest
+
+from sheeprl.data.buffers import ReplayBuffer, SharedReplayBuffer
+
+N_STEPS = 2000
+ROW_SIZE = 4096
+
+
+def _write(rb, writer_id, n_steps, barrier):
+    rb.writer_id = writer_id
+    barrier.wait()
+    n_envs = rb.n_envs // rb.n_writers
+    envs = np.arange(writer_id * n_envs, (writer_id + 1) * n_envs)
+    for t in range(n_steps):
+        # Every element is filled with a value identifying its step and its environment
+        value = (t * rb.n_envs + envs).astype(np.float64)
+        rb.add(
+            {
+                "observations": np.broadcast_to(value[np.newaxis, :, np.newaxis], (1, n_envs, ROW_SIZE)).copy(),
+                "envs": envs.reshape(1, n_envs, 1),
+            }
+        )
+    rb.close()
+
+
+def _allocated_buffer(buffer_size, n_envs, n_writers):
+    rb = SharedReplayBuffer(buffer_size, n_envs, n_writers=n_writers)
+    # The creator allocates the arrays, then the writers overwrite the first element
+    rb.add(
+        {
+            "observations": np.zeros((1, n_envs // n_writers, ROW_SIZE), dtype=np.float64),
+            "envs": np.zeros((1, n_envs // n_writers, 1), dtype=np.int64),
+        }
+    )
+    rb._cursors[:] = 0
+    return rb
+
+
+def test_shared_replay_buffer_wrong_args():
+    with pytest.raises(ValueError, match="must be greater than zero and divide the number of environments"):
+        SharedReplayBuffer(10, 3, n_writers=2)
+    with pytest.raises(ValueError, match="does not support memory-mapping"):
+        SharedReplayBuffer(10, memmap=True, memmap_dir="memmap_buffer")
+    rb = SharedReplayBuffer(10, 2, n_writers=2)
+    with pytest.raises(ValueError, match="'writer_id' must be in"):
+        rb.writer_id = 2
+    with pytest.raises(ValueError, match="No sample has been added"):
+        rb.sample(1)
+    rb.close()
+
+
+def test_shared_replay_buffer_add_and_sample():
+    rb = SharedReplayBuffer(10, 4, n_writers=2)
+    rb.add({"observations": np.arange(30).reshape(15, 2, 1) * 4})
+    rb.writer_id = 1
+    rb.add({"observations": np.arange(6).reshape(3, 2, 1) * 4 + 2})
+    np.testing.assert_array_equal(rb.n_added, [15, 3])
+    sample = rb.sample(1000, sample_next_obs=True, n_samples=2)
+    assert sample["observations"].shape == (2, 1000, 1)
+    assert (sample["next_observations"] - sample["observations"] == 8).all()
+    # The second writer has added only 3 steps: the first 2 of them have a next observation
+    second_writer = sample["observations"] % 4 == 2
+    assert np.isin(sample["observations"][second_writer], [2, 6, 10, 14]).all()
+    # The first writer has overwritten its first 5 steps
+    assert (sample["observations"][~second_writer] >= 5 * 8).all()
+    # The writers are drawn proportionally to their number of valid elements
+    np.testing.assert_allclose(second_writer.mean(), 2 / (2 + 9), atol=0.03)
+    rb.close()
+
+
+def test_shared_replay_buffer_pickle_shares_the_arrays():
+    rb = SharedReplayBuffer(10_000, 2)
+    rb.add({"observations": np.zeros((4, 2, 256), dtype=np.float32)})
+    state = pickle.dumps(rb)
+    # Only the names of the shared memory blocks are pickled
+    assert len(state) < 4096
+    restored = pickle.loads(state)
+    restored.add({"observations": np.ones((1, 2, 256), dtype=np.float32)})
+    np.testing.assert_array_equal(rb["observations"][4], 1)
+    np.testing.assert_array_equal(rb.n_added, [5])
+    with pytest.raises(RuntimeError, match="can be added only by the process that created the buffer"):
+        restored.add({"rewards": np.zeros((1, 2, 1))})
+    restored.close()
+    rb.close()
+
+
+def test_shared_replay_buffer_to_replay_buffer():
+    rb = SharedReplayBuffer(5, 2)
+    rb.add({"observations": np.arange(14).reshape(7, 2, 1)})
+    local_rb = rb.to_replay_buffer()
+    assert isinstance(local_rb, ReplayBuffer) and local_rb.full and local_rb._pos == 2
+    np.testing.assert_array_equal(local_rb["observations"], rb["observations"])
+    # The elements of a replay buffer are added from the oldest to the newest
+    restored = SharedReplayBuffer(5, 2)
+    restored.add(local_rb)
+    np.testing.assert_array_equal(restored["observations"], np.arange(4, 14).reshape(5, 2, 1))
+    np.testing.assert_array_equal(restored.n_added, [5])
+    rb.close()
+    restored.close()
+
+    rb = SharedReplayBuffer(5, 2, n_writers=2)
+    rb.add({"observations": np.zeros((1, 1, 1))})
+    with pytest.raises(RuntimeError, match="all the writers have added the same number of elements"):
+        rb.to_replay_buffer()
+    rb.close()
+
+
+@pytest.mark.timeout(120)
+def test_shared_replay_buffer_concurrent_writers_and_reader():
+    n_writers, n_envs = 2, 4
+    rb = _allocated_buffer(32, n_envs, n_writers)
+    ctx = mp.get_context("spawn")
+    # The reader and the writers start together, once the writers have been spawned
+    barrier = ctx.Barrier(n_writers + 1)
+    writers = [ctx.Process(target=_write, args=(rb, i, N_STEPS, barrier)) for i in range(n_writers)]
+    for writer in writers:
+        writer.start()
+    barrier.wait()
+    n_checked = 0
+    while any(writer.is_alive() for writer in writers) or n_checked == 0:
+        if (rb.n_added < 2).any():
+            continue
+        sample = rb.sample(16, sample_next_obs=True)
+        obs, next_obs, envs = sample["observations"][0], sample["next_observations"][0], sample["envs"][0, :, 0]
+        # No element has been read while it was written
+        assert (obs == obs[:, :1]).all() and (next_obs == next_obs[:, :1]).all()
+        assert (obs[:, 0] % n_envs == envs).all()
+        assert (next_obs[:, 0] - obs[:, 0] == n_envs).all()
+        n_checked += 1
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+
+    # No element has been lost or duplicated
+    np.testing.assert_array_equal(rb.n_added, [N_STEPS] * n_writers)
+    last_steps = np.arange(N_STEPS - 32, N_STEPS)
+    expected = np.roll(last_steps, N_STEPS % 32)[:, np.newaxis] * n_envs + np.arange(n_envs)
+    np.testing.assert_array_equal(rb["observations"][..., 0], expected)
+    assert (rb["observations"] == rb["observations"][..., :1]).all()
+    rb.close()
@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+import torch
+
+from sheeprl.data.buffers import EnvIndependentReplayBuffer
+from sheeprl.envs.perturbations import (
+    OBJ_SIZE,
+    Perturbation,
+    load_recorded_observations,
+    perturb_frames,
+    perturb_objects,
+    score_perturbations,
+    sweep_perturbations,
+)
+
+N_SLOTS = 9
+
+
+@pytest.fixture()
+def objects():
+    rng = np.random.default_rng(0)
+    objects = rng.integers(1, 255, (64, N_SLOTS * OBJ_SIZE), dtype=np.uint8)
+    # The last three slots are empty
+    objects[:, -3 * OBJ_SIZE :] = 0
+    return objects
+
+
+def test_perturb_objects_none(objects):
+    perturbed = perturb_objects(objects, Perturbation.NONE, np.random.default_rng(0))
+    assert not np.shares_memory(perturbed, objects)
+    np.testing.assert_array_equal(perturbed, objects)
+
+
+def test_perturb_objects_wrong_perturbation(objects):
+    with pytest.raises(ValueError, match="Invalid perturbation"):
+        perturb_objects(objects, 8, np.random.default_rng(0))
+    with pytest.raises(ValueError, match="not compatible with the batch dimensions"):
+        perturb_objects(objects[0], np.zeros(2, dtype=np.int64), np.random.default_rng(0))
+
+
+def test_perturb_objects_noise(objects):
+    perturbed = perturb_objects(objects, Perturbation.NOISE, np.random.default_rng(0))
+    assert perturbed.dtype == np.uint8
+    # Only the detected objects are perturbed
+    np.testing.assert_array_equal(perturbed[objects == 0], 0)
+    assert (perturbed != objects).any()
+
+
+def test_perturb_objects_occlusion(objects):
+    perturbed = perturb_objects(objects, Perturbation.OCCLUSION, np.random.default_rng(0))
+    slots, perturbed_slots = objects.reshape(len(objects), -1, OBJ_SIZE), perturbed.reshape(len(objects), -1, OBJ_SIZE)
+    changed = (slots != perturbed_slots).any(axis=-1)
+    # The occluded objects are zeroed out, less than a third of the slots for every vector
+    np.testing.assert_array_equal(perturbed_slots[changed], 0)
+    assert changed.sum(axis=-1).max() < N_SLOTS // 3
+    assert changed.any()
+
+
+def test_perturb_objects_false_positive(objects):
+    perturbed = perturb_objects(objects, Perturbation.FALSE_POSITIVE, np.random.default_rng(0))
+    changed = (objects != perturbed).reshape(len(objects), -1, OBJ_SIZE).any(axis=-1)
+    # Only the first empty slot can be changed
+    assert not changed[:, : N_SLOTS - 3].any() and not changed[:, N_SLOTS - 2 :].any()
+    # A full vector is not perturbed
+    full = perturb_objects(
+        np.ones(N_SLOTS * OBJ_SIZE, dtype=np.uint8), Perturbation.FALSE_POSITIVE, np.random.default_rng(0)
+    )
+    np.testing.assert_array_equal(full, 1)
+
+
+def test_perturb_objects_per_sample_perturbation(objects):
+    perturbation = np.array([Perturbation.NONE, Perturbation.ALL])
+    perturbed = perturb_objects(np.stack([objects, objects]), perturbation, np.random.default_rng(0))
+    np.testing.assert_array_equal(perturbed[0], objects)
+    assert (perturbed[1] != objects).any()
+
+
+def test_perturb_frames():
+    frames = np.full((2, 5, 3, 30, 40), 100, dtype=np.uint8)
+    perturbation = np.array([Perturbation.NONE, Perturbation.OCCLUSION])
+    perturbed = perturb_frames(frames, perturbation, np.random.default_rng(0))
+    assert perturbed.shape == frames.shape and perturbed.dtype == np.uint8
+    np.testing.assert_array_equal(perturbed[0], frames[0])
+    # Every occluded frame has a black rectangle, the same for all the channels
+    occluded = perturbed[1] == 0
+    assert occluded.any(axis=(-1, -2, -3)).all()
+    np.testing.assert_array_equal(occluded, occluded[:, :1].repeat(3, axis=1))
+    np.testing.assert_array_equal(perturbed[1][~occluded], 100)
+    with pytest.raises(ValueError, match="must have shape"):
+        perturb_frames(frames[0, 0, 0], Perturbation.NOISE, np.random.default_rng(0))
+
+
+def test_sweep_perturbations(objects):
+    obs = {
+        "objects_position": objects,
+        "rgb": np.full((len(objects), 3, 16, 16), 100, dtype=np.uint8),
+        "state": np.arange(len(objects)),
+    }
+    perturbations = [Perturbation.NONE, Perturbation.NOISE, Perturbation.ALL]
+    swept = sweep_perturbations(obs, perturbations, np.random.default_rng(0))
+    for k, v in obs.items():
+        assert swept[k].shape == (len(perturbations), *v.shape)
+        np.testing.assert_array_equal(swept[k][0], v)
+    np.testing.assert_array_equal(swept["state"][2], obs["state"])
+    assert (swept["objects_position"][1] != objects).any()
+    assert (swept["rgb"][2] != obs["rgb"]).any()
+
+
+def test_score_perturbations(objects):
+    obs = {"objects_position": objects}
+    calls = []
+
+    def score_fn(batch):
+        calls.append(len(batch["objects_position"]))
+        return torch.from_numpy((batch["objects_position"] != np.tile(objects, (3, 1))).mean(axis=-1))
+
+    scores = score_perturbations(obs, score_fn, [Perturbation.NONE, Perturbation.NOISE, Perturbation.ALL], seed=0)
+    # All the perturbations are scored with a single call
+    assert calls == [3 * len(objects)]
+    assert list(scores.keys()) == [Perturbation.NONE, Perturbation.NOISE, Perturbation.ALL]
+    assert scores[Perturbation.NONE] == 0
+    assert scores[Perturbation.NOISE] > 0 and scores[Perturbation.ALL] > 0
+    assert (
+        score_perturbations(obs, score_fn, [Perturbation.NONE, Perturbation.NOISE, Perturbation.ALL], seed=0) == scores
+    )
+
+
+def test_load_recorded_observations_npz(tmp_path):
+    path = tmp_path / "episode.npz"
+    np.savez(path, rgb=np.zeros((5, 3, 4, 4), dtype=np.uint8), rewards=np.ones((5, 1)))
+    obs = load_recorded_observations(path, keys=["rgb"])
+    assert list(obs.keys()) == ["rgb"]
+    assert obs["rgb"].shape == (5, 3, 4, 4)
+
+
+def test_load_recorded_observations_checkpoint(tmp_path):
+    rb = EnvIndependentReplayBuffer(10, 2)
+    rb.add({"objects_position": np.arange(6).reshape(3, 2, 1), "rewards": np.zeros((3, 2, 1))})
+    rb.add({"objects_position": np.full((1, 1, 1), 10), "rewards": np.zeros((1, 1, 1))}, env_idxes=[1])
+    torch.save({"rb": rb}, tmp_path / "ckpt.ckpt")
+    obs = load_recorded_observations(tmp_path / "ckpt.ckpt", keys=["objects_position"])
+    # The steps of all the environments are flattened in the first dimension
+    np.testing.assert_array_equal(obs["objects_position"][:, 0], [0, 2, 4, 1, 3, 5, 10])
+    with pytest.raises(ValueError, match="are not in the replay buffer"):
+        load_recorded_observations(tmp_path / "ckpt.ckpt", keys=["rgb"])
+    torch.save({"rb": None}, tmp_path / "no_rb.ckpt")
+    with pytest.raises(ValueError, match="has no replay buffer"):
+        load_recorded_observations(tmp_path / "no_rb.ckpt")
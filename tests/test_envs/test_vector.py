@@ -0,0 +1,207 @@
+import time
+
+import gymnasium as gym
+import numpy as np
+import pytest
+from gymnasium.error import AlreadyPendingCallError, NoAsyncCallError
+
+from sheeprl.envs.vector import AsyncBatchVectorEnv, SharedMemoryVectorEnv
+from sheeprl.envs.wrappers import BatchedFrameStack, BatchedPreprocessObservation
+
+
+class CounterEnv(gym.Env):
+    def __init__(self, env_idx: int, episode_length: int = 3, step_time: float = 0.0):
+        self.observation_space = gym.spaces.Dict(
+            {
+                "rgb": gym.spaces.Box(0, 255, shape=(3, 8, 8), dtype=np.uint8),
+                "state": gym.spaces.Box(-np.inf, np.inf, shape=(2,), dtype=np.float32),
+            }
+        )
+        self.action_space = gym.spaces.Discrete(2)
+        self._env_idx = env_idx
+        self._episode_length = episode_length + env_idx
+        self._step_time = step_time
+        self._step = 0
+
+    def _obs(self):
+        return {
+            "rgb": np.full((3, 8, 8), self._step * 10 + self._env_idx, dtype=np.uint8),
+            "state": np.array([self._step, self._env_idx], dtype=np.float32),
+        }
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        self._step = 0
+        return self._obs(), {"env_idx": self._env_idx}
+
+    def step(self, action):
+        time.sleep(self._step_time)
+        self._step += 1
+        done = self._step == self._episode_length
+        return self._obs(), float(action), done, False, {"step": self._step}
+
+
+def _env_fns(num_envs, step_times=None):
+    step_times = step_times or [0.0] * num_envs
+    return [lambda i=i: CounterEnv(i, step_time=step_times[i]) for i in range(num_envs)]
+
+
+@pytest.fixture()
+def envs():
+    envs = SharedMemoryVectorEnv(_env_fns(3))
+    yield envs
+    envs.close()
+
+
+def test_shared_memory_vector_env_same_as_async(envs):
+    async_envs = gym.vector.AsyncVectorEnv(_env_fns(3))
+    obs, info = envs.reset(seed=0)
+    async_obs, async_info = async_envs.reset(seed=0)
+    for k in obs.keys():
+        np.testing.assert_array_equal(obs[k], async_obs[k])
+    np.testing.assert_array_equal(info["env_idx"], async_info["env_idx"])
+    for t in range(8):
+        actions = np.array([t % 2] * 3)
+        obs, rewards, terminated, truncated, info = envs.step(actions)
+        async_obs, async_rewards, async_terminated, async_truncated, async_info = async_envs.step(actions)
+        for k in obs.keys():
+            np.testing.assert_array_equal(obs[k], async_obs[k])
+        np.testing.assert_array_equal(rewards, async_rewards)
+        np.testing.assert_array_equal(terminated, async_terminated)
+        np.testing.assert_array_equal(truncated, async_truncated)
+        assert ("final_observation" in info) == ("final_observation" in async_info)
+        if "final_observation" in info:
+            np.testing.assert_array_equal(info["_final_observation"], async_info["_final_observation"])
+            for i in np.flatnonzero(info["_final_observation"]):
+                for k in obs.keys():
+                    np.testing.assert_array_equal(
+                        info["final_observation"][i][k], async_info["final_observation"][i][k]
+                    )
+                assert info["final_info"][i]["step"] == async_info["final_info"][i]["step"]
+    async_envs.close()
+
+
+def test_shared_memory_vector_env_returns_double_buffered_views(envs):
+    obs, _ = envs.reset()
+    next_obs, *_ = envs.step(np.zeros(3, dtype=np.int64))
+    assert not np.shares_memory(obs["rgb"], next_obs["rgb"])
+    # The observations of the previous step are still valid
+    np.testing.assert_array_equal(obs["state"][:, 0], 0)
+    np.testing.assert_array_equal(next_obs["state"][:, 0], 1)
+    last_obs, *_ = envs.step(np.zeros(3, dtype=np.int64))
+    # The observations are written into the slot of the step before the previous one
+    assert np.shares_memory(obs["rgb"], last_obs["rgb"])
+    np.testing.assert_array_equal(next_obs["state"][:, 0], 1)
+
+
+def test_shared_memory_vector_env_final_observation(envs):
+    envs.reset()
+    for _ in range(2):
+        envs.step(np.zeros(3, dtype=np.int64))
+    obs, _, terminated, _, info = envs.step(np.zeros(3, dtype=np.int64))
+    # Only the first environment has terminated its episode (of 3 steps)
+    np.testing.assert_array_equal(terminated, [True, False, False])
+    np.testing.assert_array_equal(info["_final_observation"], [True, False, False])
+    final_obs = info["final_observation"][0]
+    np.testing.assert_array_equal(final_obs["state"], [3, 0])
+    np.testing.assert_array_equal(final_obs["rgb"], 30)
+    # The observation returned is the one of the reset environment
+    np.testing.assert_array_equal(obs["state"][0], [0, 0])
+    assert info["final_info"][0]["step"] == 3
+
+
+def test_async_batch_vector_env_wrong_args():
+    with pytest.raises(ValueError, match="The batch size must be in"):
+        AsyncBatchVectorEnv(_env_fns(2), batch_size=3)
+    envs = AsyncBatchVectorEnv(_env_fns(2), batch_size=1)
+    envs.reset()
+    with pytest.raises(NoAsyncCallError):
+        envs.recv()
+    envs.send(np.zeros(1, dtype=np.int64), [0])
+    with pytest.raises(AlreadyPendingCallError, match="which are already stepping"):
+        envs.send(np.zeros(1, dtype=np.int64), [0])
+    with pytest.raises(AlreadyPendingCallError, match="call `recv` first"):
+        envs.step(np.zeros(2, dtype=np.int64))
+    # The stepping environments are waited for before closing them
+    envs.close()
+
+
+def test_async_batch_vector_env_returns_the_ready_environments():
+    envs = AsyncBatchVectorEnv(_env_fns(3, step_times=[2.0, 0.0, 0.0]), batch_size=2)
+    envs.reset()
+    envs.send(np.zeros(3, dtype=np.int64))
+    obs, rewards, terminated, truncated, info, env_ids = envs.recv()
+    # The slow environment is still stepping
+    np.testing.assert_array_equal(env_ids, [1, 2])
+    np.testing.assert_array_equal(obs["state"], [[1, 1], [1, 2]])
+    assert rewards.shape == terminated.shape == truncated.shape == (2,)
+    np.testing.assert_array_equal(info["step"], [1, 1])
+    envs.send(np.ones(2, dtype=np.int64), env_ids)
+    obs, rewards, *_, env_ids = envs.recv()
+    np.testing.assert_array_equal(env_ids, [1, 2])
+    np.testing.assert_array_equal(obs["state"][:, 0], [2, 2])
+    np.testing.assert_array_equal(rewards, [1, 1])
+    # Only the slow environment is stepping
+    obs, *_, env_ids = envs.recv()
+    np.testing.assert_array_equal(env_ids, [0])
+    np.testing.assert_array_equal(obs["state"], [[1, 0]])
+    envs.close()
+
+
+def test_async_batch_vector_env_serves_the_ready_environments_in_fifo_order():
+    envs = AsyncBatchVectorEnv(_env_fns(4), batch_size=2)
+    envs.reset()
+    counts = np.zeros(4, dtype=np.int64)
+    env_ids = np.arange(4)
+    for _ in range(40):
+        envs.send(np.zeros(len(env_ids), dtype=np.int64), env_ids)
+        # All the environments are ready: the ones that have been waiting the longest are served first
+        time.sleep(0.01)
+        *_, env_ids = envs.recv()
+        counts[env_ids] += 1
+    np.testing.assert_array_equal(counts, [20, 20, 20, 20])
+    envs.close()
+
+
+def test_async_batch_vector_env_final_observation():
+    envs = AsyncBatchVectorEnv(_env_fns(2), batch_size=2)
+    envs.reset()
+    env_ids = np.arange(2)
+    for _ in range(3):
+        envs.send(np.zeros(len(env_ids), dtype=np.int64), env_ids)
+        obs, _, terminated, _, info, env_ids = envs.recv()
+    np.testing.assert_array_equal(env_ids, [0, 1])
+    np.testing.assert_array_equal(terminated, [True, False])
+    np.testing.assert_array_equal(info["final_observation"][0]["state"], [3, 0])
+    np.testing.assert_array_equal(obs["state"], [[0, 0], [3, 1]])
+    assert info["final_info"][0]["step"] == 3
+    envs.close()
+
+
+def test_async_batch_vector_env_batched_preprocessing():
+    envs = AsyncBatchVectorEnv(_env_fns(3, step_times=[2.0, 0.0, 0.0]), batch_size=2)
+    envs = BatchedPreprocessObservation(envs, ["rgb"], screen_size=4, grayscale=False)
+    envs.reset()
+    envs.send(np.zeros(3, dtype=np.int64))
+    obs, *_, env_ids = envs.recv()
+    np.testing.assert_array_equal(env_ids, [1, 2])
+    assert obs["rgb"].shape == (2, 3, 4, 4)
+    np.testing.assert_array_equal(obs["rgb"][:, 0, 0, 0], [11, 12])
+    envs.close()
+
+
+def test_async_batch_vector_env_batched_frame_stack():
+    envs = AsyncBatchVectorEnv(_env_fns(3, step_times=[0.5, 0.0, 0.0]), batch_size=2)
+    envs = BatchedFrameStack(BatchedPreprocessObservation(envs, ["rgb"], screen_size=4, grayscale=False), 2, ["rgb"])
+    obs, _ = envs.reset()
+    assert obs["rgb"].shape == (3, 2, 3, 4, 4)
+    np.testing.assert_array_equal(obs["rgb"][:, :, 0, 0, 0], [[0, 0], [1, 1], [2, 2]])
+    envs.send(np.zeros(3, dtype=np.int64))
+    obs, *_, env_ids = envs.recv()
+    np.testing.assert_array_equal(env_ids, [1, 2])
+    # Only the stacks of the received environments are updated
+    np.testing.assert_array_equal(obs["rgb"][:, :, 0, 0, 0], [[1, 11], [2, 12]])
+    obs, *_, env_ids = envs.recv()
+    np.testing.assert_array_equal(env_ids, [0])
+    np.testing.assert_array_equal(obs["rgb"][:, :, 0, 0, 0], [[0, 10]])
+    envs.close()
@@ -1,10 +1,301 @@
+import threading
+import time
+from collections import deque
+
 import gymnasium as gym
+import numpy as np
 import pytest
 
-from sheeprl.envs.wrappers import MaskVelocityWrapper
+from sheeprl.envs.wrappers import (
+    ActionRepeat,
+    BatchedFrameStack,
+    BatchedPreprocessObservation,
+    FrameStack,
+    MaskVelocityWrapper,
+    RestartOnException,
+)
+from sheeprl.utils.env import make_env, make_vector_env
+from sheeprl.utils.utils import dotdict
 
 
 def test_mask_velocities_fail():
     with pytest.raises(NotImplementedError):
         env = gym.make("CarRacing-v2")
         env = MaskVelocityWrapper(env)
+
+
+class RandomFramesEnv(gym.Env):
+    """Random frames, with episodes of random length and DIAMBRA-like round ends."""
+
+    def __init__(self):
+        self.observation_space = gym.spaces.Dict(
+            {
+                "rgb": gym.spaces.Box(0, 255, shape=(3, 4, 4), dtype=np.uint8),
+                "state": gym.spaces.Box(0, 1, shape=(2,), dtype=np.float32),
+            }
+        )
+        self.action_space = gym.spaces.Discrete(2)
+        self._rng = np.random.default_rng(0)
+        self.last_frame = None
+
+    def _obs(self):
+        self.last_frame = self._rng.integers(0, 256, (3, 4, 4), dtype=np.uint8)
+        return {"rgb": self.last_frame.copy(), "state": np.zeros(2, np.float32)}
+
+    def reset(self, seed=None, options=None):
+        return self._obs(), {}
+
+    def step(self, action):
+        round_done = bool(self._rng.random() < 0.05)
+        infos = {"env_domain": "DIAMBRA", "round_done": round_done, "stage_done": False, "game_done": False}
+        return self._obs(), 0.0, bool(self._rng.random() < 0.05), False, infos
+
+
+class ObservationCountingEnv(gym.Env):
+    """Counts the observations computed, with episodes of `episode_length` steps."""
+
+    def __init__(self, episode_length=10):
+        self.observation_space = gym.spaces.Dict({"rgb": gym.spaces.Box(0, 255, shape=(1, 2, 2), dtype=np.uint8)})
+        self.action_space = gym.spaces.Discrete(2)
+        self.episode_length = episode_length
+        self.num_steps = 0
+        self.num_obs = 0
+
+    def observe(self):
+        self.num_obs += 1
+        # Alternate between bright and dark frames, to check the max-pooling
+        return {"rgb": np.full((1, 2, 2), self.num_steps * 10 if self.num_steps % 2 else 0, dtype=np.uint8)}
+
+    def reset(self, seed=None, options=None):
+        self.num_steps = 0
+        return self.observe(), {}
+
+    def step_without_obs(self, action):
+        self.num_steps += 1
+        return 1.0, self.num_steps == self.episode_length, False, {"step": self.num_steps}
+
+    def step(self, action):
+        reward, done, truncated, info = self.step_without_obs(action)
+        return self.observe(), reward, done, truncated, info
+
+
+@pytest.mark.parametrize("skip_obs", [False, True])
+def test_action_repeat(skip_obs):
+    env = ActionRepeat(ObservationCountingEnv(), 4, skip_obs=skip_obs)
+    env.reset()
+    obs, reward, done, _, info = env.step(0)
+    assert reward == 4.0 and not done and info["step"] == 4
+    np.testing.assert_array_equal(obs["rgb"], 0)
+    # Only the returned observations are computed
+    assert env.num_obs == (2 if skip_obs else 5)
+    env.step(0)
+    # The episode ends during the intermediate steps
+    obs, reward, done, _, info = env.step(0)
+    assert reward == 2.0 and done and info["step"] == 10
+    np.testing.assert_array_equal(obs["rgb"], 0)
+    assert env.num_obs == (4 if skip_obs else 11)
+
+
+def test_action_repeat_max_pool():
+    env = ActionRepeat(ObservationCountingEnv(), 4, skip_obs=True, max_pool_keys=["rgb"])
+    env.reset()
+    obs, *_ = env.step(0)
+    # The bright frame of the third step is max-pooled with the dark one of the last step
+    np.testing.assert_array_equal(obs["rgb"], 30)
+    assert env.num_obs == 3
+
+
+def test_action_repeat_skip_obs_not_supported():
+    with pytest.raises(ValueError, match="must expose the `step_without_obs` and `observe` methods"):
+        ActionRepeat(RandomFramesEnv(), 2, skip_obs=True)
+
+
+class CrashingEnv(ObservationCountingEnv):
+    """Crashes at the third step, taking `build_time` seconds to be built."""
+
+    def __init__(self, build_time=0.0):
+        time.sleep(build_time)
+        super().__init__()
+        self.build_thread = threading.current_thread()
+        self.closed = False
+
+    def step(self, action):
+        if self.num_steps == 2:
+            raise RuntimeError("Crash")
+        return super().step(action)
+
+    def close(self):
+        self.closed = True
+
+
+def test_restart_on_exception():
+    env = RestartOnException(CrashingEnv, wait=0)
+    crashed_env = env.env
+    env.reset()
+    env.step(0)
+    env.step(0)
+    obs, reward, done, truncated, info = env.step(0)
+    assert crashed_env.closed and env.env is not crashed_env
+    assert reward == 0.0 and not done and not truncated
+    assert info["restart_on_exception"] and info["restarts"] == env.restarts == 1
+    np.testing.assert_array_equal(obs["rgb"], 0)
+    # The env is restarted at most `maxfails` times in the window
+    env.step(0)
+    env.step(0)
+    env.step(0)
+    env.step(0)
+    env.step(0)
+    with pytest.raises(RuntimeError, match="The env crashed too many times"):
+        env.step(0)
+
+
+def test_restart_on_exception_hot_spare():
+    env = RestartOnException(lambda: CrashingEnv(build_time=0.5), wait=10, hot_spare=True)
+    env.reset()
+    # The spare env is built in background while the env is stepping
+    time.sleep(1)
+    env.step(0)
+    env.step(0)
+    tic = time.perf_counter()
+    _, _, _, _, info = env.step(0)
+    # Neither the wait nor the build time is spent in the restart
+    assert time.perf_counter() - tic < 0.5
+    assert info["restart_on_exception"] and info["restart_latency"] < 0.5
+    assert env.env.build_thread is not threading.current_thread()
+    spare = env._spare
+    env.close()
+    assert env.env.closed and spare.result().closed
+
+
+@pytest.mark.parametrize("num_stack", [1, 4, 7])
+@pytest.mark.parametrize("dilation", [1, 2, 3])
+def test_frame_stack(num_stack, dilation):
+    env = FrameStack(RandomFramesEnv(), num_stack, ["rgb"], dilation)
+    assert env.observation_space["rgb"].shape == (num_stack, 3, 4, 4)
+    # The reference implementation, with a deque
+    frames = deque(maxlen=num_stack * dilation)
+    done = True
+    for _ in range(300):
+        if done:
+            obs, _ = env.reset()
+            done = False
+            frames.extend([env.env.last_frame] * num_stack * dilation)
+        else:
+            obs, _, done, _, infos = env.step(0)
+            frames.append(env.env.last_frame)
+            if infos["round_done"] and not done:
+                frames.extend([env.env.last_frame] * (num_stack * dilation - 1))
+        np.testing.assert_array_equal(obs["rgb"], np.stack(list(frames)[dilation - 1 :: dilation], axis=0))
+        assert obs["rgb"].dtype == np.uint8 and obs["state"].shape == (2,)
+        # The returned stacks are not overwritten by the next steps
+        assert not np.shares_memory(obs["rgb"], env._frames["rgb"])
+
+
+def _preprocessing_cfg(size, grayscale=False, frame_stack=1, num_envs=3, frame_stack_dilation=1):
+    return dotdict(
+        {
+            "env": {
+                "id": "discrete_dummy",
+                "num_envs": num_envs,
+                "sync_env": True,
+                "screen_size": 32,
+                "grayscale": grayscale,
+                "frame_stack": frame_stack,
+                "frame_stack_dilation": frame_stack_dilation,
+                "action_repeat": 1,
+                "capture_video": False,
+                "max_episode_steps": None,
+                "reward_as_observation": False,
+                "batched_preprocessing": True,
+                "wrapper": {"_target_": "sheeprl.envs.dummy.DiscreteDummyEnv", "size": list(size)},
+            },
+            "algo": {"cnn_keys": {"encoder": ["rgb"]}, "mlp_keys": {"encoder": []}},
+        }
+    )
+
+
+def _rollout(cfg, batched_preprocessing, num_threads=None):
+    np.random.seed(0)
+    cfg.env.batched_preprocessing = batched_preprocessing
+    envs = make_vector_env(
+        cfg,
+        [
+            make_env(cfg, i, 0, vector_env_idx=i, batched_preprocessing=batched_preprocessing)
+            for i in range(cfg.env.num_envs)
+        ],
+    )
+    if num_threads is not None:
+        envs._num_threads = num_threads
+    obs, _ = envs.reset(seed=0)
+    observations, final_observations = [obs["rgb"].copy()], []
+    for _ in range(6):
+        obs, _, _, _, infos = envs.step(envs.action_space.sample())
+        observations.append(obs["rgb"].copy())
+        if "final_observation" in infos:
+            final_observations.extend(o["rgb"] for o in infos["final_observation"][infos["_final_observation"]])
+    envs.close()
+    return envs, np.stack(observations), np.stack(final_observations)
+
+
+@pytest.mark.parametrize("size", [(3, 64, 64), (210, 160, 3), (1, 84, 84), (96, 96)])
+@pytest.mark.parametrize("grayscale", [False, True])
+@pytest.mark.parametrize("frame_stack", [1, 3])
+def test_batched_preprocess_observation(size, grayscale, frame_stack):
+    cfg = _preprocessing_cfg(size, grayscale, frame_stack)
+    envs, observations, final_observations = _rollout(cfg, False)
+    batched_envs, batched_observations, batched_final_observations = _rollout(cfg, True)
+    preprocessing_envs = batched_envs
+    if frame_stack > 1:
+        # The frames are stacked after having been preprocessed
+        assert isinstance(batched_envs, BatchedFrameStack)
+        preprocessing_envs = batched_envs.env
+    assert isinstance(preprocessing_envs, BatchedPreprocessObservation)
+    assert preprocessing_envs.single_observation_space["rgb"].shape == (1 if grayscale else 3, 32, 32)
+    assert batched_envs.single_observation_space["rgb"] == envs.single_observation_space["rgb"]
+    assert batched_envs.observation_space["rgb"] == envs.observation_space["rgb"]
+    np.testing.assert_array_equal(batched_observations, observations)
+    # The observations of the terminated episodes are preprocessed too
+    assert len(final_observations) > 0
+    np.testing.assert_array_equal(batched_final_observations, final_observations)
+
+
+def test_batched_frame_stack_dilation():
+    cfg = _preprocessing_cfg((210, 160, 3), frame_stack=3, frame_stack_dilation=2)
+    _, observations, final_observations = _rollout(cfg, False)
+    _, batched_observations, batched_final_observations = _rollout(cfg, True)
+    np.testing.assert_array_equal(batched_observations, observations)
+    np.testing.assert_array_equal(batched_final_observations, final_observations)
+
+
+def test_batched_preprocess_observation_threads():
+    cfg = _preprocessing_cfg((210, 160, 3), num_envs=20)
+    _, observations, _ = _rollout(cfg, True, num_threads=1)
+    _, threaded_observations, _ = _rollout(cfg, True, num_threads=4)
+    np.testing.assert_array_equal(threaded_observations, observations)
+
+
+def test_batched_preprocess_observation_reuses_two_outputs():
+    cfg = _preprocessing_cfg((3, 64, 64))
+    envs = make_vector_env(cfg, [make_env(cfg, i, 0, batched_preprocessing=True) for i in range(cfg.env.num_envs)])
+    first, _ = envs.reset(seed=0)
+    second = envs.step(envs.action_space.sample())[0]
+    third = envs.step(envs.action_space.sample())[0]
+    assert first["rgb"] is not second["rgb"] and third["rgb"] is first["rgb"]
+    envs.close()
+
+
+def test_batched_preprocessing_copies_the_observations_without_pixels():
+    cfg = _preprocessing_cfg((4,))
+    cfg.algo = dotdict({"cnn_keys": {"encoder": []}, "mlp_keys": {"encoder": ["state"]}})
+    envs = make_vector_env(cfg, [make_env(cfg, i, 0, batched_preprocessing=True) for i in range(cfg.env.num_envs)])
+    # Without pixel observations there is nothing to preprocess: the observations are copied as usual
+    assert isinstance(envs, gym.vector.SyncVectorEnv) and envs.copy
+    first, _ = envs.reset(seed=0)
+    second = envs.step(envs.action_space.sample())[0]
+    assert not np.shares_memory(first["state"], second["state"])
+    envs.close()
+
+    cfg = _preprocessing_cfg((3, 64, 64))
+    envs = make_vector_env(cfg, [make_env(cfg, i, 0, batched_preprocessing=True) for i in range(cfg.env.num_envs)])
+    assert isinstance(envs, BatchedPreprocessObservation) and not envs.env.copy
+    envs.close()
@@ -0,0 +1,52 @@
+import pytest
+import torch
+
+from sheeprl.models.models import LayerNormGRUCell
+
+SEQUENCE_LENGTH, BATCH_SIZE, INPUT_SIZE, HIDDEN_SIZE = 5, 4, 6, 8
+
+
+@pytest.mark.parametrize("bias", [True, False])
+@pytest.mark.parametrize("batch_first", [True, False])
+def test_layer_norm_gru_cell_forward_sequence(bias, batch_first):
+    torch.manual_seed(0)
+    cell = LayerNormGRUCell(INPUT_SIZE, HIDDEN_SIZE, bias=bias, batch_first=batch_first, layer_norm=True)
+    input = torch.randn(SEQUENCE_LENGTH, BATCH_SIZE, INPUT_SIZE)
+    hx = torch.randn(1, BATCH_SIZE, HIDDEN_SIZE)
+    hxs = cell.forward_sequence(input.transpose(0, 1) if batch_first else input, hx)
+    if batch_first:
+        hxs = hxs.transpose(0, 1)
+    assert hxs.shape == (SEQUENCE_LENGTH, BATCH_SIZE, HIDDEN_SIZE)
+    for t in range(SEQUENCE_LENGTH):
+        step_input = input[t : t + 1].transpose(0, 1) if batch_first else input[t : t + 1]
+        hx = cell(step_input, hx)
+        torch.testing.assert_close(hxs[t], hx.squeeze(0))
+
+
+def test_layer_norm_gru_cell_forward_sequence_gradients():
+    torch.manual_seed(0)
+    cell = LayerNormGRUCell(INPUT_SIZE, HIDDEN_SIZE, layer_norm=True)
+    input = torch.randn(SEQUENCE_LENGTH, BATCH_SIZE, INPUT_SIZE)
+    cell.forward_sequence(input).sum().backward()
+    sequence_grads = [p.grad.clone() for p in cell.parameters()]
+    cell.zero_grad()
+    hx = torch.zeros(BATCH_SIZE, HIDDEN_SIZE)
+    loss = 0
+    for t in range(SEQUENCE_LENGTH):
+        hx = cell(input[t], hx)
+        loss = loss + hx.sum()
+    loss.backward()
+    for sequence_grad, p in zip(sequence_grads, cell.parameters()):
+        torch.testing.assert_close(sequence_grad, p.grad)
+    with pytest.raises(ValueError, match="Expected the input sequence to be 3-D"):
+        cell.forward_sequence(input[0])
+
+
+def test_layer_norm_gru_cell_fused():
+    torch.manual_seed(0)
+    cell = LayerNormGRUCell(INPUT_SIZE, HIDDEN_SIZE, layer_norm=True)
+    fused_cell = LayerNormGRUCell(INPUT_SIZE, HIDDEN_SIZE, layer_norm=True, fused=True)
+    fused_cell.load_state_dict(cell.state_dict())
+    input = torch.randn(SEQUENCE_LENGTH, BATCH_SIZE, INPUT_SIZE)
+    torch.testing.assert_close(fused_cell.forward_sequence(input), cell.forward_sequence(input))
+    torch.testing.assert_close(fused_cell(input[:1], torch.zeros(BATCH_SIZE, HIDDEN_SIZE)), cell(input[:1], None))
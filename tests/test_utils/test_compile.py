@@ -0,0 +1,51 @@
+import os
+
+import pytest
+import torch
+from torch import nn
+
+from sheeprl.utils.compile import compile_modules
+from sheeprl.utils.utils import dotdict
+
+
+def _cfg(**kwargs):
+    compile_cfg = {
+        "enabled": True,
+        "modules": ["encoder", "actor"],
+        "mode": None,
+        "modes": {},
+        "fullgraph": False,
+        "backend": "eager",
+        "dynamic": None,
+        "cache_size_limit": 8,
+        "cache_dir": None,
+    }
+    compile_cfg.update(kwargs)
+    return dotdict({"compile": compile_cfg})
+
+
+def test_compile_modules_disabled():
+    encoder = nn.Linear(2, 2)
+    compile_modules({"encoder": [encoder]}, _cfg(enabled=False))
+    compile_modules({"encoder": [encoder]}, dotdict({}))
+    assert encoder._compiled_call_impl is None
+
+
+def test_compile_modules(tmp_path, monkeypatch):
+    monkeypatch.delenv("TORCHINDUCTOR_CACHE_DIR", raising=False)
+    encoder, actor, critic = nn.Linear(2, 3), nn.Linear(3, 1), nn.Linear(3, 1)
+    state_dict_keys = list(encoder.state_dict().keys())
+    with pytest.warns(UserWarning, match="no 'actor' module to compile"):
+        compile_modules({"encoder": [encoder], "critic": [critic]}, _cfg(cache_dir=str(tmp_path / "cache")))
+    # Only the selected modules are compiled, in place
+    assert encoder._compiled_call_impl is not None
+    assert actor._compiled_call_impl is None
+    assert critic._compiled_call_impl is None
+    assert list(encoder.state_dict().keys()) == state_dict_keys
+    x = torch.randn(4, 2)
+    torch.testing.assert_close(encoder(x), x @ encoder.weight.T + encoder.bias)
+    # The compiled graphs are cached in the given directory
+    assert os.environ["TORCHINDUCTOR_CACHE_DIR"] == str(tmp_path / "cache")
+    assert (tmp_path / "cache").is_dir()
+    with pytest.raises(ValueError, match="Unknown modules to compile"):
+        compile_modules({"encoder": [encoder]}, _cfg(modules=["policy"]))
@@ -0,0 +1,64 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from sheeprl.utils.compression import CompressedArray
+
+
+def test_compressed_array_wrong_args():
+    with pytest.raises(ValueError, match="'batch_dims' must be in"):
+        CompressedArray((4, 2), np.uint8, batch_dims=3)
+    with pytest.raises(ValueError, match="Unknown compression codec"):
+        CompressedArray((4, 2), np.uint8, codec="rar")
+
+
+@pytest.mark.parametrize("num_threads", [1, 4])
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32])
+def test_compressed_array_roundtrip(num_threads, dtype):
+    array = np.random.randint(0, 255, (300, 2, 3, 8, 8)).astype(dtype)
+    compressed = CompressedArray(array.shape, dtype, batch_dims=2, num_threads=num_threads)
+    compressed[:200] = array[:200]
+    compressed[200:] = array[200:]
+    assert compressed.shape == array.shape and compressed.dtype == dtype
+    np.testing.assert_array_equal(np.asarray(compressed), array)
+    np.testing.assert_array_equal(compressed[5], array[5])
+    np.testing.assert_array_equal(compressed[5, 1, 2], array[5, 1, 2])
+    np.testing.assert_array_equal(compressed[[3, 7]], array[[3, 7]])
+
+    idxes = np.random.randint(0, 600, (100,))
+    out = np.empty((100, 3, 8, 8), dtype=dtype)
+    compressed.take(idxes, out=out)
+    np.testing.assert_array_equal(out, array.reshape(600, 3, 8, 8)[idxes])
+
+
+def test_compressed_array_slice_is_a_view():
+    compressed = CompressedArray((10, 4), np.int64)
+    compressed[:] = np.arange(40).reshape(10, 4)
+    view = compressed[2:5]
+    assert isinstance(view, CompressedArray) and view.shape == (3, 4)
+    compressed[3] = -1
+    np.testing.assert_array_equal(np.asarray(view), [[8, 9, 10, 11], [-1, -1, -1, -1], [16, 17, 18, 19]])
+
+
+def test_compressed_array_compresses():
+    compressed = CompressedArray((100, 3, 64, 64), np.uint8)
+    compressed[:] = np.zeros((100, 3, 64, 64), dtype=np.uint8)
+    assert compressed.nbytes < 100 * 3 * 64 * 64 // 100
+
+
+def test_compressed_array_read_unwritten():
+    compressed = CompressedArray((10, 4), np.uint8)
+    compressed[:5] = 1
+    with pytest.raises(RuntimeError, match="never been written"):
+        compressed[7]
+
+
+def test_compressed_array_pickle():
+    array = np.random.randint(0, 255, (10, 3, 4), dtype=np.uint8)
+    compressed = CompressedArray(array.shape, np.uint8, num_threads=2)
+    compressed[:] = array
+    restored = pickle.loads(pickle.dumps(compressed))
+    np.testing.assert_array_equal(np.asarray(restored), array)
+    restored[0] = 0
+    np.testing.assert_array_equal(restored[0], 0)
@@ -0,0 +1,83 @@
+import copy
+
+import pytest
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+from sheeprl.utils.precision import set_modules_precision
+from sheeprl.utils.utils import dotdict
+
+
+def _cfg(fabric_precision="32-true", **kwargs):
+    precision_cfg = {
+        "enabled": True,
+        "dtype": "bfloat16",
+        "modules": ["encoder", "rssm"],
+        "full_precision_modules": ["critic"],
+    }
+    precision_cfg.update(kwargs)
+    return dotdict(
+        {
+            "precision": precision_cfg,
+            "distribution": {"validate_args": False, "dtype": "float32"},
+            "fabric": {"precision": fabric_precision},
+        }
+    )
+
+
+def test_set_modules_precision_disabled():
+    encoder = nn.Linear(4, 3)
+    set_modules_precision({"encoder": [encoder]}, _cfg(enabled=False), torch.device("cpu"))
+    set_modules_precision({"encoder": [encoder]}, dotdict({}), torch.device("cpu"))
+    assert "forward" not in encoder.__dict__
+
+
+def test_set_modules_precision():
+    torch.manual_seed(0)
+    encoder, recurrent_model, actor, critic = nn.Linear(4, 3), nn.Linear(3, 3), nn.Linear(3, 2), nn.Linear(3, 1)
+    state_dict_keys = list(encoder.state_dict().keys())
+    set_modules_precision(
+        {"encoder": [encoder], "rssm": [recurrent_model, None], "actor": [actor], "critic": [critic]},
+        _cfg(),
+        torch.device("cpu"),
+    )
+    assert list(encoder.state_dict().keys()) == state_dict_keys
+    x = torch.randn(5, 4)
+
+    # The low-precision modules run in bfloat16 and their outputs are cast to the dtype of the distributions
+    out = encoder(x)
+    assert out.dtype == torch.float32
+    torch.testing.assert_close(out, F.linear(x.bfloat16(), encoder.weight.bfloat16(), encoder.bias.bfloat16()).float())
+
+    # The full-precision modules run in float32, also under autocast
+    with torch.autocast("cpu", dtype=torch.bfloat16):
+        value = critic(out.bfloat16())
+        policy = actor(out)
+    assert value.dtype == torch.float32
+    torch.testing.assert_close(value, F.linear(out.bfloat16().float(), critic.weight, critic.bias))
+    # The other modules are not affected
+    assert policy.dtype == torch.bfloat16
+
+    # The precision follows the deep copies of the modules
+    target_critic = copy.deepcopy(critic)
+    target_critic.weight.data.zero_()
+    with torch.autocast("cpu", dtype=torch.bfloat16):
+        target_value = target_critic(out)
+    assert target_value.dtype == torch.float32
+    torch.testing.assert_close(target_value, target_critic.bias.expand(5, 1))
+
+
+@pytest.mark.parametrize(
+    "kwargs,match",
+    [
+        ({"modules": ["policy"]}, "Unknown modules"),
+        ({"full_precision_modules": ["encoder"]}, "both in low and in full precision"),
+        ({"fabric_precision": "bf16-true"}, "parameters are in half precision"),
+        ({"dtype": "float64"}, "must be 'bfloat16' or 'float16'"),
+        ({"dtype": "float16"}, "requires the gradient scaling"),
+    ],
+)
+def test_set_modules_precision_errors(kwargs, match):
+    with pytest.raises(ValueError, match=match):
+        set_modules_precision({"encoder": [nn.Linear(2, 2)]}, _cfg(**kwargs), torch.device("cpu"))
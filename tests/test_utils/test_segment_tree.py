@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from sheeprl.utils.segment_tree import MinSegmentTree, SumSegmentTree
+
+
+def test_segment_tree_wrong_capacity():
+    with pytest.raises(ValueError, match="must be greater than zero"):
+        SumSegmentTree(0)
+
+
+@pytest.mark.parametrize("capacity", [1, 5, 8, 1000])
+def test_segment_tree_batched_update(capacity):
+    rng = np.random.default_rng(0)
+    values = rng.random(capacity)
+    sum_tree, min_tree = SumSegmentTree(capacity), MinSegmentTree(capacity)
+    sum_tree[np.arange(capacity)] = values
+    min_tree[np.arange(capacity)] = values
+    np.testing.assert_allclose(sum_tree.sum(), values.sum())
+    assert min_tree.min() == values.min()
+
+    idxes = rng.choice(capacity, size=(capacity + 1) // 2, replace=False)
+    values[idxes] = rng.random(len(idxes))
+    sum_tree[idxes] = values[idxes]
+    min_tree[idxes] = values[idxes]
+    np.testing.assert_allclose(sum_tree.sum(), values.sum())
+    assert min_tree.min() == values.min()
+    np.testing.assert_array_equal(sum_tree[np.arange(capacity)], values)
+
+
+def test_sum_segment_tree_find_prefixsum_idx():
+    tree = SumSegmentTree(5)
+    tree[np.arange(5)] = [1.0, 0.0, 2.0, 0.0, 1.0]
+    prefixsums = np.array([0.0, 0.99, 1.0, 2.5, 3.0, 3.99])
+    np.testing.assert_array_equal(tree.find_prefixsum_idx(prefixsums), [0, 0, 2, 2, 4, 4])
+
+
+def test_sum_segment_tree_find_prefixsum_idx_skips_zeros():
+    tree = SumSegmentTree(8)
+    tree[[1, 2]] = [1.0, 1.0]
+    # Prefix sums past the total, as the ones caused by rounding errors, never select an empty element
+    np.testing.assert_array_equal(tree.find_prefixsum_idx(np.array([2.0, 100.0])), [2, 2])